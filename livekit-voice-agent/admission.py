@@ -0,0 +1,232 @@
+"""Admisión de jobs según la carga real del worker.
+
+El worker (proceso principal) calcula su carga con señales reales y la reporta a
+LiveKit mediante `load_fnc`; `request_fnc` vuelve a comprobarla antes de aceptar
+cada llamada. Si el contenedor está saturado la llamada se difiere unos instantes
+o se rechaza para que el servidor la despache a otro worker.
+
+Señales:
+- sesiones activas frente a ADMISSION_MAX_SESSIONS
+- CPU del contenedor (cgroup o psutil, vía livekit.agents)
+- lag del event loop de cada proceso de job
+- tiempo de inferencia por sesión (VAD Silero)
+
+Los procesos de job publican su lag e inferencia en LOAD_STATS_DIR con
+`SessionLoadReporter`; el proceso principal los lee al calcular la carga.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+from livekit import agents
+from livekit.agents import AgentSession, MetricsCollectedEvent, metrics, utils
+from livekit.agents.utils.hw import get_cpu_monitor
+
+logger = logging.getLogger(__name__)
+
+# Umbral de carga (0-1) a partir del cual el worker deja de aceptar llamadas
+ADMISSION_LOAD_THRESHOLD = float(os.getenv("ADMISSION_LOAD_THRESHOLD", "0.75"))
+# Límites que equivalen a carga 1.0 para cada señal
+ADMISSION_MAX_SESSIONS = int(os.getenv("ADMISSION_MAX_SESSIONS", str(os.cpu_count() or 1)))
+ADMISSION_MAX_LOOP_LAG_MS = float(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "150"))
+ADMISSION_MAX_INFERENCE_MS = float(os.getenv("ADMISSION_MAX_INFERENCE_MS", "20"))
+# Segundos que se espera a que baje la carga antes de rechazar (0 = rechazar de inmediato)
+ADMISSION_DEFER_S = float(os.getenv("ADMISSION_DEFER_S", "0"))
+
+LOAD_STATS_DIR = os.getenv("LOAD_STATS_DIR", os.path.join(tempfile.gettempdir(), "autofuturo-load"))
+# Reportes más antiguos que esto se consideran de procesos muertos
+_STALE_REPORT_S = 5.0
+
+
+@dataclass
+class LoadSignals:
+    active_sessions: int = 0
+    cpu: float = 0.0
+    loop_lag_ms: float = 0.0
+    inference_ms: float = 0.0
+
+
+@dataclass
+class AdmissionLimits:
+    max_sessions: int = ADMISSION_MAX_SESSIONS
+    max_loop_lag_ms: float = ADMISSION_MAX_LOOP_LAG_MS
+    max_inference_ms: float = ADMISSION_MAX_INFERENCE_MS
+    threshold: float = ADMISSION_LOAD_THRESHOLD
+
+
+def compute_load(signals: LoadSignals, limits: AdmissionLimits) -> float:
+    """Carga normalizada 0-1: basta una señal saturada para que el worker se considere lleno"""
+    ratios = [
+        signals.cpu,
+        # ADMISSION_MAX_SESSIONS es la capacidad: al llegar a ella la carga alcanza el umbral
+        signals.active_sessions / max(limits.max_sessions, 1) * limits.threshold,
+        signals.loop_lag_ms / limits.max_loop_lag_ms,
+        signals.inference_ms / limits.max_inference_ms,
+    ]
+    return min(max(ratios), 1.0)
+
+
+class WorkerLoadMonitor:
+    """Muestrea la CPU en un hilo y agrega los reportes de los procesos de job"""
+
+    _instance: WorkerLoadMonitor | None = None
+
+    def __init__(self, limits: AdmissionLimits | None = None) -> None:
+        self.limits = limits or AdmissionLimits()
+        self._cpu_monitor = get_cpu_monitor()
+        # La cuota del cgroup puede ser mayor que los núcleos en los que el proceso puede correr
+        quota = self._cpu_monitor.cpu_count()
+        usable = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else quota
+        self._cpu_scale = quota / min(quota, usable) if usable else 1.0
+        self._cpu_avg = utils.MovingAverage(5)  # promedio de ~2.5s
+        self.active_sessions = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._sample_cpu, daemon=True, name="admission_cpu_monitor")
+        self._thread.start()
+
+    @classmethod
+    def instance(cls) -> WorkerLoadMonitor:
+        if cls._instance is None:
+            cls._instance = WorkerLoadMonitor()
+        return cls._instance
+
+    def _sample_cpu(self) -> None:
+        while True:
+            cpu = min(self._cpu_monitor.cpu_percent(interval=0.5) * self._cpu_scale, 1.0)
+            with self._lock:
+                self._cpu_avg.add_sample(cpu)
+
+    def _read_session_reports(self) -> list[dict]:
+        reports = []
+        try:
+            names = os.listdir(LOAD_STATS_DIR)
+        except FileNotFoundError:
+            return reports
+
+        now = time.time()
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(LOAD_STATS_DIR, name)
+            try:
+                if now - os.path.getmtime(path) > _STALE_REPORT_S:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    reports.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return reports
+
+    def signals(self, active_sessions: int) -> LoadSignals:
+        reports = self._read_session_reports()
+        with self._lock:
+            cpu = self._cpu_avg.get_avg()
+        return LoadSignals(
+            active_sessions=active_sessions,
+            cpu=cpu,
+            # El peor proceso manda: un loop atrasado ya degrada esa llamada
+            loop_lag_ms=max((r.get("loop_lag_ms", 0.0) for r in reports), default=0.0),
+            inference_ms=max((r.get("inference_ms", 0.0) for r in reports), default=0.0),
+        )
+
+    def load(self, active_sessions: int) -> float:
+        return compute_load(self.signals(active_sessions), self.limits)
+
+
+def load_fnc(worker: agents.Worker) -> float:
+    """`WorkerOptions.load_fnc`: carga reportada a LiveKit para repartir dispatches"""
+    monitor = WorkerLoadMonitor.instance()
+    monitor.active_sessions = len(worker.active_jobs)
+    return monitor.load(monitor.active_sessions)
+
+
+async def request_fnc(req: agents.JobRequest) -> None:
+    """`WorkerOptions.request_fnc`: acepta, difiere o rechaza cada llamada según la carga actual"""
+    monitor = WorkerLoadMonitor.instance()
+    # La llamada entrante todavía no figura en active_jobs; se cuenta como una sesión más
+    active_sessions = monitor.active_sessions + 1
+
+    load = monitor.load(active_sessions)
+    deadline = time.monotonic() + ADMISSION_DEFER_S
+    while load >= monitor.limits.threshold and time.monotonic() < deadline:
+        await asyncio.sleep(0.25)
+        load = monitor.load(active_sessions)
+
+    if load >= monitor.limits.threshold:
+        signals = monitor.signals(active_sessions)
+        logger.warning(
+            f"[ADMISSION] Rechazando job {req.id} - carga {load:.2f} >= {monitor.limits.threshold:.2f} "
+            f"(sesiones={signals.active_sessions}, cpu={signals.cpu:.2f}, "
+            f"lag={signals.loop_lag_ms:.0f}ms, inferencia={signals.inference_ms:.1f}ms)"
+        )
+        await req.reject()
+        return
+
+    logger.info(f"[ADMISSION] Aceptando job {req.id} - carga {load:.2f}")
+    await req.accept()
+
+
+class SessionLoadReporter:
+    """Publica desde el proceso de job el lag del event loop y el tiempo de inferencia"""
+
+    def __init__(self, *, interval: float = 0.25, report_interval: float = 1.0) -> None:
+        self._interval = interval
+        self._report_interval = report_interval
+        self._lag_ms = utils.MovingAverage(8)
+        self._inference_ms = utils.MovingAverage(8)
+        self._path = os.path.join(LOAD_STATS_DIR, f"{os.getpid()}.json")
+        self._task: asyncio.Task | None = None
+
+    def attach(self, session: AgentSession) -> None:
+        @session.on("metrics_collected")
+        def _on_metrics(ev: MetricsCollectedEvent) -> None:
+            if isinstance(ev.metrics, metrics.VADMetrics) and ev.metrics.inference_count > 0:
+                self._inference_ms.add_sample(
+                    1000 * ev.metrics.inference_duration_total / ev.metrics.inference_count
+                )
+
+    def start(self) -> None:
+        os.makedirs(LOAD_STATS_DIR, exist_ok=True)
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        last_report = 0.0
+        while True:
+            expected = time.monotonic() + self._interval
+            await asyncio.sleep(self._interval)
+            self._lag_ms.add_sample(max(time.monotonic() - expected, 0.0) * 1000)
+
+            if time.monotonic() - last_report >= self._report_interval:
+                self._write_report()
+                last_report = time.monotonic()
+
+    def _write_report(self) -> None:
+        report = {
+            "pid": os.getpid(),
+            "loop_lag_ms": self._lag_ms.get_avg(),
+            "inference_ms": self._inference_ms.get_avg(),
+        }
+        tmp_path = f"{self._path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(report, f)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            logger.warning(f"[ADMISSION] No se pudo escribir el reporte de carga: {e}")
+
+    async def aclose(self) -> None:
+        if self._task:
+            await utils.aio.cancel_and_wait(self._task)
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
@@ -1,32 +1,84 @@
 from dotenv import load_dotenv
+
+# Antes de importar los módulos del agente: leen su configuración del entorno al cargarse
+load_dotenv()
+
+import asyncio
 import os
 import logging
 import json
 import re
 from datetime import datetime, timezone, timedelta
+from typing import Literal
 from livekit import agents, rtc, api
-from livekit.agents import AgentSession, Agent, RoomInputOptions, mcp, function_tool, get_job_context
+from livekit.agents import AgentSession, Agent, StopResponse, mcp, function_tool, get_job_context, inference, llm
 from livekit.agents.voice import RunContext
-from livekit.plugins import noise_cancellation, silero, deepgram, elevenlabs
+from livekit.plugins import silero, deepgram
+# El turn detector debe importarse al cargar el módulo: registra su runner de
+# inferencia en el proceso principal del worker y sus archivos en download-files
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
-from supabase import create_client, Client
-from openai import AsyncOpenAI
-
-load_dotenv()
+from admission import ADMISSION_LOAD_THRESHOLD, SessionLoadReporter, load_fnc, request_fnc
+from load_shedding import LOAD_SHEDDING, SessionShedding
+from endpointing import ADAPTIVE_ENDPOINTING, AdaptiveEndpointing
+from audio_profile import AudioProfile, room_input_options, room_output_options, select_profile
+from text_segmenter import SpeechSegmenter, attach_speech_metrics
+from tts_router import TTS_PROVIDERS, TTSRouter, attach_router_summary
+from llm_router import LLM_ROUTING, LLMRouter, attach_llm_route_summary
+from faq import FAQ_FAST_PATH, FAQFastPath, audio_cache_nbytes, load_matcher
+from post_call import (
+    PostCallQueue, attach_post_call, close_on_caller_hangup, delete_room_on_close, memory_report_job, prospect_sync_job,
+    transcript_job, usage_metrics_job,
+)
+from warm_transfer import TRANSFER_MODE, WarmTransfer
+from outbound_greeting import OUTBOUND_PRERENDER, OutboundGreeting, greeting_template
+from voicemail import VOICEMAIL_DETECTION, VoicemailGuard, voicemail_message
+from connection_pool import (
+    STREAM_POOL,
+    PooledSTT,
+    close_stream_pools,
+    pooled_tts_class,
+    stt_pool_supported,
+    tts_pool_supported,
+    warm_stt,
+    warm_tts,
+)
+from session_memory import SESSION_MEMORY, SessionMemory, frames_nbytes
+from tenants import Tenant, UnknownTenantError, resolve_tenant
+from startup import StartupPipeline, job_dispatched_at
+from tool_cache import TOOL_CACHE, CachedMCPServerHTTP, ToolCallCache, attach_tool_cache_summary
+from availability import (
+    AVAILABILITY,
+    SessionAvailability,
+    attach_availability,
+    describe_business_hours,
+    get_availability_engine,
+)
+from kb_sidecar import (
+    KB_SIDECAR_SOCKET, KB_SNAPSHOT, KBQuery, KBSidecarClient, KnowledgeBase, openai_embedder, supabase_documents,
+    supabase_rpc,
+)
 
 # Configuración del logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Variables de entorno MCP
-mcp_token = os.getenv("MCP_TOKEN")
-mcp_server_url = os.getenv("MCP_SERVER")
-mcp_timeout = int(os.getenv("MCP_TIMEOUT", "10"))
-mcp_session_timeout = int(os.getenv("MCP_SESSION_TIMEOUT", "30"))
+# Variables de entorno MCP (servidor y token de cada concesionaria en tenants.py).
+# MCP_SESSION_TIMEOUT acota la espera de cada lectura: elegidos con evals/sweep_backend_timeouts.py
+mcp_timeout = float(os.getenv("MCP_TIMEOUT", "4"))
+mcp_session_timeout = float(os.getenv("MCP_SESSION_TIMEOUT", "6"))
+# Las escrituras no se cortan a los 6 s: una cita o un prospecto cortados pueden haberse guardado
+# igual, y el LLM los reintentaría (cita duplicada)
+mcp_write_timeout = float(os.getenv("MCP_WRITE_TIMEOUT", "20"))
+mcp_write_tools = {
+    t.strip() for t in os.getenv("MCP_WRITE_TOOLS", "agendar_cita,guardar_prospecto").split(",") if t.strip()
+}
+
+# Nombre con el que LiveKit despacha jobs a este worker (uno para todas las concesionarias)
+AGENT_NAME = os.getenv("AGENT_NAME", "autofuturo-ia")
 
-# Variables de entorno para llamadas salientes
-outbound_trunk_id = os.getenv("SIP_OUTBOUND_TRUNK_ID")
-transfer_to_number = os.getenv("TRANSFER_TO")
+# Endpoints de STT y TTS (proxy, región o servidores locales de prueba)
+DEEPGRAM_BASE_URL = os.getenv("DEEPGRAM_BASE_URL", "https://api.deepgram.com/v1/listen")
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io/v1")
 
 # Variables de entorno para Supabase
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -37,36 +89,329 @@ SUPABASE_TABLE = os.getenv("SUPABASE_TABLE", "documents")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
 K_TOP = int(os.getenv("K_TOP", "3"))
+# Tiempo máximo de la consulta completa (embedding + búsqueda) antes de responder con el fallback;
+# elegido con evals/sweep_backend_timeouts.py. 0 = sin límite
+KB_TIMEOUT_S = float(os.getenv("KB_TIMEOUT_S", "3"))
+
+# Categorías de la base de conocimiento (metadata->>'category', ver supabase/migrations)
+KBCategory = Literal["financiamiento", "inventario", "sucursales", "garantia"]
+
+# Clientes de la base de conocimiento compartidos por el proceso (carga diferida)
+_openai_client = None
+_supabase_client = None
+# Cachés e índice del proceso, o conexión al sidecar del host (KB_SIDECAR_SOCKET, ver kb_sidecar.py)
+_knowledge_base: KnowledgeBase | None = None
+_kb_sidecar: KBSidecarClient | None = None
+
+
+def get_openai_client():
+    """Cliente OpenAI para embeddings; importa `openai` solo la primera vez que se usa"""
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI
+
+        # Sin esto el cliente espera hasta 600 s por intento y reintenta dos veces
+        _openai_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"), timeout=KB_TIMEOUT_S or None, max_retries=1
+        )
+    return _openai_client
+
+
+def get_supabase_client():
+    """Cliente de Supabase; importa `supabase` solo si está configurado y se consulta la base"""
+    global _supabase_client
+    if _supabase_client is None and SUPABASE_URL and SUPABASE_KEY:
+        from supabase import ClientOptions, create_client
+
+        _supabase_client = create_client(
+            SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(postgrest_client_timeout=KB_TIMEOUT_S or 120)
+        )
+    return _supabase_client
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """Base de conocimiento del proceso: se usa sin sidecar o si el sidecar no responde"""
+    global _knowledge_base
+    if _knowledge_base is None:
+        _knowledge_base = KnowledgeBase(
+            openai_embedder(get_openai_client, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS),
+            supabase_rpc(get_supabase_client),
+            load_documents=supabase_documents(get_supabase_client, SUPABASE_TABLE) if KB_SNAPSHOT else None,
+        )
+    return _knowledge_base
+
+
+def get_kb_sidecar() -> KBSidecarClient:
+    global _kb_sidecar
+    if _kb_sidecar is None:
+        _kb_sidecar = KBSidecarClient(KB_SIDECAR_SOCKET)
+    return _kb_sidecar
+
+
+def knowledge_base_nbytes() -> int:
+    return _knowledge_base.nbytes() if _knowledge_base is not None else 0
+
+
+def create_tts_providers(
+    tenant: Tenant, encoding: str = "mp3_22050_32", segmenter: SpeechSegmenter | None = None, *, pooled: bool = False
+) -> dict:
+    """Un TTS por proveedor de TTS_PROVIDERS, con las voces de la concesionaria.
+
+    El plugin de ElevenLabs se importa al construir la sesión, no al cargar el worker.
+    Con `pooled`, ElevenLabs toma una conexión del pool del proceso en su primera síntesis.
+    """
+    from livekit.plugins import elevenlabs
+
+    elevenlabs_cls = pooled_tts_class() if pooled and tts_pool_supported() else elevenlabs.TTS
+    factories = {
+        "elevenlabs": lambda: elevenlabs_cls(
+            model="eleven_turbo_v2_5",
+            voice_id=tenant.voice_id,
+            language="es",
+            encoding=encoding,
+            base_url=ELEVENLABS_BASE_URL,
+            # auto_mode (por defecto): ElevenLabs sintetiza cada trozo del segmentador al recibirlo
+            word_tokenizer=segmenter or SpeechSegmenter(),
+        ),
+        # Proveedor de versiones anteriores, vía LiveKit Inference
+        "cartesia": lambda: inference.TTS(
+            "cartesia/sonic-2",
+            voice=tenant.cartesia_voice,
+            language="es",
+            # Misma tasa que ElevenLabs: el router no remuestrea
+            sample_rate=22050,
+        ),
+    }
+    return {name: factories[name]() for name in TTS_PROVIDERS if name in factories}
+
+
+def create_tts(
+    tenant: Tenant, encoding: str = "mp3_22050_32", segmenter: SpeechSegmenter | None = None, *, pooled: bool = True
+):
+    """TTS de la sesión: un proveedor o un router entre los de TTS_PROVIDERS"""
+    # Con pool, el saludo usa la conexión ya abierta (o la que el pool está terminando de abrir)
+    providers = create_tts_providers(tenant, encoding, segmenter, pooled=STREAM_POOL and pooled)
+    if len(providers) == 1:
+        return next(iter(providers.values()))
+    return TTSRouter(providers)
+
+
+def load_vad(sample_rate: int = 16000) -> silero.VAD:
+    """VAD hiper-sensible; Silero infiere a 16 kHz (banda ancha) o 8 kHz (telefonía)"""
+    return silero.VAD.load(
+        min_silence_duration=0.25,
+        min_speech_duration=0.1,
+        activation_threshold=0.25,
+        prefix_padding_duration=0.1,
+        max_buffered_speech=60.0,
+        sample_rate=sample_rate,
+        force_cpu=True
+    )
+
+
+def prewarm(proc: agents.JobProcess):
+    """Precarga en procesos inactivos lo que toda llamada necesita (modelo VAD y plugin TTS).
+
+    Corre en cada proceso de job antes de recibir una llamada, así el proceso
+    principal del worker nunca importa ElevenLabs ni la base de conocimiento.
+    """
+    from livekit.plugins import elevenlabs  # noqa: F401
+
+    proc.userdata["vad"] = {16000: load_vad(16000), 8000: load_vad(8000)}
+
+
+def load_models(proc: agents.JobProcess) -> None:
+    """Modelos locales de la sesión; normalmente ya los cargó `prewarm` y no hay nada que hacer"""
+    if "vad" not in proc.userdata:
+        logger.warning("[ENTRYPOINT] VAD no precargado en el proceso, cargándolo")
+        proc.userdata["vad"] = {16000: load_vad(16000), 8000: load_vad(8000)}
+
+
+def create_stt(profile: AudioProfile) -> deepgram.STT:
+    """Deepgram recibe la tasa nativa del perfil; con STREAM_POOL toma un websocket ya abierto"""
+    stt_cls = PooledSTT if STREAM_POOL and stt_pool_supported() else deepgram.STT
+    return stt_cls(model="nova-2", language="es", sample_rate=profile.stt_sample_rate, base_url=DEEPGRAM_BASE_URL)
+
+
+def warm_stream_pools(profile: AudioProfile, tenant: Tenant) -> None:
+    """Abre las conexiones de STT y TTS del perfil mientras el job se conecta a la sala"""
+    try:
+        warm_stt(create_stt(profile))
+        for engine in create_tts_providers(tenant, profile.tts_encoding).values():
+            warm_tts(engine)
+    except Exception as e:
+        # Sin claves o sin plugin: la sesión abrirá sus conexiones (y reportará el error) al arrancar
+        logger.warning(f"[ENTRYPOINT] No se pudieron pre-abrir las conexiones de streaming: {e}")
+
+
+def create_mcp_server(
+    tenant: Tenant, tool_cache: ToolCallCache | None = None, availability: SessionAvailability | None = None
+) -> mcp.MCPServerHTTP:
+    options = dict(
+        url=tenant.mcp_server,
+        headers={"token": f"{tenant.mcp_token}"},
+        timeout=mcp_timeout,
+        client_session_timeout_seconds=mcp_session_timeout,
+    )
+    # Con caché, las herramientas MCP de la sesión se deduplican y los prospectos se fusionan;
+    # con disponibilidad local, los horarios salen del proceso y se verifican antes de agendar
+    return CachedMCPServerHTTP(
+        **options,
+        cache=tool_cache,
+        handler=availability.call if availability else None,
+        timeouts={tool: mcp_write_timeout for tool in mcp_write_tools},
+    )
+
+
+async def handshake_mcp_servers(mcp_servers: list[mcp.MCPServer]) -> None:
+    """Handshake MCP y lista de herramientas antes de `session.start`, que ya no los repite.
+
+    Si falla, `session.start` reintenta el handshake (y lo reporta) como antes.
+    """
+    for server in mcp_servers:
+        try:
+            await server.initialize()
+            await server.list_tools()
+        except Exception as e:
+            logger.warning(f"[ENTRYPOINT] Handshake MCP anticipado falló, se reintenta al iniciar la sesión: {e}")
+
+
+def create_session(
+    ctx: agents.JobContext,
+    mcp_servers: list,
+    profile: AudioProfile,
+    tenant: Tenant,
+    *,
+    is_outbound: bool = False,
+    memory: SessionMemory | None = None,
+    tool_cache: ToolCallCache | None = None,
+    availability: SessionAvailability | None = None,
+    shedding: SessionShedding | None = None,
+) -> AgentSession:
+    """Crea la AgentSession con la ruta de audio del perfil y sus controladores por sesión"""
+    vad_model = ctx.proc.userdata["vad"][profile.vad_sample_rate]
+    logger.info(f"[ENTRYPOINT] Perfil de audio: {profile.name}")
+    segmenter = SpeechSegmenter()
+    turn_detector = MultilingualModel()
+    if shedding:
+        # Con el host saturado, el recorte por carga puede dejar el fin de turno al VAD
+        turn_detector = shedding.wrap_turn_detector(turn_detector)
+
+    session = AgentSession(
+        # LLM por turno (modelo rápido para turnos simples) y STT de Deepgram
+        llm=LLMRouter(is_outbound=is_outbound) if LLM_ROUTING else "openai/gpt-4o-mini",
+        stt=create_stt(profile),
+
+        # TTS con ElevenLabs (texto del LLM segmentado por cláusulas)
+        tts=create_tts(tenant, profile.tts_encoding, segmenter),
+
+        # VAD hiper-sensible (precargado en prewarm)
+        vad=vad_model,
+
+        # Habilitar el modelo de detección de turnos
+        turn_detection=turn_detector,
+
+        # HABILITAR GENERACIÓN PREEMPTIVA
+        preemptive_generation=True,
+
+        # Endpointing
+        min_endpointing_delay=0.2,
+        max_endpointing_delay=3.0,
+
+        # Interrupciones hiper-reactivas
+        allow_interruptions=True,
+        discard_audio_if_uninterruptible=True,
+        min_interruption_duration=0.15,
+        min_interruption_words=1,
+        min_consecutive_speech_delay=0.1,
+
+        # El resto se mantiene igual
+        max_tool_steps=3,
+        mcp_servers=mcp_servers
+    )
+
+    # Reportar lag e inferencia de esta sesión para la admisión de nuevas llamadas
+    load_reporter = SessionLoadReporter()
+    load_reporter.attach(session)
+    load_reporter.start()
+    ctx.add_shutdown_callback(load_reporter.aclose)
+
+    # Niveles más baratos de cancelación de ruido, turn detector y VAD cuando el host se satura
+    if shedding:
+        shedding.attach(session, vad_model, profile)
+
+    # Endpointing adaptativo según las pausas de este llamante
+    if ADAPTIVE_ENDPOINTING:
+        AdaptiveEndpointing().attach(session, vad_model)
+
+    # Tamaño del primer trozo y tiempo hasta el primer audio de cada respuesta
+    attach_speech_metrics(session, segmenter)
+    if isinstance(session.tts, TTSRouter):
+        attach_router_summary(session, session.tts)
+    if isinstance(session.llm, LLMRouter):
+        attach_llm_route_summary(session, session.llm)
+    if tool_cache:
+        attach_tool_cache_summary(session, tool_cache)
+    if availability:
+        attach_availability(session, availability)
+
+    # Trabajo post-llamada: corre tras colgar, con tiempo acotado, y libera el proceso
+    post_call = PostCallQueue()
+    post_call.submit("transcripcion", transcript_job(session, ctx.room.name))
+    post_call.submit(
+        "prospectos",
+        prospect_sync_job(session, (lambda: create_mcp_server(tenant)) if mcp_servers else None, tool_cache),
+    )
+    post_call.submit("metricas", usage_metrics_job(session, ctx.room.name))
+    attach_post_call(ctx, session, post_call)
+
+    # Memoria retenida por la sesión (audio, contexto y cachés), muestreada y reportada al colgar
+    if memory is not None:
+        memory.attach(session)
+        memory.track_cache("faq_audio", audio_cache_nbytes)
+        memory.track_cache("base_conocimiento", knowledge_base_nbytes)
+        memory.start()
+        post_call.submit("memoria", memory_report_job(memory, ctx.room.name))
+
+    return session
 
 class Assistant(Agent):
-    def __init__(self, *, name: str = None, appointment_time: str = None, dial_info: dict = None, is_outbound: bool = False) -> None:
-        # Inicializar clientes para la base de conocimiento
-        self._openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self._embeddings_model = EMBEDDING_MODEL
-        self._embeddings_dimension = EMBEDDING_DIMENSIONS
-        
-        # Inicializar cliente de Supabase
-        if SUPABASE_URL and SUPABASE_KEY:
-            self._supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        else:
-            self._supabase_client = None
+    def __init__(self, *, tenant: Tenant, name: str = None, appointment_time: str = None, dial_info: dict = None, is_outbound: bool = False, tool_cache: ToolCallCache | None = None) -> None:
+        # Concesionaria de la llamada: persona, base de conocimiento, FAQ y transferencias
+        self.tenant = tenant
+        # Llamadas repetidas a herramientas en la misma sesión (compartida con el servidor MCP)
+        self.tool_cache = tool_cache
             
         # Configuración para llamadas salientes
         self.participant: rtc.RemoteParticipant | None = None
+        self.transfer: WarmTransfer | None = None
         self.dial_info = dial_info
         self.is_outbound = is_outbound
         self.name = name
         self.appointment_time = appointment_time
+
+        # Ruta rápida de preguntas frecuentes (sin LLM ni búsqueda vectorial), solo con el FAQ propio
+        matcher = load_matcher(tenant.faq_file) if FAQ_FAST_PATH and tenant.faq_file else None
+        self.faq = (
+            FAQFastPath(
+                matcher,
+                scope=tenant.id,
+                fields={"horario": describe_business_hours(tenant.business_hours)},
+                voices=tenant.voices,
+            )
+            if matcher
+            else None
+        )
             
         # Construir instrucciones basadas en el tipo de llamada
         if is_outbound and name and appointment_time:
             instructions = f"""
                 Hoy es {datetime.now(timezone(timedelta(hours=-5))).strftime('%A, %d de %B de %Y, %H:%M %p (UTC-5)')}.
                 ## Rol y Objetivo Principal - LLAMADA SALIENTE
-                Eres **Alex**, el asistente virtual de la concesionaria **AutoFuturo IA**. Estás realizando una llamada saliente a **{name}** para recordarle su cita programada para **{appointment_time}**. Tu objetivo es confirmar la cita, resolver cualquier duda y asegurar que el cliente asista.
+                Eres **{tenant.assistant_name}**, el asistente virtual de la concesionaria **{tenant.company}**. Estás realizando una llamada saliente a **{name}** para recordarle su cita programada para **{appointment_time}**. Tu objetivo es confirmar la cita, resolver cualquier duda y asegurar que el cliente asista.
                 
                 ## Comportamiento para Llamadas Salientes
-                - **Saludo personalizado**: "Hola {name}, te habla Alex de AutoFuturo IA. Te llamo para confirmar tu cita programada para {appointment_time}."
+                - **Saludo personalizado**: "Hola {name}, te habla {tenant.assistant_name} de {tenant.company}. Te llamo para confirmar tu cita programada para {appointment_time}."
                 - **Confirmación de cita**: Verifica que el cliente recuerde y pueda asistir a su cita.
                 - **Resolución de dudas**: Si tiene preguntas, usa las herramientas disponibles para responder.
                 - **Reagendamiento**: Si no puede asistir, ofrece reagendar usando las herramientas de calendario.
@@ -76,11 +421,17 @@ class Assistant(Agent):
             instructions = f"""
                 Hoy es {datetime.now(timezone(timedelta(hours=-5))).strftime('%A, %d de %B de %Y, %H:%M %p (UTC-5)')}.
                 ## Rol y Objetivo Principal - LLAMADA ENTRANTE
-                Eres **Alex**, el asistente virtual de la concesionaria **AutoFuturo IA**. Eres amable, profesional y muy eficiente. Tu **objetivo principal e irrenunciable** es despertar el interés del cliente en nuestros vehículos y **conseguir que agende una cita presencial** para una prueba de manejo o para recibir asesoría personalizada en nuestra sucursal. Toda la conversación debe dirigirse hacia ese fin.
+                Eres **{tenant.assistant_name}**, el asistente virtual de la concesionaria **{tenant.company}**. Eres amable, profesional y muy eficiente. Tu **objetivo principal e irrenunciable** es despertar el interés del cliente en nuestros vehículos y **conseguir que agende una cita presencial** para una prueba de manejo o para recibir asesoría personalizada en nuestra sucursal. Toda la conversación debe dirigirse hacia ese fin.
+            """
+
+        if tenant.prompt_notes:
+            instructions += f"""
+                ## Sobre la Concesionaria
+                {tenant.prompt_notes}
             """
 
         super().__init__(
-            instructions=instructions + """
+            instructions=instructions + f"""
 
                 ## Personalidad y Principios de Comunicación
                 - **Orientado al Objetivo:** Siempre busca la oportunidad para ofrecer una visita. Si respondes una pregunta, termina con una invitación. Ej: "...sí tenemos planes de financiamiento. ¿Qué te parece si agendas una cita y uno de nuestros asesores te explica todo en persona?"
@@ -108,7 +459,7 @@ class Assistant(Agent):
                 - **NUNCA** incluyas la sintaxis de la función en el texto que hablas.
 
                 ## Flujo de Conversación para Agendar una Cita
-                1.  **Saludo:** Preséntate amablemente. `"Hola, te atiende Alex de la concesionaria AutoFuturo IA. ¿En qué puedo ayudarte hoy?"`
+                1.  **Saludo:** Preséntate amablemente. `"Hola, te atiende {tenant.assistant_name} de la concesionaria {tenant.company}. ¿En qué puedo ayudarte hoy?"`
                 2.  **Escuchar y Responder:**
                     *   Si es una pregunta general (ej: "¿Tienen financiamiento?"), usa `buscar_en_base_de_conocimiento`.
                     *   Si es sobre un auto (ej: "¿Tienen la RAV4?"), usa `consultar_inventario`.
@@ -118,17 +469,26 @@ class Assistant(Agent):
                 4.  **Captura de Datos:** Si el cliente acepta, pide sus datos. `"¡Excelente! Para registrar tu cita, ¿me podrías dar tu nombre completo y tu número de teléfono, por favor?"` → **Inmediatamente** usa `guardar_prospecto`.
                 5.  **Búsqueda de Horarios:** Propón un día o pregunta cuándo le gustaría venir. `"Perfecto. ¿Tienes disponibilidad para el sábado por la mañana?"` → Usa `consultar_horarios_disponibles` para verificar.
                 6.  **Confirmación de Cita:** Ofrece los horarios disponibles de forma clara. `"Tengo un espacio libre el sábado a las 10 AM o a las 11 AM. ¿Cuál prefieres?"`
-                7.  **Agendamiento Final:** Una vez que elija, confirma todos los datos y usa `agendar_cita`. `"Confirmado, [Nombre]. Tu cita para probar el [Modelo] es el sábado a las 10 AM. Te enviaremos un recordatorio. ¡Te esperamos en AutoFuturo IA!"`
+                7.  **Agendamiento Final:** Una vez que elija, confirma todos los datos y usa `agendar_cita`. `"Confirmado, [Nombre]. Tu cita para probar el [Modelo] es el sábado a las 10 AM. Te enviaremos un recordatorio. ¡Te esperamos en {tenant.company}!"`
                 8.  **Manejo de Negativas:** Si el cliente no quiere agendar, no insistas más de una vez. Ofrécele la información por otro medio. `"Entendido. Si cambias de opinión, no dudes en llamarnos. ¡Que tengas un buen día!"`
 
                 ## Reglas Clave
                 - Tu **prioridad #1** es agendar la cita. Sé proactivo.
                 - Guarda los datos del prospecto tan pronto como los tengas.
-                - No leas URLs. Di "Puedes encontrar más detalles en nuestra web, autofuturo punto com".
+                - No leas URLs. Di "Puedes encontrar más detalles en nuestra web, {tenant.website}".
                 - Si el usuario se repite o la herramienta falla, ofrece amablemente que un asesor humano lo llame más tarde. `"Veo que tengo una dificultad técnica. Para no hacerte esperar, ¿te parece si un asesor te devuelve la llamada en unos minutos?"`
                 """,
         )
 
+    async def on_enter(self) -> None:
+        if self.faq:
+            self.faq.attach(self.session)
+
+    async def on_user_turn_completed(self, turn_ctx: llm.ChatContext, new_message: llm.ChatMessage) -> None:
+        # Preguntas frecuentes con coincidencia de alta confianza: respuesta aprobada sin pasar por el LLM
+        if self.faq and await self.faq.try_answer(self, new_message):
+            raise StopResponse()
+
     def set_participant(self, participant: rtc.RemoteParticipant):
         """Configurar el participante para transferencias"""
         self.participant = participant
@@ -141,7 +501,9 @@ class Assistant(Agent):
         )
         logger.info(f"[AGENT] Saludo inicial generado exitosamente")
     @function_tool()
-    async def buscar_en_base_de_conocimiento(self, pregunta: str, ctx: RunContext) -> str:
+    async def buscar_en_base_de_conocimiento(
+        self, pregunta: str, ctx: RunContext, categoria: KBCategory | None = None
+    ) -> str:
         """
         Usa siempre esta herramienta para obtener información de la base de conocimiento y generar una respuesta al usuario.
 
@@ -152,58 +514,66 @@ class Assistant(Agent):
                             - "¿Tienen la RAV4?"
                             - "¿Tienen el modelo 2026?"
                             - "Dónde se encuentra la concesionaria?"
+            categoria (str, opcional): Tema de la pregunta, si es claro: "financiamiento" (créditos,
+                            cuotas, planes), "inventario" (modelos, versiones, precios, stock),
+                            "sucursales" (direcciones, horarios, contacto) o "garantia" (garantía,
+                            mantenimiento, servicio técnico). Omítela si la pregunta mezcla temas.
 
         Returns:
             str: Referencias con información para brindar una respuesta al usuario.
         """
-        logger.info(f"Query base de conocimiento: {pregunta}")
+        logger.info(f"Query base de conocimiento: {pregunta} (categoría: {categoria or 'todas'})")
 
         try:
-            # Verificar si Supabase está configurado
-            if not self._supabase_client:
-                return "La base de conocimiento no está configurada. Por favor, contacta con nuestro servicio al cliente para obtener información."
-
-            # Crear embedding de la pregunta
-            query_embedding = await self._openai_client.embeddings.create(
-                input=[pregunta],
-                model=self._embeddings_model,
-                dimensions=self._embeddings_dimension,
-            )
-
-            embeddings = query_embedding.data[0].embedding
-
-            # Buscar en Supabase usando búsqueda vectorial con la función match_documents
-            results = self._supabase_client.rpc(
-                'match_documents',
-                {
-                    'query_embedding': embeddings,
-                    'match_count': K_TOP,
-                    'filter': {}
-                }
-            ).execute()
-            
-            if results.data and len(results.data) > 0:
-                # Formatear salida
-                salida = ""
-                for i, r in enumerate(results.data, start=1):
-                    content = r.get("content", "").replace("\r\n", "\n").strip()
-                    similarity = r.get("similarity", 0)
-                    salida += (
-                        f"{i}. **referencia {i} - Inicio**\n"
-                        f"id: {r.get('id', 'N/A')}\n"
-                        f"similarity: {similarity:.4f}\n"
-                        f"content: {content}\n"
-                        f"**fin de referencia {i}**\n\n"
-                    )
-                return salida
-            else:
-                logger.info("[Supabase] No se encontraron resultados relevantes con búsqueda vectorial.")
-                return "No encontré información específica sobre tu consulta. Te recomiendo contactar directamente con nuestro servicio al cliente para obtener una respuesta más precisa."
-                
+            args = {"pregunta": pregunta, "categoria": categoria}
+            async with asyncio.timeout(KB_TIMEOUT_S or None):
+                if self.tool_cache:
+                    return await self.tool_cache.call("buscar_en_base_de_conocimiento", args, self._buscar_referencias)
+                return await self._buscar_referencias(args)
+        except TimeoutError:
+            logger.error(f"[Supabase] buscar_en_base_de_conocimiento sin respuesta en {KB_TIMEOUT_S:.1f}s")
+            return "Lo siento, la consulta está tardando más de lo normal. Por favor, intenta de nuevo o contacta con nuestro servicio al cliente."
         except Exception as e:
             logger.error(f"Error en buscar_en_base_de_conocimiento: {e}")
             return f"Lo siento, estoy teniendo problemas para consultar la información. Por favor, intenta de nuevo o contacta con nuestro servicio al cliente."
 
+    async def _buscar_referencias(self, args: dict) -> str:
+        """Búsqueda vectorial de la pregunta; los errores se propagan (no se memorizan)"""
+        pregunta, categoria = args["pregunta"], args["categoria"]
+
+        # Función y filtro de la concesionaria (nunca datos del LLM); la categoría se filtra en la base,
+        # dentro del recorrido del índice HNSW, y si no hay resultados se busca en todo el corpus
+        query = KBQuery(pregunta, categoria, self.tenant.kb_function, self.tenant.kb_filter, K_TOP)
+        rows = None
+        if KB_SIDECAR_SOCKET:
+            try:
+                rows = await get_kb_sidecar().search(query)
+            except (ConnectionError, OSError) as e:
+                logger.warning(f"[KB_SIDECAR] Sin respuesta de {KB_SIDECAR_SOCKET} ({e}); búsqueda en el proceso")
+        if rows is None:
+            # Verificar si Supabase está configurado
+            if not get_supabase_client():
+                return "La base de conocimiento no está configurada. Por favor, contacta con nuestro servicio al cliente para obtener información."
+            rows = await get_knowledge_base().search(query)
+
+        if rows:
+            # Formatear salida
+            salida = ""
+            for i, r in enumerate(rows, start=1):
+                content = r.get("content", "").replace("\r\n", "\n").strip()
+                similarity = r.get("similarity", 0)
+                salida += (
+                    f"{i}. **referencia {i} - Inicio**\n"
+                    f"id: {r.get('id', 'N/A')}\n"
+                    f"similarity: {similarity:.4f}\n"
+                    f"content: {content}\n"
+                    f"**fin de referencia {i}**\n\n"
+                )
+            return salida
+        else:
+            logger.info("[Supabase] No se encontraron resultados relevantes con búsqueda vectorial.")
+            return "No encontré información específica sobre tu consulta. Te recomiendo contactar directamente con nuestro servicio al cliente para obtener una respuesta más precisa."
+
     @function_tool()
     async def transfer_call(self, transfer_to: str, reason: str, ctx: RunContext) -> str:
         """Call this tool if the user wants to speak to a human agent"""
@@ -215,14 +585,34 @@ class Assistant(Agent):
             logger.error("[TOOL] transfer_call - Error: No hay participante configurado")
             return "Error: No hay participante configurado para transferir"
 
-        if not transfer_to_number:
+        if not self.tenant.transfer_to:
             logger.warning("[TOOL] transfer_call - No transfer number configured")
             await ctx.session.generate_reply(
                 instructions="Lo siento, no puedo transferir la llamada en este momento. Por favor, contacta directamente con nuestro servicio al cliente."
             )
             return "Lo siento, no puedo transferir la llamada en este momento. Por favor, contacta directamente con nuestro servicio al cliente."
 
-        logger.info(f"[TOOL] transfer_call - transfiriendo llamada a: {transfer_to_number}")
+        # Transferencia en caliente: se marca al asesor en paralelo y el agente sigue con el llamante
+        if TRANSFER_MODE == "warm" and self.tenant.outbound_trunk_id:
+            if self.transfer and self.transfer.in_progress:
+                return "La transferencia ya está en curso. Sigue conversando con el cliente mientras contesta el asesor."
+            self.transfer = WarmTransfer(
+                ctx.session,
+                caller_identity=self.participant.identity,
+                transfer_to=self.tenant.transfer_to,
+                trunk_id=self.tenant.outbound_trunk_id,
+                reason=reason,
+                # La sala de consulta habla con su propio TTS (la conexión lista del pool es del llamante)
+                tts_factory=lambda: create_tts(self.tenant, pooled=False),
+            )
+            self.transfer.start()
+            logger.info(f"[TOOL] transfer_call - transferencia en caliente iniciada a: {self.tenant.transfer_to}")
+            return (
+                "Estoy llamando a un asesor humano. Dile al cliente en una frase que lo estás comunicando y sigue "
+                "conversando con él mientras contesta; no vuelvas a usar transfer_call."
+            )
+
+        logger.info(f"[TOOL] transfer_call - transfiriendo llamada a: {self.tenant.transfer_to}")
         
         # El agente ya maneja los mensajes de transferencia automáticamente según sus instrucciones
         logger.info(f"[TOOL] transfer_call - agente manejará mensaje de transferencia automáticamente")
@@ -233,11 +623,11 @@ class Assistant(Agent):
                 api.TransferSIPParticipantRequest(
                     room_name=job_ctx.room.name,
                     participant_identity=self.participant.identity,
-                    transfer_to=f"tel:{transfer_to_number}",
+                    transfer_to=f"tel:{self.tenant.transfer_to}",
                 )
             )
             
-            logger.info(f"[TOOL] transfer_call - llamada transferida exitosamente a: {transfer_to_number}")
+            logger.info(f"[TOOL] transfer_call - llamada transferida exitosamente a: {self.tenant.transfer_to}")
             return "transferencia completada exitosamente"
             
         except Exception as e:
@@ -254,59 +644,91 @@ class Assistant(Agent):
 
         # Inform the user that the call is ending
         logger.info(f"[TOOL] end_call - generando mensaje de despedida")
-        await ctx.session.generate_reply(
+        ctx.session.generate_reply(
             instructions="Gracias por tu tiempo. Ha sido un placer ayudarte. La llamada está terminando."
         )
 
-        # let the agent finish speaking
-        current_speech = ctx.session.current_speech
-        if current_speech:
-            logger.info(f"[TOOL] end_call - esperando que termine el speech actual")
-            try:
-                await current_speech.wait_for_playout()
-            except Exception as e:
-                logger.warning(f"[TOOL] end_call - error esperando speech: {e}")
-
-        # Pequeña pausa para asegurar que el mensaje se complete
-        import asyncio
-        await asyncio.sleep(0.5)
-
-        logger.info(f"[TOOL] end_call - colgando llamada")
-        await self.hangup()
-        logger.info(f"[TOOL] end_call - llamada terminada exitosamente")
-        return "llamada terminada exitosamente"
+        # `shutdown` drena la cola de locuciones: la sesión se cierra cuando termina de
+        # reproducirse la despedida y al cerrarse elimina la sala (sin pausas fijas)
+        logger.info(f"[TOOL] end_call - colgando al terminar la despedida")
+        ctx.session.shutdown()
+        # Sin salida: la despedida es lo último que dice el agente
+        return None
 
-    async def hangup(self):
-        """Helper function to hang up the call by deleting the room"""
 
-        job_ctx = get_job_context()
-        if job_ctx is None:
-            logger.warning("No job context available for hangup")
-            return
-        
+def parse_dial_info(metadata: str) -> dict | None:
+    """Datos de marcado de la metadata del job (JSON o el formato sin comillas del CLI); None si no hay"""
+    if not metadata:
+        return None
+    logger.info(f"[ENTRYPOINT] Metadata encontrada: {metadata}")
+    dial_info = None
+    try:
+        # Intentar parsear como JSON válido primero
         try:
-            logger.info(f"[HANGUP] Eliminando room: {job_ctx.room.name}")
-            await job_ctx.api.room.delete_room(
-                api.DeleteRoomRequest(
-                    room=job_ctx.room.name,
-                )
-            )
-            logger.info("[HANGUP] Room eliminado exitosamente")
-        except Exception as e:
-            logger.error(f"[HANGUP] Error eliminando room: {e}")
-            # Intentar shutdown como alternativa
-            try:
-                logger.info("[HANGUP] Intentando shutdown del contexto")
-                job_ctx.shutdown()
-            except Exception as shutdown_error:
-                logger.error(f"[HANGUP] Error en shutdown: {shutdown_error}")
-            # Continue anyway to avoid hanging
+            dial_info = json.loads(metadata)
+            logger.info(f"[ENTRYPOINT] Metadata parseada como JSON: {dial_info}")
+        except json.JSONDecodeError:
+            logger.info(f"[ENTRYPOINT] Falló parseo JSON, intentando formato CLI")
+            # Si falla, intentar parsear el formato sin comillas del CLI
+            metadata_str = metadata
+            logger.info(f"[ENTRYPOINT] Metadata original: {metadata_str}")
+            
+            # Reemplazar claves sin comillas con claves con comillas
+            metadata_str = re.sub(r'(\w+):', r'"\1":', metadata_str)
+            
+            # Manejar valores que pueden contener espacios y caracteres especiales
+            # El problema es que la metadata se está cortando, necesitamos parsear lo que tenemos
+            
+            # Buscar phone_number específicamente
+            phone_match = re.search(r'phone_number["\']?\s*:\s*["\']?([^,}]+)', metadata_str)
+            if phone_match:
+                phone_number = phone_match.group(1).strip('"\'')
+                dial_info = {"phone_number": phone_number}
+                
+                # Buscar name si existe
+                name_match = re.search(r'name["\']?\s*:\s*["\']?([^,}]+)', metadata_str)
+                if name_match:
+                    dial_info["name"] = name_match.group(1).strip('"\'')
+                
+                # Buscar appointment_time si existe
+                appointment_match = re.search(r'appointment_time["\']?\s*:\s*["\']?([^,}]+)', metadata_str)
+                if appointment_match:
+                    dial_info["appointment_time"] = appointment_match.group(1).strip('"\'')
+                
+                logger.info(f"[ENTRYPOINT] Metadata parseada manualmente: {dial_info}")
+            else:
+                # Si no encontramos phone_number, intentar parseo JSON normal
+                def quote_values(match):
+                    key = match.group(1)
+                    value = match.group(2).strip()
+                    if value.startswith('"') and value.endswith('"'):
+                        return match.group(0)
+                    return f'"{key}": "{value}"'
+                
+                metadata_str = re.sub(r'"(\w+)":\s*([^,}]+)', quote_values, metadata_str)
+                logger.info(f"[ENTRYPOINT] Metadata procesada: {metadata_str}")
+                
+                try:
+                    dial_info = json.loads(metadata_str)
+                    logger.info(f"[ENTRYPOINT] Metadata parseada como CLI: {dial_info}")
+                except json.JSONDecodeError as e:
+                    logger.error(f"[ENTRYPOINT] Error parseando metadata CLI: {e}")
+                    dial_info = {}
+    except Exception as e:
+        logger.warning(f"[ENTRYPOINT] Could not parse metadata: {e}")
+    return dial_info if isinstance(dial_info, dict) else None
 
 async def entrypoint(ctx: agents.JobContext):
     logger.info(f"[ENTRYPOINT] Iniciando entrypoint - room: {ctx.room.name}")
-    logger.info(f"[ENTRYPOINT] Conectando a la sala")
-    await ctx.connect(auto_subscribe=agents.AutoSubscribe.AUDIO_ONLY)
-    logger.info(f"[ENTRYPOINT] Conexión exitosa a la sala")
+    # Concesionaria del job (metadata del dispatch o prefijo de la sala); una desconocida no se atiende
+    try:
+        tenant = resolve_tenant(ctx.job.metadata, ctx.room.name)
+    except UnknownTenantError as e:
+        logger.error(f"[ENTRYPOINT] {e} - room: {ctx.room.name}")
+        ctx.shutdown(reason="unknown tenant")
+        return
+    ctx.log_context_fields["tenant"] = tenant.id
+    logger.info(f"[ENTRYPOINT] Concesionaria: {tenant.id} ({tenant.company})")
 
     # Verificar API keys antes de continuar
     openai_key = os.getenv("OPENAI_API_KEY")
@@ -317,91 +739,50 @@ async def entrypoint(ctx: agents.JobContext):
     if not deepgram_key:
         raise ValueError("DEEPGRAM_API_KEY no está configurado")
 
-    # Check if this is an outbound call by looking for metadata
-    is_outbound = False
-    dial_info = None
-    agent_name = "Alex"
-    appointment_time = None
-
-    if ctx.job.metadata:
-        logger.info(f"[ENTRYPOINT] Metadata encontrada: {ctx.job.metadata}")
-        try:
-            # Intentar parsear como JSON válido primero
-            try:
-                dial_info = json.loads(ctx.job.metadata)
-                logger.info(f"[ENTRYPOINT] Metadata parseada como JSON: {dial_info}")
-            except json.JSONDecodeError:
-                logger.info(f"[ENTRYPOINT] Falló parseo JSON, intentando formato CLI")
-                # Si falla, intentar parsear el formato sin comillas del CLI
-                metadata_str = ctx.job.metadata
-                logger.info(f"[ENTRYPOINT] Metadata original: {metadata_str}")
-                
-                # Reemplazar claves sin comillas con claves con comillas
-                metadata_str = re.sub(r'(\w+):', r'"\1":', metadata_str)
-                
-                # Manejar valores que pueden contener espacios y caracteres especiales
-                # El problema es que la metadata se está cortando, necesitamos parsear lo que tenemos
-                
-                # Buscar phone_number específicamente
-                phone_match = re.search(r'phone_number["\']?\s*:\s*["\']?([^,}]+)', metadata_str)
-                if phone_match:
-                    phone_number = phone_match.group(1).strip('"\'')
-                    dial_info = {"phone_number": phone_number}
-                    
-                    # Buscar name si existe
-                    name_match = re.search(r'name["\']?\s*:\s*["\']?([^,}]+)', metadata_str)
-                    if name_match:
-                        dial_info["name"] = name_match.group(1).strip('"\'')
-                    
-                    # Buscar appointment_time si existe
-                    appointment_match = re.search(r'appointment_time["\']?\s*:\s*["\']?([^,}]+)', metadata_str)
-                    if appointment_match:
-                        dial_info["appointment_time"] = appointment_match.group(1).strip('"\'')
-                    
-                    logger.info(f"[ENTRYPOINT] Metadata parseada manualmente: {dial_info}")
-                else:
-                    # Si no encontramos phone_number, intentar parseo JSON normal
-                    def quote_values(match):
-                        key = match.group(1)
-                        value = match.group(2).strip()
-                        if value.startswith('"') and value.endswith('"'):
-                            return match.group(0)
-                        return f'"{key}": "{value}"'
-                    
-                    metadata_str = re.sub(r'"(\w+)":\s*([^,}]+)', quote_values, metadata_str)
-                    logger.info(f"[ENTRYPOINT] Metadata procesada: {metadata_str}")
-                    
-                    try:
-                        dial_info = json.loads(metadata_str)
-                        logger.info(f"[ENTRYPOINT] Metadata parseada como CLI: {dial_info}")
-                    except json.JSONDecodeError as e:
-                        logger.error(f"[ENTRYPOINT] Error parseando metadata CLI: {e}")
-                        dial_info = {}
-            
-            if dial_info and "phone_number" in dial_info:
-                is_outbound = True
-                agent_name = dial_info.get("name", "Alex")
-                appointment_time = dial_info.get("appointment_time", "next Tuesday at 3pm")
-                logger.info(f"[ENTRYPOINT] Llamada saliente detectada - phone: {dial_info['phone_number']}, name: {agent_name}")
-        except Exception as e:
-            logger.warning(f"[ENTRYPOINT] Could not parse metadata: {e}")
+    # Nivel de degradación del host: la sesión arranca en el actual
+    shedding = SessionShedding(ctx.room.name) if LOAD_SHEDDING else None
 
-    # Configurar servidores MCP
+    # Configurar servidores MCP (el handshake corre como paso del arranque)
+    tool_cache = ToolCallCache() if TOOL_CACHE else None
+    availability = None
     mcp_servers = []
-    if mcp_server_url and mcp_token:
-        logger.info(f"Configurando MCP server: {mcp_server_url}")
-        logger.info(f"MCP timeout: {mcp_timeout}s, session timeout: {mcp_session_timeout}s")
-        mcp_servers.append(
-            mcp.MCPServerHTTP(
-                url=mcp_server_url,
-                headers={"token": f"{mcp_token}"},
-                timeout=mcp_timeout,
-                client_session_timeout_seconds=mcp_session_timeout,
-            )
+    if tenant.mcp_server and tenant.mcp_token:
+        logger.info(f"Configurando MCP server: {tenant.mcp_server}")
+        logger.info(
+            f"MCP timeout: {mcp_timeout}s, session timeout: {mcp_session_timeout}s, "
+            f"escrituras: {mcp_write_timeout}s"
         )
+        if AVAILABILITY:
+            # Horarios desde la copia del calendario del host (compartida por sus procesos en AVAILABILITY_HOLDS_DB)
+            engine = get_availability_engine(tenant, lambda: create_mcp_server(tenant))
+            availability = SessionAvailability(engine, ctx.room.name)
+        mcp_servers.append(create_mcp_server(tenant, tool_cache, availability))
     else:
         logger.warning("MCP server no configurado - funcionalidad limitada")
 
+    # Pasos sin dependencias entre sí: arrancan juntos desde el dispatch (ver startup.py)
+    startup = StartupPipeline(ctx.room.name, dispatched_at=job_dispatched_at(ctx.job))
+    logger.info(f"[ENTRYPOINT] Conectando a la sala")
+    startup.step("sala", lambda: ctx.connect(auto_subscribe=agents.AutoSubscribe.AUDIO_ONLY))
+    startup.step("metadata", lambda: parse_dial_info(ctx.job.metadata))
+    startup.step("modelos", lambda: load_models(ctx.proc))
+    if STREAM_POOL:
+        # Perfil de telefonía (salientes y casi todas las entrantes); una llamada web abre sus conexiones al arrancar
+        startup.step("proveedores", lambda: warm_stream_pools(select_profile(is_outbound=True), tenant))
+        ctx.add_shutdown_callback(close_stream_pools)
+    if mcp_servers:
+        startup.step("mcp", lambda: handshake_mcp_servers(mcp_servers))
+
+    # Check if this is an outbound call by looking for metadata
+    dial_info = await startup.result("metadata")
+    is_outbound = dial_info is not None and "phone_number" in dial_info
+    agent_name = "Alex"
+    appointment_time = None
+    if is_outbound:
+        agent_name = dial_info.get("name", "Alex")
+        appointment_time = dial_info.get("appointment_time", "next Tuesday at 3pm")
+        logger.info(f"[ENTRYPOINT] Llamada saliente detectada - phone: {dial_info['phone_number']}, name: {agent_name}")
+
     if is_outbound:
         # Outbound call logic
         logger.info(f"[ENTRYPOINT] Iniciando lógica de llamada saliente")
@@ -411,74 +792,42 @@ async def entrypoint(ctx: agents.JobContext):
 
         # Create outbound agent
         logger.info(f"[ENTRYPOINT] Creando agente saliente")
-        agent = Assistant(
+        agent = await startup.step("agente", lambda: Assistant(
+            tenant=tenant,
             name=agent_name,
             appointment_time=appointment_time,
             dial_info=dial_info,
             is_outbound=True,
-        )
+            tool_cache=tool_cache,
+        ))
         logger.info(f"[ENTRYPOINT] Agente saliente creado exitosamente")
 
         # Crear y configurar AgentSession para llamada saliente
         logger.info(f"[ENTRYPOINT] Creando sesión para llamada saliente")
         
-        session = AgentSession(
-            # LLM y STT
-            llm="openai/gpt-4o-mini",
-            stt=deepgram.STT(model="nova-2", language="es"),
-
-            # TTS con ElevenLabs
-            tts=elevenlabs.TTS(
-                model="eleven_turbo_v2_5",
-                voice_id="b2htR0pMe28pYwCY9gnP",
-                language="es"
-            ),
-
-            # VAD hiper-sensible
-            vad=silero.VAD.load(
-                min_silence_duration=0.25,
-                min_speech_duration=0.1,
-                activation_threshold=0.25,
-                prefix_padding_duration=0.1,
-                max_buffered_speech=60.0,
-                force_cpu=True
-            ),
-
-            # Habilitar el modelo de detección de turnos
-            turn_detection=MultilingualModel(),
-
-            # HABILITAR GENERACIÓN PREEMPTIVA
-            preemptive_generation=True,
-
-            # Endpointing
-            min_endpointing_delay=0.2,
-            max_endpointing_delay=3.0,
-
-            # Interrupciones hiper-reactivas
-            allow_interruptions=True,
-            discard_audio_if_uninterruptible=True,
-            min_interruption_duration=0.15,
-            min_interruption_words=1,
-            min_consecutive_speech_delay=0.1,
-
-            # El resto se mantiene igual
-            max_tool_steps=3,
-            mcp_servers=mcp_servers
-        )
+        # Las llamadas salientes son SIP: ruta de audio de telefonía nativa
+        profile = select_profile(is_outbound=True)
+        memory = SessionMemory() if SESSION_MEMORY else None
+        session = await startup.step("sesion", lambda: create_session(
+            ctx, mcp_servers, profile, tenant, is_outbound=True, memory=memory, tool_cache=tool_cache,
+            availability=availability, shedding=shedding,
+        ))
+        delete_room_on_close(ctx, session, keep_room=lambda: agent.transfer is not None and agent.transfer.bridged)
+        startup.watch_greeting(session)
         
         logger.info(f"[ENTRYPOINT] Sesión para llamada saliente creada exitosamente")
 
-        # Start the session
+        # Start the session (espera la conexión a la sala y el handshake MCP)
         try:
             logger.info(f"[ENTRYPOINT] Iniciando sesión del agente")
-            session_started = await session.start(
+            session_started = await startup.step("inicio", lambda: session.start(
                 agent=agent,
                 room=ctx.room,
-                room_input_options=RoomInputOptions(
-                    # Cancelación de ruido optimizada para telefonía
-                    noise_cancellation=noise_cancellation.BVCTelephony()
-                )
-            )
+                room_input_options=room_input_options(
+                    profile, light_noise_cancellation=shedding is not None and shedding.light_noise_cancellation
+                ),
+                room_output_options=room_output_options(profile),
+            ))
             logger.info(f"[ENTRYPOINT] Sesión iniciada exitosamente")
 
         except Exception as e:
@@ -486,24 +835,51 @@ async def entrypoint(ctx: agents.JobContext):
             logger.error(f"[ENTRYPOINT] Traceback completo: ", exc_info=True)
             if "MCP" in str(e) or "mcp" in str(e):
                 logger.error("Error de conexión MCP - verificando configuración del servidor")
+            startup.report()
             ctx.shutdown()
             return
 
+        # Mientras suena el teléfono: generar y sintetizar el saludo de recordatorio
+        greeting = None
+        if OUTBOUND_PRERENDER:
+            greeting = OutboundGreeting(
+                session,
+                instructions=agent.instructions,
+                text=greeting_template(agent_name, appointment_time, tenant.assistant_name, tenant.company),
+            )
+            greeting.start()
+            greeting.watch(ctx.room, participant_identity)
+            if memory:
+                memory.track_cache("saludo", lambda: frames_nbytes(greeting.frames))
+
+        # Detección de buzón: el mensaje para la contestadora también se sintetiza durante el timbrado
+        voicemail_guard = None
+        if VOICEMAIL_DETECTION:
+            voicemail_guard = VoicemailGuard(session, message=voicemail_message(agent_name, appointment_time, tenant.company))
+            voicemail_guard.prerender()
+            if memory:
+                memory.track_cache("buzon", lambda: frames_nbytes(voicemail_guard.frames))
+
         # Create SIP participant for outbound call
         try:
             logger.info(f"[ENTRYPOINT] Creando participante SIP para llamada saliente")
-            logger.info(f"[ENTRYPOINT] Parámetros SIP - room: {ctx.room.name}, trunk: {outbound_trunk_id}, to: {phone_number}")
+            logger.info(f"[ENTRYPOINT] Parámetros SIP - room: {ctx.room.name}, trunk: {tenant.outbound_trunk_id}, to: {phone_number}")
             
-            await ctx.api.sip.create_sip_participant(
+            await startup.step("marcado", lambda: ctx.api.sip.create_sip_participant(
                 api.CreateSIPParticipantRequest(
                     room_name=ctx.room.name,
-                    sip_trunk_id=outbound_trunk_id,
+                    sip_trunk_id=tenant.outbound_trunk_id,
                     sip_call_to=phone_number,
                     participant_identity=participant_identity,
                     wait_until_answered=True,
                 )
-            )
+            ))
+            # El saludo de una saliente incluye el timbrado: se reporta también hasta que contestan
+            startup.mark("marcado")
             logger.info(f"[ENTRYPOINT] Participante SIP creado exitosamente")
+            # Por si el cambio de estado SIP no llegó antes: el cliente ya contestó
+            if greeting:
+                greeting.play()
 
             # Wait for participant to join
             participant = await ctx.wait_for_participant(identity=participant_identity)
@@ -511,89 +887,70 @@ async def entrypoint(ctx: agents.JobContext):
 
             agent.set_participant(participant)
             logger.info(f"[ENTRYPOINT] Participante configurado en el agente")
+            close_on_caller_hangup(ctx, session, participant.identity)
 
-            # El agente manejará el saludo automáticamente según sus instrucciones
-            logger.info(f"[ENTRYPOINT] Agente configurado para manejar saludo automáticamente")
+            # Los primeros segundos del audio del cliente deciden si es una persona o un buzón
+            if voicemail_guard:
+                voicemail_guard.start(participant, sample_rate=profile.input_sample_rate)
+
+            # Sin pre-renderizado el agente manejará el saludo según sus instrucciones
+            logger.info(f"[ENTRYPOINT] Saludo {'pre-renderizado en reproducción' if greeting else 'a cargo del agente'}")
 
         except api.TwirpError as e:
             logger.error(f"[ENTRYPOINT] error creating SIP participant: {e.message}")
             logger.error(f"[ENTRYPOINT] SIP status: {e.metadata.get('sip_status_code')} {e.metadata.get('sip_status')}")
+            if greeting:
+                greeting.cancel()
+            startup.report()
             ctx.shutdown()
     else:
         # Inbound call logic
         logger.info(f"[ENTRYPOINT] Iniciando lógica de llamada entrante")
         
         # Add transfer configuration for inbound calls
-        dial_info = {"transfer_to": transfer_to_number} if transfer_to_number else {}
+        dial_info = {"transfer_to": tenant.transfer_to} if tenant.transfer_to else {}
         logger.info(f"[ENTRYPOINT] Configuración de transferencia para llamada entrante: {dial_info}")
         
         logger.info(f"[ENTRYPOINT] Creando agente para llamada entrante")
-        agent = Assistant(
+        agent = await startup.step("agente", lambda: Assistant(
+            tenant=tenant,
             is_outbound=False,
             dial_info=dial_info,
-        )
+            tool_cache=tool_cache,
+        ))
         logger.info(f"[ENTRYPOINT] Agente para llamada entrante creado exitosamente")
 
+        # El perfil de audio depende de si el participante entra por SIP o por web
+        logger.info(f"[ENTRYPOINT] Esperando que se una el participante")
+        
+        participant = await startup.step("participante", ctx.wait_for_participant)
+        logger.info(f"[ENTRYPOINT] Participante unido: {participant.identity}")
+        profile = select_profile(participant)
+
         # Crear y configurar AgentSession para llamada entrante
         logger.info(f"[ENTRYPOINT] Creando sesión para llamada entrante")
         
-        session = AgentSession(
-            # LLM y STT
-            llm="openai/gpt-4o-mini",
-            stt=deepgram.STT(model="nova-2", language="es"),
-
-            # TTS con Cartesia
-            tts=elevenlabs.TTS(
-                model="eleven_turbo_v2_5",
-                voice_id="b2htR0pMe28pYwCY9gnP",
-                language="es"
-            ),
-
-            # VAD hiper-sensible
-            vad=silero.VAD.load(
-                min_silence_duration=0.25,
-                min_speech_duration=0.1,
-                activation_threshold=0.25,
-                prefix_padding_duration=0.1,
-                max_buffered_speech=60.0,
-                force_cpu=True
-            ),
-
-            # Habilitar el modelo de detección de turnos
-            turn_detection=MultilingualModel(),
-
-            # HABILITAR GENERACIÓN PREEMPTIVA
-            preemptive_generation=True,
-
-            # Endpointing
-            min_endpointing_delay=0.2,
-            max_endpointing_delay=3.0,
-
-            # Interrupciones hiper-reactivas
-            allow_interruptions=True,
-            discard_audio_if_uninterruptible=True,
-            min_interruption_duration=0.15,
-            min_interruption_words=1,
-            min_consecutive_speech_delay=0.1,
-
-            # El resto se mantiene igual
-            max_tool_steps=3,
-            mcp_servers=mcp_servers
-        )
+        session = await startup.step("sesion", lambda: create_session(
+            ctx, mcp_servers, profile, tenant,
+            memory=SessionMemory() if SESSION_MEMORY else None, tool_cache=tool_cache,
+            availability=availability, shedding=shedding,
+        ))
+        delete_room_on_close(ctx, session, keep_room=lambda: agent.transfer is not None and agent.transfer.bridged)
+        startup.watch_greeting(session)
         
         logger.info(f"[ENTRYPOINT] Sesión para llamada entrante creada exitosamente")
 
-        # Start session
+        # Start session (espera el handshake MCP si todavía no terminó)
         try:
             logger.info(f"[ENTRYPOINT] Iniciando sesión para llamada entrante")
-            await session.start(
+            await startup.step("inicio", lambda: session.start(
                 agent=agent,
                 room=ctx.room,
-                room_input_options=RoomInputOptions(
-                    # Cancelación de ruido optimizada para llamadas entrantes
-                    noise_cancellation=noise_cancellation.BVC()
-                )
-            )
+                room_input_options=room_input_options(
+                    profile, light_noise_cancellation=shedding is not None and shedding.light_noise_cancellation
+                ),
+                room_output_options=room_output_options(profile),
+            ))
             logger.info(f"[ENTRYPOINT] Sesión para llamada entrante iniciada exitosamente")
             
         except Exception as e:
@@ -601,21 +958,17 @@ async def entrypoint(ctx: agents.JobContext):
             logger.error(f"[ENTRYPOINT] Traceback completo: ", exc_info=True)
             if "MCP" in str(e) or "mcp" in str(e):
                 logger.error("Error de conexión MCP en llamada entrante - verificando configuración del servidor")
+            startup.report()
             ctx.shutdown()
             return
 
-        # Wait for participant to join and session to be ready
-        logger.info(f"[ENTRYPOINT] Esperando que se una el participante")
-        
-        participant = await ctx.wait_for_participant()
-        logger.info(f"[ENTRYPOINT] Participante unido: {participant.identity}")
-        
         agent.set_participant(participant)
         logger.info(f"[ENTRYPOINT] Participante configurado en el agente")
+        close_on_caller_hangup(ctx, session, participant.identity)
 
         # Generar saludo inicial para llamadas entrantes usando el método del agente
         logger.info(f"[ENTRYPOINT] Llamando método de saludo del agente")
-        await agent.generate_initial_greeting(session)
+        await startup.step("saludo", lambda: agent.generate_initial_greeting(session))
         logger.info(f"[ENTRYPOINT] Saludo inicial completado")
     
     logger.info(f"[ENTRYPOINT] Agente iniciado exitosamente - is_outbound: {is_outbound}")
@@ -623,6 +976,11 @@ async def entrypoint(ctx: agents.JobContext):
 if __name__ == "__main__":
     agents.cli.run_app(agents.WorkerOptions(
         entrypoint_fnc=entrypoint, 
+        prewarm_fnc=prewarm,
+        # Admisión según carga real: sesiones, lag del loop, CPU e inferencia
+        load_fnc=load_fnc,
+        request_fnc=request_fnc,
+        load_threshold=ADMISSION_LOAD_THRESHOLD,
         initialize_process_timeout=120,
-        agent_name="autofuturo-ia",
+        agent_name=AGENT_NAME,
     ))
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""Perfiles de audio de la sesión: banda ancha (web) y telefonía nativa (SIP).
+
+En llamadas SIP el audio útil es de banda estrecha (8 kHz). El perfil de
+telefonía mantiene toda la ruta de entrada a 8 kHz: el AudioStream de la sala
+entrega 8 kHz directamente (el remuestreo se hace una sola vez, en el FFI),
+Silero infiere a 8 kHz y Deepgram recibe 8 kHz, así que ningún componente
+vuelve a remuestrear en Python. La salida se publica a la tasa nativa del TTS.
+
+ElevenLabs (plugin 1.2) solo decodifica MP3: se pide `mp3_22050_32`, el formato
+de menor tasa disponible, y se publica a 22050 Hz sin remuestrear.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, replace
+
+from livekit import rtc
+from livekit.agents import RoomInputOptions, RoomOutputOptions
+from livekit.plugins import noise_cancellation
+
+TELEPHONY_AUDIO = os.getenv("TELEPHONY_AUDIO", "true").lower() == "true"
+
+
+@dataclass(frozen=True)
+class AudioProfile:
+    name: str
+    input_sample_rate: int
+    vad_sample_rate: int
+    stt_sample_rate: int
+    tts_encoding: str
+    output_sample_rate: int
+    telephony_noise_cancellation: bool
+
+
+# Ruta actual: 24 kHz de entrada, remuestreo a 16 kHz en VAD y STT, salida a 24 kHz
+WIDEBAND = AudioProfile(
+    name="wideband",
+    input_sample_rate=24000,
+    vad_sample_rate=16000,
+    stt_sample_rate=16000,
+    tts_encoding="mp3_22050_32",
+    output_sample_rate=24000,
+    telephony_noise_cancellation=False,
+)
+
+# Ruta SIP: todo a 8 kHz en la entrada, salida a la tasa nativa del TTS
+TELEPHONY = AudioProfile(
+    name="telephony",
+    input_sample_rate=8000,
+    vad_sample_rate=8000,
+    stt_sample_rate=8000,
+    tts_encoding="mp3_22050_32",
+    output_sample_rate=22050,
+    telephony_noise_cancellation=True,
+)
+
+
+def select_profile(participant: rtc.RemoteParticipant | None = None, *, is_outbound: bool = False) -> AudioProfile:
+    """Las llamadas salientes siempre son SIP; las entrantes se deciden por el tipo de participante"""
+    is_sip = is_outbound or (
+        participant is not None and participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP
+    )
+    if not is_sip:
+        return WIDEBAND
+    if not TELEPHONY_AUDIO:
+        # Ruta de banda ancha, pero conservando la cancelación de ruido de telefonía
+        return replace(WIDEBAND, telephony_noise_cancellation=True)
+    return TELEPHONY
+
+
+def noise_cancellation_options(profile: AudioProfile, *, light: bool = False) -> rtc.NoiseCancellationOptions:
+    """BVC (BVCTelephony en llamadas SIP); `light` usa NC, más barato, cuando el host está saturado"""
+    if light:
+        return noise_cancellation.NC()
+    # Cancelación de ruido optimizada para telefonía en llamadas SIP
+    return noise_cancellation.BVCTelephony() if profile.telephony_noise_cancellation else noise_cancellation.BVC()
+
+
+def room_input_options(profile: AudioProfile, *, light_noise_cancellation: bool = False) -> RoomInputOptions:
+    return RoomInputOptions(
+        audio_sample_rate=profile.input_sample_rate,
+        noise_cancellation=noise_cancellation_options(profile, light=light_noise_cancellation),
+        # La sala se elimina en `delete_room_on_close` (post_call.py) salvo tras una transferencia en caliente
+        delete_room_on_close=False,
+    )
+
+
+def room_output_options(profile: AudioProfile) -> RoomOutputOptions:
+    return RoomOutputOptions(audio_sample_rate=profile.output_sample_rate)
@@ -0,0 +1,739 @@
+"""Disponibilidad de citas calculada en el proceso.
+
+Cada pregunta de horarios iba a `consultar_horarios_disponibles` (MCP) y de ahí al
+calendario, que calculaba los huecos: tardaba, y dos llamadas a la vez podían
+ofrecer el mismo horario antes de que cualquiera llegara a `agendar_cita`.
+
+`AvailabilityEngine` (uno por concesionaria y proceso):
+
+- copia del calendario: eventos de los próximos AVAILABILITY_DAYS días, leídos
+  cada AVAILABILITY_SYNC_S con la herramienta MCP AVAILABILITY_EVENTS_TOOL
+  (`{"desde": "AAAA-MM-DD", "hasta": "AAAA-MM-DD"}` → lista de eventos con
+  inicio/fin), más el horario de atención de la concesionaria
+  (`business_hours`, `slot_minutes`). Todo en UTC-5, como el prompt.
+- la copia es del host, no del proceso: vive en la misma base SQLite que las
+  retenciones. Cada proceso de job atiende una llamada, así que con una copia
+  por proceso cada llamada esperaba su propia sincronización de 21 días (y
+  consultaba por MCP mientras tanto). Ahora un solo proceso por concesionaria
+  tiene el turno de sincronizar (se renueva en cada sincronización y vence si el
+  proceso termina) y los demás, incluido el de una llamada nueva, cargan la
+  copia al instante.
+- índice por día: inicios ordenados de los eventos y el mayor fin acumulado; si
+  un horario choca con un evento se decide con una búsqueda binaria.
+- retenciones: los horarios ofrecidos a una llamada quedan apartados
+  AVAILABILITY_HOLD_S para las demás mientras el cliente confirma. Viven en una
+  base SQLite (AVAILABILITY_HOLDS_DB) que comparten los procesos del host; una
+  nueva consulta de la misma llamada reemplaza sus retenciones y se liberan al
+  colgar. SQLite bloquea: todas las operaciones corren fuera del event loop.
+- `agendar_cita`: antes de enviarla se vuelve a leer ese día del calendario. Si
+  el horario ya no está libre (otro host, una cita creada a mano) se responde con
+  los libres de ese día sin enviarla. Si se confirma, el evento entra al índice y
+  la retención pasa a reserva hasta la próxima sincronización de los demás.
+
+Si el servidor MCP no tiene la herramienta de eventos, la copia está vencida
+(AVAILABILITY_STALE_S) o no se entiende la fecha, la consulta sigue por MCP. Que
+falta la herramienta queda anotado en la base del host: los demás procesos ni
+abren el servidor ni esperan la copia, y se vuelve a probar pasada
+AVAILABILITY_MISSING_RECHECK_S.
+
+Está apagado por defecto (AVAILABILITY): el servidor MCP de producción no expone
+`listar_eventos`; se enciende al publicar la herramienta (o al apuntar
+AVAILABILITY_EVENTS_TOOL a la que exista).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+from livekit.agents import AgentSession, CloseEvent, mcp
+from livekit.agents.llm.tool_context import get_raw_function_info
+
+from tenants import Tenant
+from text_segmenter import say_time
+from tool_cache import ToolCall
+
+logger = logging.getLogger(__name__)
+
+# Apagado por defecto: el servidor MCP de producción no expone AVAILABILITY_EVENTS_TOOL
+AVAILABILITY = os.getenv("AVAILABILITY", "false").lower() == "true"
+AVAILABILITY_EVENTS_TOOL = os.getenv("AVAILABILITY_EVENTS_TOOL", "listar_eventos")
+AVAILABILITY_QUERY_TOOL = os.getenv("AVAILABILITY_QUERY_TOOL", "consultar_horarios_disponibles")
+AVAILABILITY_BOOK_TOOL = os.getenv("AVAILABILITY_BOOK_TOOL", "agendar_cita")
+AVAILABILITY_DAYS = int(os.getenv("AVAILABILITY_DAYS", "21"))
+AVAILABILITY_SYNC_S = float(os.getenv("AVAILABILITY_SYNC_S", "60"))
+# Copia más vieja que esto (p. ej. el calendario no responde): se consulta por MCP
+AVAILABILITY_STALE_S = float(os.getenv("AVAILABILITY_STALE_S", "300"))
+# Cada cuánto se vuelve a probar si el servidor MCP ya tiene AVAILABILITY_EVENTS_TOOL
+AVAILABILITY_MISSING_RECHECK_S = float(os.getenv("AVAILABILITY_MISSING_RECHECK_S", "3600"))
+AVAILABILITY_HOLD_S = float(os.getenv("AVAILABILITY_HOLD_S", "180"))
+AVAILABILITY_OFFER_SLOTS = int(os.getenv("AVAILABILITY_OFFER_SLOTS", "3"))
+# Anticipación mínima para una cita de hoy
+AVAILABILITY_LEAD_MIN = int(os.getenv("AVAILABILITY_LEAD_MIN", "60"))
+# Espera máxima para releer el día antes de agendar; si no llega, se agenda con la copia
+AVAILABILITY_RECONCILE_S = float(os.getenv("AVAILABILITY_RECONCILE_S", "2"))
+AVAILABILITY_HOLDS_DB = os.getenv(
+    "AVAILABILITY_HOLDS_DB", os.path.join(tempfile.gettempdir(), "autofuturo-holds.sqlite3")
+)
+
+# La zona que usa el prompt ("Hoy es ... (UTC-5)")
+TZ = timezone(timedelta(hours=-5))
+
+_WEEKDAYS = {"lunes": 0, "martes": 1, "miercoles": 2, "jueves": 3, "viernes": 4, "sabado": 5, "domingo": 6}
+_DAY_NAMES = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+_DAY_KEYS = {"lun": 0, "mar": 1, "mie": 2, "jue": 3, "vie": 4, "sab": 5, "dom": 6}
+_MONTHS = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7, "agosto": 8,
+    "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+_MONTH_NAMES = [
+    "enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre", "octubre",
+    "noviembre", "diciembre",
+]
+_SUFFIX = r"(am|pm|a m|p m|de la manana|de la tarde|de la noche)"
+
+
+def now() -> datetime:
+    return datetime.now(TZ)
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s:/-]", " ", text).split())
+
+
+def _future(day: int, month: int, year: int | None, today: date) -> date | None:
+    try:
+        result = date(year or today.year, month, day)
+    except ValueError:
+        return None
+    # "15 de enero" dicho en diciembre es el del año siguiente
+    if year is None and result < today:
+        result = result.replace(year=result.year + 1)
+    return result
+
+
+def parse_day(text: str, today: date) -> date | None:
+    """Día de una expresión del cliente o del LLM: fecha ISO, 24/10, 24 de octubre, hoy, mañana, sábado..."""
+    t = _normalize(text)
+    if m := re.search(r"(?<!\d)(\d{4})-(\d{1,2})-(\d{1,2})(?!\d)", t):
+        return _future(int(m[3]), int(m[2]), int(m[1]), today)
+    if m := re.search(r"(?<!\d)(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?(?!\d)", t):
+        year = int(m[3]) + (2000 if len(m[3]) == 2 else 0) if m[3] else None
+        return _future(int(m[1]), int(m[2]), year, today)
+    if m := re.search(rf"(?<!\d)(\d{{1,2}}) de ({'|'.join(_MONTHS)})(?: de (\d{{4}}))?", t):
+        return _future(int(m[1]), _MONTHS[m[2]], int(m[3]) if m[3] else None, today)
+    if "pasado manana" in t:
+        return today + timedelta(days=2)
+    if re.search(r"(?<!la )\bmanana\b", t):
+        return today + timedelta(days=1)
+    if re.search(r"\bhoy\b", t):
+        return today
+    for name, weekday in _WEEKDAYS.items():
+        if re.search(rf"\b{name}\b", t):
+            delta = (weekday - today.weekday()) % 7
+            if delta == 0 and re.search(r"proximo|siguiente|que viene", t):
+                delta = 7
+            return today + timedelta(days=delta)
+    return None
+
+
+def parse_time(text: str) -> int | None:
+    """Hora en minutos desde la medianoche: 10:00, 4 pm, 10 de la mañana, a las 3, mediodía"""
+    t = _normalize(text)
+    if "mediodia" in t:
+        return 12 * 60
+    m = (
+        re.search(rf"(?<![\d/-])(\d{{1,2}}):(\d{{2}})\s*{_SUFFIX}?", t)
+        or re.search(rf"(?<![\d/-])(\d{{1,2}})()\s*{_SUFFIX}", t)
+        or re.search(r"\blas (\d{1,2})()(?![\d:/])", t)
+    )
+    if not m:
+        return None
+    hour, minute = int(m[1]), int(m[2] or 0)
+    suffix = m[3] if m.lastindex and m.lastindex >= 3 else None
+    if suffix in ("pm", "p m", "de la tarde", "de la noche") and hour < 12:
+        hour += 12
+    elif suffix in ("am", "a m", "de la manana") and hour == 12:
+        hour = 0
+    elif suffix is None and not m[2] and 1 <= hour <= 7:
+        # Sin am/pm ni minutos, "a las 3" en una concesionaria es de la tarde (07:00 es 07:00)
+        hour += 12
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+def parse_part_of_day(text: str) -> tuple[int, int]:
+    """Rango pedido (minutos): desde una hora, por la mañana, por la tarde o todo el día"""
+    t = _normalize(text)
+    at = parse_time(text)
+    if at is not None:
+        return at, 24 * 60
+    if re.search(r"(por|en|de) la manana", t):
+        return 0, 12 * 60
+    if "tarde" in t:
+        return 12 * 60, 24 * 60
+    if "noche" in t:
+        return 18 * 60, 24 * 60
+    return 0, 24 * 60
+
+
+def parse_business_hours(hours: dict[str, str]) -> dict[int, list[tuple[int, int]]]:
+    """{"lun-vie": "09:00-18:00", "sab": "09:00-13:00"} → por día de la semana, tramos en minutos"""
+    result: dict[int, list[tuple[int, int]]] = {}
+    for days, ranges in hours.items():
+        first, _, last = _normalize(days).partition("-")
+        start, end = _DAY_KEYS[first[:3]], _DAY_KEYS[(last or first)[:3]]
+        spans = []
+        for span in filter(None, (r.strip() for r in ranges.split(","))):
+            opens, closes = span.split("-")
+            spans.append((parse_time(opens.strip()) or 0, parse_time(closes.strip()) or 0))
+        for weekday in range(start, (end if end >= start else end + 7) + 1):
+            result[weekday % 7] = sorted(spans)
+    return result
+
+
+def describe_business_hours(hours: dict[str, str]) -> str:
+    """{"lun-vie": "09:00-18:00", "sab": "09:00-13:00"} → 'de lunes a viernes de nueve de la mañana a seis de la tarde y ...'"""
+    parts = []
+    for days, ranges in hours.items():
+        first, _, last = _normalize(days).partition("-")
+        start, end = _DAY_KEYS[first[:3]], _DAY_KEYS[(last or first)[:3]]
+        when = f"de {_DAY_NAMES[start]} a {_DAY_NAMES[end]}" if start != end else f"los {_DAY_NAMES[start]}s"
+        spans = []
+        for span in filter(None, (r.strip() for r in ranges.split(","))):
+            opens, closes = (parse_time(t.strip()) or 0 for t in span.split("-"))
+            spans.append(f"de {_say_minutes(opens)} a {_say_minutes(closes)}")
+        parts.append(f"{when} {' y '.join(spans)}")
+    if len(parts) == 1:
+        return parts[0]
+    # Con tramos partidos ("de nueve a una y de tres a siete") la coma separa los días
+    last = ", y " if any(" y " in part for part in parts) else " y "
+    return ", ".join(parts[:-1]) + last + parts[-1]
+
+
+def _say_minutes(minutes: int) -> str:
+    hour, minute = divmod(minutes, 60)
+    return say_time(hour, minute, "am" if hour < 12 else "pm")
+
+
+def _when(value: Any) -> datetime | None:
+    if isinstance(value, dict):
+        value = value.get("dateTime") or value.get("date")
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    # Sin zona: hora local de la concesionaria
+    return parsed.replace(tzinfo=TZ) if parsed.tzinfo is None else parsed.astimezone(TZ)
+
+
+def parse_events(result: Any) -> list[tuple[datetime, datetime]]:
+    """Eventos de la respuesta de la herramienta MCP (texto JSON, lista, o `items` de Google Calendar)"""
+    if isinstance(result, str):
+        result = json.loads(result)
+    # Contenido de texto de MCP: {"type": "text", "text": "..."} (o una lista de ellos)
+    if isinstance(result, dict) and result.get("type") == "text":
+        result = json.loads(result["text"])
+    elif isinstance(result, list) and result and isinstance(result[0], dict) and result[0].get("type") == "text":
+        result = [event for part in result for event in _as_list(json.loads(part["text"]))]
+    events = []
+    for event in _as_list(result):
+        if not isinstance(event, dict) or event.get("status") == "cancelled":
+            continue
+        start = _when(event.get("inicio") or event.get("start"))
+        end = _when(event.get("fin") or event.get("end"))
+        if start and end and end > start:
+            events.append((start, end))
+    return events
+
+
+def _as_list(data: Any) -> list:
+    if isinstance(data, dict):
+        return data.get("eventos") or data.get("events") or data.get("items") or []
+    return data if isinstance(data, list) else []
+
+
+class DayIndex:
+    """Eventos de un día (minutos desde la medianoche) ordenados por inicio, con el mayor fin acumulado"""
+
+    __slots__ = ("starts", "max_ends", "intervals")
+
+    def __init__(self, intervals: list[tuple[int, int]] = ()) -> None:
+        self.intervals = sorted(intervals)
+        self.starts = [start for start, _ in self.intervals]
+        self.max_ends, running = [], -1
+        for _, end in self.intervals:
+            running = max(running, end)
+            self.max_ends.append(running)
+
+    def busy(self, start: int, end: int) -> bool:
+        """¿Algún evento se cruza con [start, end)?"""
+        i = bisect_left(self.starts, end)
+        return i > 0 and self.max_ends[i - 1] > start
+
+    def add(self, start: int, end: int) -> DayIndex:
+        return DayIndex([*self.intervals, (start, end)])
+
+
+def build_index(events: list[tuple[datetime, datetime]], first: date, last: date) -> dict[date, DayIndex]:
+    """Índice por día de `first` a `last`; los eventos de varios días se reparten"""
+    intervals: dict[date, list[tuple[int, int]]] = {first + timedelta(days=i): [] for i in range((last - first).days + 1)}
+    for start, end in events:
+        day = start.date()
+        while day <= end.date():
+            if day in intervals:
+                midnight = datetime.combine(day, datetime.min.time(), TZ)
+                from_min = max(0, int((start - midnight).total_seconds() // 60))
+                to_min = min(24 * 60, int(-(-(end - midnight).total_seconds() // 60)))
+                if to_min > from_min:
+                    intervals[day].append((from_min, to_min))
+            day += timedelta(days=1)
+    return {day: DayIndex(spans) for day, spans in intervals.items()}
+
+
+def slot_key(day: date, minute: int) -> str:
+    return f"{day.isoformat()}T{minute // 60:02d}:{minute % 60:02d}"
+
+
+def describe_day(day: date) -> str:
+    return f"{_DAY_NAMES[day.weekday()]} {day.day} de {_MONTH_NAMES[day.month - 1]}"
+
+
+def _hhmm(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def _join(items: list[str]) -> str:
+    return items[0] if len(items) == 1 else f"{', '.join(items[:-1])} y {items[-1]}"
+
+
+class HoldStore:
+    """Retenciones y copia del calendario compartidas por los procesos del host (SQLite).
+
+    Las retenciones sobreviven a un proceso caído hasta vencer. Los métodos bloquean (hasta
+    `timeout` esperando el lock de la base): se llaman con `asyncio.to_thread`.
+    """
+
+    def __init__(self, path: str = AVAILABILITY_HOLDS_DB) -> None:
+        self._db = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        # Una conexión usada desde los hilos de `asyncio.to_thread`, de a una operación
+        self._lock = threading.Lock()
+        self._db.execute("pragma journal_mode=wal")
+        # Datos efímeros: no hace falta esperar al disco
+        self._db.execute("pragma synchronous=off")
+        self._db.execute(
+            "create table if not exists holds (tenant text not null, slot text not null, session text not null, "
+            "kind text not null, expires_at real not null, primary key (tenant, slot))"
+        )
+        self._db.execute(
+            "create table if not exists calendar (tenant text not null, day text not null, "
+            "intervals text not null, primary key (tenant, day))"
+        )
+        # Última sincronización de cada concesionaria y proceso con el turno de sincronizar
+        self._db.execute(
+            "create table if not exists calendar_sync (tenant text primary key, synced_at real not null, "
+            "owner text not null, lease_until real not null)"
+        )
+        # Herramientas de eventos que el servidor MCP de la concesionaria no tiene, y cuándo se vio
+        self._db.execute(
+            "create table if not exists missing_tools (tenant text not null, tool text not null, "
+            "checked_at real not null, primary key (tenant, tool))"
+        )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._db.execute("begin immediate")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("rollback")
+                raise
+            self._db.execute("commit")
+
+    def offer(self, tenant: str, session: str, slots: list[str], limit: int, ttl_s: float) -> list[str]:
+        """Aparta para `session` los primeros `limit` horarios de `slots` que nadie más tenga"""
+        at = time.time()
+        acquired = []
+        with self._transaction() as db:
+            db.execute("delete from holds where expires_at <= ?", (at,))
+            db.execute("delete from holds where tenant = ? and session = ? and kind = 'oferta'", (tenant, session))
+            for slot in slots:
+                cursor = db.execute(
+                    "insert or ignore into holds values (?, ?, ?, 'oferta', ?)", (tenant, slot, session, at + ttl_s)
+                )
+                if cursor.rowcount == 1:
+                    acquired.append(slot)
+                    if len(acquired) >= limit:
+                        break
+        return acquired
+
+    def holder(self, tenant: str, slot: str) -> str | None:
+        with self._lock:
+            row = self._db.execute(
+                "select session from holds where tenant = ? and slot = ? and expires_at > ?", (tenant, slot, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def book(self, tenant: str, session: str, slot: str, ttl_s: float) -> None:
+        with self._transaction() as db:
+            db.execute("delete from holds where tenant = ? and session = ? and kind = 'oferta'", (tenant, session))
+            db.execute(
+                "insert or replace into holds values (?, ?, ?, 'reserva', ?)", (tenant, slot, session, time.time() + ttl_s)
+            )
+
+    def release(self, session: str) -> None:
+        with self._lock:
+            self._db.execute("delete from holds where session = ? and kind = 'oferta'", (session,))
+
+    def claim_sync(self, tenant: str, owner: str, lease_s: float) -> bool:
+        """Toma (o renueva) el turno de sincronizar `tenant` si está libre, vencido o ya es de `owner`"""
+        at = time.time()
+        with self._transaction() as db:
+            row = db.execute("select owner, lease_until from calendar_sync where tenant = ?", (tenant,)).fetchone()
+            if row and row[0] != owner and row[1] > at:
+                return False
+            db.execute(
+                "insert into calendar_sync values (?, 0, ?, ?) "
+                "on conflict (tenant) do update set owner = excluded.owner, lease_until = excluded.lease_until",
+                (tenant, owner, at + lease_s),
+            )
+        return True
+
+    def mark_missing(self, tenant: str, tool: str) -> None:
+        with self._lock:
+            self._db.execute("insert or replace into missing_tools values (?, ?, ?)", (tenant, tool, time.time()))
+
+    def missing(self, tenant: str, tool: str, max_age_s: float) -> bool:
+        """Si algún proceso vio hace menos de `max_age_s` que el servidor no tiene `tool`"""
+        with self._lock:
+            row = self._db.execute(
+                "select checked_at from missing_tools where tenant = ? and tool = ?", (tenant, tool)
+            ).fetchone()
+        return bool(row) and time.time() - row[0] < max_age_s
+
+    def save_calendar(self, tenant: str, days: dict[date, DayIndex], synced_at: float | None = None) -> None:
+        """Guarda los días de `days`; con `synced_at` es una sincronización completa"""
+        rows = [(tenant, day.isoformat(), json.dumps(index.intervals)) for day, index in days.items()]
+        with self._transaction() as db:
+            if synced_at is not None:
+                db.execute("delete from calendar where tenant = ?", (tenant,))
+                db.execute("update calendar_sync set synced_at = ? where tenant = ?", (synced_at, tenant))
+            db.executemany("insert or replace into calendar values (?, ?, ?)", rows)
+
+    def load_calendar(self, tenant: str) -> tuple[float | None, dict[date, DayIndex]]:
+        """(instante de la última sincronización completa, días) de la copia del host"""
+        with self._lock:
+            row = self._db.execute("select synced_at from calendar_sync where tenant = ?", (tenant,)).fetchone()
+            if not row or not row[0]:
+                return None, {}
+            days = self._db.execute("select day, intervals from calendar where tenant = ?", (tenant,)).fetchall()
+        return row[0], {
+            date.fromisoformat(day): DayIndex([tuple(span) for span in json.loads(intervals)]) for day, intervals in days
+        }
+
+
+class AvailabilityEngine:
+    def __init__(
+        self,
+        tenant: Tenant,
+        make_server: Callable[[], mcp.MCPServerHTTP],
+        *,
+        holds: HoldStore | None = None,
+        hold_s: float = AVAILABILITY_HOLD_S,
+    ) -> None:
+        self.tenant_id = tenant.id
+        self.hours = parse_business_hours(tenant.business_hours)
+        self.slot_minutes = tenant.slot_minutes
+        self.hold_s = hold_s
+        self.holds = holds or HoldStore()
+        self._make_server = make_server
+        self._server: mcp.MCPServerHTTP | None = None
+        self._events_tool = None
+        self._days: dict[date, DayIndex] = {}
+        # Instante (time.time) de la sincronización de la copia en uso, propia o de otro proceso
+        self._synced_at: float | None = None
+        # Identidad ante el turno de sincronizar del host
+        self._owner = f"{os.getpid()}-{id(self)}"
+        self._task: asyncio.Task | None = None
+        self.disabled = False
+        self.stats: Counter[str] = Counter()
+
+    @property
+    def ready(self) -> bool:
+        return (
+            not self.disabled and self._synced_at is not None
+            and time.time() - self._synced_at < AVAILABILITY_STALE_S
+        )
+
+    def covers(self, day: date) -> bool:
+        return self.ready and day in self._days
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"availability_{self.tenant_id}")
+
+    async def _run(self) -> None:
+        while True:
+            delay = AVAILABILITY_SYNC_S
+            try:
+                delay = await self._tick()
+            except Exception as e:
+                logger.warning(f"[AVAILABILITY] {self.tenant_id}: no se pudo leer el calendario ({e})")
+                await self._reset()
+            if self.disabled:
+                break
+            await asyncio.sleep(delay)
+
+    async def _tick(self) -> float:
+        """Usa la copia del host si está al día; si no, sincroniza quien tenga el turno. Devuelve la espera"""
+        if await asyncio.to_thread(
+            self.holds.missing, self.tenant_id, AVAILABILITY_EVENTS_TOOL, AVAILABILITY_MISSING_RECHECK_S
+        ):
+            # Otro proceso ya vio que falta la herramienta: ni se abre el servidor ni se espera su copia
+            self.disabled = True
+            logger.info(f"[AVAILABILITY] {self.tenant_id}: sin {AVAILABILITY_EVENTS_TOOL} (visto por el host)")
+            return AVAILABILITY_SYNC_S
+        synced_at, days = await asyncio.to_thread(self.holds.load_calendar, self.tenant_id)
+        age = time.time() - synced_at if synced_at is not None else None
+        if age is not None and age < AVAILABILITY_SYNC_S:
+            self._adopt(synced_at, days)
+            return AVAILABILITY_SYNC_S - age
+        if await asyncio.to_thread(self.holds.claim_sync, self.tenant_id, self._owner, 2 * AVAILABILITY_SYNC_S):
+            await self.sync()
+            return AVAILABILITY_SYNC_S
+        # Otro proceso está sincronizando: mientras tanto sirve la copia anterior (si no venció)
+        if synced_at is not None:
+            self._adopt(synced_at, days)
+        return 1.0
+
+    def _adopt(self, synced_at: float, days: dict[date, DayIndex]) -> None:
+        if self._synced_at is None or synced_at > self._synced_at:
+            first = self._synced_at is None
+            self._days, self._synced_at = days, synced_at
+            if first:
+                logger.info(
+                    f"[AVAILABILITY] {self.tenant_id}: copia del host cargada "
+                    f"({len(days)} días, de hace {time.time() - synced_at:.0f}s)"
+                )
+
+    async def _tool(self):
+        if self._events_tool is None:
+            server = self._make_server()
+            try:
+                await server.initialize()
+                tools = {get_raw_function_info(tool).name: tool for tool in await server.list_tools()}
+            except BaseException:
+                await _aclose(server)
+                raise
+            if AVAILABILITY_EVENTS_TOOL not in tools:
+                self.disabled = True
+                await _aclose(server)
+                await asyncio.to_thread(self.holds.mark_missing, self.tenant_id, AVAILABILITY_EVENTS_TOOL)
+                logger.warning(
+                    f"[AVAILABILITY] {self.tenant_id}: el servidor MCP no tiene {AVAILABILITY_EVENTS_TOOL}; "
+                    "horarios por MCP"
+                )
+                raise LookupError(AVAILABILITY_EVENTS_TOOL)
+            self._server, self._events_tool = server, tools[AVAILABILITY_EVENTS_TOOL]
+        return self._events_tool
+
+    async def _reset(self) -> None:
+        server, self._server, self._events_tool = self._server, None, None
+        if server is not None:
+            await _aclose(server)
+
+    async def fetch(self, first: date, last: date) -> dict[date, DayIndex]:
+        tool = await self._tool()
+        result = await tool(raw_arguments={"desde": first.isoformat(), "hasta": last.isoformat()})
+        return build_index(parse_events(result), first, last)
+
+    async def sync(self) -> None:
+        started_at = time.perf_counter()
+        today = now().date()
+        self._days = await self.fetch(today, today + timedelta(days=AVAILABILITY_DAYS - 1))
+        self._synced_at = time.time()
+        await asyncio.to_thread(self.holds.save_calendar, self.tenant_id, self._days, self._synced_at)
+        self.stats["syncs"] += 1
+        events = sum(len(index.intervals) for index in self._days.values())
+        logger.info(
+            f"[AVAILABILITY] {self.tenant_id}: {events} eventos en {len(self._days)} días "
+            f"({(time.perf_counter() - started_at) * 1000:.0f} ms)"
+        )
+
+    async def refresh_day(self, day: date) -> None:
+        fresh = await self.fetch(day, day)
+        self._days[day] = fresh[day]
+        await asyncio.to_thread(self.holds.save_calendar, self.tenant_id, fresh)
+
+    def free_slots(self, day: date, start: int = 0, end: int = 24 * 60) -> list[int]:
+        """Inicios (minutos) de los horarios libres de `day` entre `start` y `end`, sin contar retenciones"""
+        index = self._days.get(day)
+        if index is None:
+            return []
+        earliest = start
+        current = now()
+        if day == current.date():
+            earliest = max(earliest, current.hour * 60 + current.minute + AVAILABILITY_LEAD_MIN)
+        slots = []
+        for opens, closes in self.hours.get(day.weekday(), []):
+            for minute in range(opens, closes - self.slot_minutes + 1, self.slot_minutes):
+                if earliest <= minute < end and not index.busy(minute, minute + self.slot_minutes):
+                    slots.append(minute)
+        return slots
+
+    async def offer(
+        self, day: date, session: str, start: int = 0, end: int = 24 * 60, limit: int = AVAILABILITY_OFFER_SLOTS
+    ) -> list[int]:
+        """Horarios libres que nadie más tiene apartados, apartados ahora para `session`"""
+        free = self.free_slots(day, start, end)
+        acquired = set(
+            await asyncio.to_thread(
+                self.holds.offer, self.tenant_id, session, [slot_key(day, m) for m in free], limit, self.hold_s
+            )
+        )
+        return [m for m in free if slot_key(day, m) in acquired]
+
+    async def available_for(self, day: date, minute: int, session: str) -> bool:
+        index = self._days.get(day, DayIndex())
+        holder = await asyncio.to_thread(self.holds.holder, self.tenant_id, slot_key(day, minute))
+        return not index.busy(minute, minute + self.slot_minutes) and holder in (None, session)
+
+    async def book(self, day: date, minute: int, session: str) -> None:
+        self._days[day] = self._days.get(day, DayIndex()).add(minute, minute + self.slot_minutes)
+        # Los otros procesos ven la cita por la reserva hasta su próxima sincronización
+        await asyncio.to_thread(
+            self.holds.book, self.tenant_id, session, slot_key(day, minute), 2 * AVAILABILITY_SYNC_S
+        )
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        await self._reset()
+
+
+async def _aclose(server: mcp.MCPServerHTTP) -> None:
+    try:
+        await server.aclose()
+    except Exception:
+        pass
+
+
+_engines: dict[str, AvailabilityEngine] = {}
+
+
+def get_availability_engine(tenant: Tenant, make_server: Callable[[], mcp.MCPServerHTTP]) -> AvailabilityEngine:
+    """Motor de la concesionaria en este proceso; carga la copia del host (o sincroniza) con el primer job"""
+    engine = _engines.get(tenant.id)
+    if engine is None:
+        engine = _engines[tenant.id] = AvailabilityEngine(tenant, make_server)
+        engine.start()
+    return engine
+
+
+class SessionAvailability:
+    """Horarios de una llamada: responde con el motor, aparta lo ofrecido y verifica antes de agendar"""
+
+    def __init__(self, engine: AvailabilityEngine, session_id: str) -> None:
+        self.engine = engine
+        self.session_id = session_id
+        self.stats: Counter[str] = Counter()
+
+    async def call(self, name: str, args: dict, call: ToolCall) -> Any:
+        if name == AVAILABILITY_QUERY_TOOL:
+            answer = await self._query(args)
+            if answer is not None:
+                return answer
+        elif name == AVAILABILITY_BOOK_TOOL:
+            return await self._book(args, call)
+        return await call(args)
+
+    async def _query(self, args: dict) -> str | None:
+        text = " ".join(str(v) for v in args.values() if v)
+        day = parse_day(text, now().date())
+        if day is None or not self.engine.covers(day):
+            self.stats["por_mcp"] += 1
+            logger.info(f"[AVAILABILITY] {AVAILABILITY_QUERY_TOOL} por MCP ({args})")
+            return None
+        self.stats["locales"] += 1
+        start, end = parse_part_of_day(text)
+        slots = await self.engine.offer(day, self.session_id, start, end)
+        if slots:
+            return self._offered(day, slots)
+        # Día lleno: el siguiente con horarios en el mismo rango
+        for offset in range(1, 8):
+            other = day + timedelta(days=offset)
+            if not self.engine.covers(other):
+                break
+            slots = await self.engine.offer(other, self.session_id, start, end)
+            if slots:
+                return f"No hay horarios libres el {describe_day(day)}. " + self._offered(other, slots)
+        return f"No hay horarios libres el {describe_day(day)} ni en los días siguientes en ese rango."
+
+    def _offered(self, day: date, slots: list[int]) -> str:
+        minutes = round(self.engine.hold_s / 60)
+        return (
+            f"Horarios libres el {describe_day(day)} ({day.isoformat()}): {_join([_hhmm(m) for m in slots])}. "
+            f"Quedan apartados para esta llamada por {minutes} minutos; confirma el elegido con {AVAILABILITY_BOOK_TOOL}."
+        )
+
+    async def _book(self, args: dict, call: ToolCall) -> Any:
+        text = " ".join(str(v) for v in args.values() if v)
+        day, minute = parse_day(text, now().date()), parse_time(text)
+        if day is None or minute is None or not self.engine.covers(day):
+            return await call(args)
+
+        # La copia puede no tener citas de otros hosts o creadas a mano: se relee el día
+        try:
+            await asyncio.wait_for(self.engine.refresh_day(day), AVAILABILITY_RECONCILE_S)
+        except Exception as e:
+            logger.warning(f"[AVAILABILITY] No se pudo releer el {day} antes de agendar ({e!r}); se usa la copia")
+        if not await self.engine.available_for(day, minute, self.session_id):
+            self.stats["conflictos"] += 1
+            logger.info(f"[AVAILABILITY] {slot_key(day, minute)} ya no está libre; no se envía {AVAILABILITY_BOOK_TOOL}")
+            slots = await self.engine.offer(day, self.session_id)
+            alternatives = f" Libres ese día: {_join([_hhmm(m) for m in slots])}." if slots else " No quedan horarios ese día."
+            return (
+                f"El horario de las {_hhmm(minute)} del {describe_day(day)} acaba de ocuparse y no se agendó."
+                f"{alternatives} Ofrece estas opciones al cliente."
+            )
+
+        result = await call(args)
+        await self.engine.book(day, minute, self.session_id)
+        self.stats["agendadas"] += 1
+        return result
+
+    async def release(self) -> None:
+        await asyncio.to_thread(self.engine.holds.release, self.session_id)
+
+
+def attach_availability(session: AgentSession, availability: SessionAvailability) -> None:
+    # Referencia a la liberación hasta que termine (el loop solo guarda referencias débiles)
+    releasing: set[asyncio.Task] = set()
+
+    @session.on("close")
+    def _on_close(ev: CloseEvent) -> None:
+        # Lo ofrecido y no agendado vuelve a estar libre para las demás llamadas
+        task = asyncio.create_task(availability.release())
+        releasing.add(task)
+        task.add_done_callback(releasing.discard)
+        logger.info(f"[AVAILABILITY] Resumen - {dict(availability.stats) or 'sin consultas de horarios'}")
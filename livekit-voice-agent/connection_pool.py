@@ -0,0 +1,453 @@
+"""Pools por proceso de conexiones de streaming ya abiertas (STT y TTS).
+
+Cada sesión abría sus websockets al empezar la llamada: Deepgram al arrancar la
+sesión y ElevenLabs con la primera síntesis (el saludo). El handshake TLS y la
+autenticación quedaban en el camino crítico del primer turno. Aquí cada proceso
+mantiene STREAM_POOL_SIZE conexiones abiertas y autenticadas por proveedor y
+configuración, y las sesiones las toman prestadas:
+
+- Deepgram: `PooledSTT` (subclase de `deepgram.STT`) toma un websocket del pool
+  al conectar su stream; si no hay uno listo abre uno nuevo como siempre.
+- ElevenLabs: la primera síntesis de un TTS de `pooled_tts_class` toma una
+  conexión multi-stream ya abierta (`lease_tts_connection`) como su conexión
+  actual. El préstamo ocurre al sintetizar y no al crear la sesión: en una
+  saliente la sesión se crea antes de que el pool termine su handshake.
+- Si el pool todavía está abriendo su conexión, el préstamo la espera hasta
+  STREAM_POOL_LEASE_WAIT_S: lo que falta de ese handshake nunca es más que uno
+  nuevo, y un préstamo fallido cerraría la conexión a medio abrir.
+- Salud y reposición: hasta el primer préstamo, cada STREAM_POOL_HEALTH_S se
+  envía KeepAlive a Deepgram (cierra a los ~10 s sin audio), se descartan
+  conexiones cerradas o con más de STREAM_POOL_MAX_AGE_S y se repone el tamaño,
+  con espera creciente si el proveedor falla. Tras el primer préstamo no se
+  repone: la llamada del proceso ya tiene su conexión y una reconexión a mitad
+  de llamada conecta como siempre (reponer sería una conexión ociosa por job).
+
+Cada proceso de job atiende una llamada y `prewarm` corre antes de que exista su
+event loop, así que los pools se llenan al inicio del entrypoint, en paralelo
+a la conexión con la sala, y se cierran con el job.
+
+El pool usa atributos internos de los plugins (`SpeechStream._connect_ws`,
+`elevenlabs.tts._Connection`, `TTS._current_connection`), verificados con las
+versiones fijadas en pyproject.toml. `stt_pool_supported` y `tts_pool_supported`
+los comprueban al arrancar; si un plugin cambió, ese pool se desactiva y la
+sesión conecta como siempre.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import os
+import re
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, Generic, TypeVar
+
+import aiohttp
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, tts
+from livekit.plugins import deepgram
+
+logger = logging.getLogger(__name__)
+
+STREAM_POOL = os.getenv("STREAM_POOL", "true").lower() == "true"
+STREAM_POOL_SIZE = int(os.getenv("STREAM_POOL_SIZE", "1"))
+STREAM_POOL_MAX_AGE_S = float(os.getenv("STREAM_POOL_MAX_AGE_S", "120"))
+# Menor que los ~10 s que Deepgram tolera sin audio ni KeepAlive
+STREAM_POOL_HEALTH_S = float(os.getenv("STREAM_POOL_HEALTH_S", "4"))
+STREAM_POOL_MAX_BACKOFF_S = 30.0
+# Espera máxima de un préstamo por la conexión que el pool está abriendo
+STREAM_POOL_LEASE_WAIT_S = float(os.getenv("STREAM_POOL_LEASE_WAIT_S", "1"))
+
+T = TypeVar("T")
+
+
+@dataclass(eq=False)
+class _Idle(Generic[T]):
+    conn: T
+    opened_at: float
+    watcher: asyncio.Task | None = None
+
+
+class StreamPool(Generic[T]):
+    """Mantiene `size` conexiones abiertas; `lease()` entrega una al instante o None"""
+
+    def __init__(
+        self,
+        name: str,
+        open_conn: Callable[[], Awaitable[T]],
+        *,
+        is_alive: Callable[[T], bool],
+        close_conn: Callable[[T], Awaitable[Any]],
+        ping: Callable[[T], Awaitable[Any]] | None = None,
+        watch: Callable[[T], Awaitable[Any]] | None = None,
+        size: int = STREAM_POOL_SIZE,
+        max_age_s: float = STREAM_POOL_MAX_AGE_S,
+        health_s: float = STREAM_POOL_HEALTH_S,
+    ) -> None:
+        self.name = name
+        self.size = size
+        self.max_age_s = max_age_s
+        self.health_s = health_s
+        self.hits = 0
+        self.misses = 0
+        self.opened = 0
+        self.evicted = 0
+        # Tras el primer préstamo (con o sin conexión lista) el pool ya no repone
+        self.leased = False
+        self._open_conn = open_conn
+        self._is_alive = is_alive
+        self._close_conn = close_conn
+        self._ping = ping
+        self._watch = watch
+        self._idle: list[_Idle[T]] = []
+        self._opening = 0
+        self._failures = 0
+        self._wake = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._added = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._started_at = 0.0
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._started_at = time.perf_counter()
+            self._task = asyncio.create_task(self._maintain(), name=f"stream_pool_{self.name}")
+
+    async def wait_ready(self, timeout: float | None = None) -> bool:
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def lease_ready(self, timeout: float = STREAM_POOL_LEASE_WAIT_S) -> T | None:
+        """Como `lease`, pero si no hay una lista y se está abriendo una, la espera hasta `timeout`"""
+        if not self._idle and self._opening and not self.leased:
+            self._added.clear()
+            try:
+                await asyncio.wait_for(self._added.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.lease()
+
+    def lease(self) -> T | None:
+        self.leased = True
+        while self._idle:
+            entry = self._idle.pop(0)
+            if self._healthy(entry):
+                if entry.watcher is not None:
+                    entry.watcher.cancel()
+                self.hits += 1
+                return entry.conn
+            self._discard(entry)
+        self.misses += 1
+        return None
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        idle, self._idle = self._idle, []
+        for entry in idle:
+            if entry.watcher is not None:
+                entry.watcher.cancel()
+        await asyncio.gather(*(self._close_conn(entry.conn) for entry in idle), return_exceptions=True)
+        logger.info(
+            f"[POOL] {self.name}: {self.hits} préstamos en caliente, {self.misses} en frío, "
+            f"{self.opened} abiertas, {self.evicted} descartadas"
+        )
+
+    def _healthy(self, entry: _Idle[T]) -> bool:
+        return (
+            (entry.watcher is None or not entry.watcher.done())
+            and self._is_alive(entry.conn)
+            and time.monotonic() - entry.opened_at < self.max_age_s
+        )
+
+    def _discard(self, entry: _Idle[T]) -> None:
+        self.evicted += 1
+        if entry.watcher is not None:
+            entry.watcher.cancel()
+        asyncio.create_task(self._close_conn(entry.conn))
+
+    async def _maintain(self) -> None:
+        while True:
+            self._check_health()
+            missing = 0 if self.leased else self.size - len(self._idle) - self._opening
+            if missing > 0:
+                await asyncio.gather(*(self._open_one() for _ in range(missing)))
+                if self._failures:
+                    continue
+            if self._ping is not None:
+                await asyncio.gather(*(self._ping_one(entry) for entry in list(self._idle)))
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.health_s)
+            except asyncio.TimeoutError:
+                pass
+
+    def _check_health(self) -> None:
+        healthy = []
+        for entry in self._idle:
+            if self._healthy(entry):
+                healthy.append(entry)
+            else:
+                self._discard(entry)
+        self._idle = healthy
+
+    async def _ping_one(self, entry: _Idle[T]) -> None:
+        try:
+            await self._ping(entry.conn)
+        except Exception:
+            self._remove(entry)
+
+    def _remove(self, entry: _Idle[T]) -> None:
+        if entry in self._idle:
+            self._idle.remove(entry)
+            self._discard(entry)
+            self._wake.set()
+
+    async def _watch_idle(self, entry: _Idle[T]) -> None:
+        # Mientras espera préstamo el servidor no debería enviar nada: cualquier
+        # mensaje es un cierre o un error que nadie más leería
+        await self._watch(entry.conn)
+        self._remove(entry)
+
+    async def _open_one(self) -> None:
+        self._opening += 1
+        try:
+            conn = await self._open_conn()
+        except Exception as e:
+            self._failures += 1
+            backoff = min(STREAM_POOL_MAX_BACKOFF_S, self.health_s * 2 ** (self._failures - 1))
+            logger.warning(f"[POOL] {self.name}: no se pudo abrir una conexión ({e!r}), reintento en {backoff:.0f}s")
+            await asyncio.sleep(backoff)
+            return
+        finally:
+            self._opening -= 1
+
+        self._failures = 0
+        self.opened += 1
+        if self.leased:
+            # Terminó de abrir después del préstamo: nadie la va a usar
+            await self._close_conn(conn)
+            return
+        entry = _Idle(conn, time.monotonic())
+        if self._watch is not None:
+            entry.watcher = asyncio.create_task(self._watch_idle(entry))
+        self._idle.append(entry)
+        self._added.set()
+        if not self._ready.is_set():
+            self._ready.set()
+            logger.info(f"[POOL] {self.name}: lista en {(time.perf_counter() - self._started_at) * 1000:.0f} ms")
+
+
+def _attrs_used(func: Callable) -> set[str]:
+    """Atributos de `self` que lee o escribe el código fuente de un método"""
+    return set(re.findall(r"self\.(\w+)", inspect.getsource(func)))
+
+
+@lru_cache(maxsize=1)
+def stt_pool_supported() -> bool:
+    """Los internos de Deepgram que usan `PooledSTT` y `warm_stt` siguen como en la versión fijada"""
+    try:
+        supported = (
+            {"stt", "opts", "conn_options", "api_key", "http_session", "base_url"}
+            <= set(inspect.signature(deepgram.SpeechStream.__init__).parameters)
+            # El websocket pre-abierto se abre con un sustituto del stream que solo tiene estos atributos
+            and _attrs_used(deepgram.SpeechStream._connect_ws) <= {"_opts", "_api_key", "_conn_options", "_session"}
+            and isinstance(getattr(deepgram.SpeechStream, "_KEEPALIVE_MSG", None), str)
+            and {"_api_key", "_opts", "_streams"} <= _attrs_used(deepgram.STT.__init__)
+            and callable(getattr(deepgram.STT, "_sanitize_options", None))
+            and callable(getattr(deepgram.STT, "_ensure_session", None))
+        )
+    except (AttributeError, OSError, TypeError, ValueError):
+        supported = False
+    if not supported:
+        logger.warning("[POOL] El plugin de Deepgram cambió sus internos: pool de STT desactivado")
+    return supported
+
+
+@lru_cache(maxsize=1)
+def tts_pool_supported() -> bool:
+    """Los internos de ElevenLabs que usan `warm_tts` y `lease_tts_connection` siguen como en la versión fijada"""
+    from livekit.plugins import elevenlabs
+
+    try:
+        connection = elevenlabs.tts._Connection
+        supported = (
+            callable(elevenlabs.tts._multi_stream_url)
+            and list(inspect.signature(connection.__init__).parameters) == ["self", "opts", "session"]
+            and {"_opts", "_closed"} <= _attrs_used(connection.__init__)
+            and all(hasattr(connection, name) for name in ("connect", "aclose", "is_current"))
+            # La primera síntesis usa la conexión que deja `lease_tts_connection`
+            and "_current_connection" in _attrs_used(elevenlabs.TTS.current_connection)
+            and {"_opts", "_current_connection", "_connection_lock"} <= _attrs_used(elevenlabs.TTS.__init__)
+        )
+    except (AttributeError, OSError, TypeError, ValueError):
+        supported = False
+    if not supported:
+        logger.warning("[POOL] El plugin de ElevenLabs cambió sus internos: pool de TTS desactivado")
+    return supported
+
+
+# Un pool por proveedor y configuración, compartido por el proceso
+_pools: dict[tuple, StreamPool] = {}
+_http_session: aiohttp.ClientSession | None = None
+
+
+def _session() -> aiohttp.ClientSession:
+    # Sesión HTTP propia: la de `http_context` pertenece al job y se cierra con él
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession()
+    return _http_session
+
+
+def _stt_key(api_key: str, opts: Any) -> tuple:
+    return ("deepgram", api_key, repr(opts))
+
+
+class _PooledSpeechStream(deepgram.SpeechStream):
+    async def _connect_ws(self) -> aiohttp.ClientWebSocketResponse:
+        pool = _pools.get(_stt_key(self._api_key, self._opts))
+        ws = await pool.lease_ready() if pool is not None else None
+        if ws is not None:
+            return ws
+        return await super()._connect_ws()
+
+
+class PooledSTT(deepgram.STT):
+    """`deepgram.STT` cuyos streams toman un websocket del pool del proceso si hay uno listo"""
+
+    def stream(self, *, language=NOT_GIVEN, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        stream = _PooledSpeechStream(
+            stt=self,
+            conn_options=conn_options,
+            opts=self._sanitize_options(language=language),
+            api_key=self._api_key,
+            http_session=self._ensure_session(),
+            base_url=self._opts.endpoint_url,
+        )
+        self._streams.add(stream)
+        return stream
+
+
+def warm_stt(stt: deepgram.STT) -> StreamPool | None:
+    if not stt_pool_supported():
+        return None
+    opts = stt._sanitize_options()
+    key = _stt_key(stt._api_key, opts)
+    if key not in _pools:
+        # Lo único que `_connect_ws` lee del stream: así la URL y la autenticación
+        # del websocket pre-abierto son exactamente las del plugin
+        probe = SimpleNamespace(
+            _opts=opts, _api_key=stt._api_key, _conn_options=DEFAULT_API_CONNECT_OPTIONS, _session=None
+        )
+
+        async def _open() -> aiohttp.ClientWebSocketResponse:
+            probe._session = _session()
+            return await deepgram.SpeechStream._connect_ws(probe)
+
+        pool: StreamPool[aiohttp.ClientWebSocketResponse] = StreamPool(
+            f"deepgram-{opts.model}-{opts.sample_rate}",
+            _open,
+            is_alive=lambda ws: not ws.closed,
+            close_conn=lambda ws: ws.close(),
+            ping=lambda ws: ws.send_str(deepgram.SpeechStream._KEEPALIVE_MSG),
+            watch=lambda ws: ws.receive(),
+        )
+        _pools[key] = pool
+        pool.start()
+    return _pools[key]
+
+
+def _elevenlabs_key(engine: Any) -> tuple | None:
+    from livekit.plugins import elevenlabs
+
+    if not isinstance(engine, elevenlabs.TTS):
+        return None
+    return ("elevenlabs", engine._opts.api_key, elevenlabs.tts._multi_stream_url(engine._opts))
+
+
+def warm_tts(engine: tts.TTS) -> StreamPool | None:
+    """Solo ElevenLabs: los TTS de LiveKit Inference ya pre-conectan en `prewarm()` de la sesión"""
+    key = _elevenlabs_key(engine)
+    if key is None or not tts_pool_supported():
+        return None
+    if key not in _pools:
+        from livekit.plugins import elevenlabs
+
+        opts = engine._opts
+
+        async def _open() -> Any:
+            conn = elevenlabs.tts._Connection(opts, _session())
+            try:
+                await conn.connect()
+            except Exception:
+                await conn.aclose()
+                raise
+            return conn
+
+        pool: StreamPool[Any] = StreamPool(
+            f"elevenlabs-{opts.model}-{opts.encoding}",
+            _open,
+            is_alive=lambda conn: not conn._closed and conn.is_current,
+            close_conn=lambda conn: conn.aclose(),
+        )
+        _pools[key] = pool
+        pool.start()
+    return _pools[key]
+
+
+async def lease_tts_connection(engine: tts.TTS) -> bool:
+    """Deja una conexión del pool como la conexión actual del TTS (la usa la primera síntesis)"""
+    key = _elevenlabs_key(engine)
+    pool = _pools.get(key) if key is not None and tts_pool_supported() else None
+    conn = await pool.lease_ready() if pool is not None else None
+    if conn is None:
+        return False
+    # La conexión lee voz y ajustes de las opciones del TTS que la usa
+    conn._opts = engine._opts
+    engine._current_connection = conn
+    return True
+
+
+@lru_cache(maxsize=1)
+def pooled_tts_class() -> type:
+    """`elevenlabs.TTS` que toma una conexión del pool del proceso en su primera síntesis.
+
+    Se define al usarse: el proceso principal del worker no importa ElevenLabs.
+    """
+    from livekit.plugins import elevenlabs
+
+    class PooledTTS(elevenlabs.TTS):
+        _pool_checked = False
+
+        async def current_connection(self):
+            async with self._connection_lock:
+                if not self._pool_checked:
+                    self._pool_checked = True
+                    await lease_tts_connection(self)
+            return await super().current_connection()
+
+    return PooledTTS
+
+
+async def close_stream_pools(reason: str = "") -> None:
+    global _http_session
+    pools = list(_pools.values())
+    _pools.clear()
+    await asyncio.gather(*(pool.aclose() for pool in pools), return_exceptions=True)
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
@@ -0,0 +1,158 @@
+"""Endpointing adaptativo por llamante.
+
+Aprende durante la llamada la distribución de pausas del llamante y ajusta
+`min_endpointing_delay`, `max_endpointing_delay` y el `min_silence_duration` de
+Silero dentro de límites seguros. También cuenta los cortes falsos: el agente
+tomó el turno y el llamante siguió hablando casi de inmediato.
+
+`AdaptiveEndpointing` no depende de la sesión: recibe instantes de inicio/fin de
+voz y de toma de turno, así que se puede evaluar offline con llamadas grabadas
+(`evals/eval_endpointing.py`). `attach()` lo conecta a una `AgentSession` real.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass
+
+from livekit.agents import AgentSession, AgentStateChangedEvent, CloseEvent, UserStateChangedEvent, vad
+
+logger = logging.getLogger(__name__)
+
+ADAPTIVE_ENDPOINTING = os.getenv("ADAPTIVE_ENDPOINTING", "true").lower() == "true"
+
+
+@dataclass
+class EndpointingBounds:
+    # Valores iniciales (los que usaba la sesión fija)
+    min_delay: float = 0.2
+    max_delay: float = 3.0
+    min_silence: float = 0.25
+    # Límites seguros de ajuste
+    min_delay_range: tuple[float, float] = (0.1, 1.2)
+    max_delay_range: tuple[float, float] = (1.5, 4.0)
+    min_silence_range: tuple[float, float] = (0.25, 0.5)
+    # Si el llamante retoma la voz antes de esto tras la toma de turno, fue un corte falso
+    continuation_window: float = 1.0
+    # Pausas más largas que esto ya no se consideran dentro del turno
+    max_pause: float = 3.0
+    min_samples: int = 4
+
+
+def _quantile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _clamp(value: float, bounds: tuple[float, float]) -> float:
+    return min(max(value, bounds[0]), bounds[1])
+
+
+class AdaptiveEndpointing:
+    def __init__(self, bounds: EndpointingBounds | None = None, *, window: int = 30) -> None:
+        self.bounds = bounds or EndpointingBounds()
+        self.min_delay = self.bounds.min_delay
+        self.max_delay = self.bounds.max_delay
+        self.min_silence = self.bounds.min_silence
+
+        self._pauses: deque[float] = deque(maxlen=window)
+        # Margen extra que crece con cada corte falso y decae con turnos limpios
+        self._cutoff_margin = 0.0
+        self._silence_start: float | None = None
+        self._agent_took_turn = False
+
+        self.turns = 0
+        self.false_cutoffs = 0
+
+    @property
+    def false_cutoff_rate(self) -> float:
+        return self.false_cutoffs / self.turns if self.turns else 0.0
+
+    def on_user_speech_end(self, t: float) -> None:
+        """El llamante dejó de hablar (`t` es el inicio real del silencio)"""
+        self._silence_start = t
+        self._agent_took_turn = False
+
+    def on_agent_turn(self, t: float) -> None:
+        """El agente tomó el turno (empezó a pensar o a hablar)"""
+        if self._silence_start is not None and not self._agent_took_turn:
+            self._agent_took_turn = True
+            self.turns += 1
+
+    def on_user_speech_start(self, t: float) -> bool:
+        """El llamante volvió a hablar; devuelve True si fue un corte falso"""
+        if self._silence_start is None:
+            return False
+
+        pause = t - self._silence_start
+        self._silence_start = None
+        false_cutoff = False
+
+        if self._agent_took_turn:
+            if pause <= self.bounds.continuation_window:
+                # El agente cortó una pausa dentro del turno
+                false_cutoff = True
+                self.false_cutoffs += 1
+                self._cutoff_margin = min(self._cutoff_margin + 0.15, 0.6)
+                self._pauses.append(pause)
+            else:
+                self._cutoff_margin *= 0.8
+        elif pause <= self.bounds.max_pause:
+            self._pauses.append(pause)
+
+        self._update()
+        return false_cutoff
+
+    def _update(self) -> None:
+        if len(self._pauses) < self.bounds.min_samples:
+            return
+
+        pauses = list(self._pauses)
+        # La espera mínima cubre la mayoría de las pausas habituales del llamante;
+        # la máxima, sus pausas largas (cuando el turn detector duda)
+        self.min_delay = _clamp(_quantile(pauses, 0.75) - self.min_silence + self._cutoff_margin,
+                                self.bounds.min_delay_range)
+        self.max_delay = _clamp(2 * _quantile(pauses, 0.95) + self._cutoff_margin,
+                                self.bounds.max_delay_range)
+        self.max_delay = max(self.max_delay, self.min_delay + 0.5)
+        self.min_silence = _clamp(self.bounds.min_silence + self._cutoff_margin / 2,
+                                  self.bounds.min_silence_range)
+
+    def attach(self, session: AgentSession, vad_model: vad.VAD | None = None) -> None:
+        """Conecta el controlador a los eventos de la sesión y aplica los ajustes en vivo"""
+
+        @session.on("user_state_changed")
+        def _on_user_state(ev: UserStateChangedEvent) -> None:
+            if ev.new_state == "listening" and ev.old_state == "speaking":
+                # El VAD avisa tras `min_silence` de silencio: el silencio empezó antes
+                self.on_user_speech_end(ev.created_at - self.min_silence)
+            elif ev.new_state == "speaking":
+                previous = (self.min_delay, self.max_delay, self.min_silence)
+                if self.on_user_speech_start(ev.created_at):
+                    logger.info(f"[ENDPOINTING] Corte falso detectado ({self.false_cutoffs}/{self.turns})")
+                if (self.min_delay, self.max_delay, self.min_silence) != previous:
+                    self._apply(session, vad_model)
+
+        @session.on("agent_state_changed")
+        def _on_agent_state(ev: AgentStateChangedEvent) -> None:
+            if ev.new_state in ("thinking", "speaking"):
+                self.on_agent_turn(ev.created_at)
+
+        @session.on("close")
+        def _on_close(ev: CloseEvent) -> None:
+            logger.info(
+                f"[ENDPOINTING] Resumen - turnos: {self.turns}, cortes falsos: {self.false_cutoffs} "
+                f"({self.false_cutoff_rate:.1%}), min_delay={self.min_delay:.2f}s, "
+                f"max_delay={self.max_delay:.2f}s, min_silence={self.min_silence:.2f}s"
+            )
+
+    def _apply(self, session: AgentSession, vad_model: vad.VAD | None) -> None:
+        logger.info(
+            f"[ENDPOINTING] Ajustando endpointing - min_delay={self.min_delay:.2f}s, "
+            f"max_delay={self.max_delay:.2f}s, min_silence={self.min_silence:.2f}s"
+        )
+        session.update_options(min_endpointing_delay=self.min_delay, max_endpointing_delay=self.max_delay)
+        if vad_model is not None and hasattr(vad_model, "update_options"):
+            vad_model.update_options(min_silence_duration=self.min_silence)
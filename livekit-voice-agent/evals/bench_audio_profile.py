@@ -0,0 +1,125 @@
+"""Benchmark de CPU por sesión: perfil de telefonía (8 kHz) frente a banda ancha.
+
+Reproduce localmente la ruta de audio de una sesión durante N segundos de llamada
+con los mismos componentes que usa el agente:
+- entrada de la sala: 48 kHz (WebRTC) remuestreado a la tasa del perfil
+- STT: remuestreo a la tasa de Deepgram si difiere de la de entrada
+- VAD: Silero con su remuestreo interno e inferencia a la tasa del perfil
+- salida: audio del TTS (22050 Hz) remuestreado a la tasa publicada si difiere
+
+La cancelación de ruido (BVC/BVCTelephony) no se incluye porque requiere
+credenciales de LiveKit Cloud. Reporta CPU (ms de CPU por segundo de llamada).
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/bench_audio_profile.py --seconds 60 --runs 3
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from livekit import rtc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent import load_vad  # noqa: E402
+from audio_profile import TELEPHONY, WIDEBAND, AudioProfile  # noqa: E402
+
+ROOM_SAMPLE_RATE = 48000
+TTS_SAMPLE_RATE = 22050
+FRAME_MS = 10
+# Fracción de la llamada en la que habla el agente
+AGENT_TALK_RATIO = 0.4
+
+
+def synthetic_call(seconds: float, sample_rate: int, seed: int = 7) -> list[rtc.AudioFrame]:
+    """Audio con tramos de voz (ruido modulado) y silencios, en frames de 10 ms"""
+    rng = np.random.default_rng(seed)
+    samples_per_frame = sample_rate * FRAME_MS // 1000
+    frames = []
+    for i in range(int(seconds * 1000 / FRAME_MS)):
+        speaking = (i // 150) % 2 == 0  # alterna 1.5 s de voz y 1.5 s de silencio
+        amplitude = 6000 if speaking else 80
+        t = np.arange(samples_per_frame) / sample_rate
+        data = amplitude * np.sin(2 * np.pi * 180 * t) * rng.uniform(0.5, 1.0) + rng.normal(0, amplitude / 4, samples_per_frame)
+        frames.append(rtc.AudioFrame(
+            data=data.astype(np.int16).tobytes(),
+            sample_rate=sample_rate,
+            num_channels=1,
+            samples_per_channel=samples_per_frame,
+        ))
+    return frames
+
+
+def resample(frames: list[rtc.AudioFrame], input_rate: int, output_rate: int) -> list[rtc.AudioFrame]:
+    if input_rate == output_rate:
+        return frames
+    resampler = rtc.AudioResampler(input_rate, output_rate, quality=rtc.AudioResamplerQuality.MEDIUM)
+    out = []
+    for frame in frames:
+        out.extend(resampler.push(frame))
+    out.extend(resampler.flush())
+    return out
+
+
+async def run_vad(vad_model, frames: list[rtc.AudioFrame]) -> None:
+    stream = vad_model.stream()
+
+    async def _consume() -> None:
+        async for _ in stream:
+            pass
+
+    consumer = asyncio.create_task(_consume())
+    for frame in frames:
+        stream.push_frame(frame)
+    stream.end_input()
+    await consumer
+
+
+async def run_session(profile: AudioProfile, room_frames, tts_frames, vad_model) -> float:
+    """CPU (s) consumida por la ruta de audio local de una sesión"""
+    cpu_start = time.process_time()
+
+    # Entrada: el AudioStream de la sala entrega la tasa del perfil
+    input_frames = resample(room_frames, ROOM_SAMPLE_RATE, profile.input_sample_rate)
+    # STT: remuestreo si Deepgram espera otra tasa
+    resample(input_frames, profile.input_sample_rate, profile.stt_sample_rate)
+    # VAD: Silero remuestrea internamente si hace falta e infiere
+    await run_vad(vad_model, input_frames)
+    # Salida: audio del TTS a la tasa publicada
+    resample(tts_frames, TTS_SAMPLE_RATE, profile.output_sample_rate)
+
+    return time.process_time() - cpu_start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=60.0, help="duración simulada de la llamada")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    room_frames = synthetic_call(args.seconds, ROOM_SAMPLE_RATE)
+    tts_frames = synthetic_call(args.seconds * AGENT_TALK_RATIO, TTS_SAMPLE_RATE, seed=11)
+
+    results = {}
+    for profile in (WIDEBAND, TELEPHONY):
+        vad_model = load_vad(profile.vad_sample_rate)
+        await run_session(profile, room_frames[:100], tts_frames[:100], vad_model)  # calentamiento
+        samples = [await run_session(profile, room_frames, tts_frames, vad_model) for _ in range(args.runs)]
+        results[profile.name] = statistics.median(samples)
+
+    print(f"{'perfil':<12} {'CPU (s)':>9} {'ms CPU / s de llamada':>22} {'% de un núcleo':>15}")
+    for name, cpu_s in results.items():
+        per_second_ms = 1000 * cpu_s / args.seconds
+        print(f"{name:<12} {cpu_s:>9.3f} {per_second_ms:>22.2f} {per_second_ms / 10:>15.2f}")
+
+    saving = 1 - results[TELEPHONY.name] / results[WIDEBAND.name]
+    print(f"\nAhorro de CPU por sesión con el perfil de telefonía: {saving:.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""Benchmark con umbral (gate) de arranque en frío y memoria base por proceso.
+
+Mide, en procesos nuevos, cuánto tarda `import agent` y cuánta memoria residente
+(RSS máximo) queda en el proceso después de importarlo. Es lo que paga cada
+proceso de job antes de atender una llamada. Falla con código 1 si la mediana
+supera los umbrales o si algún subsistema de carga diferida se importa al inicio.
+Los umbrales dependen del hardware: calíbralos con BENCH_MAX_IMPORT_S y
+BENCH_MAX_RSS_MB en la máquina donde corre el gate.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/bench_cold_start.py
+    uv run evals/bench_cold_start.py --runs 10 --max-import-s 4.0 --max-rss-mb 300
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Subsistemas opcionales que no deben cargarse al importar el worker
+# (`openai` no está aquí: livekit.agents lo importa para su gateway de inferencia)
+LAZY_MODULES = ["supabase", "tensorflow", "livekit.plugins.elevenlabs"]
+
+# Se ejecuta en un proceso limpio; imprime una sola línea JSON con los resultados
+_CHILD = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+loaded = [m for m in {lazy!r} if m in sys.modules]
+print(json.dumps({{"import_s": elapsed, "rss_mb": rss_kb / 1024, "lazy_loaded": loaded}}))
+"""
+
+
+def measure_once(module: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(module=module, lazy=LAZY_MODULES)],
+        cwd=AGENT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module}:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="agent")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-s", type=float, default=float(os.getenv("BENCH_MAX_IMPORT_S", "5.0")))
+    parser.add_argument("--max-rss-mb", type=float, default=float(os.getenv("BENCH_MAX_RSS_MB", "320")))
+    args = parser.parse_args()
+
+    # El primer proceso calienta la caché de bytecode y del sistema de archivos
+    first = measure_once(args.module)
+    samples = [measure_once(args.module) for _ in range(args.runs)]
+
+    import_s = statistics.median(s["import_s"] for s in samples)
+    rss_mb = statistics.median(s["rss_mb"] for s in samples)
+
+    print(f"import {args.module}: mediana {import_s:.3f}s (máx {max(s['import_s'] for s in samples):.3f}s, "
+          f"primer arranque {first['import_s']:.3f}s)")
+    print(f"RSS base por proceso: mediana {rss_mb:.1f} MB")
+
+    leaked = samples[-1]["lazy_loaded"]
+    if leaked:
+        print(f"Paquetes de carga diferida importados al inicio: {', '.join(leaked)}")
+
+    failed = False
+    if import_s > args.max_import_s:
+        print(f"FALLO: import {import_s:.3f}s > umbral {args.max_import_s:.3f}s")
+        failed = True
+    if rss_mb > args.max_rss_mb:
+        print(f"FALLO: RSS {rss_mb:.1f} MB > umbral {args.max_rss_mb:.1f} MB")
+        failed = True
+    if leaked:
+        print("FALLO: la carga diferida de subsistemas opcionales se rompió")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
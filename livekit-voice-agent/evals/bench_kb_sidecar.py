@@ -0,0 +1,253 @@
+"""Base de conocimiento por proceso frente al sidecar compartido (`kb_sidecar.py`).
+
+Levanta los backends falsos (`fake_backends.py`, escenario `--scenario` de
+`backend_scenarios.json`) y `--processes` procesos de job que atienden `--calls`
+llamadas cada uno, una tras otra (como el pool de LiveKit). Cada llamada hace
+`--questions` preguntas con la herramienta real `buscar_en_base_de_conocimiento`,
+elegidas con una distribución de Zipf sobre preguntas de clientes (con
+variaciones de mayúsculas y signos). Dos modos:
+
+- proceso: cada proceso con su `KnowledgeBase` (cachés, clientes e índice propios,
+  en frío al arrancar)
+- sidecar: los procesos consultan al sidecar por el socket Unix (KB_SIDECAR_SOCKET)
+
+Con `--snapshot` se activa el índice en memoria (KB_SNAPSHOT) sobre
+`--documents` fragmentos: uno por proceso o uno en el sidecar.
+
+Reporta por modo los aciertos de caché (resultados y embeddings), las llamadas a
+la API de embeddings y los textos por llamada (lotes), las búsquedas que llegan
+a la base, la espera p50/p95 de la herramienta y la memoria: bytes en cachés e
+índice y RSS sumada de los procesos de job (más el sidecar).
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/bench_kb_sidecar.py
+    uv run evals/bench_kb_sidecar.py --processes 16 --calls 10 --snapshot --documents 5000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_backends import FakeBackends  # noqa: E402
+from kb_sidecar import KBSidecarClient, _rss_mb  # noqa: E402
+
+SCENARIOS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend_scenarios.json")
+
+MODELS = ["RAV4", "Hilux", "Corolla", "Yaris", "Corolla Cross", "Fortuner", "Land Cruiser Prado", "Rush"]
+TEMPLATES = [
+    "¿Tienen financiamiento para la {modelo}?",
+    "¿Cuánto cuesta la {modelo} 2025?",
+    "¿Tienen la {modelo} en stock?",
+    "¿Qué versiones tiene la {modelo}?",
+    "¿Cuánto dura la garantía de la {modelo}?",
+]
+GENERAL = [
+    "¿Tienen financiamiento?",
+    "¿Dónde están ubicados?",
+    "¿Cuál es su horario?",
+    "¿Cuánto dura la garantía?",
+    "¿Aceptan mi auto como parte de pago?",
+    "¿Cuál es la cuota inicial mínima?",
+    "¿Tienen sucursal en Arequipa?",
+    "¿Cada cuánto es el mantenimiento?",
+]
+
+
+def question_pool() -> list[str]:
+    """Preguntas en orden de popularidad: las generales primero"""
+    return GENERAL + [template.format(modelo=m) for m in MODELS for template in TEMPLATES]
+
+
+def spoken_variant(question: str, rng: random.Random) -> str:
+    """La misma pregunta como la transcribe el STT: a veces sin signos o en minúsculas"""
+    if rng.random() < 0.3:
+        question = question.strip("¿?")
+    if rng.random() < 0.3:
+        question = question.lower()
+    return question
+
+
+# --- Proceso de job ---
+
+async def run_job_process(args: argparse.Namespace) -> None:
+    # Los errores inyectados llenarían la salida con los logs del agente
+    logging.disable(logging.CRITICAL)
+    rss_start = _rss_mb()
+    import agent
+    from tenants import default_tenant
+
+    rng = random.Random(args.seed)
+    questions = question_pool()
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(questions))]
+    rss_imported = _rss_mb()
+    waits, ok = [], 0
+    for _ in range(args.calls):
+        # Un Assistant por llamada, como un job nuevo en el mismo proceso
+        assistant = agent.Assistant(tenant=default_tenant())
+        for question in rng.choices(questions, weights, k=args.questions):
+            await asyncio.sleep(rng.uniform(0, 2 * args.gap_ms / 1000))
+            started_at = time.perf_counter()
+            result = await assistant.buscar_en_base_de_conocimiento(spoken_variant(question, rng), None)
+            waits.append(time.perf_counter() - started_at)
+            ok += result.startswith("1. **referencia")
+    # El índice en memoria carga en segundo plano: se espera para medir su memoria
+    kb = agent._knowledge_base
+    if kb is not None and kb._snapshot_task is not None:
+        await kb._snapshot_task
+    print(json.dumps({
+        "kb": kb.summary() if kb is not None else None,
+        "waits": waits,
+        "ok": ok,
+        "rss_start": rss_start,
+        "rss_imported": rss_imported,
+        "rss_end": _rss_mb(),
+    }))
+
+
+# --- Coordinador ---
+
+async def _wait_for_socket(path: str, process: asyncio.subprocess.Process, timeout_s: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while not os.path.exists(path):
+        if process.returncode is not None or time.monotonic() > deadline:
+            raise RuntimeError("el sidecar no arrancó")
+        await asyncio.sleep(0.05)
+
+
+async def run_mode(mode: str, scenario: dict, args: argparse.Namespace) -> dict:
+    backends = FakeBackends(scenario, documents=args.documents, seed=args.seed)
+    await backends.start()
+    if args.snapshot:
+        backends.prepare_table(page_size=250)
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"{backends.url}/v1",
+        "OPENAI_API_KEY": "bench",
+        "SUPABASE_URL": backends.url,
+        "SUPABASE_KEY": "bench",
+        "KB_SNAPSHOT": "true" if args.snapshot else "false",
+        "KB_SIDECAR_SOCKET": "",
+        # Cada proceso hace una sola búsqueda a la vez: solo la reutilización entre llamadas cuenta
+        "TOOL_CACHE": "false",
+    }
+    sidecar = None
+    socket_dir = tempfile.mkdtemp(prefix="kb-sidecar-")
+    if mode == "sidecar":
+        env["KB_SIDECAR_SOCKET"] = os.path.join(socket_dir, "kb.sock")
+        sidecar = await asyncio.create_subprocess_exec(
+            sys.executable, "kb_sidecar.py", "--socket", env["KB_SIDECAR_SOCKET"], "--stats-interval-s", "3600",
+            cwd=ROOT, env=env, stderr=asyncio.subprocess.DEVNULL,
+        )
+        await _wait_for_socket(env["KB_SIDECAR_SOCKET"], sidecar)
+
+    try:
+        jobs = [
+            await asyncio.create_subprocess_exec(
+                sys.executable, os.path.abspath(__file__), "--job-process",
+                "--calls", str(args.calls), "--questions", str(args.questions), "--gap-ms", str(args.gap_ms),
+                "--zipf", str(args.zipf), "--seed", str(args.seed * 1000 + i),
+                cwd=ROOT, env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+            )
+            for i in range(args.processes)
+        ]
+        outputs = [json.loads((await job.communicate())[0].decode().strip().splitlines()[-1]) for job in jobs]
+
+        sidecar_stats = None
+        if sidecar is not None:
+            client = KBSidecarClient(env["KB_SIDECAR_SOCKET"])
+            if args.snapshot:
+                # Misma condición que los procesos: índice cargado antes de medir la memoria
+                while not (await client.stats())["snapshot_rows"]:
+                    await asyncio.sleep(0.1)
+            sidecar_stats = await client.stats()
+            await client.aclose()
+    finally:
+        if sidecar is not None:
+            sidecar.terminate()
+            await sidecar.wait()
+        await backends.aclose()
+
+    waits = sorted(w for out in outputs for w in out["waits"])
+    stats = [sidecar_stats] if sidecar_stats else [out["kb"] for out in outputs if out["kb"]]
+    total = {key: sum(s.get(key, 0) for s in stats) for key in (
+        "result_hits", "result_misses", "embedding_hits", "embedding_misses", "nbytes",
+    )}
+    api_calls = backends.faults.requests["embeddings"]
+    return {
+        "queries": len(waits),
+        "ok": sum(out["ok"] for out in outputs) / len(waits),
+        "result_hit_rate": total["result_hits"] / max(1, total["result_hits"] + total["result_misses"]),
+        "embedding_hit_rate": total["embedding_hits"] / max(1, total["embedding_hits"] + total["embedding_misses"]),
+        "api_calls": api_calls,
+        "texts_per_call": backends.embedded_texts / max(1, api_calls),
+        "rpc": backends.faults.requests["match_documents"],
+        "p50": statistics.median(waits),
+        "p95": waits[min(int(0.95 * len(waits)), len(waits) - 1)],
+        "kb_mb": total["nbytes"] / 2**20,
+        "job_rss_mb": sum(out["rss_end"] for out in outputs),
+        "job_state_mb": sum(out["rss_end"] - out["rss_imported"] for out in outputs),
+        "sidecar_rss_mb": sidecar_stats["rss_mb"] if sidecar_stats else 0.0,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=SCENARIOS_FILE)
+    parser.add_argument("--scenario", default="normal")
+    parser.add_argument("--modes", default="proceso,sidecar")
+    parser.add_argument("--processes", type=int, default=8, help="procesos de job del host")
+    parser.add_argument("--calls", type=int, default=6, help="llamadas por proceso")
+    parser.add_argument("--questions", type=int, default=4, help="preguntas a la base por llamada")
+    parser.add_argument("--gap-ms", type=float, default=250.0, help="pausa media entre preguntas")
+    parser.add_argument("--zipf", type=float, default=1.1, help="exponente de popularidad de las preguntas")
+    parser.add_argument("--snapshot", action="store_true", help="índice en memoria (KB_SNAPSHOT)")
+    parser.add_argument("--documents", type=int, default=2000, help="fragmentos de la tabla falsa")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--job-process", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.job_process:
+        await run_job_process(args)
+        return
+
+    logging.disable(logging.CRITICAL)
+    with open(args.scenarios, encoding="utf-8") as f:
+        scenario = next(s for s in json.load(f)["scenarios"] if s["name"] == args.scenario)
+    print(
+        f"{args.processes} procesos × {args.calls} llamadas × {args.questions} preguntas, "
+        f"escenario {args.scenario}, índice en memoria: {'sí' if args.snapshot else 'no'}"
+    )
+    rows = [(mode, await run_mode(mode, scenario, args)) for mode in args.modes.split(",") if mode]
+
+    print(
+        f"\n  {'modo':<9}{'ok':>6}{'resultados':>12}{'embeddings':>12}{'API emb.':>10}{'textos/lote':>13}"
+        f"{'búsquedas':>11}{'p50':>8}{'p95':>8}"
+    )
+    for mode, r in rows:
+        print(
+            f"  {mode:<9}{r['ok']:>6.0%}{r['result_hit_rate']:>12.0%}{r['embedding_hit_rate']:>12.0%}"
+            f"{r['api_calls']:>10}{r['texts_per_call']:>13.2f}{r['rpc']:>11}"
+            f"{r['p50'] * 1000:>6.0f}ms{r['p95'] * 1000:>6.0f}ms"
+        )
+    print(
+        f"\n  {'modo':<9}{'cachés e índice':>17}{'RSS jobs':>11}{'estado en jobs':>16}{'RSS sidecar':>13}{'RSS total':>11}"
+    )
+    for mode, r in rows:
+        print(
+            f"  {mode:<9}{r['kb_mb']:>15.1f}MB{r['job_rss_mb']:>9.0f}MB{r['job_state_mb']:>14.1f}MB"
+            f"{r['sidecar_rss_mb']:>11.0f}MB{r['job_rss_mb'] + r['sidecar_rss_mb']:>9.0f}MB"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,311 @@
+"""Prueba de carga: latencia de cola con y sin la degradación escalonada (`load_shedding.py`).
+
+Lanza `--sessions` procesos de job que arrancan escalonados en `--ramp-s` y
+hablan `--seconds` (la mitad cuelga a mitad de la prueba, así la carga vuelve a
+bajar). Cada proceso reproduce en tiempo real la ruta de entrada de una sesión:
+
+- frames de 10 ms a 16 kHz: frases de 1-3 s (vocales sintetizadas con formantes,
+  que Silero reconoce como voz) separadas por silencios de 1.5-3 s
+- cancelación de ruido: CPU consumida en un hilo por frame (`--bvc-ms` con BVC,
+  `--nc-ms` con NC); el filtro real necesita credenciales de LiveKit Cloud
+- VAD: Silero real (`agent.load_vad`)
+- turn detector: `--turn-detector-ms` de CPU por fin de voz, detrás de
+  `ShedTurnDetector`; el modelo real necesita descargar sus archivos
+
+`SessionLoadReporter`, `ShedController` y `SessionShedding` son los reales: el
+nivel lo deciden la CPU del contenedor, el lag y la inferencia reportados. Modos:
+- fijo: LOAD_SHEDDING=false, todas las sesiones en el nivel completo
+- escalonado: el controlador baja y sube de nivel según la carga
+
+Reporta la latencia local del fin de turno (desde que el audio del fin de voz
+debió llegar hasta que el turn detector responde), el retraso de los frames
+respecto del tiempo real, el tiempo del host en cada nivel y sus cambios.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/bench_load_shedding.py
+    uv run evals/bench_load_shedding.py --sessions 12 --seconds 90 --bvc-ms 1.5
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from livekit import rtc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SAMPLE_RATE = 16000
+FRAME_S = 0.01
+
+_BUFFER = os.urandom(1 << 16)
+# Formantes F1-F3 de a, i, e, o, u
+VOWELS = [(730, 1090, 2440), (270, 2290, 3010), (530, 1840, 2480), (570, 840, 2410), (300, 870, 2240)]
+
+
+def burn(ms: float) -> None:
+    """Consume `ms` de CPU del hilo (sha256 suelta el GIL, como el código nativo)"""
+    deadline = time.thread_time() + ms / 1000
+    while time.thread_time() < deadline:
+        hashlib.sha256(_BUFFER).digest()
+
+
+class BurnTurnDetector:
+    """Turn detector con el costo de CPU del modelo y sin sus archivos"""
+
+    def __init__(self, cost_ms: float) -> None:
+        self.cost_ms = cost_ms
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def model(self) -> str:
+        return "burn"
+
+    @property
+    def provider(self) -> str:
+        return "bench"
+
+    async def unlikely_threshold(self, language: str | None) -> float | None:
+        return 0.15
+
+    async def supports_language(self, language: str | None) -> bool:
+        return True
+
+    async def predict_end_of_turn(self, chat_ctx, *, timeout: float | None = None) -> float:
+        await asyncio.get_running_loop().run_in_executor(self._executor, burn, self.cost_ms)
+        return 0.9
+
+
+def syllable(rng: np.random.Generator, seconds: float) -> np.ndarray:
+    """Pulsos glóticos con f0 variable filtrados por los formantes de una vocal"""
+    n = int(seconds * SAMPLE_RATE)
+    t = np.arange(n) / SAMPLE_RATE
+    f0 = rng.uniform(110, 200) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(1, 3) * t))
+    pulses = np.diff(np.floor(np.cumsum(f0) / SAMPLE_RATE), prepend=0.0)
+    freqs = np.fft.rfftfreq(n, 1 / SAMPLE_RATE)
+    formants = VOWELS[rng.integers(len(VOWELS))]
+    envelope = sum(gain / (1 + ((freqs - f) / (60 + 0.08 * f)) ** 2) for f, gain in zip(formants, (1.0, 0.6, 0.3)))
+    voiced = np.fft.irfft(np.fft.rfft(pulses) * envelope / (1 + freqs / 300), n)
+    return voiced * np.minimum(1, np.minimum(t, t[::-1]) / 0.03)
+
+
+def caller_audio(seconds: float, seed: int) -> list[rtc.AudioFrame]:
+    """Frases de 1-3 s (sílabas y consonantes sordas) y silencios de 1.5-3 s, en frames de 10 ms"""
+    rng = np.random.default_rng(seed)
+    parts, total = [], 0.0
+    while total < seconds:
+        phrase, length = [], rng.uniform(1.0, 3.0)
+        while sum(len(p) for p in phrase) < length * SAMPLE_RATE:
+            phrase.append(syllable(rng, rng.uniform(0.12, 0.3)))
+            if rng.random() < 0.3:
+                phrase.append(0.05 * rng.standard_normal(int(rng.uniform(0.03, 0.08) * SAMPLE_RATE)))
+        voice = np.concatenate(phrase)
+        pause = rng.uniform(1.5, 3.0)
+        parts += [voice / np.sqrt(np.mean(voice**2)) * 0.1, 0.003 * rng.standard_normal(int(pause * SAMPLE_RATE))]
+        total += length + pause
+    audio = (np.clip(np.concatenate(parts), -1, 1) * 32767).astype(np.int16)[: int(seconds * SAMPLE_RATE)]
+    n = int(FRAME_S * SAMPLE_RATE)
+    return [rtc.AudioFrame(audio[i:i + n].tobytes(), SAMPLE_RATE, 1, n) for i in range(0, len(audio) - n + 1, n)]
+
+
+def _quantile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+# --- Proceso de job ---
+
+async def run_job_process(args: argparse.Namespace) -> None:
+    logging.disable(logging.CRITICAL)
+    from livekit.agents import vad
+
+    from admission import SessionLoadReporter
+    from agent import load_vad
+    from load_shedding import LOAD_SHEDDING, SessionShedding
+
+    vad_model = load_vad(SAMPLE_RATE)
+    frames = caller_audio(args.seconds, args.seed)
+    loop = asyncio.get_running_loop()
+    # El coordinador da la salida cuando todos los procesos terminaron de importar
+    start_at = float(await loop.run_in_executor(None, sys.stdin.readline))
+    await asyncio.sleep(max(start_at - time.time(), 0.0))
+
+    reporter = SessionLoadReporter()
+    reporter.start()
+    detector = BurnTurnDetector(args.turn_detector_ms)
+    shedding = SessionShedding(f"bench-{args.seed}") if LOAD_SHEDDING else None
+    turn_detector = shedding.wrap_turn_detector(detector) if shedding else detector
+    if shedding:
+        shedding.start(vad_model)
+
+    stream = vad_model.stream()
+    nc_executor = ThreadPoolExecutor(max_workers=1)
+    turn_latencies: list[float] = []
+    frame_lags: list[float] = []
+    t0 = time.monotonic()
+    cpu_start = time.process_time()
+
+    async def _consume() -> None:
+        async for ev in stream:
+            if ev.type == vad.VADEventType.INFERENCE_DONE:
+                reporter._inference_ms.add_sample(ev.inference_duration * 1000)
+            elif ev.type == vad.VADEventType.START_OF_SPEECH and shedding:
+                shedding.set_user_speaking(True)
+            elif ev.type == vad.VADEventType.END_OF_SPEECH:
+                if shedding:
+                    shedding.set_user_speaking(False)
+                # Instante en que llegó el audio con el que el VAD cerró la voz
+                expected = t0 + ev.samples_index / SAMPLE_RATE
+                await turn_detector.predict_end_of_turn(None)
+                turn_latencies.append(time.monotonic() - expected)
+
+    consumer = asyncio.create_task(_consume())
+    for k, frame in enumerate(frames):
+        scheduled = t0 + k * FRAME_S
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        light = shedding is not None and shedding.light_noise_cancellation
+        await loop.run_in_executor(nc_executor, burn, args.nc_ms if light else args.bvc_ms)
+        stream.push_frame(frame)
+        frame_lags.append(time.monotonic() - scheduled)
+    stream.end_input()
+    await consumer
+    cpu = (time.process_time() - cpu_start) / (time.monotonic() - t0)
+
+    if shedding:
+        await shedding.aclose()
+    await reporter.aclose()
+    print(json.dumps({
+        "turn_latencies": turn_latencies,
+        "frame_lags": frame_lags[::10],
+        "skipped": turn_detector.skipped if shedding else 0,
+        "cpu": cpu,
+    }))
+
+
+# --- Coordinador ---
+
+async def _sample_tiers(state_file: str, started_at: float, timeline: list[tuple[float, int]]) -> None:
+    last = None
+    while True:
+        try:
+            with open(state_file) as f:
+                tier = json.loads(f.read() or "{}").get("tier", 0)
+        except (OSError, ValueError):
+            tier = 0
+        if tier != last:
+            timeline.append((time.time() - started_at, tier))
+            last = tier
+        await asyncio.sleep(0.25)
+
+
+async def run_mode(mode: str, args: argparse.Namespace) -> dict:
+    stats_dir = tempfile.mkdtemp(prefix="shed-")
+    env = {
+        **os.environ,
+        "LOAD_STATS_DIR": stats_dir,
+        "LOAD_SHEDDING": "true" if mode == "escalonado" else "false",
+        # Los hilos de onnxruntime/BLAS de cada proceso competirían entre sí
+        "OMP_NUM_THREADS": "1",
+        "OPENBLAS_NUM_THREADS": "1",
+    }
+    jobs = []
+    for i in range(args.sessions):
+        # La mitad de las llamadas termina a mitad de la prueba
+        seconds = args.seconds if i % 2 == 0 else args.seconds / 2
+        jobs.append(await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--job-process", "--seconds", str(seconds),
+            "--bvc-ms", str(args.bvc_ms), "--nc-ms", str(args.nc_ms),
+            "--turn-detector-ms", str(args.turn_detector_ms), "--seed", str(args.seed * 1000 + i),
+            cwd=ROOT, env=env, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        ))
+    # Las importaciones de todos los procesos no deben caer dentro de la prueba
+    await asyncio.sleep(args.warmup_s)
+    started_at = time.time() + 1.0
+    for i, job in enumerate(jobs):
+        job.stdin.write(f"{started_at + i * args.ramp_s / args.sessions}\n".encode())
+        await job.stdin.drain()
+
+    timeline: list[tuple[float, int]] = []
+    sampler = asyncio.create_task(_sample_tiers(os.path.join(stats_dir, "shed_tier.state"), started_at, timeline))
+    outputs = [json.loads((await job.communicate())[0].decode().strip().splitlines()[-1]) for job in jobs]
+    sampler.cancel()
+    ended_at = time.time() - started_at
+
+    turns = [t for out in outputs for t in out["turn_latencies"]]
+    lags = [lag for out in outputs for lag in out["frame_lags"]]
+    tier_s = [0.0] * 4
+    for (at, tier), (next_at, _) in zip(timeline, timeline[1:] + [(ended_at, 0)]):
+        tier_s[tier] += next_at - max(at, 0.0)
+    return {
+        "turns": len(turns),
+        "turn_p50": statistics.median(turns),
+        "turn_p95": _quantile(turns, 0.95),
+        "turn_p99": _quantile(turns, 0.99),
+        "lag_p95": _quantile(lags, 0.95),
+        "lag_max": max(lags),
+        "tier_s": tier_s,
+        "timeline": timeline,
+        "skipped": sum(out["skipped"] for out in outputs),
+        "cpu": statistics.mean(out["cpu"] for out in outputs),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="fijo,escalonado")
+    parser.add_argument("--sessions", type=int, default=8 * (os.cpu_count() or 1), help="procesos de job")
+    parser.add_argument("--seconds", type=float, default=60.0, help="duración de las llamadas largas")
+    parser.add_argument("--ramp-s", type=float, default=10.0, help="ventana de llegada de las llamadas")
+    parser.add_argument("--warmup-s", type=float, default=15.0, help="espera a que los procesos importen")
+    parser.add_argument("--bvc-ms", type=float, default=1.2, help="CPU de BVC por frame de 10 ms")
+    parser.add_argument("--nc-ms", type=float, default=0.3, help="CPU de NC por frame de 10 ms")
+    parser.add_argument("--turn-detector-ms", type=float, default=80.0, help="CPU del turn detector por turno")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--job-process", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.job_process:
+        await run_job_process(args)
+        return
+
+    from load_shedding import TIERS
+
+    print(
+        f"{args.sessions} sesiones en {os.cpu_count()} núcleos, {args.seconds:.0f}s (la mitad cuelga a los "
+        f"{args.seconds / 2:.0f}s), BVC {args.bvc_ms}ms/frame, NC {args.nc_ms}ms/frame, "
+        f"turn detector {args.turn_detector_ms:.0f}ms/turno"
+    )
+    rows = [(mode, await run_mode(mode, args)) for mode in args.modes.split(",") if mode]
+
+    print(
+        f"\n  {'modo':<12}{'turnos':>8}{'fin de turno p50':>18}{'p95':>8}{'p99':>8}"
+        f"{'retraso audio p95':>19}{'máx':>8}{'CPU/sesión':>14}"
+    )
+    for mode, r in rows:
+        print(
+            f"  {mode:<12}{r['turns']:>8}{r['turn_p50'] * 1000:>16.0f}ms{r['turn_p95'] * 1000:>6.0f}ms"
+            f"{r['turn_p99'] * 1000:>6.0f}ms{r['lag_p95'] * 1000:>17.0f}ms{r['lag_max'] * 1000:>6.0f}ms"
+            f"{r['cpu']:>14.0%}"
+        )
+    for mode, r in rows:
+        if len(r["timeline"]) <= 1:
+            continue
+        levels = ", ".join(f"{TIERS[t].name}={s:.0f}s" for t, s in enumerate(r["tier_s"]) if s > 0)
+        changes = " → ".join(f"{TIERS[t].name}@{at:.0f}s" for at, t in r["timeline"][1:])
+        print(f"\n  {mode}: {levels}; turnos sin turn detector: {r['skipped']}\n    {changes}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""Benchmark del segmentador LLM→TTS: cuándo sale el primer trozo sintetizable.
+
+Simula el stream de tokens de gpt-4o-mini (--tokens-per-s, un token ≈ 4
+caracteres) con respuestas típicas del agente y compara el tokenizer de
+oraciones por defecto del plugin con `SpeechSegmenter`. Reporta, por respuesta,
+la longitud del primer trozo y cuánto stream del LLM hay que esperar hasta que
+el TTS puede empezar a sintetizar.
+
+También verifica `normalize_for_speech` con casos que el agente dice en voz
+alta (teléfonos, fechas, horas, "uno" delante de un sustantivo) y termina con
+código 1 si alguno no da el texto esperado.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/bench_segmenter.py --tokens-per-s 60
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+
+from livekit.agents import tokenize
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_segmenter import SpeechSegmenter, normalize_for_speech  # noqa: E402
+
+RESPONSES = [
+    "¡Claro! Tenemos planes de financiamiento desde $299 al mes, con una tasa de 12% anual y plazos de hasta 60 meses. ¿Te gustaría que un asesor te llame?",
+    "Perfecto, Juan. Te agendé la cita para el 15/10/2025 a las 10:30 AM en nuestra sede de San Isidro. Te llegará una confirmación por correo.",
+    "Entiendo, la verdad es que el mantenimiento de los 10,000 kilómetros cuesta aproximadamente $180 e incluye cambio de aceite y filtros. ¿Quieres reservarlo?",
+    "Sí, el modelo está disponible en tres colores y la entrega es inmediata. Además, este mes tenemos un bono de S/ 1,500 por tu auto usado.",
+    "Mira, para darte el precio exacto necesito saber la versión que te interesa. ¿Buscas la versión automática o la mecánica?",
+]
+CHARS_PER_TOKEN = 4
+
+# (texto del LLM, lo que debe leer el TTS)
+NORMALIZATION = [
+    ("Tu número es 987654321.", "Tu número es nueve ocho siete seis cinco cuatro tres dos uno."),
+    ("+51 987 654 321", "más cinco uno, nueve ocho siete, seis cinco cuatro, tres dos uno"),
+    ("Llámanos al 987-654-321, por favor.", "Llámanos al nueve ocho siete, seis cinco cuatro, tres dos uno, por favor."),
+    ("La cita es el 24/10.", "La cita es el veinticuatro de octubre."),
+    ("el 15/10/2025 a las 10:30 AM", "el quince de octubre de dos mil veinticinco a las diez y media de la mañana"),
+    ("a las 16:45", "a las cuatro y cuarenta y cinco de la tarde"),
+    ("Tienes 21 años.", "Tienes veintiún años."),
+    ("Solo falta 1 cuota.", "Solo falta una cuota."),
+    ("en 31 días", "en treinta y un días"),
+    ("son 21 y 1.", "son veintiuno y uno."),
+    ("desde $15,000 con 3.5% de interés", "desde quince mil dólares con tres coma cinco por ciento de interés"),
+    ("un bono de S/ 1,500", "un bono de mil quinientos soles"),
+    ("los 10,000 kilómetros", "los diez mil kilómetros"),
+]
+
+
+def tokens(text: str) -> list[str]:
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+async def first_chunk(tokenizer: tokenize.SentenceTokenizer, text: str, tokens_per_s: float) -> tuple[int, float]:
+    """Longitud del primer trozo y tiempo de stream del LLM (s) hasta emitirlo"""
+    stream = tokenizer.stream()
+    for i, token in enumerate(tokens(text), start=1):
+        stream.push_text(token)
+        # Deja correr al tokenizer (el básico procesa en una tarea propia)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        if not stream._event_ch.empty():
+            return len(stream._event_ch.recv_nowait().token), i / tokens_per_s
+    stream.end_input()
+    async for data in stream:
+        return len(data.token), len(tokens(text)) / tokens_per_s
+    return 0, 0.0
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens-per-s", type=float, default=60.0, help="velocidad de stream del LLM")
+    args = parser.parse_args()
+
+    tokenizers = {
+        "por defecto": tokenize.blingfire.SentenceTokenizer(),
+        "segmentador": SpeechSegmenter(),
+    }
+    print(f"{'tokenizer':<13} {'primer trozo (caracteres)':>26} {'espera del LLM (ms)':>20}")
+    for name, tokenizer in tokenizers.items():
+        results = [await first_chunk(tokenizer, text, args.tokens_per_s) for text in RESPONSES]
+        chars = statistics.mean(r[0] for r in results)
+        wait_ms = 1000 * statistics.mean(r[1] for r in results)
+        print(f"{name:<13} {chars:>26.0f} {wait_ms:>20.0f}")
+
+    print("\nPrimer trozo del segmentador por respuesta:")
+    for text in RESPONSES:
+        print(f"  {SpeechSegmenter().tokenize(text)[0]!r}")
+
+    failures = [(text, expected, normalize_for_speech(text)) for text, expected in NORMALIZATION]
+    failures = [f for f in failures if f[1] != f[2]]
+    print(f"\nNormalización para voz: {len(NORMALIZATION) - len(failures)}/{len(NORMALIZATION)} casos correctos")
+    for text, expected, got in failures:
+        print(f"  {text!r}: esperado {expected!r}, obtenido {got!r}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
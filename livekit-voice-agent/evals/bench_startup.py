@@ -0,0 +1,272 @@
+"""Benchmark con umbral (gate) del arranque del job: dispatch→saludo en serie y en paralelo.
+
+Corre los pasos de una llamada entrante y de una saliente con
+`startup.StartupPipeline` y el mismo grafo que el entrypoint (`STARTUP_STEPS`):
+
+- mcp: handshake real (initialize + list_tools) contra el servidor MCP falso de
+  `fake_backends.py`, más `--mcp-rtt-ms` por cada ida y vuelta (TLS, initialize,
+  list_tools) que en producción cruzan la red
+- proveedores y saludo: pool real de ElevenLabs (`connection_pool.warm_tts`) y
+  TTS de la sesión con el plugin real contra el ElevenLabs falso de
+  `fake_providers.py`, con `--tts-handshake-ms` por conexión. El saludo espera
+  `--greeting-ms` (primer texto del LLM) y mide el primer audio del TTS
+- sala, participante, inicio (`session.start`) y marcado (timbrado de la
+  saliente): esperas simuladas con la latencia indicada (±30 %), porque dependen
+  del servidor de LiveKit
+- modelos: con `--cold-vad`, carga real de Silero (como un proceso sin prewarm);
+  si no, el VAD ya está cargado y el paso no cuesta nada
+
+En la saliente la sesión se crea sin esperar a un participante, antes de que el
+pool termine su handshake; el saludo se sintetiza durante el timbrado. Ahí se
+comprueba que el saludo use la conexión del pool y no abra otra.
+
+Modos: `serie` (STARTUP_PIPELINE=false, el orden anterior) y `paralelo`. Reporta
+p50/p95 de dispatch→saludo, el span medio de cada paso, la ruta crítica más
+frecuente y los préstamos del pool de TTS. Termina con código 1 si la p95 de la
+entrante en paralelo supera `--budget-ms` o si algún saludo no tomó la conexión
+del pool.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/bench_startup.py
+    uv run evals/bench_startup.py --runs 50 --mcp-rtt-ms 200 --cold-vad --budget-ms 2500
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp  # noqa: E402
+from livekit.agents import mcp  # noqa: E402
+
+import connection_pool  # noqa: E402
+from agent import load_vad  # noqa: E402
+from fake_backends import FakeBackends  # noqa: E402
+from fake_providers import FakeProviders  # noqa: E402
+from startup import STARTUP_STEPS, StartupPipeline  # noqa: E402
+
+SCENARIOS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend_scenarios.json")
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+
+async def _wait_ms(ms: float, rng: random.Random) -> None:
+    await asyncio.sleep(ms * rng.uniform(0.7, 1.3) / 1000)
+
+
+async def _handshake(
+    backends: FakeBackends, rtt_ms: float, rng: random.Random, close: asyncio.Event
+) -> asyncio.Task:
+    """Abre la sesión MCP; anyio exige cerrarla en la misma tarea, que espera a `close`"""
+    opened = asyncio.get_running_loop().create_future()
+
+    async def _connection() -> None:
+        server = mcp.MCPServerHTTP(
+            url=backends.mcp_url, headers={"token": "bench"}, timeout=4, client_session_timeout_seconds=6,
+        )
+        try:
+            await _wait_ms(rtt_ms, rng)  # TLS
+            await _wait_ms(rtt_ms, rng)
+            await server.initialize()
+            await _wait_ms(rtt_ms, rng)
+            await server.list_tools()
+            opened.set_result(None)
+            await close.wait()
+        except Exception as e:
+            if not opened.done():
+                opened.set_exception(e)
+        finally:
+            await server.aclose()
+
+    task = asyncio.create_task(_connection())
+    await opened
+    return task
+
+
+def create_tts(providers: FakeProviders, http: aiohttp.ClientSession):
+    """El TTS de la sesión con STREAM_POOL (ver `agent.create_tts_providers`)"""
+    return connection_pool.pooled_tts_class()(
+        model="eleven_turbo_v2_5",
+        voice_id="b2htR0pMe28pYwCY9gnP",
+        language="es",
+        encoding="mp3_22050_32",
+        api_key="bench",
+        base_url=providers.base_url,
+        http_session=http,
+    )
+
+
+async def _greeting(engine, ms: float, rng: random.Random) -> None:
+    """Primer texto del LLM y primer audio del TTS"""
+    await _wait_ms(ms, rng)
+    async with engine.stream() as stream:
+        stream.push_text("Hola, te habla Alex de AutoFuturo IA.")
+        stream.end_input()
+        async for _ in stream:
+            return
+
+
+async def run_once(
+    i: int, parallel: bool, outbound: bool, backends: FakeBackends, providers: FakeProviders, args: argparse.Namespace
+) -> tuple[StartupPipeline, bool]:
+    """Un arranque; devuelve el pipeline y si el saludo tomó la conexión del pool"""
+    rng = random.Random(args.seed * 1000 + i)
+    startup = StartupPipeline(f"bench-{i}", parallel=parallel)
+    vad: dict = {} if args.cold_vad else {"vad": object()}
+    close_mcp = asyncio.Event()
+    pools: list[connection_pool.StreamPool] = []
+    engine = None
+
+    def load_models() -> None:
+        if "vad" not in vad:
+            vad["vad"] = {16000: load_vad(16000), 8000: load_vad(8000)}
+
+    def create_session():
+        nonlocal engine
+        engine = create_tts(providers, http)
+
+    # Como la sesión HTTP del job: nueva en cada llamada
+    async with aiohttp.ClientSession() as http:
+        try:
+            # Mismo orden de declaración que el entrypoint (en serie, es el orden de ejecución)
+            startup.step("sala", lambda: _wait_ms(args.room_ms, rng))
+            startup.step("metadata", lambda: json.loads('{"tenant": "autofuturo"}'))
+            startup.step("modelos", lambda: asyncio.to_thread(load_models))
+            # Las conexiones se abren en segundo plano: el paso solo las lanza
+            startup.step("proveedores", lambda: pools.append(connection_pool.warm_tts(create_tts(providers, http))))
+            startup.step("mcp", lambda: _handshake(backends, args.mcp_rtt_ms, rng, close_mcp))
+            await startup.result("metadata")
+            startup.step("agente", lambda: None)
+            if outbound:
+                startup.step("sesion", create_session)
+                startup.step("inicio", lambda: _wait_ms(args.start_ms, rng))
+                # El saludo se sintetiza mientras suena el teléfono y suena al contestar
+                greeting = startup.step("saludo", lambda: _greeting(engine, args.greeting_ms, rng))
+                await startup.step("marcado", lambda: _wait_ms(args.ring_ms, rng))
+                startup.mark("marcado")
+                await greeting
+            else:
+                startup.step("participante", lambda: _wait_ms(args.participant_ms, rng))
+                startup.step("sesion", create_session)
+                startup.step("inicio", lambda: _wait_ms(args.start_ms, rng))
+                await startup.step("saludo", lambda: _greeting(engine, args.greeting_ms, rng))
+            startup.mark("saludo")
+
+            connection = await startup.result("mcp")
+            close_mcp.set()
+            await connection
+        finally:
+            if engine is not None:
+                await engine.aclose()
+            await connection_pool.close_stream_pools()
+    return startup, bool(pools) and pools[0].hits == 1
+
+
+async def run_mode(
+    parallel: bool, outbound: bool, backends: FakeBackends, providers: FakeProviders, args: argparse.Namespace
+) -> dict:
+    handshakes = providers.handshakes["elevenlabs"]
+    results = [await run_once(i, parallel, outbound, backends, providers, args) for i in range(args.runs)]
+    runs = [startup for startup, _ in results]
+    greeting = [startup.milestones["saludo"] for startup in runs]
+    spans = {
+        name: statistics.mean(s.spans[name].end_ms - s.spans[name].start_ms for s in runs)
+        for name in STARTUP_STEPS
+        if name in runs[0].spans
+    }
+    paths = Counter(" → ".join(startup.critical_path()) for startup in runs)
+    return {
+        "p50": statistics.median(greeting),
+        "p95": percentile(greeting, 0.95),
+        "spans": spans,
+        "path": paths.most_common(1)[0][0],
+        "dial": [startup.milestones["marcado"] for startup in runs] if outbound else [],
+        "pool_hits": sum(hit for _, hit in results),
+        "handshakes": providers.handshakes["elevenlabs"] - handshakes,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--scenario", default="normal", help="escenario de backend_scenarios.json")
+    parser.add_argument("--room-ms", type=float, default=250, help="conexión a la sala")
+    parser.add_argument("--participant-ms", type=float, default=150, help="el llamante aparece tras la conexión")
+    parser.add_argument("--mcp-rtt-ms", type=float, default=150, help="ida y vuelta al servidor MCP")
+    parser.add_argument("--start-ms", type=float, default=120, help="session.start sin el handshake MCP")
+    parser.add_argument("--greeting-ms", type=float, default=600, help="primer texto del LLM para el saludo")
+    parser.add_argument("--tts-handshake-ms", type=float, default=300, help="TCP + TLS + auth de ElevenLabs")
+    parser.add_argument("--tts-ttfb-ms", type=float, default=80, help="primer audio de ElevenLabs")
+    parser.add_argument("--ring-ms", type=float, default=1500, help="timbrado hasta que contestan (saliente)")
+    parser.add_argument("--cold-vad", action="store_true", help="cargar Silero en cada arranque")
+    parser.add_argument(
+        "--budget-ms", type=float, default=1800, help="p95 máximo de dispatch→saludo de la entrante en paralelo"
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with open(SCENARIOS_FILE) as f:
+        scenario = next(s for s in json.load(f)["scenarios"] if s["name"] == args.scenario)
+
+    backends = FakeBackends(scenario, seed=args.seed)
+    providers = FakeProviders(handshake_s=args.tts_handshake_ms / 1000, ttfb_s=args.tts_ttfb_ms / 1000)
+    await backends.start()
+    await providers.start()
+    results = {}
+    try:
+        for branch in ("entrante", "saliente"):
+            for mode in ("serie", "paralelo"):
+                results[branch, mode] = await run_mode(
+                    mode == "paralelo", branch == "saliente", backends, providers, args
+                )
+    finally:
+        await providers.aclose()
+        await backends.aclose()
+
+    print(f"{args.runs} arranques por modo, escenario {args.scenario}, VAD {'en frío' if args.cold_vad else 'precargado'}")
+    failures = []
+    for branch in ("entrante", "saliente"):
+        print(f"\n{branch}")
+        print(f"{'modo':<10}{'saludo p50':>12}{'saludo p95':>12}{'pool TTS':>10}  ruta crítica")
+        for mode in ("serie", "paralelo"):
+            r = results[branch, mode]
+            print(
+                f"{mode:<10}{r['p50']:>10.0f}ms{r['p95']:>10.0f}ms{r['pool_hits']:>5}/{args.runs:<4}  {r['path']}"
+            )
+            if r["dial"]:
+                print(f"{'':<10}marcado p50 {statistics.median(r['dial']):.0f}ms (el saludo incluye el timbrado)")
+            if r["pool_hits"] < args.runs:
+                failures.append(
+                    f"{branch} en {mode}: {args.runs - r['pool_hits']} saludos sin la conexión del pool "
+                    f"({r['handshakes']} handshakes de TTS en {args.runs} llamadas)"
+                )
+        print("span medio por paso (ms):")
+        for name in results[branch, "serie"]["spans"]:
+            print(
+                f"  {name:<14}{results[branch, 'serie']['spans'][name]:>8.0f}"
+                f"{results[branch, 'paralelo']['spans'][name]:>8.0f}"
+            )
+
+    p95 = results["entrante", "paralelo"]["p95"]
+    if p95 > args.budget_ms:
+        failures.append(f"p95 dispatch→saludo de la entrante en paralelo {p95:.0f}ms > {args.budget_ms:.0f}ms")
+    if failures:
+        print("\nFALLA: " + "; ".join(failures))
+        sys.exit(1)
+    print(f"\nOK: p95 dispatch→saludo de la entrante en paralelo {p95:.0f}ms <= {args.budget_ms:.0f}ms, "
+          "todos los saludos con la conexión del pool")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+"""Benchmark de los pools de conexiones de streaming (connection_pool.py).
+
+Levanta servidores locales que hablan el protocolo websocket de Deepgram
+(`/v1/listen`) y de ElevenLabs (`multi-stream-input`) con una demora de handshake
+inyectable (TCP + TLS + autenticación contra el proveedor real) y mide el primer
+turno de una llamada con los plugins reales:
+
+- STT: desde que arranca el stream y llega el primer "aló" hasta la transcripción final
+- TTS: desde que se pide el saludo hasta el primer frame de audio
+
+En frío cada llamada abre sus conexiones; con pool se toman del pool del proceso,
+llenado antes de la llamada. Con `--idle` se espera ese tiempo antes de la llamada:
+el Deepgram falso cierra a los 10 s sin mensajes, así se comprueba
+que el KeepAlive del pool mantiene viva la conexión prestada.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/bench_stream_pool.py
+    uv run evals/bench_stream_pool.py --calls 20 --handshake-ms 300 --idle 15
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import aiohttp
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livekit import rtc  # noqa: E402
+from livekit.agents import stt as agents_stt  # noqa: E402
+from livekit.plugins import deepgram, elevenlabs  # noqa: E402
+
+import connection_pool  # noqa: E402
+from fake_providers import FakeProviders  # noqa: E402
+
+SAMPLE_RATE = 8000
+# Audio del cliente que el STT necesita antes de dar la transcripción final
+UTTERANCE_S = 0.5
+
+
+def create_stt(server: FakeProviders, http: aiohttp.ClientSession, pooled: bool) -> deepgram.STT:
+    stt_cls = connection_pool.PooledSTT if pooled else deepgram.STT
+    return stt_cls(
+        model="nova-2",
+        language="es",
+        sample_rate=SAMPLE_RATE,
+        api_key="bench",
+        base_url=f"{server.base_url}/listen",
+        http_session=http,
+    )
+
+
+def create_tts(server: FakeProviders, http: aiohttp.ClientSession, pooled: bool) -> elevenlabs.TTS:
+    tts_cls = connection_pool.pooled_tts_class() if pooled else elevenlabs.TTS
+    return tts_cls(
+        model="eleven_turbo_v2_5",
+        voice_id="b2htR0pMe28pYwCY9gnP",
+        language="es",
+        encoding="mp3_22050_32",
+        api_key="bench",
+        base_url=server.base_url,
+        http_session=http,
+    )
+
+
+async def first_transcript_s(engine: deepgram.STT) -> float:
+    frame = rtc.AudioFrame(
+        data=np.zeros(int(UTTERANCE_S * SAMPLE_RATE), dtype=np.int16).tobytes(),
+        sample_rate=SAMPLE_RATE,
+        num_channels=1,
+        samples_per_channel=int(UTTERANCE_S * SAMPLE_RATE),
+    )
+    started_at = time.perf_counter()
+    async with engine.stream() as stream:
+        stream.push_frame(frame)
+        stream.flush()
+        async for ev in stream:
+            if ev.type == agents_stt.SpeechEventType.FINAL_TRANSCRIPT:
+                return time.perf_counter() - started_at
+    raise RuntimeError("el stream terminó sin transcripción")
+
+
+async def first_audio_s(engine: elevenlabs.TTS) -> float:
+    started_at = time.perf_counter()
+    async with engine.stream() as stream:
+        stream.push_text("Hola, te habla Alex de AutoFuturo IA.")
+        stream.end_input()
+        async for _ in stream:
+            return time.perf_counter() - started_at
+    raise RuntimeError("el stream terminó sin audio")
+
+
+async def run_call(server: FakeProviders, pooled: bool, idle_s: float) -> tuple[float, float]:
+    """Una llamada: pools llenados al inicio del job y, tras `idle_s`, el primer turno"""
+    # Como la sesión HTTP del job: nueva en cada llamada
+    async with aiohttp.ClientSession() as http:
+        if pooled:
+            stt_pool = connection_pool.warm_stt(create_stt(server, http, pooled=True))
+            tts_pool = connection_pool.warm_tts(create_tts(server, http, pooled=True))
+            await stt_pool.wait_ready(5)
+            await tts_pool.wait_ready(5)
+        if idle_s:
+            await asyncio.sleep(idle_s)
+
+        engine_stt = create_stt(server, http, pooled)
+        engine_tts = create_tts(server, http, pooled)
+        try:
+            return await asyncio.gather(first_transcript_s(engine_stt), first_audio_s(engine_tts))
+        finally:
+            await engine_stt.aclose()
+            await engine_tts.aclose()
+            # Como el job: los pools se cierran con la llamada
+            await connection_pool.close_stream_pools()
+
+
+def _summary(values: list[float]) -> str:
+    ordered = sorted(values)
+    p95 = ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)]
+    return f"p50={statistics.median(ordered) * 1000:5.0f} ms  p95={p95 * 1000:5.0f} ms"
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=10, help="llamadas por modo")
+    parser.add_argument("--handshake-ms", type=float, default=250, help="TCP + TLS + auth del proveedor")
+    parser.add_argument("--ttfb-ms", type=float, default=80, help="procesamiento del proveedor")
+    parser.add_argument("--idle", type=float, default=0.0, help="segundos entre llenar el pool y la llamada")
+    args = parser.parse_args()
+
+    server = FakeProviders(handshake_s=args.handshake_ms / 1000, ttfb_s=args.ttfb_ms / 1000, utterance_s=UTTERANCE_S)
+    await server.start()
+    results = {}
+    try:
+        for pooled in (False, True):
+            mode = "con pool" if pooled else "en frío"
+            stt_s, tts_s = [], []
+            for _ in range(args.calls):
+                stt_latency, tts_latency = await run_call(server, pooled, args.idle)
+                stt_s.append(stt_latency)
+                tts_s.append(tts_latency)
+            results[mode] = (stt_s, tts_s)
+    finally:
+        await server.aclose()
+
+    print(f"Llamadas por modo: {args.calls}  handshake: {args.handshake_ms:.0f} ms  espera previa: {args.idle:.0f}s")
+    for mode, (stt_s, tts_s) in results.items():
+        print(f"{mode:<9} STT primer final: {_summary(stt_s)}   TTS primer audio: {_summary(tts_s)}")
+    cold, warm = results["en frío"], results["con pool"]
+    print(
+        f"Ahorro (p50): STT {(statistics.median(cold[0]) - statistics.median(warm[0])) * 1000:.0f} ms, "
+        f"TTS {(statistics.median(cold[1]) - statistics.median(warm[1])) * 1000:.0f} ms"
+    )
+    print(f"Handshakes en el servidor: {server.handshakes}  cierres por inactividad: {server.idle_closes}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
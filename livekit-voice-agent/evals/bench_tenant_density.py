@@ -0,0 +1,143 @@
+"""Densidad: sesiones por núcleo con un worker multi-concesionaria frente a un despliegue por concesionaria.
+
+1. Mide en procesos nuevos la memoria de un proceso de job precalentado
+   (`import agent` + `prewarm`: modelos VAD) y la de `import agent` solo (el
+   proceso principal del worker, sin el modelo del turn detector).
+2. Simula `--days` días de tráfico de `--tenants` concesionarias con volumen
+   desigual (Zipf) y horas pico distintas; llamadas de Poisson con duración
+   exponencial.
+3. Dimensiona contenedores de `--container-cores` núcleos para la p99 de sesiones
+   simultáneas, con el umbral de admisión (ADMISSION_LOAD_THRESHOLD):
+   - por concesionaria: cada flota se dimensiona para su propio pico, con al
+     menos `--min-containers` contenedores, y cada contenedor paga su proceso
+     principal, su proceso de inferencia y sus procesos de job precalentados
+   - multi-concesionaria: una flota para el pico del tráfico agregado
+
+Las sesiones por núcleo se calculan sobre el mismo tráfico (la p99 agregada) en
+ambos casos. El costo de CPU por sesión es el del modelo de `sim_admission.py`.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/bench_tenant_density.py
+    uv run evals/bench_tenant_density.py --tenants 30 --calls-per-day 20000 --container-cores 8
+"""
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+
+from admission import ADMISSION_LOAD_THRESHOLD  # noqa: E402
+from sim_admission import CPU_PER_SESSION  # noqa: E402
+
+DAY_S = 24 * 3600
+
+# Se ejecuta en un proceso limpio; imprime una línea JSON con la RSS tras importar y tras prewarm
+_CHILD = """
+import json
+from livekit.agents import JobExecutorType, JobProcess
+import agent
+from session_memory import process_rss_mb
+imported = process_rss_mb()
+agent.prewarm(JobProcess(executor_type=JobExecutorType.PROCESS, user_arguments=None, http_proxy=None))
+print(json.dumps({"import_mb": imported, "prewarm_mb": process_rss_mb()}))
+"""
+
+
+def measure_process_mb() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD], cwd=AGENT_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def tenant_rates(args: argparse.Namespace, rng: np.random.Generator) -> np.ndarray:
+    """Llamadas esperadas por minuto, (concesionarias, 1440): horario comercial con pico propio"""
+    shares = 1.0 / np.arange(1, args.tenants + 1) ** args.zipf
+    shares /= shares.sum()
+    minutes = np.arange(24 * 60) / 60
+    peaks = rng.uniform(10, 18, size=args.tenants)
+    curves = 0.05 + np.exp(-0.5 * ((minutes[None, :] - peaks[:, None]) / 2.0) ** 2)
+    curves[:, (minutes < 8) | (minutes >= 21)] *= 0.1
+    curves /= curves.sum(axis=1, keepdims=True)
+    return shares[:, None] * args.calls_per_day * curves
+
+
+def simulate_day(rates: np.ndarray, call_s: float, rng: np.random.Generator) -> np.ndarray:
+    """Sesiones simultáneas por concesionaria y segundo, (concesionarias, 86400)"""
+    concurrency = np.zeros((rates.shape[0], DAY_S + 1), dtype=np.int32)
+    for tenant, per_minute in enumerate(rates):
+        counts = rng.poisson(per_minute)
+        starts = np.repeat(np.arange(len(counts)) * 60, counts) + rng.uniform(0, 60, counts.sum())
+        ends = np.minimum(starts + rng.exponential(call_s, starts.size), DAY_S)
+        np.add.at(concurrency[tenant], starts.astype(int), 1)
+        np.add.at(concurrency[tenant], ends.astype(int), -1)
+    return np.cumsum(concurrency, axis=1)[:, :DAY_S]
+
+
+def size_fleet(peak_sessions: float, args: argparse.Namespace, job_mb: float, base_mb: float) -> dict:
+    """Contenedores para `peak_sessions` por CPU (umbral de admisión) y por memoria"""
+    sessions_per_container = max(1, int(args.container_cores * ADMISSION_LOAD_THRESHOLD / CPU_PER_SESSION))
+    by_mem = int((args.container_mem_gb * 1024 - base_mb) / job_mb) - args.idle_processes
+    per_container = max(1, min(sessions_per_container, by_mem))
+    containers = max(args.min_containers, math.ceil(peak_sessions / per_container))
+    memory_mb = containers * (base_mb + args.idle_processes * job_mb) + peak_sessions * job_mb
+    return {"containers": containers, "cores": containers * args.container_cores, "memory_gb": memory_mb / 1024}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=12)
+    parser.add_argument("--calls-per-day", type=float, default=6000, help="llamadas diarias de todas las concesionarias")
+    parser.add_argument("--zipf", type=float, default=1.0, help="desigualdad de volumen entre concesionarias")
+    parser.add_argument("--call-min", type=float, default=4.0, help="duración media de una llamada")
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--container-cores", type=int, default=4)
+    parser.add_argument("--container-mem-gb", type=float, default=8.0)
+    parser.add_argument("--min-containers", type=int, default=1, help="contenedores mínimos por flota")
+    parser.add_argument("--idle-processes", type=int, default=3, help="procesos de job precalentados por contenedor")
+    parser.add_argument("--inference-mb", type=float, default=400.0, help="proceso de inferencia del turn detector (medir con ps)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    measured = measure_process_mb()
+    job_mb = measured["prewarm_mb"]
+    base_mb = measured["import_mb"] + args.inference_mb
+    print(
+        f"Proceso de job precalentado: {job_mb:.0f} MB  proceso principal: {measured['import_mb']:.0f} MB "
+        f"+ inferencia {args.inference_mb:.0f} MB  CPU por sesión: {CPU_PER_SESSION} núcleos"
+    )
+
+    rng = np.random.default_rng(args.seed)
+    rates = tenant_rates(args, rng)
+    days = [simulate_day(rates, args.call_min * 60, rng) for _ in range(args.days)]
+    per_tenant = np.concatenate(days, axis=1)
+    aggregate = per_tenant.sum(axis=0)
+    tenant_p99 = np.percentile(per_tenant, 99, axis=1)
+    aggregate_p99 = float(np.percentile(aggregate, 99))
+
+    dedicated = [size_fleet(p99, args, job_mb, base_mb) for p99 in tenant_p99]
+    dedicated_total = {k: sum(fleet[k] for fleet in dedicated) for k in ("containers", "cores", "memory_gb")}
+    shared = size_fleet(aggregate_p99, args, job_mb, base_mb)
+
+    print(
+        f"{args.tenants} concesionarias, {args.calls_per_day:.0f} llamadas/día, {args.days} días simulados: "
+        f"p99 simultáneas agregada {aggregate_p99:.0f}, suma de p99 por concesionaria {tenant_p99.sum():.0f}"
+    )
+    print(f"{'':<22}{'contenedores':>13}{'núcleos':>9}{'memoria':>10}{'sesiones/núcleo':>17}")
+    for label, fleet in (("una por concesionaria", dedicated_total), ("multi-concesionaria", shared)):
+        print(
+            f"{label:<22}{fleet['containers']:>13}{fleet['cores']:>9}{fleet['memory_gb']:>8.1f} GB"
+            f"{aggregate_p99 / fleet['cores']:>17.2f}"
+        )
+    print(f"Densidad: x{dedicated_total['cores'] / shared['cores']:.1f} sesiones por núcleo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Evaluación offline del endpointing: latencia de respuesta frente a cortes falsos.
+
+Reproduce llamadas grabadas como secuencias de segmentos de voz del llamante y
+compara configuraciones fijas con `AdaptiveEndpointing`.
+
+Formato de las llamadas (JSONL, una llamada por línea):
+    {"call_id": "abc", "segments": [[0.0, 1.8], [2.3, 4.0], [9.1, 10.2]], "turn_ends": [1]}
+- `segments`: inicio y fin (s) de cada tramo de voz del llamante
+- `turn_ends`: índices de los segmentos tras los cuales el turno terminó de verdad
+  (el resto de silencios son pausas dentro del turno)
+
+El turn detector se modela como imperfecto: en una pausa dentro del turno
+detecta "no terminó" con probabilidad --eou-recall y espera `max_delay`; en un
+fin de turno real detecta "terminó" con probabilidad --eou-precision y espera
+`min_delay`. Las mismas tiradas se usan para todas las políticas.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/eval_endpointing.py --calls grabaciones.jsonl
+    uv run evals/eval_endpointing.py --synthetic 300
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from endpointing import AdaptiveEndpointing  # noqa: E402
+
+# Configuraciones fijas (min_silence, min_delay, max_delay); la primera es la actual
+FIXED_POLICIES = {
+    "fijo actual": (0.25, 0.2, 3.0),
+    "fijo conservador": (0.4, 0.6, 3.0),
+    "fijo agresivo": (0.2, 0.1, 1.5),
+}
+
+
+def load_calls(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_calls(n: int, seed: int) -> list[dict]:
+    """Llamadas sintéticas con ritmos de habla variados (rápidos y pausados)"""
+    rng = random.Random(seed)
+    calls = []
+    for i in range(n):
+        pace = rng.lognormvariate(0, 0.45)  # >1: llamante pausado
+        t, segments, turn_ends = 0.0, [], []
+        for _ in range(rng.randint(4, 10)):
+            for k in range(rng.randint(1, 4)):
+                length = rng.uniform(0.6, 3.0)
+                segments.append([round(t, 3), round(t + length, 3)])
+                t += length + rng.lognormvariate(-1.1, 0.5) * pace
+            turn_ends.append(len(segments) - 1)
+            # El agente responde antes del siguiente turno del llamante
+            t = segments[-1][1] + rng.uniform(2.0, 6.0)
+        calls.append({"call_id": f"sint-{i}", "pace": pace, "segments": segments, "turn_ends": turn_ends})
+    return calls
+
+
+def replay(call: dict, policy: str, args: argparse.Namespace) -> dict:
+    """Devuelve latencias de respuesta y cortes falsos de una llamada"""
+    rng = random.Random(f"{args.seed}-{call['call_id']}")
+    controller = AdaptiveEndpointing() if policy == "adaptativo" else None
+    min_silence, min_delay, max_delay = FIXED_POLICIES.get(policy, (0.25, 0.2, 3.0))
+
+    segments = call["segments"]
+    turn_ends = set(call["turn_ends"])
+    latencies, false_cutoffs, pauses = [], 0, 0
+
+    for i, (_, end) in enumerate(segments):
+        if controller:
+            min_silence, min_delay, max_delay = controller.min_silence, controller.min_delay, controller.max_delay
+            controller.on_user_speech_end(end)
+
+        is_turn_end = i in turn_ends
+        next_start = segments[i + 1][0] if i + 1 < len(segments) else None
+        eou_done = rng.random() < (args.eou_precision if is_turn_end else 1 - args.eou_recall)
+        wait = min_silence + (min_delay if eou_done else max_delay)
+
+        fired = next_start is None or end + wait < next_start
+        if fired and controller:
+            controller.on_agent_turn(end + wait)
+        if is_turn_end:
+            latencies.append(wait)
+        else:
+            pauses += 1
+            false_cutoffs += int(fired)
+
+        if controller and next_start is not None:
+            controller.on_user_speech_start(next_start)
+
+    return {"latencies": latencies, "false_cutoffs": false_cutoffs, "pauses": pauses}
+
+
+def evaluate(calls: list[dict], policy: str, args: argparse.Namespace) -> dict:
+    latencies, false_cutoffs, pauses = [], 0, 0
+    for call in calls:
+        r = replay(call, policy, args)
+        latencies += r["latencies"]
+        false_cutoffs += r["false_cutoffs"]
+        pauses += r["pauses"]
+    return {
+        "latency": statistics.mean(latencies) if latencies else 0.0,
+        "false_cutoff_rate": false_cutoffs / pauses if pauses else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", help="JSONL con llamadas grabadas")
+    parser.add_argument("--synthetic", type=int, default=200, help="llamadas sintéticas si no se pasa --calls")
+    parser.add_argument("--eou-recall", type=float, default=0.7)
+    parser.add_argument("--eou-precision", type=float, default=0.85)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    calls = load_calls(args.calls) if args.calls else synthetic_calls(args.synthetic, args.seed)
+    groups = {"todas": calls}
+    if all("pace" in c for c in calls):
+        groups["rápidos"] = [c for c in calls if c["pace"] < 0.8]
+        groups["pausados"] = [c for c in calls if c["pace"] > 1.25]
+
+    policies = list(FIXED_POLICIES) + ["adaptativo"]
+    for name, group in groups.items():
+        print(f"\n{name} ({len(group)} llamadas)")
+        print(f"{'política':<18} {'latencia media (s)':>19} {'cortes falsos':>14}")
+        for policy in policies:
+            r = evaluate(group, policy, args)
+            print(f"{policy:<18} {r['latency']:>19.3f} {r['false_cutoff_rate']:>14.1%}")
+
+
+if __name__ == "__main__":
+    main()
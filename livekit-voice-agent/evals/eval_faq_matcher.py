@@ -0,0 +1,89 @@
+"""Evaluación de la ruta rápida de preguntas frecuentes.
+
+Compara `FAQMatcher.match` con etiquetas manuales (id de la FAQ o "llm") sobre
+turnos típicos de las llamadas. Reporta la tasa de turnos que se responderían
+sin LLM y los errores: una respuesta de FAQ a una pregunta que no lo era es el
+error caro (respuesta equivocada); una FAQ que cae al LLM solo cuesta latencia.
+
+Formato opcional (JSONL, un turno por línea):
+    {"user": "¿Tienen financiamiento?", "label": "financiamiento"}
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/eval_faq_matcher.py
+    uv run evals/eval_faq_matcher.py --turns turnos.jsonl --llm-latency 1.8
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from faq import FAQ_EXAMPLE_FILE, FAQMatcher  # noqa: E402
+
+# (turno del usuario, etiqueta)
+TURNS = [
+    ("¿Tienen financiamiento?", "financiamiento"),
+    ("Hola, quería saber si dan crédito vehicular", "financiamiento"),
+    ("¿Se puede pagar en cuotas?", "financiamiento"),
+    ("¿A qué hora cierran?", "horario"),
+    ("¿Atienden los domingos?", "horario"),
+    ("Buenas, ¿cuál es el horario de atención?", "horario"),
+    ("¿Dónde están ubicados?", "ubicacion"),
+    ("¿Cuál es la dirección de la concesionaria?", "ubicacion"),
+    ("¿Cuánto dura la garantía?", "garantia"),
+    ("¿Reciben mi auto como parte de pago?", "parte_de_pago"),
+    ("¿Cuánto cuesta la RAV4?", "llm"),
+    ("¿Tienen la Hilux 2025 en color blanco?", "llm"),
+    ("Quiero agendar una prueba de manejo para el sábado", "llm"),
+    ("¿Cuánto sería la cuota inicial de una Corolla con un crédito a 36 meses?", "llm"),
+    ("¿La garantía cubre la batería del híbrido si la cambio en otro taller?", "llm"),
+    ("Sí, claro", "llm"),
+    ("No voy a poder ir el jueves", "llm"),
+    ("Quiero hablar con un asesor", "llm"),
+]
+
+
+def load_turns(path: str) -> list[tuple[str, str]]:
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(r["user"], r["label"]) for r in rows]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", help="JSONL con turnos etiquetados")
+    parser.add_argument("--faq", help="archivo de FAQ (por defecto el faq.json del repositorio)")
+    parser.add_argument(
+        "--llm-latency", type=float, default=1.5,
+        help="segundos típicos hasta la primera palabra cuando el turno pasa por LLM + RAG",
+    )
+    args = parser.parse_args()
+
+    matcher = FAQMatcher.from_file(args.faq or FAQ_EXAMPLE_FILE)
+    turns = load_turns(args.turns) if args.turns else TURNS
+    hits, wrong_answers, missed = 0, [], []
+    for user, label in turns:
+        match = matcher.match(user)
+        predicted = match.faq.id if match else "llm"
+        hits += match is not None
+        if match and predicted != label:
+            wrong_answers.append((user, predicted, match.score))
+        elif not match and label != "llm":
+            best, score = matcher.score(user)[0]
+            missed.append((user, best.id, score))
+
+    faq_turns = sum(label != "llm" for _, label in turns)
+    print(f"Turnos: {len(turns)}  atendidos por FAQ: {hits} ({hits / len(turns):.0%})  FAQ reales: {faq_turns}")
+    print(f"Ahorro estimado: ~{args.llm_latency:.1f}s por turno atendido, {hits * args.llm_latency:.1f}s en total")
+    print(f"Respuestas de FAQ equivocadas (error caro): {len(wrong_answers)}")
+    for user, faq_id, score in wrong_answers:
+        print(f"  - {user!r} -> {faq_id} ({score:.2f})")
+    print(f"FAQ que caen al LLM (solo latencia): {len(missed)}")
+    for user, faq_id, score in missed:
+        print(f"  - {user!r} (mejor: {faq_id} {score:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Evaluación del clasificador de turnos del router de LLM.
+
+Compara `classify_turn` con etiquetas manuales (fast/strong) sobre turnos
+típicos de las llamadas. Reporta la proporción de turnos que irían al modelo
+rápido y los errores en cada sentido: un turno complejo enviado al modelo rápido
+es el error caro (calidad); uno simple enviado al fuerte solo cuesta latencia.
+
+Formato opcional (JSONL, un turno por línea):
+    {"assistant": "¿Te gustaría agendar?", "user": "sí, claro", "outbound": false, "label": "fast"}
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/eval_turn_classifier.py
+    uv run evals/eval_turn_classifier.py --turns turnos.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from livekit.agents import llm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_router import classify_turn  # noqa: E402
+
+# (respuesta previa del agente, turno del usuario, llamada saliente, etiqueta)
+TURNS = [
+    ("¿En qué puedo ayudarte hoy?", "Hola, buenas tardes", False, "fast"),
+    ("Tu cita quedó confirmada. ¿Algo más en lo que pueda ayudarte?", "Perfecto, muchas gracias", False, "fast"),
+    ("¿Algo más en lo que pueda ayudarte?", "No, gracias", False, "fast"),
+    ("Con gusto. ¿Hay algo más que quieras saber?", "no, eso es todo", False, "fast"),
+    # Respuestas a preguntas que llevan a una herramienta (agenda, datos del prospecto)
+    ("¿Te gustaría agendar una prueba de manejo?", "Sí, claro", False, "strong"),
+    ("¿Qué día te acomoda venir?", "El sábado en la mañana", False, "strong"),
+    ("Tengo a las 10 AM o a las 11 AM. ¿Cuál prefieres?", "a las 11", False, "strong"),
+    ("Te agendo el sábado a las 10. ¿Te parece bien?", "sí", False, "strong"),
+    ("¿Me confirmas tu número?", "correcto", False, "strong"),
+    ("¿Me das tu nombre completo?", "Juan Pérez", False, "strong"),
+    ("¿Quieres que te comunique con un asesor?", "sí, por favor", False, "strong"),
+    ("¿En qué puedo ayudarte hoy?", "¿Cuánto cuesta la RAV4?", False, "strong"),
+    ("¿En qué puedo ayudarte hoy?", "¿Tienen financiamiento?", False, "strong"),
+    ("¿En qué puedo ayudarte hoy?", "quiero saber si tienen la Hilux 2025 en color blanco", False, "strong"),
+    ("¿En qué puedo ayudarte hoy?", "¿Dónde están ubicados?", False, "strong"),
+    ("¿Qué día te acomoda venir?", "mejor quiero hablar con un asesor", False, "strong"),
+    ("¿En qué puedo ayudarte hoy?", "mmm no sé", False, "strong"),
+    ("¿En qué puedo ayudarte hoy?", "mi auto hace un ruido raro cuando freno y quería ver si lo revisan", False, "strong"),
+    ("Te llamo para confirmar tu cita del jueves a las 4 PM.", "Sí, ahí estaré", True, "fast"),
+    ("Te llamo para confirmar tu cita del jueves a las 4 PM.", "Aló", True, "fast"),
+    ("Te llamo para confirmar tu cita del jueves a las 4 PM.", "No voy a poder", True, "strong"),
+    ("Te llamo para confirmar tu cita del jueves a las 4 PM.", "¿Puedo cambiarla para el viernes?", True, "strong"),
+    ("Te llamo para confirmar tu cita del jueves a las 4 PM.", "ok gracias", True, "fast"),
+    ("Entonces, ¿te gustaría reprogramarla para otro día?", "sí", True, "strong"),
+]
+
+
+def load_turns(path: str) -> list[tuple[str, str, bool, str]]:
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(r.get("assistant", ""), r["user"], r.get("outbound", False), r["label"]) for r in rows]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", help="JSONL con turnos etiquetados")
+    args = parser.parse_args()
+
+    turns = load_turns(args.turns) if args.turns else TURNS
+    fast_total, complex_to_fast, simple_to_strong = 0, [], []
+    for assistant, user, outbound, label in turns:
+        chat_ctx = llm.ChatContext()
+        chat_ctx.add_message(role="system", content="instrucciones")
+        if assistant:
+            chat_ctx.add_message(role="assistant", content=assistant)
+        chat_ctx.add_message(role="user", content=user)
+
+        decision = classify_turn(chat_ctx, is_outbound=outbound)
+        fast_total += decision.route == "fast"
+        if decision.route == "fast" and label == "strong":
+            complex_to_fast.append((user, decision.reason))
+        elif decision.route == "strong" and label == "fast":
+            simple_to_strong.append((user, decision.reason))
+
+    accuracy = 1 - (len(complex_to_fast) + len(simple_to_strong)) / len(turns)
+    print(f"Turnos: {len(turns)}  precisión: {accuracy:.1%}  al modelo rápido: {fast_total / len(turns):.1%}")
+    print(f"Complejos enviados al rápido (error caro): {len(complex_to_fast)}")
+    for user, reason in complex_to_fast:
+        print(f"  - {user!r} ({reason})")
+    print(f"Simples enviados al fuerte (solo latencia): {len(simple_to_strong)}")
+    for user, reason in simple_to_strong:
+        print(f"  - {user!r} ({reason})")
+
+
+if __name__ == "__main__":
+    main()
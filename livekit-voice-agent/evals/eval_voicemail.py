@@ -0,0 +1,187 @@
+"""Evaluación sin conexión del detector de buzón de voz.
+
+Pasa cada grabación etiquetada por `VoicemailDetector` en trozos de 20 ms (como
+llega en la llamada) y reporta la precisión, la matriz de confusión y la latencia
+de decisión (segundos de audio del cliente hasta decidir). El error caro es
+tratar a una persona como buzón: se le cuelga o se le deja un mensaje grabado.
+
+Sin `--manifest` se genera un conjunto sintético reproducible: personas que
+contestan corto, largo o con ruido, y contestadoras con y sin pitido. Ese audio
+sale de los mismos supuestos que el detector (sílabas de 4-6 Hz, pitido de tono
+puro), así que solo sirve como prueba de regresión: la cadencia y el pitido NO
+están validados con llamadas reales. Las frases de la transcripción sintética
+mezclan algunas que el detector conoce con otras que no (contestadoras
+personales, una persona que dice "no se encuentra en este momento").
+
+El repositorio no trae grabaciones (son audio de clientes). Con `--manifest` se
+usan grabaciones reales etiquetadas (WAV PCM 16 bits mono, JSONL por línea, rutas
+relativas al JSONL):
+    {"wav": "buzon_01.wav", "label": "buzon", "transcript": [[2.1, "deje su mensaje"]]}
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/eval_voicemail.py
+    uv run evals/eval_voicemail.py --per-kind 50 --transcripts
+    uv run evals/eval_voicemail.py --manifest /ruta/a/grabaciones/voicemail.jsonl
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voicemail import FRAME_MS, VoicemailDetector  # noqa: E402
+
+SAMPLE_RATE = 8000
+
+
+def speech(rng: np.random.Generator, seconds: float, level_db: float = -20.0) -> np.ndarray:
+    """Voz sintética: armónicos con f0 variable moduladas en sílabas de ~4-6 Hz"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = rng.uniform(100, 220) * (1 + 0.08 * np.sin(2 * np.pi * rng.uniform(0.5, 2) * t))
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = np.clip(np.sin(2 * np.pi * rng.uniform(4, 6) * t + rng.uniform(0, np.pi)), 0.15, None)
+    signal = voiced * syllables + 0.3 * rng.standard_normal(len(t)) * syllables
+    return signal / np.sqrt(np.mean(signal**2)) * 10 ** (level_db / 20)
+
+
+def silence(rng: np.random.Generator, seconds: float, noise_db: float = -60.0) -> np.ndarray:
+    return rng.standard_normal(int(seconds * SAMPLE_RATE)) * 10 ** (noise_db / 20)
+
+
+def beep(seconds: float = 0.4, freq: float = 1000.0, level_db: float = -18.0) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return np.sin(2 * np.pi * freq * t) * np.sqrt(2) * 10 ** (level_db / 20)
+
+
+def machine_greeting(rng: np.random.Generator, seconds: float) -> list[np.ndarray]:
+    # Locución grabada: frases largas con pausas cortas de respiración
+    parts, total = [], 0.0
+    while total < seconds:
+        phrase = rng.uniform(1.5, 3.5)
+        parts += [speech(rng, phrase), silence(rng, rng.uniform(0.15, 0.45))]
+        total += phrase
+    return parts
+
+
+# Frases del STT para los fixtures sintéticos: no todas están entre las señales del detector
+HUMAN_TRANSCRIPTS = [
+    "aló",
+    "aló, sí, buenas tardes, ¿quién habla?",
+    "sí, diga",
+    "no, no se encuentra en este momento, ¿de parte de quién?",
+    "no está disponible ahorita, ¿quién le habla?",
+    "no puede atender, soy su esposa, ¿de parte de quién?",
+]
+MACHINE_TRANSCRIPTS = [
+    "no se encuentra disponible, deje su mensaje después del tono",
+    "el número que usted marcó no está disponible",
+    "hola, soy Carla, ahora no te puedo contestar, llámame más tarde",
+    "gracias por llamar, en este momento estoy ocupado",
+]
+
+
+def synthetic_fixture(kind: str, rng: np.random.Generator) -> tuple[np.ndarray, str, list]:
+    noise = -45.0 if kind == "humano_ruido" else -60.0
+    lead = [silence(rng, rng.uniform(0.2, 0.8), noise)]
+    if kind in ("humano_corto", "humano_ruido"):
+        parts = lead + [speech(rng, rng.uniform(0.4, 1.0)), silence(rng, 1.5, noise)]
+        if rng.random() < 0.5:  # "¿aló? ... ¿aló?"
+            parts += [speech(rng, rng.uniform(0.4, 0.8)), silence(rng, 2.0, noise)]
+        return np.concatenate(parts), "humano", [[1.0, str(rng.choice(HUMAN_TRANSCRIPTS))]]
+    if kind == "humano_largo":
+        # "Aló, sí, buenas tardes, ¿quién habla?"
+        parts = lead + [speech(rng, rng.uniform(1.0, 1.4)), silence(rng, 0.3), speech(rng, rng.uniform(0.6, 1.0))]
+        return np.concatenate(parts + [silence(rng, 3.0)]), "humano", [[2.0, str(rng.choice(HUMAN_TRANSCRIPTS))]]
+    greeting = machine_greeting(rng, rng.uniform(4.0, 9.0))
+    tail = [silence(rng, 0.5), beep(freq=rng.choice([440.0, 850.0, 1000.0, 1400.0]))] if kind == "buzon_pitido" else []
+    audio = np.concatenate(lead + greeting + tail + [silence(rng, 2.0)])
+    return audio, "buzon", [[2.5, str(rng.choice(MACHINE_TRANSCRIPTS))]]
+
+
+def load_manifest(path: str) -> list[tuple[str, np.ndarray, str, list]]:
+    base = os.path.dirname(os.path.abspath(path))
+    fixtures = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            with wave.open(os.path.join(base, row["wav"])) as w:
+                if w.getsampwidth() != 2 or w.getnchannels() != 1:
+                    raise ValueError(f"{row['wav']}: se espera PCM de 16 bits mono")
+                rate = w.getframerate()
+                audio = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16).astype(np.float32) / 32768
+            if rate != SAMPLE_RATE:
+                audio = np.interp(np.arange(0, len(audio), rate / SAMPLE_RATE), np.arange(len(audio)), audio)
+            fixtures.append((row["wav"], audio, row["label"], row.get("transcript", [])))
+    return fixtures
+
+
+def run(audio: np.ndarray, transcript: list, use_transcripts: bool):
+    detector = VoicemailDetector(SAMPLE_RATE)
+    pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+    chunk = SAMPLE_RATE * FRAME_MS // 1000
+    cues = sorted(transcript) if use_transcripts else []
+    for start in range(0, len(pcm), chunk):
+        # El STT entrega la frase con ~0.5 s de retraso sobre el audio
+        while cues and cues[0][0] + 0.5 <= detector.elapsed_s:
+            detector.push_transcript(cues.pop(0)[1])
+        if detector.push_audio(pcm[start : start + chunk]):
+            break
+    return detector.decision
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", help="JSONL con grabaciones etiquetadas")
+    parser.add_argument("--per-kind", type=int, default=40, help="fixtures sintéticos por tipo")
+    parser.add_argument("--transcripts", action="store_true", help="incluir frases del STT como señal")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.manifest:
+        fixtures = load_manifest(args.manifest)
+    else:
+        rng = np.random.default_rng(args.seed)
+        kinds = ["humano_corto", "humano_largo", "humano_ruido", "buzon_pitido", "buzon_sin_pitido"]
+        fixtures = [(kind, *synthetic_fixture(kind, rng)) for kind in kinds for _ in range(args.per_kind)]
+
+    confusion = {(t, p): 0 for t in ("humano", "buzon") for p in ("humano", "buzon")}
+    latency = {"humano": [], "buzon": []}
+    errors = []
+    for name, audio, label, transcript in fixtures:
+        decision = run(audio, transcript, args.transcripts)
+        predicted = decision.label if decision else "humano"
+        confusion[(label, predicted)] += 1
+        if decision:
+            latency[predicted].append(decision.at_s)
+        if predicted != label:
+            errors.append((name, label, decision))
+
+    total = len(fixtures)
+    if not args.manifest:
+        print("Conjunto sintético: prueba de regresión; la cadencia y el pitido no están validados con audio real")
+    correct = confusion[("humano", "humano")] + confusion[("buzon", "buzon")]
+    print(f"Fixtures: {total}  precisión: {correct / total:.1%}  (transcripción: {'sí' if args.transcripts else 'no'})")
+    print(f"{'real / decisión':<16} {'humano':>7} {'buzon':>7}")
+    for real in ("humano", "buzon"):
+        print(f"{real:<16} {confusion[(real, 'humano')]:>7} {confusion[(real, 'buzon')]:>7}")
+    for label, values in latency.items():
+        if values:
+            ordered = sorted(values)
+            p95 = ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)]
+            print(f"Latencia de decisión ({label}): p50={statistics.median(ordered):.2f}s p95={p95:.2f}s")
+    print(f"Personas tratadas como buzón (error caro): {confusion[('humano', 'buzon')]}")
+    for name, label, decision in errors[:10]:
+        print(f"  - {name}: real={label}, decisión={decision}")
+
+
+if __name__ == "__main__":
+    main()
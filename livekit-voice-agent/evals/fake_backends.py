@@ -0,0 +1,274 @@
+"""MCP y base de conocimiento falsos con fallas inyectables, para ajustar timeouts.
+
+Un solo servidor local (uvicorn) con:
+
+- servidor MCP (streamable HTTP en `/mcp`, FastMCP) con las herramientas del
+  agente: `consultar_inventario`, `guardar_prospecto`,
+  `consultar_horarios_disponibles` y `agendar_cita`, más `listar_eventos` (la que
+  sincroniza `availability.py`). Las tres de calendario usan un `FakeCalendar`:
+  los horarios se calculan en el servidor y `agendar_cita` crea el evento sin
+  verificar choques, como Google Calendar.
+- `match_documents` de Supabase (`/rest/v1/rpc/match_documents`, lo que llama
+  `supabase.rpc`)
+- embeddings de OpenAI (`/v1/embeddings`, lo que llama `buscar_en_base_de_conocimiento`
+  antes de la búsqueda): un vector determinista por texto, varios textos por pedido
+- lectura de la tabla de documentos (`/rest/v1/<tabla>`, lo que carga el índice en
+  memoria de `kb_sidecar.py`): `documents` fragmentos con embeddings al azar
+
+Cada endpoint se comporta según el escenario (`backend_scenarios.json`):
+
+    {"name": "cuelgues", "endpoints": {"*": {"p50_ms": 250, "p95_ms": 800, "hang_rate": 0.1}}}
+
+- `p50_ms` / `p95_ms`: latencia lognormal (sin `p95_ms`, fija)
+- `error_rate`: fracción de respuestas con error (MCP: resultado con isError;
+  HTTP: 500 tras la latencia)
+- `hang_rate`: fracción de pedidos que nunca responden
+- `down_after` / `down_for`: tras `down_after` pedidos, los siguientes `down_for`
+  cuelgan (caída temporal del servicio)
+
+La clave `"*"` aplica a todos los endpoints sin entrada propia.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import uvicorn
+from mcp.server.fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from availability import TZ, build_index, now, parse_business_hours, parse_day, parse_events, parse_time
+
+HANG_S = 3600.0
+
+
+class BackendError(Exception):
+    pass
+
+
+class FaultInjector:
+    def __init__(self, scenario: dict, seed: int = 7) -> None:
+        self.scenario = scenario
+        self.requests: Counter[str] = Counter()
+        self.hangs: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self._rng = random.Random(seed)
+
+    def _spec(self, endpoint: str) -> dict:
+        endpoints = self.scenario.get("endpoints", {})
+        return endpoints.get(endpoint, endpoints.get("*", {}))
+
+    async def inject(self, endpoint: str) -> None:
+        """Espera la latencia del escenario; cuelga o lanza `BackendError` según sus tasas"""
+        spec = self._spec(endpoint)
+        self.requests[endpoint] += 1
+        seq = self.requests[endpoint]
+        down_after = spec.get("down_after")
+        if down_after is not None and down_after < seq <= down_after + spec.get("down_for", 0):
+            self.hangs[endpoint] += 1
+            await asyncio.sleep(HANG_S)
+        if self._rng.random() < spec.get("hang_rate", 0.0):
+            self.hangs[endpoint] += 1
+            await asyncio.sleep(HANG_S)
+
+        p50 = spec.get("p50_ms", 0.0) / 1000
+        if p50 > 0:
+            sigma = math.log(spec.get("p95_ms", spec["p50_ms"]) / spec["p50_ms"]) / 1.645
+            await asyncio.sleep(p50 * math.exp(sigma * self._rng.gauss(0, 1)))
+        if self._rng.random() < spec.get("error_rate", 0.0):
+            self.errors[endpoint] += 1
+            raise BackendError(f"{endpoint}: error inyectado")
+
+
+class FakeCalendar:
+    def __init__(self, business_hours: dict | None = None, slot_minutes: int = 60) -> None:
+        self.hours = parse_business_hours(business_hours or {"lun-vie": "09:00-18:00", "sab": "09:00-13:00"})
+        self.slot_minutes = slot_minutes
+        self.events: list[dict] = []
+
+    def add(self, start: datetime, minutes: int, summary: str = "Prueba de manejo") -> dict:
+        event = {
+            "id": len(self.events) + 1, "resumen": summary,
+            "inicio": start.isoformat(), "fin": (start + timedelta(minutes=minutes)).isoformat(),
+        }
+        self.events.append(event)
+        return event
+
+    def seed(self, days: int, busy_rate: float, rng: random.Random) -> None:
+        """Ocupa al azar una fracción de los horarios de los próximos `days` días"""
+        today = now().date()
+        for offset in range(days):
+            day = today + timedelta(days=offset)
+            for opens, closes in self.hours.get(day.weekday(), []):
+                for minute in range(opens, closes - self.slot_minutes + 1, self.slot_minutes):
+                    if rng.random() < busy_rate:
+                        self.add(datetime.combine(day, datetime.min.time(), TZ) + timedelta(minutes=minute), self.slot_minutes)
+
+    def between(self, desde: str, hasta: str) -> list[dict]:
+        first, last = date.fromisoformat(desde), date.fromisoformat(hasta)
+        return [e for e in self.events if first <= datetime.fromisoformat(e["inicio"]).date() <= last]
+
+    def free(self, fecha: str) -> tuple[date | None, list[str]]:
+        """El cálculo que hace el backend de calendario para `consultar_horarios_disponibles`"""
+        day = parse_day(fecha, now().date())
+        if day is None:
+            return None, []
+        index = build_index(parse_events(self.events), day, day)[day]
+        slots = [
+            minute
+            for opens, closes in self.hours.get(day.weekday(), [])
+            for minute in range(opens, closes - self.slot_minutes + 1, self.slot_minutes)
+            if not index.busy(minute, minute + self.slot_minutes)
+        ]
+        return day, [f"{m // 60:02d}:{m % 60:02d}" for m in slots]
+
+    def book(self, fecha: str, hora: str, nombre: str) -> dict | None:
+        day, minute = parse_day(f"{fecha} {hora}", now().date()), parse_time(f"{fecha} {hora}")
+        if day is None or minute is None:
+            return None
+        start = datetime.combine(day, datetime.min.time(), TZ) + timedelta(minutes=minute)
+        return self.add(start, self.slot_minutes, f"Prueba de manejo - {nombre}")
+
+    def double_bookings(self) -> int:
+        starts = Counter(e["inicio"] for e in self.events)
+        return sum(count - 1 for count in starts.values())
+
+
+def create_mcp(faults: FaultInjector, calendar: FakeCalendar) -> FastMCP:
+    server = FastMCP("autofuturo-fake")
+
+    @server.tool()
+    async def consultar_inventario(modelo: str) -> str:
+        """Consulta si un vehículo está disponible en el inventario"""
+        await faults.inject("consultar_inventario")
+        return json.dumps({"modelo": modelo, "disponible": True, "unidades": 3, "colores": ["blanco", "gris"]})
+
+    @server.tool()
+    async def guardar_prospecto(nombre: str, telefono: str, interes: str = "") -> str:
+        """Guarda los datos de un cliente interesado en la hoja de Prospectos"""
+        await faults.inject("guardar_prospecto")
+        return json.dumps({"guardado": True, "telefono": telefono})
+
+    @server.tool()
+    async def consultar_horarios_disponibles(fecha: str) -> str:
+        """Revisa los horarios libres del calendario para una prueba de manejo"""
+        await faults.inject("consultar_horarios_disponibles")
+        day, slots = calendar.free(fecha)
+        return json.dumps({"fecha": day.isoformat() if day else fecha, "horarios": slots})
+
+    @server.tool()
+    async def agendar_cita(nombre: str, telefono: str, fecha: str, hora: str) -> str:
+        """Confirma y crea la cita en el calendario"""
+        await faults.inject("agendar_cita")
+        event = calendar.book(fecha, hora, nombre)
+        return json.dumps({"confirmada": event is not None, "fecha": fecha, "hora": hora})
+
+    @server.tool()
+    async def listar_eventos(desde: str, hasta: str) -> str:
+        """Eventos del calendario entre dos fechas (AAAA-MM-DD), con inicio y fin"""
+        await faults.inject("listar_eventos")
+        return json.dumps(calendar.between(desde, hasta))
+
+    return server
+
+
+class FakeBackends:
+    def __init__(self, scenario: dict, *, dimensions: int = 1536, documents: int = 200, seed: int = 7) -> None:
+        self.faults = FaultInjector(scenario, seed)
+        self.calendar = FakeCalendar()
+        self.dimensions = dimensions
+        self.documents = documents
+        self.embedded_texts = 0
+        self._pages: dict[tuple[int, int], bytes] = {}
+        self._server: uvicorn.Server | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        app = create_mcp(self.faults, self.calendar).streamable_http_app()
+        app.router.routes.append(Route("/rest/v1/rpc/{function}", self._rpc, methods=["POST"]))
+        app.router.routes.append(Route("/v1/embeddings", self._embeddings, methods=["POST"]))
+        app.router.routes.append(Route("/rest/v1/{table}", self._table, methods=["GET"]))
+        # Las respuestas colgadas no frenan el cierre
+        config = uvicorn.Config(
+            app, host="127.0.0.1", port=0, log_level="critical", lifespan="on", timeout_graceful_shutdown=1
+        )
+        self._server = uvicorn.Server(config)
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            await asyncio.sleep(0.01)
+        port = self._server.servers[0].sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        self.mcp_url = f"{self.url}/mcp"
+
+    async def aclose(self) -> None:
+        if self._server:
+            self._server.should_exit = True
+            await self._task
+
+    async def _rpc(self, request: Request) -> JSONResponse:
+        function = request.path_params["function"]
+        body = await request.json()
+        try:
+            await self.faults.inject(function)
+        except BackendError as e:
+            return JSONResponse({"message": str(e), "code": "XX000"}, status_code=500)
+        rows = [
+            {"id": i, "content": f"Fragmento {i} sobre {body.get('categories') or 'la concesionaria'}",
+             "metadata": {}, "category": None, "similarity": 0.8 - i / 100}
+            for i in range(1, (body.get("match_count") or 3) + 1)
+        ]
+        return JSONResponse(rows)
+
+    async def _embeddings(self, request: Request) -> JSONResponse:
+        body = await request.json()
+        try:
+            await self.faults.inject("embeddings")
+        except BackendError as e:
+            return JSONResponse({"error": {"message": str(e), "type": "server_error"}}, status_code=500)
+        dimensions = body.get("dimensions") or self.dimensions
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        self.embedded_texts += len(texts)
+        return JSONResponse({
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": _vector(text, dimensions).tolist()}
+                for i, text in enumerate(texts)
+            ],
+            "model": body.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": 8 * len(texts), "total_tokens": 8 * len(texts)},
+        })
+
+    def prepare_table(self, page_size: int) -> None:
+        """Arma de antemano las páginas de la tabla (generarlas bloquea el servidor)"""
+        for offset in range(0, self.documents, page_size):
+            self._page(offset, page_size)
+
+    def _page(self, offset: int, limit: int) -> bytes:
+        if (offset, limit) not in self._pages:
+            categories = ["financiamiento", "inventario", "sucursales", "garantia"]
+            rows = [
+                {"id": i, "content": f"Fragmento {i} de la concesionaria " + "texto " * 120,
+                 "metadata": {"category": categories[i % 4]}, "category": categories[i % 4],
+                 "embedding": json.dumps(_vector(f"documento {i}", self.dimensions).round(5).tolist())}
+                for i in range(offset + 1, min(offset + limit, self.documents) + 1)
+            ]
+            self._pages[offset, limit] = json.dumps(rows).encode()
+        return self._pages[offset, limit]
+
+    async def _table(self, request: Request) -> Response:
+        offset = int(request.query_params.get("offset", 0))
+        limit = int(request.query_params.get("limit", self.documents))
+        return Response(self._page(offset, limit), media_type="application/json")
+
+def _vector(text: str, dimensions: int) -> np.ndarray:
+    """Vector unitario estable por texto (sin relación semántica)"""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
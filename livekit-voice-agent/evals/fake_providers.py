@@ -0,0 +1,217 @@
+"""Proveedores falsos en un solo servidor local, para benchmarks y pruebas de carga.
+
+Hablan el protocolo que usan los plugins, así el agente se conecta sin cambios
+apuntando sus URLs base aquí:
+
+- Deepgram STT (`/v1/listen`, websocket): por cada `utterance_s` de audio recibido
+  envía SpeechStarted y una transcripción final con la siguiente frase de
+  `script`; cierra a los IDLE_CLOSE_S sin mensajes, como Deepgram
+- ElevenLabs TTS (`/v1/text-to-speech/{voz}/multi-stream-input`): un trozo de
+  audio MP3 por texto recibido y `isFinal` al cerrar el contexto; `/stream`
+  (REST, síntesis completa) responde el mismo audio
+- LLM compatible con OpenAI (`/v1/chat/completions` en streaming, el que usa
+  LiveKit Inference): responde una frase corta y, si el cliente se despide y hay
+  herramientas, llama a `end_call`
+- RoomService de LiveKit (`/twirp/livekit.RoomService/*`): acepta todo; al
+  eliminar una sala llama a `on_room_deleted(nombre)`, que hace de la desconexión
+  que LiveKit envía a los participantes
+
+`handshake_s` demora cada websocket (TCP + TLS + autenticación del proveedor
+real) y `ttfb_s` cada respuesta.
+"""
+
+import asyncio
+import base64
+import io
+import json
+import time
+
+from collections.abc import Callable
+
+import av
+import numpy as np
+from aiohttp import WSMsgType, web
+from livekit import api
+
+# Deepgram cierra el websocket si no recibe audio ni KeepAlive en este tiempo
+IDLE_CLOSE_S = 10.0
+GOODBYE_WORDS = ("adiós", "adios", "chau", "hasta luego")
+
+
+def mp3_tone(seconds: float = 0.3, sample_rate: int = 22050) -> bytes:
+    buf = io.BytesIO()
+    # Sin cabeceras ID3/Xing: los trozos se concatenan en un solo flujo MP3
+    with av.open(buf, "w", format="mp3", options={"write_xing": "0", "id3v2_version": "0"}) as container:
+        stream = container.add_stream("mp3", rate=sample_rate, layout="mono")
+        t = np.arange(int(seconds * sample_rate)) / sample_rate
+        pcm = (0.2 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16).reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(pcm, format="s16", layout="mono")
+        frame.sample_rate = sample_rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buf.getvalue()
+
+
+def deepgram_result(text: str, *, final: bool = True) -> dict:
+    return {
+        "type": "Results",
+        "is_final": final,
+        "speech_final": final,
+        "metadata": {"request_id": "fake"},
+        "channel": {
+            "alternatives": [
+                {
+                    "transcript": text,
+                    "confidence": 0.98,
+                    "words": [{"word": w, "start": 0.1 * i, "end": 0.1 * (i + 1)} for i, w in enumerate(text.split())],
+                }
+            ]
+        },
+    }
+
+
+class FakeProviders:
+    def __init__(
+        self,
+        *,
+        handshake_s: float = 0.0,
+        ttfb_s: float = 0.0,
+        utterance_s: float = 0.5,
+        script: list[str] | None = None,
+    ) -> None:
+        self.handshake_s = handshake_s
+        self.ttfb_s = ttfb_s
+        self.utterance_s = utterance_s
+        self.script = script or ["aló, buenas tardes"]
+        self.handshakes = {"deepgram": 0, "elevenlabs": 0}
+        self.idle_closes = 0
+        self.llm_requests = 0
+        self.rooms_deleted = 0
+        self.on_room_deleted: Callable[[str], None] | None = None
+        self._mp3 = mp3_tone()
+        self._runner: web.AppRunner | None = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/v1/listen", self._deepgram)
+        app.router.add_get("/v1/text-to-speech/{voice}/multi-stream-input", self._elevenlabs)
+        app.router.add_post("/v1/text-to-speech/{voice}/stream", self._elevenlabs_rest)
+        app.router.add_post("/v1/chat/completions", self._chat_completions)
+        app.router.add_post("/twirp/livekit.RoomService/{method}", self._room_service)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        self.base_url = f"{self.url}/v1"
+
+    async def aclose(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handshake(self, request: web.Request, provider: str) -> web.WebSocketResponse | None:
+        await asyncio.sleep(self.handshake_s)
+        if request.transport is None:
+            # El cliente abandonó el handshake (p. ej. una reposición cancelada al cerrar un pool)
+            return None
+        self.handshakes[provider] += 1
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        return ws
+
+    async def _deepgram(self, request: web.Request) -> web.StreamResponse:
+        ws = await self._handshake(request, "deepgram")
+        if ws is None:
+            return web.Response(status=499)
+        bytes_per_utterance = self.utterance_s * int(request.query.get("sample_rate", 16000)) * 2
+        received = 0
+        turn = 0
+        while True:
+            try:
+                msg = await ws.receive(timeout=IDLE_CLOSE_S)
+            except asyncio.TimeoutError:
+                self.idle_closes += 1
+                await ws.close()
+                break
+            if msg.type == WSMsgType.BINARY:
+                received += len(msg.data)
+                if received >= bytes_per_utterance:
+                    received = 0
+                    await ws.send_json({"type": "SpeechStarted", "channel": [0], "timestamp": 0.0})
+                    await asyncio.sleep(self.ttfb_s)
+                    await ws.send_json(deepgram_result(self.script[turn % len(self.script)]))
+                    turn += 1
+            elif msg.type == WSMsgType.TEXT:
+                if json.loads(msg.data).get("type") == "CloseStream":
+                    await ws.close()
+                    break
+            else:
+                break
+        return ws
+
+    async def _elevenlabs(self, request: web.Request) -> web.StreamResponse:
+        ws = await self._handshake(request, "elevenlabs")
+        if ws is None:
+            return web.Response(status=499)
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                break
+            data = json.loads(msg.data)
+            context_id = data.get("context_id")
+            if data.get("close_context"):
+                await ws.send_json({"contextId": context_id, "isFinal": True})
+            elif data.get("text", " ").strip():
+                await asyncio.sleep(self.ttfb_s)
+                await ws.send_json({"contextId": context_id, "audio": base64.b64encode(self._mp3).decode()})
+        return ws
+
+    async def _elevenlabs_rest(self, request: web.Request) -> web.Response:
+        await request.json()
+        await asyncio.sleep(self.ttfb_s)
+        return web.Response(body=self._mp3, content_type="audio/mpeg")
+
+    async def _chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.llm_requests += 1
+        body = await request.json()
+        messages = body.get("messages", [])
+        last = messages[-1] if messages else {}
+        last_text = last.get("content") if isinstance(last.get("content"), str) else ""
+        tools = {t.get("function", {}).get("name") for t in body.get("tools", [])}
+        says_goodbye = last.get("role") == "user" and any(w in last_text.lower() for w in GOODBYE_WORDS)
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        await asyncio.sleep(self.ttfb_s)
+
+        async def _chunk(delta: dict, finish_reason: str | None = None) -> None:
+            chunk = {
+                "id": f"chatcmpl-{self.llm_requests}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        if says_goodbye and "end_call" in tools and body.get("tool_choice") != "none":
+            call = {"index": 0, "id": f"call_{self.llm_requests}", "type": "function",
+                    "function": {"name": "end_call", "arguments": "{}"}}
+            await _chunk({"role": "assistant", "tool_calls": [call]})
+            await _chunk({}, "tool_calls")
+        else:
+            for word in "Claro, con gusto te ayudo con eso.".split():
+                await _chunk({"role": "assistant", "content": f"{word} "})
+            await _chunk({}, "stop")
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    async def _room_service(self, request: web.Request) -> web.Response:
+        if request.match_info["method"] == "DeleteRoom":
+            self.rooms_deleted += 1
+            if self.on_room_deleted is not None:
+                self.on_room_deleted(api.DeleteRoomRequest.FromString(await request.read()).room)
+        # Respuesta vacía: protobuf válido para cualquier tipo de respuesta
+        return web.Response(body=b"", content_type="application/protobuf")
@@ -0,0 +1,131 @@
+"""Servidor TTS falso para pruebas locales, con latencia y errores inyectables.
+
+Habla el protocolo de TTS de Deepgram (WebSocket `Speak`/`Flush` y POST REST),
+así que el plugin `deepgram.TTS(base_url=...)` se conecta a él sin cambios.
+Devuelve PCM 16 bits (un tono) de duración proporcional al texto.
+
+- `ttfb`: segundos antes del primer audio de cada segmento (+ `jitter` aleatorio)
+- `error_rate`: probabilidad de cerrar la conexión / responder 500 en un segmento
+
+Los atributos se pueden cambiar en caliente para simular degradaciones.
+
+Uso independiente (desde livekit-voice-agent/):
+    uv run evals/fake_tts_server.py --port 8765 --ttfb 0.3 --error-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import struct
+
+from aiohttp import WSMsgType, web
+
+SAMPLE_RATE = 24000
+SECONDS_PER_CHAR = 0.06
+CHUNK_S = 0.1
+
+
+def _tone(seconds: float, sample_rate: int) -> bytes:
+    n = int(seconds * sample_rate)
+    return b"".join(struct.pack("<h", int(3000 * math.sin(2 * math.pi * 220 * i / sample_rate))) for i in range(n))
+
+
+class FakeTTSServer:
+    def __init__(self, *, ttfb: float = 0.2, jitter: float = 0.05, error_rate: float = 0.0, seed: int = 7) -> None:
+        self.ttfb = ttfb
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._runner: web.AppRunner | None = None
+        self._chunk_cache: dict[int, bytes] = {}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1/speak"
+
+    async def start(self, port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/v1/speak", self._ws_handler)
+        app.router.add_post("/v1/speak", self._rest_handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def aclose(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    def _chunk(self, sample_rate: int) -> bytes:
+        if sample_rate not in self._chunk_cache:
+            self._chunk_cache[sample_rate] = _tone(CHUNK_S, sample_rate)
+        return self._chunk_cache[sample_rate]
+
+    async def _delay_or_fail(self) -> bool:
+        """Aplica la latencia del primer byte; devuelve False si este segmento debe fallar"""
+        self.requests += 1
+        if self._rng.random() < self.error_rate:
+            self.errors += 1
+            return False
+        await asyncio.sleep(max(0.0, self.ttfb + self._rng.uniform(-self.jitter, self.jitter)))
+        return True
+
+    async def _ws_handler(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        sample_rate = int(request.query.get("sample_rate", SAMPLE_RATE))
+        text = ""
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            data = json.loads(msg.data)
+            if data.get("type") == "Speak":
+                text += data.get("text", "")
+            elif data.get("type") == "Flush":
+                if not await self._delay_or_fail():
+                    await ws.close(code=1011, message=b"fallo inyectado")
+                    break
+                chunk = self._chunk(sample_rate)
+                for _ in range(max(1, math.ceil(len(text) * SECONDS_PER_CHAR / CHUNK_S))):
+                    await ws.send_bytes(chunk)
+                await ws.send_str(json.dumps({"type": "Flushed"}))
+                text = ""
+            elif data.get("type") == "Close":
+                break
+        return ws
+
+    async def _rest_handler(self, request: web.Request) -> web.StreamResponse:
+        text = (await request.json()).get("text", "")
+        if not await self._delay_or_fail():
+            return web.Response(status=500, text="fallo inyectado")
+        sample_rate = int(request.query.get("sample_rate", SAMPLE_RATE))
+        resp = web.StreamResponse(headers={"Content-Type": "audio/l16"})
+        await resp.prepare(request)
+        chunk = self._chunk(sample_rate)
+        for _ in range(max(1, math.ceil(len(text) * SECONDS_PER_CHAR / CHUNK_S))):
+            await resp.write(chunk)
+        await resp.write_eof()
+        return resp
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttfb", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeTTSServer(ttfb=args.ttfb, jitter=args.jitter, error_rate=args.error_rate)
+    print(f"TTS falso en {await server.start(args.port)}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
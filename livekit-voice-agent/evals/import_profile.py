@@ -0,0 +1,71 @@
+"""Perfil de tiempo de importación por módulo del worker.
+
+Ejecuta `python -X importtime -c "import agent"` en un proceso limpio y agrupa
+el tiempo acumulado por paquete de primer nivel (livekit, supabase, openai...).
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/import_profile.py
+    uv run evals/import_profile.py --top 40 --module agent
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Formato de cada línea: "import time:  self [us] | cumulative | imported package"
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def profile_imports(module: str) -> list[tuple[str, int, int, int]]:
+    """Devuelve (módulo, self_us, cumulative_us, profundidad) para cada import"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=AGENT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module}:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="agent", help="módulo a perfilar")
+    parser.add_argument("--top", type=int, default=25, help="cantidad de filas a mostrar")
+    args = parser.parse_args()
+
+    rows = profile_imports(args.module)
+
+    # Tiempo propio agrupado por paquete de primer nivel
+    by_package: dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    total_us = sum(by_package.values())
+    print(f"Tiempo total de importación de '{args.module}': {total_us / 1e6:.3f}s\n")
+    print(f"{'paquete':<40} {'self (ms)':>10} {'%':>6}")
+    for package, self_us in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[: args.top]:
+        print(f"{package:<40} {self_us / 1e3:>10.1f} {100 * self_us / total_us:>6.1f}")
+
+    # Imports directos del módulo perfilado con su tiempo acumulado
+    print(f"\n{'import directo (acumulado)':<60} {'ms':>10}")
+    top_level = [r for r in rows if r[3] == 1]
+    for name, _, cumulative_us, _ in sorted(top_level, key=lambda r: r[2], reverse=True)[: args.top]:
+        print(f"{name:<60} {cumulative_us / 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Simulación de sobrecarga: latencia p95 con y sin la admisión por carga real.
+
+Modela un contenedor con N núcleos que recibe ráfagas de llamadas. Cada sesión
+consume CPU de forma creciente durante sus primeros segundos (BVC, VAD, turn
+detector) y, cuando la demanda supera los núcleos, todas las sesiones se
+ralentizan: sube el procesamiento local, el lag del loop y la inferencia.
+
+Compara tres políticas sobre las mismas llegadas (mismo generador con la misma
+semilla por política, así solo cambia la decisión):
+- `none`: acepta todas las llamadas
+- `cpu`: solo CPU (comportamiento por defecto)
+- `admission`: `admission.compute_load` con sesiones activas, lag, CPU e inferencia
+
+Las dos políticas con umbral ven la misma CPU, promediada en ~2.5 s como
+`WorkerLoadMonitor`; el lag y la inferencia se promedian en ~2 s, como los
+reportes de `SessionLoadReporter`.
+
+Las llamadas rechazadas se cuentan como despachadas a otro worker. Termina con
+código 1 si la p95 de la política `admission` supera el presupuesto o si, cuando
+`cpu` (mismo umbral) también lo cumple, acepta menos de `--min-accepted` de las
+llamadas que acepta `cpu`: rechazar de más también cumple el presupuesto.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/sim_admission.py
+    uv run evals/sim_admission.py --cores 4 --burst-size 10 --budget-s 1.5
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionLimits, LoadSignals, compute_load  # noqa: E402
+
+# Parámetros del modelo de sesión
+CPU_PER_SESSION = 0.45  # núcleos por sesión en régimen (BVC + VAD + turn detector)
+CPU_RAMP_S = 6.0  # segundos hasta que una sesión nueva alcanza su consumo completo
+REMOTE_LATENCY_S = 0.8  # STT + LLM + TTS remotos, no dependen de la CPU local
+LOCAL_PROCESSING_S = 0.15  # procesamiento local por turno sin contención
+VAD_INFERENCE_MS = 4.0  # inferencia Silero sin contención
+TURN_INTERVAL_S = 8.0  # cada cuánto habla el usuario
+CPU_AVG_S = 2.5  # WorkerLoadMonitor: MovingAverage(5) de muestras de 0.5 s
+REPORT_AVG_S = 2.0  # SessionLoadReporter: MovingAverage(8) de muestras de 0.25 s
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+
+def simulate(policy: str, args: argparse.Namespace) -> dict:
+    # Generadores propios de las llegadas (con su duración) y de los turnos: cada
+    # política recibe exactamente las mismas llamadas
+    arrivals_rng = random.Random(args.seed)
+    turns_rng = random.Random(args.seed + 1)
+    limits = AdmissionLimits(
+        max_sessions=args.max_sessions or int(args.cores / CPU_PER_SESSION),
+        threshold=args.threshold,
+    )
+
+    sessions: list[dict] = []  # {"start": t, "end": t}
+    latencies: list[float] = []
+    accepted = rejected = 0
+    dt = 0.1
+    cpu_window: deque[float] = deque(maxlen=round(CPU_AVG_S / dt))
+    slowdown_window: deque[float] = deque(maxlen=round(REPORT_AVG_S / dt))
+
+    t = 0.0
+    while t < args.duration_s:
+        sessions = [s for s in sessions if s["end"] > t]
+
+        # Demanda de CPU actual (las sesiones nuevas todavía están calentando)
+        demand = sum(CPU_PER_SESSION * min((t - s["start"]) / CPU_RAMP_S, 1.0) for s in sessions)
+        slowdown = max(demand / args.cores, 1.0)
+        cpu_window.append(min(demand / args.cores, 1.0))
+        slowdown_window.append(slowdown)
+        avg_slowdown = statistics.mean(slowdown_window)
+
+        signals = LoadSignals(
+            active_sessions=len(sessions) + 1,
+            cpu=statistics.mean(cpu_window),
+            loop_lag_ms=(avg_slowdown - 1.0) * 250,
+            inference_ms=VAD_INFERENCE_MS * avg_slowdown,
+        )
+
+        # Llegadas: tráfico base más ráfagas (campañas salientes, picos de entrantes)
+        arrivals = _poisson(arrivals_rng, args.arrival_rate * dt)
+        if arrivals_rng.random() < dt / args.burst_interval_s:
+            arrivals += _poisson(arrivals_rng, args.burst_size)
+        for _ in range(arrivals):
+            # Se sortea siempre, aunque se rechace: las llegadas siguientes no cambian entre políticas
+            duration = arrivals_rng.expovariate(1 / args.call_duration_s)
+            if policy == "none":
+                admit = True
+            elif policy == "cpu":
+                admit = signals.cpu < args.threshold
+            else:
+                admit = compute_load(signals, limits) < limits.threshold
+            if admit:
+                sessions.append({"start": t, "end": t + duration})
+                signals.active_sessions += 1
+                accepted += 1
+            else:
+                rejected += 1
+
+        # Turnos de usuario en este paso
+        for _ in sessions:
+            if turns_rng.random() < dt / TURN_INTERVAL_S:
+                jitter = turns_rng.lognormvariate(0, 0.15)
+                latencies.append(REMOTE_LATENCY_S * jitter + LOCAL_PROCESSING_S * slowdown ** 2)
+
+        t += dt
+
+    return {
+        "policy": policy,
+        "accepted": accepted,
+        "rejected": rejected,
+        "turns": len(latencies),
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def _poisson(rng: random.Random, lam: float) -> int:
+    # Knuth: suficiente para tasas pequeñas por paso
+    threshold = pow(2.718281828459045, -lam)
+    k, p = 0, 1.0
+    while True:
+        p *= rng.random()
+        if p < threshold:
+            return k
+        k += 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cores", type=float, default=4.0)
+    parser.add_argument("--arrival-rate", type=float, default=0.05, help="llamadas por segundo fuera de las ráfagas")
+    parser.add_argument("--burst-size", type=float, default=6.0, help="llamadas promedio por ráfaga")
+    parser.add_argument("--burst-interval-s", type=float, default=60.0, help="segundos promedio entre ráfagas")
+    parser.add_argument("--call-duration-s", type=float, default=120.0)
+    parser.add_argument("--duration-s", type=float, default=1800.0)
+    parser.add_argument("--threshold", type=float, default=0.75)
+    parser.add_argument("--max-sessions", type=int, default=0, help="0 = núcleos / CPU por sesión")
+    parser.add_argument("--budget-s", type=float, default=1.5, help="presupuesto de latencia p95 por turno")
+    parser.add_argument(
+        "--min-accepted",
+        type=float,
+        default=0.75,
+        help="llamadas aceptadas por `admission`, como fracción de las de `cpu` si esta cumple el presupuesto",
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    results = [simulate(policy, args) for policy in ("none", "cpu", "admission")]
+
+    offered = results[0]["accepted"]
+    print(f"Llamadas ofrecidas: {offered} (las mismas para las tres políticas)")
+    print(f"{'política':<10} {'aceptadas':>9} {'rechazadas':>10} {'turnos':>7} {'p50':>6} {'p95':>6} {'p99':>6}")
+    for r in results:
+        print(f"{r['policy']:<10} {r['accepted']:>6} {r['accepted'] / offered:>3.0%} {r['rejected']:>10} {r['turns']:>7} "
+              f"{r['p50']:>6.2f} {r['p95']:>6.2f} {r['p99']:>6.2f}")
+
+    admission = results[-1]
+    failures = []
+    if admission["p95"] > args.budget_s:
+        failures.append(f"p95 con admisión {admission['p95']:.2f}s > presupuesto {args.budget_s:.2f}s")
+    cpu = results[1]
+    if cpu["p95"] <= args.budget_s and admission["accepted"] < args.min_accepted * cpu["accepted"]:
+        failures.append(
+            f"admisión acepta {admission['accepted']} llamadas, < {args.min_accepted:.0%} de las "
+            f"{cpu['accepted']} de `cpu`, que también cumple el presupuesto"
+        )
+    if failures:
+        print("FALLO: " + "; ".join(failures))
+        sys.exit(1)
+    print(
+        f"OK: p95 con admisión {admission['p95']:.2f}s <= presupuesto {args.budget_s:.2f}s, "
+        f"{admission['accepted']}/{offered} llamadas aceptadas"
+    )
+
+
+if __name__ == "__main__":
+    main()
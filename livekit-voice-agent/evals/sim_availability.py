@@ -0,0 +1,275 @@
+"""Llamadas simultáneas que piden y agendan pruebas de manejo, con y sin `availability.py`.
+
+Levanta los backends falsos (`fake_backends.py`) con un calendario ocupado al
+azar (`--busy`) y simula `--callers` clientes que llegan dentro de `--window-s`.
+Cada uno pregunta por un día (el sábado es el más pedido), tarda en decidirse
+(`--confirm-s`, con el tiempo acelerado `--speed` veces) y agenda el primer
+horario ofrecido. Modos:
+
+- mcp: como antes, `consultar_horarios_disponibles` y `agendar_cita` van al
+  calendario por MCP
+- local: `SessionAvailability` sobre `--processes` motores (uno por proceso de
+  job) que comparten las retenciones del host
+- hosts: igual, pero cada motor con su propia base de retenciones (procesos en
+  hosts distintos): solo queda la verificación al agendar
+
+Reporta la espera de la consulta de horarios, los clientes a los que se les
+ofreció un horario que otro cliente tenía ofrecido al mismo tiempo, las citas
+duplicadas en el calendario, los choques detectados al agendar y los clientes
+que consiguieron cita.
+
+Al final prueba un servidor MCP sin la herramienta de eventos: solo un proceso
+debería abrirlo; los demás lo leen en la base del host y se detienen.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/sim_availability.py
+    uv run evals/sim_availability.py --callers 60 --processes 8 --busy 0.5 --scenario lento
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livekit.agents import mcp  # noqa: E402
+from livekit.agents.llm.tool_context import get_raw_function_info  # noqa: E402
+
+import availability  # noqa: E402
+from availability import AvailabilityEngine, HoldStore, SessionAvailability  # noqa: E402
+from fake_backends import FakeBackends  # noqa: E402
+from tenants import default_tenant  # noqa: E402
+
+SCENARIOS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend_scenarios.json")
+# (frase del cliente, peso)
+DAY_REQUESTS = [
+    ("el sábado", 5), ("el sábado por la mañana", 2), ("el próximo lunes", 1), ("el martes por la tarde", 1),
+    ("el miércoles", 1), ("el jueves", 1), ("el viernes por la tarde", 2),
+]
+
+
+@dataclass
+class Caller:
+    offered: list[str] = field(default_factory=list)
+    offered_at: float = 0.0
+    decided_at: float = 0.0
+    query_s: float = 0.0
+    conflicts: int = 0
+    booked: bool = False
+
+
+def _mcp_server(backends: FakeBackends) -> mcp.MCPServerHTTP:
+    return mcp.MCPServerHTTP(
+        url=backends.mcp_url, headers={"token": "sim"}, timeout=4, client_session_timeout_seconds=6,
+    )
+
+
+async def _open_tools(backends: FakeBackends) -> tuple[mcp.MCPServerHTTP, dict]:
+    server = _mcp_server(backends)
+    await server.initialize()
+    return server, {get_raw_function_info(tool).name: tool for tool in await server.list_tools()}
+
+
+def _slots_from_text(text: str) -> list[str]:
+    """Horarios ofrecidos como 'AAAA-MM-DDTHH:MM' (respuesta local o JSON de MCP)"""
+    if text.lstrip().startswith("{"):
+        data = json.loads(json.loads(text)["text"]) if '"type"' in text else json.loads(text)
+        return [f"{data['fecha']}T{h}" for h in data["horarios"]]
+    day = re.search(r"\((\d{4}-\d{2}-\d{2})\)", text)
+    if not day:
+        return []
+    hours = re.findall(r"\b(\d{2}:\d{2})\b", text[day.end():].split(".")[0])
+    return [f"{day[1]}T{h}" for h in hours]
+
+
+async def run_caller(
+    i: int, mode: str, backends: FakeBackends, engines: list[AvailabilityEngine], args: argparse.Namespace,
+    rng: random.Random,
+) -> Caller:
+    caller = Caller()
+    phrases, weights = zip(*DAY_REQUESTS)
+    phrase = rng.choices(phrases, weights)[0]
+    await asyncio.sleep(rng.uniform(0, args.window_s))
+    server, tools = await _open_tools(backends)
+
+    async def _mcp(name: str, arguments: dict):
+        return await tools[name](raw_arguments=arguments)
+
+    session = SessionAvailability(engines[i % len(engines)], f"call-{i}") if mode != "mcp" else None
+
+    async def _tool(name: str, arguments: dict):
+        if session is None:
+            return await _mcp(name, arguments)
+        return await session.call(name, arguments, lambda a: _mcp(name, a))
+
+    try:
+        started_at = time.perf_counter()
+        answer = await _tool("consultar_horarios_disponibles", {"fecha": phrase})
+        caller.query_s = time.perf_counter() - started_at
+        # El agente lee hasta tres opciones
+        caller.offered = _slots_from_text(answer)[: availability.AVAILABILITY_OFFER_SLOTS]
+        caller.offered_at = time.perf_counter()
+        for _ in range(2):
+            if not caller.offered:
+                break
+            await asyncio.sleep(rng.uniform(*args.confirm_s) / args.speed)
+            caller.decided_at = time.perf_counter()
+            day, hour = caller.offered[0].split("T")
+            result = await _tool(
+                "agendar_cita", {"nombre": f"Cliente {i}", "telefono": f"9{i:08d}", "fecha": day, "hora": hour}
+            )
+            if "acaba de ocuparse" in str(result):
+                # Otro cliente lo agendó: el agente ofrece lo que queda
+                caller.conflicts += 1
+                caller.offered = _slots_from_text(str(result).replace("Libres ese día:", f"({day}):"))
+                continue
+            caller.booked = True
+            break
+    finally:
+        if session is not None:
+            await session.release()
+        try:
+            await server.aclose()
+        except Exception:
+            pass
+    return caller
+
+
+def double_offered(callers: list[Caller]) -> int:
+    """Clientes con algún horario ofrecido que otro cliente tenía ofrecido al mismo tiempo"""
+    affected = 0
+    for i, a in enumerate(callers):
+        for j, b in enumerate(callers):
+            if i != j and a.offered and b.offered and a.offered_at < b.decided_at and b.offered_at < a.decided_at:
+                if set(a.offered) & set(b.offered):
+                    affected += 1
+                    break
+    return affected
+
+
+async def run_mode(mode: str, scenario: dict, args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    backends = FakeBackends(scenario, seed=args.seed)
+    backends.calendar.seed(args.days, args.busy, rng)
+    await backends.start()
+    engines: list[AvailabilityEngine] = []
+    db_dir = tempfile.mkdtemp(prefix="holds-")
+    try:
+        if mode != "mcp":
+            shared = HoldStore(os.path.join(db_dir, "holds.sqlite3"))
+            tenant = default_tenant()
+            for p in range(args.processes):
+                holds = shared if mode == "local" else HoldStore(os.path.join(db_dir, f"holds-{p}.sqlite3"))
+                engine = AvailabilityEngine(
+                    tenant, lambda: _mcp_server(backends), holds=holds, hold_s=availability.AVAILABILITY_HOLD_S / args.speed
+                )
+                engine.start()
+                engines.append(engine)
+            while not all(engine.ready for engine in engines):
+                await asyncio.sleep(0.05)
+        callers = await asyncio.gather(
+            *(run_caller(i, mode, backends, engines, args, random.Random(args.seed * 1000 + i)) for i in range(args.callers))
+        )
+    finally:
+        for engine in engines:
+            await engine.aclose()
+        await backends.aclose()
+
+    query = sorted(c.query_s for c in callers)
+    return {
+        "p50": statistics.median(query),
+        "p95": query[min(int(0.95 * len(query)), len(query) - 1)],
+        "double_offered": double_offered(list(callers)),
+        "double_booked": backends.calendar.double_bookings(),
+        "conflicts": sum(c.conflicts for c in callers),
+        "booked": sum(c.booked for c in callers),
+        "callers": len(callers),
+    }
+
+
+async def run_missing_tool(scenario: dict, args: argparse.Namespace) -> tuple[int, int]:
+    """(aperturas del servidor MCP, motores detenidos) con una herramienta de eventos que no existe"""
+    backends = FakeBackends(scenario, seed=args.seed)
+    await backends.start()
+    opened = 0
+
+    def _make_server() -> mcp.MCPServerHTTP:
+        nonlocal opened
+        opened += 1
+        return _mcp_server(backends)
+
+    events_tool, availability.AVAILABILITY_EVENTS_TOOL = availability.AVAILABILITY_EVENTS_TOOL, "no_existe"
+    holds = HoldStore(os.path.join(tempfile.mkdtemp(prefix="holds-"), "holds.sqlite3"))
+    engines = [AvailabilityEngine(default_tenant(), _make_server, holds=holds) for _ in range(args.processes)]
+    try:
+        for engine in engines:
+            engine.start()
+        await asyncio.sleep(args.missing_s)
+        stopped = sum(engine.disabled and engine._task.done() for engine in engines)
+    finally:
+        availability.AVAILABILITY_EVENTS_TOOL = events_tool
+        for engine in engines:
+            await engine.aclose()
+        await backends.aclose()
+    return opened, stopped
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1e6:.0f}µs" if seconds < 0.001 else f"{seconds * 1000:.0f}ms"
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=SCENARIOS_FILE)
+    parser.add_argument("--scenario", default="normal")
+    parser.add_argument("--modes", default="mcp,local,hosts")
+    parser.add_argument("--callers", type=int, default=40)
+    parser.add_argument("--processes", type=int, default=4, help="motores (procesos de job) en los modos locales")
+    parser.add_argument("--window-s", type=float, default=3.0, help="ventana de llegada de los clientes (ya acelerada)")
+    parser.add_argument("--confirm-s", type=lambda v: tuple(float(x) for x in v.split(":")), default=(10.0, 40.0),
+                        help="min:max que tarda un cliente en elegir y dar sus datos")
+    parser.add_argument("--speed", type=float, default=20.0, help="aceleración de la confirmación y las retenciones")
+    parser.add_argument("--busy", type=float, default=0.3, help="fracción de horarios ya ocupados")
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--missing-s", type=float, default=3.0, help="duración de la prueba sin herramienta de eventos")
+    args = parser.parse_args()
+
+    # Los logs de cada consulta y de los motores llenarían la salida
+    logging.disable(logging.CRITICAL)
+    with open(args.scenarios, encoding="utf-8") as f:
+        scenario = next(s for s in json.load(f)["scenarios"] if s["name"] == args.scenario)
+    print(
+        f"{args.callers} clientes en {args.window_s:.0f}s, {args.processes} procesos, "
+        f"{args.busy:.0%} del calendario ocupado, escenario {args.scenario}"
+    )
+    print(
+        f"\n  {'modo':<8}{'consulta p50':>14}{'p95':>9}{'ofertas duplicadas':>20}{'citas duplicadas':>18}"
+        f"{'choques detectados':>20}{'con cita':>10}"
+    )
+    for mode in filter(None, args.modes.split(",")):
+        r = await run_mode(mode, scenario, args)
+        print(
+            f"  {mode:<8}{_ms(r['p50']):>14}{_ms(r['p95']):>9}{r['double_offered']:>20}{r['double_booked']:>18}"
+            f"{r['conflicts']:>20}{r['booked']:>5}/{r['callers']}"
+        )
+    opened, stopped = await run_missing_tool(scenario, args)
+    print(
+        f"\n  sin herramienta de eventos (en {args.missing_s:.0f}s): {opened} aperturas del servidor MCP, "
+        f"{stopped}/{args.processes} motores detenidos"
+    )
+    if opened > 1 or stopped < args.processes:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
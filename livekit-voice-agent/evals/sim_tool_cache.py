@@ -0,0 +1,123 @@
+"""Simulación de `ToolCallCache` sobre las herramientas llamadas en llamadas reales.
+
+Reproduce, en orden y con sus tiempos (acelerados `--speed` veces), las
+llamadas a herramientas de las transcripciones que guarda el agente
+(`CALL_RECORDS_DIR/<sala>.transcript.json`) a través de una `ToolCallCache`
+por llamada, con herramientas falsas que cuentan los viajes. Sin
+transcripciones usa llamadas de ejemplo con los patrones habituales
+(prospecto corregido, horarios y preguntas repetidas).
+
+Reporta por herramienta las llamadas del LLM, los viajes a MCP/Supabase que
+quedan y los evitados, y el tiempo de espera ahorrado con `--round-trip-ms`.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/sim_tool_cache.py
+    uv run evals/sim_tool_cache.py --records /tmp/autofuturo-calls --round-trip-ms 600
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from post_call import CALL_RECORDS_DIR  # noqa: E402
+from tool_cache import TOOL_CACHE_TTL_S, TOOL_WRITE_COALESCE_S, ToolCallCache  # noqa: E402
+
+# (segundo de la llamada, herramienta, argumentos)
+SAMPLE_CALLS = [
+    [
+        (20, "buscar_en_base_de_conocimiento", {"pregunta": "¿Tienen financiamiento?", "categoria": "financiamiento"}),
+        (45, "guardar_prospecto", {"nombre": "Ana Torres", "telefono": "987 654 321"}),
+        (52, "guardar_prospecto", {"nombre": "Ana Torres", "telefono": "987 654 312"}),
+        (58, "guardar_prospecto", {"nombre": "Ana Torres", "telefono": "987654312", "modelo": "RAV4"}),
+        (70, "consultar_horarios_disponibles", {"dia": "sábado"}),
+        (84, "consultar_horarios_disponibles", {"dia": "Sábado"}),
+        (96, "agendar_cita", {"telefono": "987654312", "fecha": "sábado 10:00"}),
+        (110, "buscar_en_base_de_conocimiento", {"pregunta": "¿tienen financiamiento", "categoria": "financiamiento"}),
+    ],
+    [
+        (15, "consultar_inventario", {"modelo": "Hilux 2025"}),
+        (33, "consultar_inventario", {"modelo": "hilux 2025"}),
+        (40, "buscar_en_base_de_conocimiento", {"pregunta": "¿Dónde están ubicados?", "categoria": "sucursales"}),
+        (62, "guardar_prospecto", {"nombre": "Luis", "telefono": "+51 912 345 678"}),
+        (90, "guardar_prospecto", {"nombre": "Luis Ramírez", "telefono": "912345678"}),
+    ],
+    [
+        (30, "guardar_prospecto", {"nombre": "Carla", "telefono": "955 111 222"}),
+        (35, "consultar_horarios_disponibles", {"dia": "lunes"}),
+        (36, "consultar_horarios_disponibles", {"dia": "lunes"}),
+        (50, "agendar_cita", {"telefono": "955111222", "fecha": "lunes 16:00"}),
+    ],
+]
+
+
+def load_records(path: str) -> list[list[tuple[float, str, dict]]]:
+    calls = []
+    for file in sorted(glob.glob(os.path.join(path, "*.transcript.json"))):
+        with open(file, encoding="utf-8") as f:
+            items = json.load(f)["history"]["items"]
+        tool_calls = [item for item in items if item["type"] == "function_call"]
+        if not tool_calls:
+            continue
+        start = items[0].get("created_at", 0)
+        calls.append([
+            (item.get("created_at", start) - start, item["name"], json.loads(item.get("arguments") or "{}"))
+            for item in tool_calls
+        ])
+    return calls
+
+
+async def replay(call: list[tuple[float, str, dict]], speed: float, round_trips: Counter) -> ToolCallCache:
+    cache = ToolCallCache(ttl_s=TOOL_CACHE_TTL_S / speed, coalesce_s=TOOL_WRITE_COALESCE_S / speed)
+
+    def tool(name: str):
+        async def _call(args: dict) -> str:
+            round_trips[name] += 1
+            return f"{name} ok"
+        return _call
+
+    elapsed = 0.0
+    for at, name, args in call:
+        await asyncio.sleep(max(0.0, at - elapsed) / speed)
+        elapsed = max(elapsed, at)
+        await cache.call(name, args, tool(name))
+    # Al colgar: lo pendiente lo envía el trabajo post-llamada
+    for name, _ in await cache.aclose():
+        round_trips[name] += 1
+    return cache
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", default=CALL_RECORDS_DIR, help="directorio con <sala>.transcript.json")
+    parser.add_argument("--speed", type=float, default=200.0, help="aceleración del tiempo de las llamadas")
+    parser.add_argument("--round-trip-ms", type=float, default=400.0, help="latencia de un viaje a MCP o Supabase")
+    args = parser.parse_args()
+
+    calls = load_records(args.records) if args.records and os.path.isdir(args.records) else []
+    source = f"{len(calls)} transcripciones de {args.records}" if calls else "llamadas de ejemplo"
+    calls = calls or SAMPLE_CALLS
+
+    requested, round_trips = Counter(), Counter()
+    for call in calls:
+        cache = await replay(call, args.speed, round_trips)
+        requested.update(cache.calls)
+
+    print(f"{source}: {len(calls)} llamadas (TTL {TOOL_CACHE_TTL_S:.0f}s, fusión de escrituras {TOOL_WRITE_COALESCE_S:.0f}s)")
+    print(f"{'herramienta':<34}{'pedidas':>8}{'viajes':>8}{'evitados':>10}")
+    for name, count in requested.most_common():
+        print(f"{name:<34}{count:>8}{round_trips[name]:>8}{count - round_trips[name]:>10}")
+    avoided = sum(requested.values()) - sum(round_trips.values())
+    print(
+        f"Total: {avoided} de {sum(requested.values())} viajes evitados "
+        f"(~{avoided * args.round_trip_ms / len(calls) / 1000:.1f} s de espera menos por llamada)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+"""Simulación del router de TTS contra servidores TTS falsos locales.
+
+Levanta dos servidores con el protocolo de Deepgram (`fake_tts_server.py`): el
+primario es rápido y el de respaldo algo más lento. El primario pasa por fases
+de degradación (lento y con errores) y luego se recupera. Compara:
+- fijo: solo el proveedor primario (como hoy)
+- fallback: `FallbackAdapter` de livekit en orden fijo
+- sesion: `TTSRouter` con TTS_ROUTING=session (por defecto: cae al respaldo si el
+  primario falla y vuelve cuando el sondeo lo recupera)
+- router: `TTSRouter` con TTS_ROUTING=utterance (cambia si el primario deja de estar
+  sano y vuelve a él cuando está sano otra vez)
+
+Reporta por fase el TTFB medio/p95 por locución y los turnos perdidos (sin audio).
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/sim_tts_router.py --utterances 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import aiohttp
+from livekit.agents import tts
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+from livekit.plugins import deepgram
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_tts_server import FakeTTSServer  # noqa: E402
+from tts_router import ProviderHealth, TTSRouter  # noqa: E402
+
+TEXT = "Perfecto, te agendo la cita para el sábado a las diez de la mañana."
+# (nombre, ttfb del primario, errores del primario)
+PHASES = [
+    ("normal", 0.2, 0.0),
+    ("primario lento", 1.2, 0.0),
+    ("primario con errores", 0.2, 0.5),
+    ("recuperado", 0.2, 0.0),
+]
+BACKUP_TTFB = 0.35
+
+
+async def speak(engine: tts.TTS) -> float | None:
+    """TTFB de una locución en streaming, o None si el turno se perdió"""
+    start = time.perf_counter()
+    try:
+        async with engine.stream(conn_options=DEFAULT_API_CONNECT_OPTIONS) as stream:
+            stream.push_text(TEXT)
+            stream.end_input()
+            ttfb = None
+            async for _ in stream:
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+            return ttfb
+    except Exception:
+        return None
+
+
+async def run_policy(policy: str, args: argparse.Namespace) -> dict[str, list[float | None]]:
+    primary, backup = FakeTTSServer(seed=1), FakeTTSServer(ttfb=BACKUP_TTFB, seed=2)
+    await primary.start()
+    await backup.start()
+
+    async with aiohttp.ClientSession() as http:
+        def provider(server: FakeTTSServer) -> deepgram.TTS:
+            return deepgram.TTS(api_key="fake", base_url=server.base_url, http_session=http)
+
+        if policy == "fijo":
+            engine = provider(primary)
+        elif policy == "fallback":
+            engine = tts.FallbackAdapter([provider(primary), provider(backup)], max_retry_per_tts=0)
+        else:
+            health = {name: ProviderHealth(name, window_s=args.window) for name in ("primario", "respaldo")}
+            engine = TTSRouter(
+                {"primario": provider(primary), "respaldo": provider(backup)},
+                routing="session" if policy == "sesion" else "utterance",
+                health=health,
+            )
+
+        results = {}
+        for name, ttfb, error_rate in PHASES:
+            primary.ttfb, primary.error_rate = ttfb, error_rate
+            results[name] = []
+            for _ in range(args.utterances):
+                results[name].append(await speak(engine))
+                await asyncio.sleep(args.gap)
+
+        await engine.aclose()
+    await primary.aclose()
+    await backup.aclose()
+    return results
+
+
+def p95(values: list[float]) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--utterances", type=int, default=20, help="locuciones por fase")
+    parser.add_argument("--gap", type=float, default=0.2, help="segundos entre locuciones")
+    parser.add_argument("--window", type=float, default=8.0, help="ventana de salud del router (s)")
+    args = parser.parse_args()
+
+    print(f"{'fase':<22} {'política':<9} {'TTFB medio':>11} {'TTFB p95':>9} {'turnos perdidos':>16}")
+    all_results = {policy: await run_policy(policy, args) for policy in ("fijo", "fallback", "sesion", "router")}
+    for phase, *_ in PHASES:
+        for policy, results in all_results.items():
+            ok = [v for v in results[phase] if v is not None]
+            lost = len(results[phase]) - len(ok)
+            mean = statistics.mean(ok) if ok else 0.0
+            print(f"{phase:<22} {policy:<9} {mean:>10.2f}s {p95(ok):>8.2f}s {lost:>16}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
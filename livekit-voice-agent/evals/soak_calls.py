@@ -0,0 +1,320 @@
+"""Prueba de resistencia: miles de llamadas simuladas por `entrypoint` en un solo proceso.
+
+Cada llamada corre el `entrypoint` real de agent.py con un `JobContext` real
+(sala simulada con un participante SIP) contra proveedores falsos locales
+(`fake_providers.py`): Deepgram, ElevenLabs, el LLM de LiveKit Inference y el
+RoomService que elimina la sala. El llamante es audio sintético de 20 ms a ritmo
+real y el audio del agente se descarta al instante. Guion por llamada: pide
+información, hace una pregunta frecuente (ruta rápida) y se despide; el LLM
+falso llama a `end_call`, la sesión se cierra y corren los callbacks de
+shutdown del job como en el worker.
+
+Se miden la RSS tras las llamadas de calentamiento (el asignador de memoria
+crece hasta el pico de sesiones simultáneas y no devuelve esas páginas) y al
+final, y las `AgentSession` que siguen vivas tras colgar todas. La prueba falla
+(código de salida 1) si la RSS crece más de `--max-growth-mb`, si queda alguna
+sesión viva o si alguna llamada no cuelga. Con `--tracemalloc` se listan las
+líneas que más memoria Python retienen desde el calentamiento.
+
+Diferencias con producción: el turn detector multilingüe necesita el proceso de
+inferencia del worker, así que el fin de turno lo marca el STT (`"stt"`); y todas
+las llamadas comparten un proceso, cuando el worker usa un proceso por job.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/soak_calls.py --calls 200 --concurrency 8
+    uv run evals/soak_calls.py --calls 5000 --concurrency 16 --max-growth-mb 50 --tracemalloc
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import AsyncMock, create_autospec
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livekit import rtc  # noqa: E402
+from livekit.agents import AgentSession, JobContext, JobExecutorType, JobProcess, io  # noqa: E402
+from livekit.agents.job import RunningJobInfo, _JobContextVar  # noqa: E402
+from livekit.agents.utils import http_context  # noqa: E402
+from livekit.protocol import agent as agent_proto, models  # noqa: E402
+
+from fake_providers import FakeProviders  # noqa: E402
+
+SCRIPT = [
+    "Hola, quiero información de los autos eléctricos",
+    "¿Cuál es su horario?",
+    "Perfecto, gracias, adiós",
+]
+# Audio del llamante por frase (el STT falso transcribe cada tantos segundos)
+UTTERANCE_S = 1.0
+FRAME_MS = 20
+
+
+class CallerAudio(io.AudioInput):
+    """Micrófono del llamante: frames de silencio a ritmo real hasta que cuelga"""
+
+    def __init__(self, sample_rate: int) -> None:
+        super().__init__(label="soak-caller")
+        samples = sample_rate * FRAME_MS // 1000
+        self._frame = rtc.AudioFrame(
+            data=np.zeros(samples, dtype=np.int16).tobytes(),
+            sample_rate=sample_rate,
+            num_channels=1,
+            samples_per_channel=samples,
+        )
+        self._next_at = 0.0
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        now = time.monotonic()
+        self._next_at = max(self._next_at + FRAME_MS / 1000, now)
+        await asyncio.sleep(self._next_at - now)
+        return self._frame
+
+
+class DiscardAudio(io.AudioOutput):
+    """Parlante del llamante: cada segmento se da por reproducido al terminar de llegar"""
+
+    def __init__(self, sample_rate: int | None) -> None:
+        super().__init__(label="soak-sink", capabilities=io.AudioOutputCapabilities(pause=False), sample_rate=sample_rate)
+        self._pushed_s = 0.0
+        self._playing = False
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        await super().capture_frame(frame)
+        self._playing = True
+        self._pushed_s += frame.duration
+
+    def flush(self) -> None:
+        super().flush()
+        self._finish(interrupted=False)
+
+    def clear_buffer(self) -> None:
+        self._finish(interrupted=True)
+
+    def _finish(self, *, interrupted: bool) -> None:
+        if self._playing:
+            self.on_playback_finished(playback_position=self._pushed_s, interrupted=interrupted)
+        self._playing = False
+        self._pushed_s = 0.0
+
+
+def create_room(name: str) -> rtc.Room:
+    """Sala simulada (como `ipc.mock_room`, pero una por llamada) con el llamante SIP ya unido"""
+    room = create_autospec(rtc.Room, instance=True)
+    room.local_participant = create_autospec(rtc.LocalParticipant, instance=True)
+    room.local_participant.identity = "agent"
+    room._info = create_autospec(rtc.room.proto_room.RoomInfo, instance=True)
+    room.isconnected.return_value = True
+    room.name = name
+    room.metadata = ""
+    room.connection_state = rtc.ConnectionState.CONN_CONNECTED
+    room.sid = AsyncMock(return_value=f"RM_{name}")
+
+    caller = create_autospec(rtc.RemoteParticipant, instance=True)
+    caller.identity = f"sip_{name}"
+    caller.sid = f"PA_{name}"
+    caller.kind = rtc.ParticipantKind.PARTICIPANT_KIND_SIP
+    caller.attributes = {}
+    caller.track_publications = {}
+    room.remote_participants = {caller.identity: caller}
+    return room
+
+
+def use_synthetic_audio(session: AgentSession) -> None:
+    """Tras `session.start`: el llamante sintético reemplaza el audio de la sala"""
+    start = session.start
+
+    async def _start(*args, **kwargs):
+        result = await start(*args, **kwargs)
+        session.input.audio = CallerAudio(session.stt._opts.sample_rate)
+        session.output.audio = DiscardAudio(session.output.audio.sample_rate if session.output.audio else None)
+        return result
+
+    session.start = _start
+
+
+# Jobs en curso por sala: eliminar la sala cierra su job, como la desconexión de LiveKit
+_jobs: dict[str, JobContext] = {}
+
+
+def _on_room_deleted(name: str) -> None:
+    ctx = _jobs.get(name)
+    if ctx is not None:
+        ctx.shutdown(reason="room deleted")
+
+
+async def run_call(agent_module, proc: JobProcess, index: int, timeout: float) -> bool:
+    """Una llamada entrante completa, como la corre el proceso de job"""
+    name = f"soak-{index}"
+    room = create_room(name)
+    shutdown = asyncio.get_running_loop().create_future()
+
+    def _on_shutdown(reason: str) -> None:
+        if not shutdown.done():
+            shutdown.set_result(reason)
+
+    info = RunningJobInfo(
+        accept_arguments=None,
+        job=agent_proto.Job(id=f"AJ_{name}", room=models.Room(name=name, sid=f"RM_{name}")),
+        url=os.environ["LIVEKIT_URL"],
+        token="",
+        worker_id="soak",
+    )
+    # JobContext envuelve la fábrica de registros de logging del proceso (uno por
+    # proceso en el worker): aquí encadenaría un contexto por llamada
+    log_record_factory = logging.getLogRecordFactory()
+    ctx = JobContext(
+        proc=proc, info=info, room=room, on_connect=lambda: None, on_shutdown=_on_shutdown, inference_executor=None
+    )
+    logging.setLogRecordFactory(log_record_factory)
+
+    async def _job() -> bool:
+        _jobs[name] = ctx
+        token = _JobContextVar.set(ctx)
+        http_context._new_session_ctx()
+        entry = asyncio.create_task(agent_module.entrypoint(ctx))
+        try:
+            reason = await asyncio.wait_for(asyncio.shield(shutdown), timeout)
+            completed = True
+        except asyncio.TimeoutError:
+            reason, completed = "timeout", False
+            logging.getLogger("soak").warning(f"[SOAK] {name}: sin colgar tras {timeout:.0f}s")
+        if not entry.done():
+            entry.cancel()
+        await asyncio.gather(entry, return_exceptions=True)
+        await room.disconnect()
+        await asyncio.gather(*(cb(reason) for cb in ctx._shutdown_callbacks), return_exceptions=True)
+        await http_context._close_http_ctx()
+        _JobContextVar.reset(token)
+        del _jobs[name]
+        return completed
+
+    # Contexto propio por llamada, como el task del job
+    return await asyncio.create_task(_job())
+
+
+def _patch_agent(agent_module) -> None:
+    create_session = agent_module.create_session
+
+    def _create_session(*args, **kwargs) -> AgentSession:
+        session = create_session(*args, **kwargs)
+        use_synthetic_audio(session)
+        return session
+
+    agent_module.create_session = _create_session
+    # Sin proceso de inferencia no hay turn detector: el fin de turno lo marca el STT
+    agent_module.MultilingualModel = lambda: "stt"
+
+
+def _configure_env(server: FakeProviders, stats_dir: str) -> None:
+    os.environ.update(
+        {
+            "DEEPGRAM_BASE_URL": f"{server.base_url}/listen",
+            "ELEVENLABS_BASE_URL": server.base_url,
+            "LIVEKIT_INFERENCE_URL": server.base_url,
+            "LIVEKIT_URL": server.url,
+            "LIVEKIT_API_KEY": "soak",
+            "LIVEKIT_API_SECRET": "soak-secret-soak-secret-soak-secret",
+            "DEEPGRAM_API_KEY": "soak",
+            "ELEVEN_API_KEY": "soak",
+            "OPENAI_API_KEY": "soak",
+            "TTS_PROVIDERS": "elevenlabs",
+            "CALL_RECORDS_DIR": "",
+            "LOAD_STATS_DIR": stats_dir,
+            "POST_CALL_GRACE_S": "2",
+        }
+    )
+    for var in ("MCP_SERVER", "MCP_TOKEN", "SUPABASE_URL", "TRANSFER_TO"):
+        os.environ.pop(var, None)
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="llamadas en total")
+    parser.add_argument("--concurrency", type=int, default=8, help="llamadas simultáneas (1 = secuenciales)")
+    parser.add_argument("--warmup", type=int, default=50, help="llamadas antes de la RSS de referencia")
+    parser.add_argument("--max-growth-mb", type=float, default=30.0, help="crecimiento máximo de RSS tolerado")
+    parser.add_argument("--call-timeout", type=float, default=30.0, help="segundos máximos por llamada")
+    parser.add_argument("--tracemalloc", action="store_true", help="listar lo que más memoria retiene al final")
+    parser.add_argument("--verbose", action="store_true", help="logs del agente")
+    args = parser.parse_args()
+
+    server = FakeProviders(utterance_s=UTTERANCE_S, script=SCRIPT)
+    server.on_room_deleted = _on_room_deleted
+    await server.start()
+    _configure_env(server, tempfile.mkdtemp(prefix="soak-load-"))
+
+    import agent as agent_module
+    from session_memory import process_rss_mb
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    _patch_agent(agent_module)
+
+    proc = JobProcess(executor_type=JobExecutorType.PROCESS, user_arguments=None, http_proxy=None)
+    agent_module.prewarm(proc)
+
+    completed = failed = 0
+    rss_baseline = None
+    started_at = time.monotonic()
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def _one(index: int) -> None:
+        nonlocal completed, failed, rss_baseline
+        async with sem:
+            ok = await run_call(agent_module, proc, index, args.call_timeout)
+        completed += ok
+        failed += not ok
+        done = completed + failed
+        if done == args.warmup:
+            gc.collect()
+            rss_baseline = process_rss_mb()
+            if args.tracemalloc:
+                tracemalloc.start(10)
+        if done % max(1, args.calls // 10) == 0:
+            print(f"  {done}/{args.calls} llamadas  RSS {process_rss_mb():.0f} MB  ({time.monotonic() - started_at:.0f}s)")
+
+    try:
+        await asyncio.gather(*(_one(i) for i in range(args.calls)))
+    finally:
+        await server.aclose()
+
+    gc.collect()
+    rss_end = process_rss_mb()
+    sessions_alive = sum(isinstance(obj, AgentSession) for obj in gc.get_objects())
+    baseline = rss_baseline if rss_baseline is not None else rss_end
+    growth = rss_end - baseline
+    print(
+        f"Llamadas: {completed} completas, {failed} sin colgar  (concurrencia {args.concurrency}, "
+        f"{time.monotonic() - started_at:.0f}s)"
+    )
+    print(
+        f"Proveedores: {server.handshakes}  LLM {server.llm_requests} pedidos  salas eliminadas {server.rooms_deleted}"
+    )
+    print(f"RSS tras {args.warmup} llamadas de calentamiento: {baseline:.1f} MB  al final: {rss_end:.1f} MB  ({growth:+.1f} MB)")
+    print(f"Sesiones vivas tras colgar todas: {sessions_alive}  objetos Python: {len(gc.get_objects())}")
+
+    if args.tracemalloc and tracemalloc.is_tracing():
+        print("Mayores retenciones desde el calentamiento:")
+        for stat in tracemalloc.take_snapshot().statistics("lineno")[:10]:
+            print(f"  {stat}")
+
+    if growth > args.max_growth_mb or sessions_alive or failed:
+        print(
+            f"FALLA: crecimiento {growth:.1f} MB (máx {args.max_growth_mb:.0f} MB), "
+            f"{sessions_alive} sesiones vivas, {failed} llamadas sin colgar"
+        )
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
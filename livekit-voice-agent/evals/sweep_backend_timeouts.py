@@ -0,0 +1,251 @@
+"""Barrido de timeouts de MCP y de la base de conocimiento contra backends con fallas.
+
+Para cada escenario de `--scenarios` (ver `backend_scenarios.json`) levanta los
+backends falsos (`fake_backends.py`) y simula `--calls` llamadas simultáneas
+(`--concurrency`) por cada configuración de timeout:
+
+- MCP (`--mcp`, pares MCP_TIMEOUT:MCP_SESSION_TIMEOUT): cada llamada abre su
+  `MCPServerHTTP` como el agente y usa `consultar_inventario`,
+  `guardar_prospecto`, `consultar_horarios_disponibles` y `agendar_cita`
+- base de conocimiento (`--kb`, valores de KB_TIMEOUT_S; 0 = sin límite): tres
+  preguntas por llamada con la herramienta real `buscar_en_base_de_conocimiento`
+  (embeddings + `match_documents` falsos)
+
+Por configuración reporta:
+- espera p95 por herramienta y silencio del llamante (espera menos la frase de
+  relleno, `--filler-s`): p50, p95, máximo y herramientas con más de
+  `--long-silence-s`
+- respuestas correctas, fallas rápidas (error) y timeouts
+- recuperación: herramientas correctas justo después de una falla en la misma
+  llamada (la sesión MCP sigue usable tras un timeout)
+- silencio total p95 por llamada
+
+Una espera que pasa de `--max-wait` se corta y cuenta como colgada.
+
+Uso (desde livekit-voice-agent/):
+    uv run evals/sweep_backend_timeouts.py
+    uv run evals/sweep_backend_timeouts.py --only cuelgues,caida --mcp 10:30,5:8,3:5 --kb 0,6,3,2 --calls 40
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livekit.agents import mcp  # noqa: E402
+from livekit.agents.llm.tool_context import get_raw_function_info  # noqa: E402
+
+from fake_backends import FakeBackends  # noqa: E402
+from kb_sidecar import KnowledgeBase, openai_embedder, supabase_rpc  # noqa: E402
+
+SCENARIOS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend_scenarios.json")
+
+MCP_STEPS = [
+    ("consultar_inventario", {"modelo": "RAV4 2025"}),
+    ("guardar_prospecto", {"nombre": "Ana Torres", "telefono": "987654321", "interes": "RAV4"}),
+    ("consultar_horarios_disponibles", {"fecha": "sábado"}),
+    ("agendar_cita", {"nombre": "Ana Torres", "telefono": "987654321", "fecha": "sábado", "hora": "10:00"}),
+]
+KB_QUESTIONS = ["¿Tienen financiamiento?", "¿Dónde están ubicados?", "¿Cuánto dura la garantía?"]
+
+
+@dataclass
+class Step:
+    outcome: str  # ok | error | timeout | colgada
+    wait_s: float
+
+
+@dataclass
+class Results:
+    calls: list[list[Step]] = field(default_factory=list)
+
+    def summary(self, filler_s: float, long_silence_s: float) -> dict:
+        steps = [step for call in self.calls for step in call]
+        silences = sorted(max(0.0, step.wait_s - filler_s) for step in steps)
+        per_call = sorted(sum(max(0.0, s.wait_s - filler_s) for s in call) for call in self.calls)
+        after_failure = [
+            call[i + 1].outcome == "ok" for call in self.calls for i in range(len(call) - 1) if call[i].outcome != "ok"
+        ]
+        count = {k: sum(s.outcome == k for s in steps) / len(steps) for k in ("ok", "error", "timeout", "colgada")}
+        return {
+            "wait_p95": _p95(sorted(step.wait_s for step in steps)),
+            "p50": statistics.median(silences),
+            "p95": _p95(silences),
+            "max": silences[-1],
+            "long": sum(s > long_silence_s for s in silences) / len(silences),
+            **count,
+            "recovery": sum(after_failure) / len(after_failure) if after_failure else None,
+            "call_p95": _p95(per_call),
+        }
+
+
+def _p95(values: list[float]) -> float:
+    return values[min(int(0.95 * len(values)), len(values) - 1)]
+
+
+async def _timed(awaitable, max_wait: float) -> tuple[object, float, BaseException | None]:
+    started_at = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(awaitable, max_wait)
+        return result, time.perf_counter() - started_at, None
+    except BaseException as e:  # noqa: BLE001 - McpError, ToolError, TimeoutError...
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        return None, time.perf_counter() - started_at, e
+
+
+async def mcp_call(backends: FakeBackends, http_timeout: float, read_timeout: float, max_wait: float) -> list[Step]:
+    server = mcp.MCPServerHTTP(
+        url=backends.mcp_url, headers={"token": "sweep"},
+        timeout=http_timeout, client_session_timeout_seconds=read_timeout,
+    )
+    steps = []
+    started_at = time.perf_counter()
+    try:
+        await server.initialize()
+        tools = {get_raw_function_info(tool).name: tool for tool in await server.list_tools()}
+    except Exception:
+        # Sin sesión MCP el agente arranca sin herramientas: todas fallan
+        await _aclose(server)
+        return [Step("error", time.perf_counter() - started_at)] + [Step("error", 0.0)] * (len(MCP_STEPS) - 1)
+    try:
+        for name, arguments in MCP_STEPS:
+            _, wait_s, error = await _timed(tools[name](raw_arguments=arguments), max_wait)
+            if error is None:
+                outcome = "ok"
+            elif isinstance(error, TimeoutError) and wait_s >= max_wait:
+                outcome = "colgada"
+            elif "timed out" in str(error).lower() or isinstance(error, TimeoutError):
+                outcome = "timeout"
+            else:
+                outcome = "error"
+            steps.append(Step(outcome, wait_s))
+    finally:
+        await _aclose(server)
+    return steps
+
+
+async def _aclose(server: mcp.MCPServerHTTP) -> None:
+    try:
+        await server.aclose()
+    except Exception:
+        # Pedidos en segundo plano que fallaron (conexión cortada por el backend): no afectan la medición
+        pass
+
+
+async def kb_call(assistant, timeout_s: float, max_wait: float) -> list[Step]:
+    steps = []
+    for question in KB_QUESTIONS:
+        result, wait_s, error = await _timed(assistant.buscar_en_base_de_conocimiento(question, None), max_wait)
+        if error is not None:
+            outcome = "colgada"
+        elif result.startswith("1. **referencia"):
+            outcome = "ok"
+        elif timeout_s and wait_s >= timeout_s * 0.95:
+            outcome = "timeout"
+        else:
+            outcome = "error"
+        steps.append(Step(outcome, wait_s))
+    return steps
+
+
+def configure_kb(backends: FakeBackends, timeout_s: float):
+    """Apunta la herramienta real a los backends falsos con KB_TIMEOUT_S = `timeout_s`"""
+    os.environ["OPENAI_BASE_URL"] = f"{backends.url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sweep")
+    import agent
+    from tenants import default_tenant
+
+    agent.SUPABASE_URL, agent.SUPABASE_KEY = backends.url, "sweep"
+    agent.KB_TIMEOUT_S = timeout_s
+    # Los clientes se crean con el timeout: uno nuevo por configuración
+    agent._openai_client = None
+    agent._supabase_client = None
+    # Sin cachés ni lotes de embeddings: cada pregunta llega a los backends
+    agent._knowledge_base = KnowledgeBase(
+        openai_embedder(agent.get_openai_client, agent.EMBEDDING_MODEL, agent.EMBEDDING_DIMENSIONS),
+        supabase_rpc(agent.get_supabase_client), embedding_cache_size=0, result_cache_size=0, batch_max=1,
+    )
+    return agent.Assistant(tenant=default_tenant())
+
+
+async def run_setting(scenario: dict, kind: str, setting, args: argparse.Namespace) -> dict:
+    backends = FakeBackends(scenario, seed=args.seed)
+    await backends.start()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = Results()
+    assistant = configure_kb(backends, setting) if kind == "kb" else None
+
+    async def _one() -> None:
+        async with semaphore:
+            if kind == "mcp":
+                results.calls.append(await mcp_call(backends, *setting, args.max_wait))
+            else:
+                results.calls.append(await kb_call(assistant, setting, args.max_wait))
+
+    try:
+        await asyncio.gather(*(_one() for _ in range(args.calls)))
+    finally:
+        await backends.aclose()
+    return results.summary(args.filler_s, args.long_silence_s)
+
+
+def print_table(title: str, rows: list[tuple[str, dict]], long_silence_s: float) -> None:
+    print(f"\n{title}")
+    print(
+        f"  {'timeout':<11}{'espera p95':>11}{'silencio p50':>13}{'p95':>7}{'máx':>7}{f'>{long_silence_s:.0f}s':>7}"
+        f"{'ok':>7}{'error':>7}{'timeout':>9}{'colgada':>9}{'recupera':>10}{'por llamada p95':>17}"
+    )
+    for label, r in rows:
+        recovery = f"{r['recovery']:.0%}" if r["recovery"] is not None else "-"
+        print(
+            f"  {label:<11}{r['wait_p95']:>10.1f}s{r['p50']:>12.1f}s{r['p95']:>6.1f}s{r['max']:>6.1f}s{r['long']:>7.0%}"
+            f"{r['ok']:>7.0%}{r['error']:>7.0%}{r['timeout']:>9.0%}{r['colgada']:>9.0%}{recovery:>10}{r['call_p95']:>16.1f}s"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=SCENARIOS_FILE)
+    parser.add_argument("--only", default="", help="escenarios a correr, separados por coma")
+    parser.add_argument("--mcp", default="10:30,5:10,4:6,3:4", help="MCP_TIMEOUT:MCP_SESSION_TIMEOUT, separados por coma")
+    parser.add_argument("--kb", default="0,8,4,3,2", help="KB_TIMEOUT_S, separados por coma (0 = sin límite)")
+    parser.add_argument("--calls", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--filler-s", type=float, default=1.2, help="duración de la frase de relleno (\"Un momento, por favor\")")
+    parser.add_argument("--long-silence-s", type=float, default=3.0)
+    parser.add_argument("--max-wait", type=float, default=45.0, help="corte de una espera sin timeout")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    # Los errores inyectados llenarían la salida con los logs del agente
+    logging.disable(logging.CRITICAL)
+    with open(args.scenarios, encoding="utf-8") as f:
+        scenarios = json.load(f)["scenarios"]
+    only = {name.strip() for name in args.only.split(",") if name.strip()}
+    mcp_settings = [tuple(float(v) for v in pair.split(":")) for pair in args.mcp.split(",") if pair]
+    kb_settings = [float(v) for v in args.kb.split(",") if v]
+
+    print(f"{args.calls} llamadas por configuración, {args.concurrency} simultáneas, relleno {args.filler_s:.1f}s")
+    for scenario in scenarios:
+        if only and scenario["name"] not in only:
+            continue
+        mcp_rows = [
+            (f"{http:g}:{read:g}", await run_setting(scenario, "mcp", (http, read), args)) for http, read in mcp_settings
+        ]
+        print_table(f"[{scenario['name']}] MCP (MCP_TIMEOUT:MCP_SESSION_TIMEOUT)", mcp_rows, args.long_silence_s)
+        kb_rows = [
+            (f"{t:g}" if t else "sin límite", await run_setting(scenario, "kb", t, args)) for t in kb_settings
+        ]
+        print_table(f"[{scenario['name']}] Base de conocimiento (KB_TIMEOUT_S)", kb_rows, args.long_silence_s)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,332 @@
+"""Ruta rápida de preguntas frecuentes, delante del LLM.
+
+Horarios, financiamiento, garantía y ubicación son buena parte de las llamadas
+entrantes y cada una pasa por LLM → embeddings → `match_documents` → LLM. Con
+`FAQFastPath` esas preguntas se responden al instante:
+
+- `FAQMatcher` compara el turno del usuario con las preguntas de ejemplo de
+  `faq.json` (curado desde la base de conocimiento) con un coseno TF-IDF local
+  sobre raíces de palabras. Solo acepta coincidencias de alta confianza: puntaje
+  mínimo, margen frente a la segunda intención y turnos cortos.
+- Si coincide, se dice la respuesta aprobada tal cual (con audio en caché si ya
+  se sintetizó en este host) y la pregunta y la respuesta quedan en el
+  historial del agente y de la sesión para que la conversación y la
+  transcripción sigan coherentes. Los campos `{horario}` de las respuestas se
+  completan con los datos de la concesionaria.
+- `FAQStats` mide la tasa de turnos atendidos por la ruta rápida y la latencia
+  hasta que el agente empieza a hablar frente a los turnos que van al LLM.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import statistics
+import tempfile
+import time
+import unicodedata
+from collections import Counter
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from livekit import rtc
+from livekit.agents import Agent, AgentSession, AgentStateChangedEvent, CloseEvent, llm, tts
+
+from tts_router import TTSRouter
+
+logger = logging.getLogger(__name__)
+
+# Apagado por defecto: las respuestas de faq.json se dicen tal cual y hay que contrastarlas con
+# la base de conocimiento de cada concesionaria antes de activarlo
+FAQ_FAST_PATH = os.getenv("FAQ_FAST_PATH", "false").lower() == "true"
+# FAQ de la concesionaria por defecto (sin TENANTS_FILE); vacío = sin FAQ
+FAQ_FILE = os.getenv("FAQ_FILE", "")
+# Preguntas de ejemplo del repositorio, para evals/eval_faq_matcher.py
+FAQ_EXAMPLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "faq.json")
+# Confianza mínima (coseno) y margen frente a la segunda intención
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.7"))
+FAQ_MIN_MARGIN = float(os.getenv("FAQ_MIN_MARGIN", "0.15"))
+# Turnos más largos suelen traer más de una pregunta: van al LLM
+FAQ_MAX_WORDS = int(os.getenv("FAQ_MAX_WORDS", "14"))
+FAQ_CACHE_AUDIO = os.getenv("FAQ_CACHE_AUDIO", "true").lower() == "true"
+# Audio de las respuestas (PCM de 16 bits), compartido por los procesos del host: cada llamada
+# corre en su propio proceso y una caché en memoria moriría con ella
+FAQ_AUDIO_DIR = os.getenv("FAQ_AUDIO_DIR", os.path.join(tempfile.gettempdir(), "autofuturo-faq-audio"))
+
+_STOPWORDS = {
+    "a", "al", "algo", "como", "con", "de", "del", "el", "ella", "en", "es", "esta", "este", "hay",
+    "la", "las", "le", "lo", "los", "me", "mi", "mis", "nos", "o", "para", "por", "pues", "que",
+    "se", "su", "sus", "te", "tu", "un", "una", "unos", "y", "ya", "yo", "usted", "ustedes",
+    "hola", "buenas", "buenos", "dias", "tardes", "noches", "bueno", "oiga", "disculpe", "favor",
+    "queria", "quisiera", "quiero", "saber", "preguntar", "consulta", "consultar", "senorita",
+    "senor", "alo", "ahi", "eh", "mmm", "este", "entonces", "osea",
+}
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^\w\s]", " ", text)
+
+
+def _stems(text: str) -> list[str]:
+    """Raíces aproximadas (prefijo de 5 letras) sin palabras vacías"""
+    return [w[:5] for w in _normalize(text).split() if w not in _STOPWORDS]
+
+
+@dataclass
+class FAQ:
+    id: str
+    questions: list[str]
+    answer: str
+
+
+@dataclass
+class FAQMatch:
+    faq: FAQ
+    score: float
+    margin: float
+
+
+class FAQMatcher:
+    def __init__(self, faqs: list[FAQ]) -> None:
+        self.faqs = faqs
+        examples = [(faq, Counter(_stems(q))) for faq in faqs for q in faq.questions]
+        # IDF por raíz sobre todas las preguntas de ejemplo
+        df = Counter(stem for _, counts in examples for stem in counts)
+        self._idf = {stem: math.log((1 + len(examples)) / (1 + n)) + 1 for stem, n in df.items()}
+        # Raíces fuera del vocabulario del FAQ pesan como las más raras: bajan la similitud
+        self._max_idf = max(self._idf.values(), default=1.0)
+        self._examples = [(faq, self._vector(counts)) for faq, counts in examples]
+
+    @classmethod
+    def from_file(cls, path: str) -> FAQMatcher:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls([FAQ(id=e["id"], questions=e["questions"], answer=e["answer"]) for e in data["faqs"]])
+
+    def _vector(self, counts: Counter) -> dict[str, float]:
+        return {stem: n * self._idf.get(stem, self._max_idf) for stem, n in counts.items()}
+
+    @staticmethod
+    def _cosine(a: dict[str, float], b: dict[str, float]) -> float:
+        dot = sum(v * b.get(k, 0.0) for k, v in a.items())
+        norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+        return dot / norm if norm else 0.0
+
+    def score(self, text: str) -> list[tuple[FAQ, float]]:
+        """Mejor similitud por intención, de mayor a menor"""
+        query = self._vector(Counter(_stems(text)))
+        best: dict[str, tuple[FAQ, float]] = {}
+        for faq, example in self._examples:
+            similarity = self._cosine(query, example)
+            if faq.id not in best or similarity > best[faq.id][1]:
+                best[faq.id] = (faq, similarity)
+        return sorted(best.values(), key=lambda item: item[1], reverse=True)
+
+    def match(self, text: str) -> FAQMatch | None:
+        if not text.strip() or len(_normalize(text).split()) > FAQ_MAX_WORDS:
+            return None
+        ranked = self.score(text)
+        if not ranked:
+            return None
+        faq, top = ranked[0]
+        margin = top - (ranked[1][1] if len(ranked) > 1 else 0.0)
+        if top < FAQ_MIN_SCORE or margin < FAQ_MIN_MARGIN:
+            return None
+        return FAQMatch(faq=faq, score=top, margin=margin)
+
+
+# Un matcher por archivo (uno por concesionaria), compartido por las sesiones del proceso
+@lru_cache(maxsize=64)
+def load_matcher(path: str) -> FAQMatcher | None:
+    try:
+        matcher = FAQMatcher.from_file(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"[FAQ] No se pudo cargar {path}: {e}")
+        return None
+    logger.info(f"[FAQ] {len(matcher.faqs)} preguntas frecuentes cargadas de {path}")
+    return matcher
+
+
+# Audio leído de FAQ_AUDIO_DIR en este proceso, por archivo. El nombre lleva el ámbito (la
+# concesionaria), el proveedor y su voz, el formato y un hash del texto: una respuesta nunca
+# suena con la voz o el texto de otra, y editar el FAQ invalida su audio
+_audio_cache: dict[str, bytes] = {}
+
+
+def audio_cache_nbytes() -> int:
+    return sum(len(pcm) for pcm in _audio_cache.values())
+
+
+def _active_tts(session: AgentSession, voices: dict[str, str]) -> tuple[str, tts.TTS]:
+    """Proveedor que sintetiza ahora: el principal del router o el único de la sesión"""
+    if isinstance(session.tts, TTSRouter):
+        return session.tts.current, session.tts.current_tts
+    return next(iter(voices), ""), session.tts
+
+
+def _audio_path(scope: str, faq_id: str, answer: str, provider: str, voice: str, session: AgentSession) -> str:
+    out = session.tts
+    digest = hashlib.sha1(f"{provider}|{voice}|{answer}".encode()).hexdigest()[:12]
+    name = f"{scope or 'default'}-{faq_id}-{provider}-{out.sample_rate}x{out.num_channels}-{digest}.pcm"
+    return os.path.join(FAQ_AUDIO_DIR, name)
+
+
+def _read_audio(path: str) -> bytes | None:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_audio(path: str, pcm: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(pcm)
+    os.replace(tmp, path)
+
+
+@dataclass
+class FAQStats:
+    turns: int = 0
+    hits: int = 0
+    # Segundos desde el fin del turno del usuario hasta que el agente empieza a hablar
+    faq_latency: list[float] = field(default_factory=list)
+    llm_latency: list[float] = field(default_factory=list)
+
+    @property
+    def bypass_rate(self) -> float:
+        return self.hits / self.turns if self.turns else 0.0
+
+    @property
+    def latency_saved(self) -> float:
+        if not self.faq_latency or not self.llm_latency:
+            return 0.0
+        return statistics.mean(self.llm_latency) - statistics.mean(self.faq_latency)
+
+
+class FAQFastPath:
+    def __init__(
+        self,
+        matcher: FAQMatcher,
+        *,
+        scope: str = "",
+        fields: dict[str, str] | None = None,
+        voices: dict[str, str] | None = None,
+    ) -> None:
+        self.matcher = matcher
+        self.scope = scope
+        # Datos de la concesionaria para las respuestas con campos, p. ej. {"horario": "de lunes a ..."}
+        self.fields = fields or {}
+        # Voz por proveedor de TTS ({"elevenlabs": "b2ht..."}): el audio en caché se guarda por voz
+        self.voices = voices or {}
+        self.stats = FAQStats()
+        # Turno pendiente de medir: (ruta, instante en que terminó el turno del usuario)
+        self._pending: tuple[str, float] | None = None
+        self._cache_tasks: set[asyncio.Task] = set()
+
+    def answer(self, faq: FAQ) -> str | None:
+        """Respuesta con los campos completados; None si falta alguno (la pregunta sigue al LLM)"""
+        missing = [name for name in re.findall(r"\{(\w+)\}", faq.answer) if name not in self.fields]
+        if missing:
+            logger.warning(f"[FAQ] {faq.id}: sin datos para {missing}, se responde con el LLM")
+            return None
+        return re.sub(r"\{(\w+)\}", lambda m: self.fields[m[1]], faq.answer)
+
+    async def try_answer(self, agent: Agent, message: llm.ChatMessage) -> bool:
+        """Responde desde el FAQ si hay coincidencia de alta confianza; si no, deja pasar al LLM"""
+        text = message.text_content or ""
+        self.stats.turns += 1
+        match = self.matcher.match(text)
+        answer = self.answer(match.faq) if match else None
+        if answer is None:
+            self._pending = ("llm", time.time())
+            return False
+
+        self.stats.hits += 1
+        self._pending = ("faq", time.time())
+        logger.info(f"[FAQ] '{text}' -> {match.faq.id} (score={match.score:.2f}, margen={match.margin:.2f})")
+
+        # Quien llama lanza StopResponse: la generación preventiva de este turno queda sin
+        # programar (no suena ni llama herramientas) y se descarta al llegar el próximo turno.
+        # La pregunta va al historial del agente y al de la sesión (transcripción); la
+        # respuesta la agrega `say` a los dos
+        session = agent.session
+        chat_ctx = agent.chat_ctx.copy()
+        chat_ctx.insert(message)
+        await agent.update_chat_ctx(chat_ctx)
+        session.history.insert(message)
+
+        provider, engine = _active_tts(session, self.voices) if session.tts else ("", None)
+        voice = self.voices.get(provider)
+        if not FAQ_CACHE_AUDIO or engine is None or not voice:
+            session.say(answer, add_to_chat_ctx=True)
+            return True
+        path = _audio_path(self.scope, match.faq.id, answer, provider, voice, session)
+        pcm = _audio_cache.get(path)
+        if pcm is None:
+            pcm = await asyncio.to_thread(_read_audio, path)
+            if pcm is not None:
+                _audio_cache[path] = pcm
+        if pcm is not None:
+            session.say(answer, audio=_replay(pcm, session.tts.sample_rate, session.tts.num_channels), add_to_chat_ctx=True)
+        else:
+            session.say(answer, add_to_chat_ctx=True)
+            task = asyncio.create_task(self._cache_audio(session, engine, path, match.faq.id, answer))
+            self._cache_tasks.add(task)
+            task.add_done_callback(self._cache_tasks.discard)
+        return True
+
+    async def _cache_audio(self, session: AgentSession, engine: tts.TTS, path: str, faq_id: str, answer: str) -> None:
+        # Con el proveedor del nombre del archivo, no con el router: si este cayera al
+        # siguiente proveedor a mitad de la síntesis, se guardaría otra voz con esta clave
+        try:
+            async with engine.synthesize(answer) as stream:
+                frames = [ev.frame async for ev in stream]
+            if engine.sample_rate != session.tts.sample_rate:
+                resampler = rtc.AudioResampler(engine.sample_rate, session.tts.sample_rate, num_channels=engine.num_channels)
+                frames = [out for frame in frames for out in resampler.push(frame)] + resampler.flush()
+            pcm = b"".join(frame.data.tobytes() for frame in frames)
+            await asyncio.to_thread(_write_audio, path, pcm)
+        except Exception as e:
+            logger.warning(f"[FAQ] No se pudo cachear el audio de {faq_id}: {e}")
+            return
+        _audio_cache[path] = pcm
+        logger.info(f"[FAQ] Audio de '{faq_id}' en caché ({sum(f.duration for f in frames):.1f}s) en {path}")
+
+    def attach(self, session: AgentSession) -> None:
+        @session.on("agent_state_changed")
+        def _on_agent_state(ev: AgentStateChangedEvent) -> None:
+            if ev.new_state != "speaking" or self._pending is None:
+                return
+            route, started_at = self._pending
+            self._pending = None
+            latency = ev.created_at - started_at
+            (self.stats.faq_latency if route == "faq" else self.stats.llm_latency).append(latency)
+
+        @session.on("close")
+        def _on_close(ev: CloseEvent) -> None:
+            stats = self.stats
+            if not stats.turns:
+                return
+            logger.info(
+                f"[FAQ] Resumen - turnos: {stats.turns}, atendidos por FAQ: {stats.hits} "
+                f"({stats.bypass_rate:.0%}), ahorro medio por pregunta: {stats.latency_saved:.2f}s"
+            )
+
+
+async def _replay(pcm: bytes, sample_rate: int, num_channels: int) -> AsyncIterator[rtc.AudioFrame]:
+    # Cuadros de 100 ms
+    step = sample_rate // 10 * num_channels * 2
+    for i in range(0, len(pcm), step):
+        chunk = pcm[i : i + step]
+        yield rtc.AudioFrame(chunk, sample_rate, num_channels, len(chunk) // (2 * num_channels))
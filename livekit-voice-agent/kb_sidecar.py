@@ -0,0 +1,617 @@
+"""Base de conocimiento compartida por los procesos de job de un host.
+
+LiveKit corre cada job en su propio proceso: cada uno arranca con las cachés y
+los clientes HTTP vacíos y los mantiene duplicados. `KnowledgeBase` reúne lo que
+necesita `buscar_en_base_de_conocimiento`:
+
+- embeddings: caché LRU por pregunta normalizada (KB_EMBEDDING_CACHE_SIZE). Las
+  preguntas que llegan dentro de KB_BATCH_WINDOW_MS (de llamadas distintas) se
+  piden juntas en una sola llamada a la API; una pregunta igual en curso se comparte.
+- resultados: caché LRU por función, filtro de la concesionaria, categoría y
+  pregunta normalizada (KB_RESULT_CACHE_SIZE) durante KB_RESULT_TTL_S
+- índice (KB_SNAPSHOT=true): copia en memoria de los embeddings de SUPABASE_TABLE,
+  recargada cada KB_SNAPSHOT_REFRESH_S; busca por similitud coseno sin ir a la
+  base. Solo para concesionarias con `match_documents` (las funciones propias
+  siguen por RPC). Mientras carga, se busca por RPC.
+
+Sin KB_SIDECAR_SOCKET cada proceso usa su propia `KnowledgeBase`. Con él, los
+procesos del host consultan al sidecar (`python kb_sidecar.py`), dueño de una
+sola `KnowledgeBase`, por un socket Unix; si el socket no responde, el proceso
+vuelve a la búsqueda local.
+
+Protocolo (enteros big-endian; textos UTF-8 con prefijo u16):
+
+    trama:     u32 longitud + cuerpo
+    pedido:    u32 id, u8 op (1 buscar, 2 estadísticas), u16 k,
+               pregunta, categoría ("" = todas), función, filtro (JSON)
+    respuesta: u32 id, u8 estado (0 ok, 1 error) +
+               buscar: u16 filas × (i64 id, f32 similitud, categoría, u32 + contenido)
+               estadísticas: u32 + JSON
+               error: mensaje
+
+Una conexión por proceso lleva varios pedidos a la vez (se responden por id).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import resource
+import struct
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+import numpy as np
+from dotenv import load_dotenv
+
+# El mismo .env que agent.py, antes de leer la configuración: el sidecar corre en su propio proceso
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+KB_SIDECAR_SOCKET = os.getenv("KB_SIDECAR_SOCKET", "")  # p. ej. /run/autofuturo/kb.sock; vacío = por proceso
+KB_EMBEDDING_CACHE_SIZE = int(os.getenv("KB_EMBEDDING_CACHE_SIZE", "4096"))
+KB_RESULT_CACHE_SIZE = int(os.getenv("KB_RESULT_CACHE_SIZE", "2048"))
+KB_RESULT_TTL_S = float(os.getenv("KB_RESULT_TTL_S", "600"))
+# Espera para juntar preguntas en una llamada de embeddings y tamaño máximo del lote
+KB_BATCH_WINDOW_MS = float(os.getenv("KB_BATCH_WINDOW_MS", "10"))
+KB_BATCH_MAX = int(os.getenv("KB_BATCH_MAX", "64"))
+KB_SNAPSHOT = os.getenv("KB_SNAPSHOT", "false").lower() == "true"
+KB_SNAPSHOT_REFRESH_S = float(os.getenv("KB_SNAPSHOT_REFRESH_S", "900"))
+# Función de búsqueda que el índice en memoria reemplaza (la de SUPABASE_TABLE)
+KB_SNAPSHOT_FUNCTION = "match_documents"
+
+OP_SEARCH, OP_STATS = 1, 2
+STATUS_OK, STATUS_ERROR = 0, 1
+
+Embedder = Callable[[list[str]], Awaitable[list[np.ndarray]]]
+RPC = Callable[[str, dict], list[dict]]
+DocumentLoader = Callable[[], list[dict]]
+
+
+class KBSidecarError(Exception):
+    """El sidecar respondió con un error de la búsqueda (no de conexión)"""
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@dataclass(frozen=True)
+class KBQuery:
+    pregunta: str
+    categoria: str | None
+    kb_function: str
+    kb_filter: dict
+    k: int
+
+    def key(self) -> str:
+        return json.dumps(
+            [self.kb_function, self.kb_filter, self.categoria, _normalize(self.pregunta), self.k],
+            sort_keys=True, ensure_ascii=False,
+        )
+
+
+def _contains(value, pattern) -> bool:
+    """`value @> pattern` de jsonb"""
+    if isinstance(pattern, dict):
+        return isinstance(value, dict) and all(k in value and _contains(value[k], v) for k, v in pattern.items())
+    if isinstance(pattern, list):
+        return isinstance(value, list) and all(any(_contains(v, p) for v in value) for p in pattern)
+    return value == pattern
+
+
+def _vector(value) -> np.ndarray:
+    """Embedding de pgvector: PostgREST lo devuelve como texto "[0.1,0.2,...]" """
+    if isinstance(value, str):
+        return np.fromstring(value.strip("[]"), dtype=np.float32, sep=",")
+    return np.asarray(value, dtype=np.float32)
+
+
+class VectorSnapshot:
+    """Embeddings de la tabla en una matriz normalizada: búsqueda exacta por coseno"""
+
+    def __init__(self, rows: list[dict]) -> None:
+        self.ids = [row["id"] for row in rows]
+        self.contents = [row.get("content") or "" for row in rows]
+        self.metadata = [row.get("metadata") or {} for row in rows]
+        self.categories = [row.get("category") for row in rows]
+        matrix = np.stack([_vector(row["embedding"]) for row in rows]) if rows else np.zeros((0, 0), np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms == 0, 1, norms)
+        self.loaded_at = time.monotonic()
+
+    def search(self, vector: np.ndarray, k: int, kb_filter: dict, categories: list[str] | None) -> list[dict]:
+        mask = np.fromiter(
+            (
+                _contains(meta, kb_filter) and (not categories or category in categories)
+                for meta, category in zip(self.metadata, self.categories)
+            ),
+            dtype=bool, count=len(self.ids),
+        )
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+        norm = np.linalg.norm(vector)
+        scores = self.matrix[candidates] @ (vector / (norm or 1))
+        top = np.argsort(-scores)[:k] if len(candidates) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"id": self.ids[i], "content": self.contents[i], "category": self.categories[i], "similarity": float(s)}
+            for i, s in zip(candidates[top], scores[top])
+        ]
+
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + sum(len(c.encode()) for c in self.contents)
+
+
+class KnowledgeBase:
+    def __init__(
+        self,
+        embed: Embedder,
+        rpc: RPC,
+        *,
+        load_documents: DocumentLoader | None = None,
+        embedding_cache_size: int | None = None,
+        result_cache_size: int | None = None,
+        result_ttl_s: float | None = None,
+        batch_window_s: float | None = None,
+        batch_max: int | None = None,
+    ) -> None:
+        self._embed_batch = embed
+        self._rpc = rpc
+        self._load_documents = load_documents
+        self.embedding_cache_size = KB_EMBEDDING_CACHE_SIZE if embedding_cache_size is None else embedding_cache_size
+        self.result_cache_size = KB_RESULT_CACHE_SIZE if result_cache_size is None else result_cache_size
+        self.result_ttl_s = KB_RESULT_TTL_S if result_ttl_s is None else result_ttl_s
+        self.batch_window_s = KB_BATCH_WINDOW_MS / 1000 if batch_window_s is None else batch_window_s
+        self.batch_max = KB_BATCH_MAX if batch_max is None else batch_max
+        self._embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._results: OrderedDict[str, tuple[float, list[dict]]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._embedding_inflight: dict[str, asyncio.Future] = {}
+        self._batch: list[tuple[str, str]] = []
+        self._batch_timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._snapshot: VectorSnapshot | None = None
+        self._snapshot_task: asyncio.Task | None = None
+        self._snapshot_retry_at = 0.0
+        self.stats: Counter[str] = Counter()
+
+    async def search(self, query: KBQuery) -> list[dict]:
+        """Fragmentos más parecidos a la pregunta; los errores se propagan (no se memorizan)"""
+        key = query.key()
+        cached = self._results.get(key)
+        if cached and time.monotonic() - cached[0] < self.result_ttl_s:
+            self._results.move_to_end(key)
+            self.stats["result_hits"] += 1
+            return cached[1]
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["result_hits"] += 1
+        else:
+            self.stats["result_misses"] += 1
+            # En una tarea aparte: un llamante que se cansa de esperar no corta la búsqueda de los demás
+            task = asyncio.create_task(self._search_and_remember(key, query), name="kb_search")
+            self._inflight[key] = task
+            task.add_done_callback(self._search_done)
+        return await asyncio.shield(task)
+
+    def _search_done(self, task: asyncio.Task) -> None:
+        self._inflight = {k: t for k, t in self._inflight.items() if t is not task}
+        if not task.cancelled():
+            # Si nadie la esperaba, el error no queda como "nunca recuperado"
+            task.exception()
+
+    async def _search_and_remember(self, key: str, query: KBQuery) -> list[dict]:
+        rows = await self._search(query)
+        self._remember(self._results, key, (time.monotonic(), rows), self.result_cache_size)
+        return rows
+
+    async def _search(self, query: KBQuery) -> list[dict]:
+        vector = await self.embed(query.pregunta)
+        rows = await self._match(query, vector, [query.categoria] if query.categoria else None)
+        if query.categoria and not rows:
+            # Categoría mal elegida o fragmentos sin categorizar: se busca en todo el corpus
+            logger.info(f"[KB] Sin resultados en '{query.categoria}', buscando sin categoría")
+            rows = await self._match(query, vector, None)
+        return rows
+
+    async def _match(self, query: KBQuery, vector: np.ndarray, categories: list[str] | None) -> list[dict]:
+        snapshot = self._current_snapshot() if query.kb_function == KB_SNAPSHOT_FUNCTION else None
+        if snapshot is not None:
+            self.stats["snapshot_searches"] += 1
+            return snapshot.search(vector, query.k, query.kb_filter, categories)
+
+        params = {"query_embedding": vector.tolist(), "match_count": query.k, "filter": query.kb_filter}
+        if categories:
+            params["categories"] = categories
+        self.stats["rpc_calls"] += 1
+        # El cliente de Supabase es síncrono: en un hilo para no congelar el loop
+        rows = await asyncio.to_thread(self._rpc, query.kb_function, params)
+        return [
+            {"id": r.get("id"), "content": r.get("content") or "", "category": r.get("category"),
+             "similarity": r.get("similarity") or 0.0}
+            for r in rows or []
+        ]
+
+    async def embed(self, text: str) -> np.ndarray:
+        key = _normalize(text)
+        vector = self._embeddings.get(key)
+        if vector is not None:
+            self._embeddings.move_to_end(key)
+            self.stats["embedding_hits"] += 1
+            return vector
+        self.stats["embedding_misses"] += 1
+        future = self._embedding_inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._embedding_inflight[key] = future
+            self._batch.append((key, text))
+            if len(self._batch) >= self.batch_max:
+                self._flush_batch()
+            elif self._batch_timer is None:
+                self._batch_timer = asyncio.get_running_loop().call_later(self.batch_window_s, self._flush_batch)
+        return await asyncio.shield(future)
+
+    def _flush_batch(self) -> None:
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        batch, self._batch = self._batch, []
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch), name="kb_embeddings")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: list[tuple[str, str]]) -> None:
+        self.stats["embedding_api_calls"] += 1
+        self.stats["embedded_texts"] += len(batch)
+        try:
+            vectors = await self._embed_batch([text for _, text in batch])
+        except Exception as e:
+            for key, _ in batch:
+                future = self._embedding_inflight.pop(key)
+                future.set_exception(e)
+                future.exception()
+            return
+        for (key, _), vector in zip(batch, vectors):
+            self._embedding_inflight.pop(key).set_result(vector)
+            self._remember(self._embeddings, key, vector, self.embedding_cache_size)
+
+    @staticmethod
+    def _remember(cache: OrderedDict, key: str, value, size: int) -> None:
+        if size <= 0:
+            return
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+    def _current_snapshot(self) -> VectorSnapshot | None:
+        """Índice en memoria si está cargado; lanza la (re)carga en segundo plano si falta o venció"""
+        if self._load_documents is None:
+            return None
+        now = time.monotonic()
+        stale = self._snapshot is None or now - self._snapshot.loaded_at > KB_SNAPSHOT_REFRESH_S
+        if stale and now >= self._snapshot_retry_at and (self._snapshot_task is None or self._snapshot_task.done()):
+            self._snapshot_task = asyncio.create_task(self._load_snapshot(), name="kb_snapshot")
+        return self._snapshot
+
+    async def _load_snapshot(self) -> None:
+        started_at = time.perf_counter()
+        try:
+            rows = await asyncio.to_thread(self._load_documents)
+            self._snapshot = await asyncio.to_thread(VectorSnapshot, rows)
+        except Exception as e:
+            # No se reintenta en cada pregunta: una carga fallida no debe multiplicar la carga sobre la base
+            self._snapshot_retry_at = time.monotonic() + min(60.0, KB_SNAPSHOT_REFRESH_S)
+            logger.warning(f"[KB] No se pudo cargar el índice en memoria ({e}); se sigue por RPC")
+            return
+        logger.info(
+            f"[KB] Índice en memoria: {len(rows)} fragmentos, {self._snapshot.nbytes() / 2**20:.1f} MB "
+            f"en {time.perf_counter() - started_at:.1f}s"
+        )
+
+    def nbytes(self) -> int:
+        """Memoria de las cachés y del índice (vectores y textos)"""
+        total = sum(v.nbytes for v in self._embeddings.values())
+        total += sum(len(r["content"].encode()) + 64 for _, rows in self._results.values() for r in rows)
+        return total + (self._snapshot.nbytes() if self._snapshot else 0)
+
+    def summary(self) -> dict:
+        lookups = self.stats["result_hits"] + self.stats["result_misses"]
+        embeddings = self.stats["embedding_hits"] + self.stats["embedding_misses"]
+        return {
+            **self.stats,
+            "result_hit_rate": self.stats["result_hits"] / lookups if lookups else 0.0,
+            "embedding_hit_rate": self.stats["embedding_hits"] / embeddings if embeddings else 0.0,
+            "nbytes": self.nbytes(),
+            "snapshot_rows": len(self._snapshot.ids) if self._snapshot else 0,
+        }
+
+    async def aclose(self) -> None:
+        for task in [*self._tasks, *self._inflight.values(), self._snapshot_task]:
+            if task is not None and not task.done():
+                task.cancel()
+
+
+def openai_embedder(client_factory: Callable, model: str, dimensions: int) -> Embedder:
+    async def embed(texts: list[str]) -> list[np.ndarray]:
+        response = await client_factory().embeddings.create(input=texts, model=model, dimensions=dimensions)
+        return [np.asarray(d.embedding, dtype=np.float32) for d in sorted(response.data, key=lambda d: d.index)]
+    return embed
+
+
+def supabase_rpc(client_factory: Callable) -> RPC:
+    def rpc(function: str, params: dict) -> list[dict]:
+        return client_factory().rpc(function, params).execute().data
+    return rpc
+
+
+def supabase_documents(client_factory: Callable, table: str, page_size: int = 250) -> DocumentLoader:
+    """Lee la tabla por páginas (cada una dentro del timeout del cliente); los embeddings pasan a float32
+    página por página para no retener millones de floats de Python"""
+    def load() -> list[dict]:
+        rows, start = [], 0
+        while True:
+            page = (
+                client_factory().table(table).select("id,content,metadata,category,embedding")
+                .order("id").range(start, start + page_size - 1).execute().data
+            )
+            for row in page:
+                row["embedding"] = _vector(row["embedding"])
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            start += page_size
+    return load
+
+
+# --- Protocolo ---
+
+def _pack_str(text: str | None, width: str = "H") -> bytes:
+    data = (text or "").encode()
+    return struct.pack(f"!{width}", len(data)) + data
+
+
+def _unpack_str(body: bytes, offset: int, width: str = "H") -> tuple[str, int]:
+    (size,) = struct.unpack_from(f"!{width}", body, offset)
+    offset += struct.calcsize(f"!{width}")
+    return body[offset:offset + size].decode(), offset + size
+
+
+def _frame(body: bytes) -> bytes:
+    return struct.pack("!I", len(body)) + body
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (size,) = struct.unpack("!I", await reader.readexactly(4))
+    return await reader.readexactly(size)
+
+
+def encode_search(request_id: int, query: KBQuery) -> bytes:
+    return _frame(
+        struct.pack("!IBH", request_id, OP_SEARCH, query.k)
+        + _pack_str(query.pregunta) + _pack_str(query.categoria) + _pack_str(query.kb_function)
+        + _pack_str(json.dumps(query.kb_filter, separators=(",", ":")))
+    )
+
+
+def decode_search(body: bytes) -> KBQuery:
+    (k,) = struct.unpack_from("!H", body, 5)
+    offset = 7
+    pregunta, offset = _unpack_str(body, offset)
+    categoria, offset = _unpack_str(body, offset)
+    kb_function, offset = _unpack_str(body, offset)
+    kb_filter, offset = _unpack_str(body, offset)
+    return KBQuery(pregunta, categoria or None, kb_function, json.loads(kb_filter or "{}"), k)
+
+
+def encode_rows(rows: list[dict]) -> bytes:
+    parts = [struct.pack("!H", len(rows))]
+    for row in rows:
+        parts.append(struct.pack("!qf", int(row["id"]), row["similarity"]))
+        parts.append(_pack_str(row.get("category")))
+        parts.append(_pack_str(row["content"], "I"))
+    return b"".join(parts)
+
+
+def decode_rows(payload: bytes) -> list[dict]:
+    (count,) = struct.unpack_from("!H", payload, 0)
+    offset, rows = 2, []
+    for _ in range(count):
+        row_id, similarity = struct.unpack_from("!qf", payload, offset)
+        category, offset = _unpack_str(payload, offset + 12)
+        content, offset = _unpack_str(payload, offset, "I")
+        rows.append({"id": row_id, "content": content, "category": category or None, "similarity": similarity})
+    return rows
+
+
+class KBSidecarServer:
+    def __init__(self, kb: KnowledgeBase, path: str) -> None:
+        self.kb = kb
+        self.path = path
+        self._server: asyncio.Server | None = None
+        self.connections = 0
+
+    async def start(self) -> None:
+        # Socket de una ejecución anterior que no se cerró bien
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        # Solo el usuario del worker
+        os.chmod(self.path, 0o600)
+        logger.info(f"[KB_SIDECAR] Escuchando en {self.path}")
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def aclose(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.kb.aclose()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        tasks: set[asyncio.Task] = set()
+        try:
+            while True:
+                body = await _read_frame(reader)
+                # Cada pedido en su tarea: los de una conexión se atienden (y se agrupan) a la vez
+                task = asyncio.create_task(self._answer(body, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _answer(self, body: bytes, writer: asyncio.StreamWriter) -> None:
+        request_id, op = struct.unpack_from("!IB", body)
+        try:
+            if op == OP_SEARCH:
+                payload = encode_rows(await self.kb.search(decode_search(body)))
+            elif op == OP_STATS:
+                stats = {**self.kb.summary(), "rss_mb": _rss_mb(), "connections": self.connections}
+                payload = _pack_str(json.dumps(stats), "I")
+            else:
+                raise ValueError(f"operación desconocida {op}")
+            status = STATUS_OK
+        except Exception as e:
+            logger.error(f"[KB_SIDECAR] Error en el pedido {request_id}: {e}")
+            status, payload = STATUS_ERROR, _pack_str(str(e)[:1000])
+        if not writer.is_closing():
+            writer.write(_frame(struct.pack("!IB", request_id, status) + payload))
+
+
+class KBSidecarClient:
+    """Conexión de un proceso de job al sidecar; se reconecta en el siguiente pedido si se cae"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._writer: asyncio.StreamWriter | None = None
+        self._pending: dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._lock = asyncio.Lock()
+        self._read_task: asyncio.Task | None = None
+
+    async def search(self, query: KBQuery) -> list[dict]:
+        self._next_id = (self._next_id + 1) % 2**32
+        return decode_rows(await self._request(self._next_id, encode_search(self._next_id, query)))
+
+    async def stats(self) -> dict:
+        self._next_id = (self._next_id + 1) % 2**32
+        payload = await self._request(self._next_id, _frame(struct.pack("!IBH", self._next_id, OP_STATS, 0)))
+        return json.loads(_unpack_str(payload, 0, "I")[0])
+
+    async def _request(self, request_id: int, frame: bytes) -> bytes:
+        writer = await self._connect()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            writer.write(frame)
+            status, payload = await future
+        finally:
+            self._pending.pop(request_id, None)
+        if status != STATUS_OK:
+            raise KBSidecarError(_unpack_str(payload, 0)[0])
+        return payload
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        async with self._lock:
+            if self._writer is None or self._writer.is_closing():
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+                self._read_task = asyncio.create_task(self._read_loop(reader, self._writer), name="kb_sidecar_read")
+            return self._writer
+
+    async def _read_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                body = await _read_frame(reader)
+                request_id, status = struct.unpack_from("!IB", body)
+                future = self._pending.get(request_id)
+                if future and not future.done():
+                    future.set_result((status, body[5:]))
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("el sidecar de la base de conocimiento cerró la conexión"))
+            writer.close()
+
+    async def aclose(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._read_task is not None:
+            self._read_task.cancel()
+
+
+async def _serve(path: str, stats_interval_s: float) -> None:
+    from openai import AsyncOpenAI
+    from supabase import ClientOptions, create_client
+
+    supabase_url, supabase_key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    if not (supabase_url and supabase_key):
+        raise SystemExit("[KB_SIDECAR] Falta SUPABASE_URL / SUPABASE_KEY")
+    timeout_s = float(os.getenv("KB_TIMEOUT_S", "3"))
+    openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=timeout_s or None, max_retries=1)
+    supabase_client = create_client(
+        supabase_url, supabase_key, options=ClientOptions(postgrest_client_timeout=timeout_s or 120)
+    )
+    kb = KnowledgeBase(
+        openai_embedder(
+            lambda: openai_client,
+            os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+            int(os.getenv("EMBEDDING_DIMENSIONS", "1536")),
+        ),
+        supabase_rpc(lambda: supabase_client),
+        load_documents=(
+            supabase_documents(lambda: supabase_client, os.getenv("SUPABASE_TABLE", "documents")) if KB_SNAPSHOT else None
+        ),
+    )
+    server = KBSidecarServer(kb, path)
+    await server.start()
+    try:
+        while True:
+            await asyncio.sleep(stats_interval_s)
+            s = kb.summary()
+            logger.info(
+                f"[KB_SIDECAR] {server.connections} procesos, resultados {s['result_hit_rate']:.0%} en caché, "
+                f"embeddings {s['embedding_hit_rate']:.0%} en caché, {s['embedded_texts']} textos en "
+                f"{s['embedding_api_calls']} llamadas a la API, {s['nbytes'] / 2**20:.1f} MB"
+            )
+    finally:
+        await server.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sidecar de la base de conocimiento para los procesos de job del host")
+    parser.add_argument("--socket", default=KB_SIDECAR_SOCKET or "/tmp/autofuturo-kb.sock")
+    parser.add_argument("--stats-interval-s", type=float, default=300.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    try:
+        asyncio.run(_serve(args.socket, args.stats_interval_s))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,222 @@
+"""Enrutado del LLM por turno: modelo rápido para turnos simples, fuerte para el resto.
+
+`classify_turn` es un clasificador local y barato sobre el contexto del chat:
+- rápido: saludo inicial, acuses y confirmaciones (sí/no, gracias, perfecto),
+  respuestas cortas de agenda (día u hora) y, en llamadas salientes, la
+  confirmación de la cita
+- fuerte: preguntas que requieren herramientas (precios, inventario,
+  financiamiento...), respuestas largas, reagendamientos, el turno que sigue a
+  una herramienta y todo lo ambiguo. También cualquier respuesta a una pregunta
+  del agente que lleva a una herramienta (qué día u hora agendar, confirmar el
+  número o el nombre, elegir un horario ofrecido): un "sí" o "a las 10" ahí
+  termina en `consultar_horarios_disponibles`, `agendar_cita` o `guardar_prospecto`
+
+`LLMRouter` es un `llm.LLM` que delega cada turno en la ruta elegida. Cada ruta
+es un `FallbackAdapter` de livekit (la rápida cae al modelo fuerte y viceversa),
+y se registran por ruta el TTFT y los fallbacks.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import statistics
+import unicodedata
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Literal
+
+from livekit.agents import AgentSession, CloseEvent, inference, llm, metrics
+from livekit.agents.llm.fallback_adapter import AvailabilityChangedEvent
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, APIConnectOptions, NotGivenOr
+
+logger = logging.getLogger(__name__)
+
+LLM_ROUTING = os.getenv("LLM_ROUTING", "true").lower() == "true"
+# Modelos de cada ruta en orden de preferencia (el primero es el principal)
+LLM_FAST_MODELS = [m.strip() for m in os.getenv("LLM_FAST_MODELS", "openai/gpt-4.1-nano,openai/gpt-4o-mini").split(",") if m.strip()]
+LLM_STRONG_MODELS = [m.strip() for m in os.getenv("LLM_STRONG_MODELS", "openai/gpt-4.1-mini,openai/gpt-4o-mini").split(",") if m.strip()]
+# Un turno con más palabras que esto nunca es simple
+FAST_MAX_WORDS = int(os.getenv("LLM_FAST_MAX_WORDS", "6"))
+
+Route = Literal["fast", "strong"]
+
+_ACK = re.compile(
+    r"^(?:si|sip|no|ok|okay|vale|claro|listo|bueno|bien|perfecto|correcto|exacto|genial|excelente|"
+    r"de acuerdo|esta bien|muy bien|por supuesto|gracias|muchas gracias|hola|alo|buenos dias|"
+    r"buenas tardes|buenas noches|buenas|adios|chao|hasta luego|ya|aja)\b"
+)
+_SCHEDULE = re.compile(
+    r"\b(?:lunes|martes|miercoles|jueves|viernes|sabado|domingo|manana|tarde|noche|hoy|"
+    r"a las \w+|en la manana|en la tarde|\d{1,2}(?::\d{2})?\s*(?:am|pm)?)\b"
+)
+# Piden información o una acción que normalmente requiere herramientas
+_NEEDS_TOOLS = re.compile(
+    r"\b(?:precio|cuesta|cuanto|financ\w*|credito|cuota|inicial|tasa|inventario|stock|disponib\w*|"
+    r"tienen|modelo|version|garantia|seguro|mantenimiento|direccion|donde|ubicacion|horario|"
+    r"cambi\w*|reagend\w*|reprogram\w*|cancel\w*|mover|otro dia|otra hora|no puedo|no podre|asesor|humano)\b"
+)
+
+# Preguntas del agente cuya respuesta suele disparar una herramienta (agenda y datos del prospecto)
+_TOOL_QUESTION = re.compile(
+    r"\b(?:agend\w*|reagend\w*|reprogram\w*|cita|prueba de manejo|horario\w*|que dia|que hora|a las \d+|cual prefieres|te parece|"
+    r"confirm\w*|numero|telefono|nombre|correo|asesor|transfer\w*)\b"
+)
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^\w\s:]", " ", text).strip()
+
+
+@dataclass
+class TurnRoute:
+    route: Route
+    reason: str
+
+
+def classify_turn(chat_ctx: llm.ChatContext, *, is_outbound: bool = False) -> TurnRoute:
+    """Decide la ruta del turno con reglas locales (sin llamadas externas)"""
+    items = [item for item in chat_ctx.items if item.type != "message" or item.role not in ("system", "developer")]
+    if not items:
+        return TurnRoute("fast", "saludo")
+
+    last = items[-1]
+    if last.type in ("function_call", "function_call_output"):
+        return TurnRoute("strong", "herramienta")
+    if last.type != "message" or last.role != "user":
+        return TurnRoute("strong", "ambiguo")
+
+    if _after_tool_question(items[:-1]):
+        return TurnRoute("strong", "respuesta a pregunta con herramientas")
+
+    text = _normalize(last.text_content or "")
+    words = text.split()
+    if not words:
+        return TurnRoute("strong", "ambiguo")
+    if len(words) > FAST_MAX_WORDS:
+        return TurnRoute("strong", "largo")
+    if _NEEDS_TOOLS.search(text):
+        return TurnRoute("strong", "requiere herramientas")
+    if is_outbound and words[0] == "no":
+        # En la llamada de recordatorio un "no" suele llevar a reagendar
+        return TurnRoute("strong", "reagendamiento")
+    if _ACK.match(text):
+        return TurnRoute("fast", "confirmación de cita" if is_outbound else "acuse")
+    if _SCHEDULE.search(text):
+        return TurnRoute("fast", "agenda")
+    return TurnRoute("strong", "ambiguo")
+
+
+def _after_tool_question(previous: list[llm.ChatItem]) -> bool:
+    """El último turno del agente usó herramientas o terminó en una pregunta que lleva a una"""
+    for item in reversed(previous):
+        if item.type in ("function_call", "function_call_output"):
+            return True
+        if item.type != "message":
+            continue
+        if item.role == "user":
+            return False
+        questions = re.findall(r"[^.!?¿]*\?", item.text_content or "")
+        return any(_TOOL_QUESTION.search(_normalize(q)) for q in questions)
+    return False
+
+
+@dataclass
+class RouteStats:
+    turns: int = 0
+    fallbacks: int = 0
+    ttft: list[float] = field(default_factory=list)
+
+    def summary(self) -> str:
+        if not self.ttft:
+            return f"{self.turns} turnos, fallbacks={self.fallbacks}"
+        ordered = sorted(self.ttft)
+        p95 = ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)]
+        return (
+            f"{self.turns} turnos, TTFT p50={statistics.median(ordered):.2f}s "
+            f"p95={p95:.2f}s, fallbacks={self.fallbacks}"
+        )
+
+
+def _build_route(models: list[str], backup: list[str]) -> llm.FallbackAdapter:
+    # Los modelos de la otra ruta quedan al final como respaldo
+    names = models + [m for m in backup if m not in models]
+    return llm.FallbackAdapter([inference.LLM(m) for m in names])
+
+
+class LLMRouter(llm.LLM):
+    def __init__(
+        self,
+        *,
+        fast: llm.LLM | None = None,
+        strong: llm.LLM | None = None,
+        is_outbound: bool = False,
+    ) -> None:
+        super().__init__()
+        self._routes: dict[Route, llm.LLM] = {
+            "fast": fast or _build_route(LLM_FAST_MODELS, LLM_STRONG_MODELS),
+            "strong": strong or _build_route(LLM_STRONG_MODELS, LLM_FAST_MODELS),
+        }
+        self._is_outbound = is_outbound
+        self.stats: dict[Route, RouteStats] = {route: RouteStats() for route in self._routes}
+
+        for route, route_llm in self._routes.items():
+            route_llm.on("metrics_collected", partial(self._on_route_metrics, route))
+            route_llm.on("llm_availability_changed", partial(self._on_availability_changed, route))
+
+    @property
+    def model(self) -> str:
+        return "router"
+
+    def _on_route_metrics(self, route: Route, ev: metrics.LLMMetrics) -> None:
+        if not ev.cancelled and ev.ttft > 0:
+            self.stats[route].ttft.append(ev.ttft)
+        # La sesión escucha las métricas en este LLM, no en las rutas
+        self.emit("metrics_collected", ev)
+
+    def _on_availability_changed(self, route: Route, ev: AvailabilityChangedEvent) -> None:
+        if not ev.available:
+            self.stats[route].fallbacks += 1
+            logger.warning(f"[LLM_ROUTER] {ev.llm.model} falló en la ruta {route}, usando el siguiente modelo")
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list[llm.FunctionTool | llm.RawFunctionTool] | None = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        parallel_tool_calls: NotGivenOr[bool] = NOT_GIVEN,
+        tool_choice: NotGivenOr[llm.ToolChoice] = NOT_GIVEN,
+        extra_kwargs: NotGivenOr[dict[str, Any]] = NOT_GIVEN,
+    ) -> llm.LLMStream:
+        decision = classify_turn(chat_ctx, is_outbound=self._is_outbound)
+        self.stats[decision.route].turns += 1
+        logger.info(f"[LLM_ROUTER] Turno -> {decision.route} ({decision.reason})")
+        return self._routes[decision.route].chat(
+            chat_ctx=chat_ctx,
+            tools=tools,
+            conn_options=conn_options,
+            parallel_tool_calls=parallel_tool_calls,
+            tool_choice=tool_choice,
+            extra_kwargs=extra_kwargs,
+        )
+
+    def prewarm(self) -> None:
+        for route_llm in self._routes.values():
+            route_llm.prewarm()
+
+    async def aclose(self) -> None:
+        for route_llm in self._routes.values():
+            await route_llm.aclose()
+
+
+def attach_llm_route_summary(session: AgentSession, router: LLMRouter) -> None:
+    @session.on("close")
+    def _on_close(ev: CloseEvent) -> None:
+        logger.info(
+            "[LLM_ROUTER] Resumen - "
+            + "; ".join(f"{route}: {stats.summary()}" for route, stats in router.stats.items())
+        )
@@ -0,0 +1,409 @@
+"""Degradación escalonada de las sesiones cuando el contenedor se satura.
+
+La admisión (`admission.py`) deja de aceptar llamadas nuevas, pero las que ya
+están en curso siguen pagando BVC, Silero y el turn detector `MultilingualModel`
+completos: cerca de la saturación todas se ralentizan a la vez. `ShedController`
+mira las mismas señales que la admisión (CPU del contenedor, peor lag de event
+loop e inferencia del VAD de los procesos de job) y baja o sube un nivel para
+todo el host:
+
+0. completo: BVC/BVCTelephony, turn detector y `max_buffered_speech` de 60 s
+1. nc_ligera: cancelación de ruido NC (el modelo liviano) en lugar de BVC
+2. solo_vad: sin turn detector; el fin de turno lo decide el VAD con
+   `min_endpointing_delay` (y el endpointing adaptativo, si está activo)
+3. minimo: además, `max_buffered_speech` de SHED_MIN_BUFFERED_SPEECH segundos
+
+Se baja un nivel con la carga sobre SHED_HIGH_LOAD durante SHED_DOWN_AFTER_S y
+se sube uno con la carga bajo SHED_LOW_LOAD durante SHED_UP_AFTER_S. Si al subir
+el host vuelve a saturarse enseguida, la espera para volver a subir se duplica.
+El nivel vive en SHED_STATE_FILE (dentro de LOAD_STATS_DIR, con lock), así que
+los procesos de job deciden sobre el mismo nivel y las sesiones nuevas arrancan
+en el nivel actual. `SessionShedding` lo aplica a su sesión y registra cada cambio.
+
+Una sesión nueva toma la cancelación de ruido del nivel con `room_input_options`.
+Cambiarla en una llamada en curso no tiene API pública: se reabre el stream de
+audio de la sala con internos de RoomIO. `live_noise_cancellation_supported`
+los comprueba al arrancar; si cambiaron, las llamadas en curso conservan su
+filtro y solo bajan el turn detector y el buffer del VAD.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import inspect
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+
+from livekit.agents import AgentSession, CloseEvent, UserStateChangedEvent, llm, utils, vad
+
+from admission import LOAD_STATS_DIR, AdmissionLimits, LoadSignals, WorkerLoadMonitor, compute_load
+from audio_profile import AudioProfile, noise_cancellation_options
+
+logger = logging.getLogger(__name__)
+
+LOAD_SHEDDING = os.getenv("LOAD_SHEDDING", "true").lower() == "true"
+# Carga (0-1, como la admisión) sobre la que se baja un nivel y bajo la que se sube
+SHED_HIGH_LOAD = float(os.getenv("SHED_HIGH_LOAD", "0.85"))
+SHED_LOW_LOAD = float(os.getenv("SHED_LOW_LOAD", "0.5"))
+SHED_DOWN_AFTER_S = float(os.getenv("SHED_DOWN_AFTER_S", "2"))
+SHED_UP_AFTER_S = float(os.getenv("SHED_UP_AFTER_S", "15"))
+SHED_INTERVAL_S = float(os.getenv("SHED_INTERVAL_S", "0.5"))
+SHED_MIN_BUFFERED_SPEECH = float(os.getenv("SHED_MIN_BUFFERED_SPEECH", "10"))
+SHED_STATE_FILE = os.getenv("SHED_STATE_FILE", os.path.join(LOAD_STATS_DIR, "shed_tier.state"))
+
+# Tope de la espera para subir tras varias recaídas seguidas
+_MAX_UP_BACKOFF = 8
+
+
+@dataclass(frozen=True)
+class ShedTier:
+    name: str
+    light_noise_cancellation: bool
+    turn_detector: bool
+    max_buffered_speech: float
+
+
+TIERS = (
+    ShedTier("completo", light_noise_cancellation=False, turn_detector=True, max_buffered_speech=60.0),
+    ShedTier("nc_ligera", light_noise_cancellation=True, turn_detector=True, max_buffered_speech=60.0),
+    ShedTier("solo_vad", light_noise_cancellation=True, turn_detector=False, max_buffered_speech=60.0),
+    ShedTier("minimo", light_noise_cancellation=True, turn_detector=False,
+             max_buffered_speech=SHED_MIN_BUFFERED_SPEECH),
+)
+
+
+@dataclass
+class ShedState:
+    tier: int = 0
+    changed_at: float = 0.0
+    # Multiplicador de SHED_UP_AFTER_S: crece si subir de nivel vuelve a saturar el host
+    up_backoff: int = 1
+    last_up_at: float = 0.0
+
+
+class ShedController:
+    """Decide el nivel del host; un controlador por proceso, el estado compartido en SHED_STATE_FILE"""
+
+    _instance: ShedController | None = None
+
+    def __init__(
+        self,
+        *,
+        state_file: str = SHED_STATE_FILE,
+        limits: AdmissionLimits | None = None,
+        monitor: WorkerLoadMonitor | None = None,
+        high_load: float = SHED_HIGH_LOAD,
+        low_load: float = SHED_LOW_LOAD,
+        down_after_s: float = SHED_DOWN_AFTER_S,
+        up_after_s: float = SHED_UP_AFTER_S,
+    ) -> None:
+        self.state_file = state_file
+        self.limits = limits or AdmissionLimits()
+        self._monitor = monitor
+        self.high_load = high_load
+        self.low_load = low_load
+        self.down_after_s = down_after_s
+        self.up_after_s = up_after_s
+        # Desde cuándo este proceso ve la carga alta o baja sin interrupción
+        self._high_since: float | None = None
+        self._low_since: float | None = None
+        self.load = 0.0
+        self.signals = LoadSignals()
+
+    @classmethod
+    def instance(cls) -> ShedController:
+        if cls._instance is None:
+            cls._instance = ShedController()
+        return cls._instance
+
+    @property
+    def monitor(self) -> WorkerLoadMonitor:
+        # Mismo muestreo de CPU y reportes de lag/inferencia que usa la admisión
+        if self._monitor is None:
+            self._monitor = WorkerLoadMonitor.instance()
+        return self._monitor
+
+    def _read(self, f) -> ShedState:
+        f.seek(0)
+        try:
+            return ShedState(**json.loads(f.read() or "{}"))
+        except (TypeError, ValueError):
+            return ShedState()
+
+    def _write(self, f, state: ShedState) -> None:
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(state.__dict__))
+        f.flush()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        return open(self.state_file, "a+")
+
+    def current(self) -> int:
+        """Nivel actual del host (0 si no hay estado)"""
+        try:
+            with self._open() as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                return min(self._read(f).tier, len(TIERS) - 1)
+        except OSError:
+            return 0
+
+    def step(self) -> int:
+        """Mide la carga y, si corresponde, baja o sube un nivel; devuelve el nivel del host"""
+        # Las sesiones activas las limita la admisión; aquí solo cuenta la presión real
+        self.signals = self.monitor.signals(active_sessions=0)
+        self.load = compute_load(self.signals, self.limits)
+        now = time.time()
+        if self.load >= self.high_load:
+            self._high_since = self._high_since or now
+            self._low_since = None
+        elif self.load <= self.low_load:
+            self._low_since = self._low_since or now
+            self._high_since = None
+        else:
+            self._high_since = self._low_since = None
+
+        try:
+            with self._open() as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                state = self._read(f)
+                tier = min(state.tier, len(TIERS) - 1)
+                if (
+                    self._high_since is not None
+                    and tier < len(TIERS) - 1
+                    and now - self._high_since >= self.down_after_s
+                    and now - state.changed_at >= self.down_after_s
+                ):
+                    if now - state.last_up_at < self.up_after_s * state.up_backoff:
+                        # Recién se había subido y el host se volvió a saturar
+                        state.up_backoff = min(state.up_backoff * 2, _MAX_UP_BACKOFF)
+                    self._change(state, tier, tier + 1, now)
+                    self._write(f, state)
+                elif (
+                    self._low_since is not None
+                    and tier > 0
+                    and now - self._low_since >= self.up_after_s * state.up_backoff
+                    and now - state.changed_at >= self.up_after_s * state.up_backoff
+                ):
+                    state.last_up_at = now
+                    self._change(state, tier, tier - 1, now)
+                    self._write(f, state)
+                elif tier == 0 and state.up_backoff > 1 and now - state.changed_at >= self.up_after_s * _MAX_UP_BACKOFF:
+                    # Un buen rato en el nivel completo: se olvidan las recaídas
+                    state.up_backoff = 1
+                    self._write(f, state)
+                return state.tier
+        except OSError as e:
+            logger.warning(f"[SHEDDING] No se pudo leer el nivel del host: {e}")
+            return 0
+
+    def _change(self, state: ShedState, old: int, new: int, now: float) -> None:
+        state.tier = new
+        state.changed_at = now
+        # Los procesos que no decidieron arrancan su propia cuenta desde el cambio
+        self._high_since = self._low_since = None
+        logger.warning(
+            f"[SHEDDING] Host: nivel {TIERS[old].name} -> {TIERS[new].name} - carga {self.load:.2f} "
+            f"(cpu={self.signals.cpu:.2f}, lag={self.signals.loop_lag_ms:.0f}ms, "
+            f"inferencia={self.signals.inference_ms:.1f}ms, espera para subir x{state.up_backoff})"
+        )
+
+
+class ShedTurnDetector:
+    """Envuelve el turn detector: en los niveles sin él, el fin de turno queda en manos del VAD"""
+
+    def __init__(self, model) -> None:
+        self._model = model
+        self.enabled = True
+        self.skipped = 0
+
+    @property
+    def model(self) -> str:
+        return self._model.model
+
+    @property
+    def provider(self) -> str:
+        return self._model.provider
+
+    async def unlikely_threshold(self, language: str | None) -> float | None:
+        if not self.enabled:
+            # Sin umbral la sesión nunca espera `max_endpointing_delay`
+            return None
+        return await self._model.unlikely_threshold(language)
+
+    async def supports_language(self, language: str | None) -> bool:
+        if not self.enabled:
+            return True
+        return await self._model.supports_language(language)
+
+    async def predict_end_of_turn(self, chat_ctx: llm.ChatContext, *, timeout: float | None = None) -> float:
+        if not self.enabled:
+            self.skipped += 1
+            return 1.0
+        return await self._model.predict_end_of_turn(chat_ctx, timeout=timeout)
+
+
+@lru_cache(maxsize=1)
+def live_noise_cancellation_supported() -> bool:
+    """Los internos de RoomIO que usa `SessionShedding._set_noise_cancellation` siguen como en livekit-agents 1.2"""
+
+    def _attrs(func) -> set[str]:
+        return set(re.findall(r"self\.(\w+)", inspect.getsource(func)))
+
+    try:
+        from livekit.agents.voice.room_io import RoomIO, _input
+
+        stream = _input._ParticipantAudioInputStream
+        supported = (
+            "_room_io" in _attrs(AgentSession.__init__)
+            and "_audio_input" in _attrs(RoomIO.__init__)
+            and "_noise_cancellation" in _attrs(stream.__init__)
+            # El filtro se lee al abrir el stream de cada pista
+            and "_noise_cancellation" in _attrs(stream._create_stream)
+            and {"_room", "_publication", "_participant_identity"} <= _attrs(_input._ParticipantInputStream.__init__)
+            and list(inspect.signature(stream._on_track_available).parameters)
+            == ["self", "track", "publication", "participant"]
+        )
+    except (AttributeError, ImportError, OSError, TypeError, ValueError):
+        supported = False
+    if not supported:
+        logger.warning(
+            "[SHEDDING] RoomIO cambió sus internos: las llamadas en curso conservan su cancelación de ruido"
+        )
+    return supported
+
+
+class SessionShedding:
+    """Aplica el nivel del host a una sesión: cancelación de ruido, turn detector y buffer del VAD"""
+
+    def __init__(self, room_name: str, *, controller: ShedController | None = None) -> None:
+        self.room_name = room_name
+        self.controller = controller or ShedController.instance()
+        # La sesión nueva arranca en el nivel actual del host
+        self.tier = self.controller.current()
+        self.turn_detector: ShedTurnDetector | None = None
+        self.changes = 0
+        self._vad_model: vad.VAD | None = None
+        self._session: AgentSession | None = None
+        self._profile: AudioProfile | None = None
+        self._user_speaking = False
+        self._pending_buffered_speech: float | None = None
+        self._tier_s: Counter[str] = Counter()
+        self._tier_since = time.monotonic()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def light_noise_cancellation(self) -> bool:
+        return TIERS[self.tier].light_noise_cancellation
+
+    def wrap_turn_detector(self, model):
+        """Envuelve un modelo de turn detector; los modos de texto ("stt", "vad", ...) quedan como están"""
+        if isinstance(model, str):
+            return model
+        self.turn_detector = ShedTurnDetector(model)
+        self.turn_detector.enabled = TIERS[self.tier].turn_detector
+        return self.turn_detector
+
+    def attach(self, session: AgentSession, vad_model: vad.VAD | None, profile: AudioProfile) -> None:
+        """Conecta el controlador a la sesión; la cancelación de ruido inicial la pone `room_input_options`"""
+        self._session = session
+        self._profile = profile
+        # Se comprueba al arrancar la sesión, no en el primer cambio de nivel con el host saturado
+        live_noise_cancellation_supported()
+
+        @session.on("user_state_changed")
+        def _on_user_state(ev: UserStateChangedEvent) -> None:
+            self.set_user_speaking(ev.new_state == "speaking")
+
+        @session.on("close")
+        def _on_close(ev: CloseEvent) -> None:
+            asyncio.create_task(self.aclose())
+
+        self.start(vad_model)
+
+    def start(self, vad_model: vad.VAD | None = None) -> None:
+        self._vad_model = vad_model
+        # El VAD es del proceso: la sesión anterior pudo dejarlo en otro nivel
+        self._set_buffered_speech(TIERS[self.tier].max_buffered_speech)
+        self._task = asyncio.create_task(self._run())
+
+    def set_user_speaking(self, speaking: bool) -> None:
+        self._user_speaking = speaking
+        if not speaking and self._pending_buffered_speech is not None:
+            self._set_buffered_speech(self._pending_buffered_speech)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(SHED_INTERVAL_S)
+            # La lectura de CPU y de los reportes toca disco: fuera del event loop
+            tier = await asyncio.to_thread(self.controller.step)
+            if tier != self.tier:
+                self.apply(tier)
+
+    def apply(self, tier: int) -> None:
+        old, new = TIERS[self.tier], TIERS[tier]
+        now = time.monotonic()
+        self._tier_s[old.name] += now - self._tier_since
+        self._tier_since = now
+        self.tier = tier
+        self.changes += 1
+        logger.info(f"[SHEDDING] Sala {self.room_name}: nivel {old.name} -> {new.name}")
+
+        if self.turn_detector is not None:
+            self.turn_detector.enabled = new.turn_detector
+        if new.max_buffered_speech != old.max_buffered_speech:
+            self._set_buffered_speech(new.max_buffered_speech)
+        if new.light_noise_cancellation != old.light_noise_cancellation and live_noise_cancellation_supported():
+            self._set_noise_cancellation(new.light_noise_cancellation)
+
+    def _set_buffered_speech(self, seconds: float) -> None:
+        if self._vad_model is None or not hasattr(self._vad_model, "update_options"):
+            return
+        if self._user_speaking:
+            # Silero redimensiona su buffer de voz: se espera a que el llamante termine de hablar
+            self._pending_buffered_speech = seconds
+            return
+        self._pending_buffered_speech = None
+        self._vad_model.update_options(max_buffered_speech=seconds)
+
+    def _set_noise_cancellation(self, light: bool) -> None:
+        """Reabre el AudioStream de la sala con el otro filtro (la API no permite cambiarlo en vivo)"""
+        room_io = getattr(self._session, "_room_io", None)
+        stream = getattr(room_io, "_audio_input", None)
+        if stream is None or self._profile is None:
+            return
+        try:
+            stream._noise_cancellation = noise_cancellation_options(self._profile, light=light)
+            publication = stream._publication
+            participant = stream._room.remote_participants.get(stream._participant_identity or "")
+            if publication is None or publication.track is None or participant is None:
+                # Todavía no hay audio del llamante: el filtro nuevo se usa al suscribirse
+                return
+            stream._publication = None
+            stream._on_track_available(publication.track, publication, participant)
+        except Exception as e:
+            logger.warning(f"[SHEDDING] No se pudo cambiar la cancelación de ruido: {e}")
+
+    def summary(self) -> dict[str, float]:
+        tier_s = self._tier_s.copy()
+        tier_s[TIERS[self.tier].name] += time.monotonic() - self._tier_since
+        return dict(tier_s)
+
+    async def aclose(self) -> None:
+        if self._task:
+            await utils.aio.cancel_and_wait(self._task)
+            self._task = None
+            tiers = ", ".join(f"{name}={seconds:.0f}s" for name, seconds in self.summary().items())
+            skipped = self.turn_detector.skipped if self.turn_detector else 0
+            logger.info(
+                f"[SHEDDING] Resumen sala {self.room_name} - cambios de nivel: {self.changes}, "
+                f"tiempo por nivel: {tiers}, turnos sin turn detector: {skipped}"
+            )
@@ -0,0 +1,158 @@
+"""Saludo pre-renderizado para llamadas salientes.
+
+En la rama saliente la sesión arranca antes de marcar y `create_sip_participant`
+bloquea hasta que el cliente contesta. `OutboundGreeting` aprovecha ese timbrado:
+
+- genera el saludo de recordatorio con el LLM de la sesión (con `name` y
+  `appointment_time`), lo que además abre su conexión; si el LLM no responde en
+  OUTBOUND_GREETING_TIMEOUT_S se usa la plantilla de las instrucciones
+- lo sintetiza con `tts.stream()`, la misma ruta (y conexión) que usa la sesión
+- reproduce el audio ya sintetizado en cuanto el participante SIP pasa a
+  `active`, sin esperar a que el cliente diga "aló"
+
+El STT de Deepgram ya abre su websocket al arrancar la sesión, antes de marcar.
+Se registra la latencia desde que el cliente contesta hasta el primer audio.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections.abc import AsyncIterator
+
+from livekit import rtc
+from livekit.agents import AgentSession, AgentStateChangedEvent, CloseEvent, llm, tts
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_PRERENDER = os.getenv("OUTBOUND_PRERENDER", "true").lower() == "true"
+OUTBOUND_GREETING_TIMEOUT_S = float(os.getenv("OUTBOUND_GREETING_TIMEOUT_S", "3"))
+# Si al contestar el audio aún no está listo, se espera esto antes de sintetizar en vivo
+OUTBOUND_GREETING_WAIT_S = float(os.getenv("OUTBOUND_GREETING_WAIT_S", "0.3"))
+
+SIP_CALL_STATUS = "sip.callStatus"
+
+
+def greeting_template(
+    name: str, appointment_time: str, assistant: str = "Alex", company: str = "AutoFuturo IA"
+) -> str:
+    return f"Hola {name}, te habla {assistant} de {company}. Te llamo para confirmar tu cita programada para {appointment_time}."
+
+
+class OutboundGreeting:
+    def __init__(self, session: AgentSession, *, instructions: str, text: str) -> None:
+        self.session = session
+        self.instructions = instructions
+        # Plantilla de respaldo si el LLM no responde a tiempo
+        self.text = text
+        self.frames: list[rtc.AudioFrame] | None = None
+        self._render_task: asyncio.Task | None = None
+        self._play_task: asyncio.Task | None = None
+        self._answered_at: float | None = None
+        self._first_audio_s: float | None = None
+
+    def start(self) -> None:
+        """Genera y sintetiza el saludo mientras suena el teléfono"""
+        self._render_task = asyncio.create_task(self._render(), name="outbound_greeting_render")
+
+        @self.session.on("agent_state_changed")
+        def _on_agent_state(ev: AgentStateChangedEvent) -> None:
+            if ev.new_state == "speaking" and self._answered_at is not None and self._first_audio_s is None:
+                self._first_audio_s = ev.created_at - self._answered_at
+                logger.info(
+                    f"[OUTBOUND] Contestó -> primer audio: {self._first_audio_s * 1000:.0f} ms "
+                    f"(pre-renderizado: {'sí' if self.frames else 'no'})"
+                )
+
+        @self.session.on("close")
+        def _on_close(ev: CloseEvent) -> None:
+            self.cancel()
+
+    def watch(self, room: rtc.Room, identity: str) -> None:
+        """Reproduce el saludo en cuanto el participante SIP pasa a `active` (contestó)"""
+
+        @room.on("participant_attributes_changed")
+        def _on_attributes(changed: dict[str, str], participant: rtc.Participant) -> None:
+            if participant.identity == identity and changed.get(SIP_CALL_STATUS) == "active":
+                self.play()
+
+    def play(self) -> None:
+        """Idempotente: lo llaman el cambio de estado SIP y el retorno de `create_sip_participant`"""
+        if self._play_task is not None:
+            return
+        self._answered_at = time.time()
+        self._play_task = asyncio.create_task(self._play(), name="outbound_greeting_play")
+
+    def cancel(self) -> None:
+        for task in (self._render_task, self._play_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+    async def _render(self) -> None:
+        started_at = time.perf_counter()
+        self.text = await self._generate_text()
+        text_s = time.perf_counter() - started_at
+        try:
+            self.frames = frames = await synthesize(self.session.tts, self.text)
+        except Exception as e:
+            logger.warning(f"[OUTBOUND] No se pudo pre-sintetizar el saludo: {e}")
+            return
+        logger.info(
+            f"[OUTBOUND] Saludo listo durante el timbrado: texto {text_s:.2f}s, "
+            f"audio {time.perf_counter() - started_at - text_s:.2f}s ({sum(f.duration for f in frames):.1f}s de voz)"
+        )
+
+    async def _generate_text(self) -> str:
+        chat_ctx = llm.ChatContext()
+        chat_ctx.add_message(role="system", content=self.instructions)
+        chat_ctx.add_message(
+            role="user",
+            content=(
+                "El cliente acaba de contestar. Di solo tu saludo personalizado de la llamada saliente, "
+                "en una o dos oraciones, sin hacer más preguntas."
+            ),
+        )
+
+        async def _generate() -> str:
+            parts = []
+            async with self.session.llm.chat(chat_ctx=chat_ctx) as stream:
+                async for chunk in stream:
+                    if chunk.delta and chunk.delta.content:
+                        parts.append(chunk.delta.content)
+            return "".join(parts).strip()
+
+        try:
+            return await asyncio.wait_for(_generate(), OUTBOUND_GREETING_TIMEOUT_S) or self.text
+        except Exception as e:
+            logger.warning(f"[OUTBOUND] Saludo con plantilla, el LLM no respondió: {e!r}")
+            return self.text
+
+    async def _play(self) -> None:
+        if self._render_task is not None:
+            await asyncio.wait({self._render_task}, timeout=OUTBOUND_GREETING_WAIT_S)
+
+        # Saludo sin interrupciones: el "aló" del cliente no lo corta ni genera otra respuesta
+        if self.frames:
+            self.session.say(self.text, audio=replay(self.frames), allow_interruptions=False)
+        else:
+            if self._render_task is not None:
+                self._render_task.cancel()
+            self.session.say(self.text, allow_interruptions=False)
+
+
+async def synthesize(engine: tts.TTS, text: str) -> list[rtc.AudioFrame]:
+    """Sintetiza por streaming (la misma conexión que usa la sesión) y devuelve los frames"""
+    frames = []
+    async with engine.stream() as stream:
+        stream.push_text(text)
+        stream.end_input()
+        async for ev in stream:
+            frames.append(ev.frame)
+    return frames
+
+
+async def replay(frames: list[rtc.AudioFrame]) -> AsyncIterator[rtc.AudioFrame]:
+    for frame in frames:
+        yield frame
@@ -0,0 +1,229 @@
+"""Cierre de la llamada por eventos y cola de trabajo post-llamada.
+
+El proceso de job queda ocupado hasta que terminan sus callbacks de cierre, así
+que todo lo que no necesita al llamante se hace después de colgar y con tiempo
+acotado:
+
+- Colgar: `end_call` pide la despedida y llama a `session.shutdown()`, que drena
+  la cola de locuciones (la despedida se reproduce completa) y al cerrar la
+  sesión elimina la sala (`delete_room_on_close`, salvo tras una transferencia
+  en caliente). Si el llamante cuelga primero, `close_on_caller_hangup`
+  cierra la sesión con cualquier motivo de desconexión (las desconexiones SIP no
+  siempre usan los motivos por defecto de livekit).
+- `PostCallQueue` acumula trabajos durante la llamada, los lanza en paralelo al
+  cerrarse la sesión y, como callback de cierre del job, espera como máximo
+  POST_CALL_GRACE_S; lo que no termina a tiempo se cancela y se registra.
+- Trabajos incluidos: volcado de la transcripción, reintento de los prospectos
+  que `guardar_prospecto` no pudo guardar durante la llamada (y envío de los que
+  `ToolCallCache` aún tenía en espera), métricas de uso y reporte de memoria de
+  la sesión.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict
+
+from livekit import agents, rtc
+from livekit.agents import AgentSession, CloseEvent, MetricsCollectedEvent, llm, mcp, metrics
+from livekit.agents.llm.tool_context import get_raw_function_info
+
+from session_memory import SessionMemory
+from tool_cache import ToolCallCache
+
+logger = logging.getLogger(__name__)
+
+# Tiempo máximo que el proceso espera al trabajo post-llamada antes de liberarse
+POST_CALL_GRACE_S = float(os.getenv("POST_CALL_GRACE_S", "10"))
+# Directorio de transcripciones y métricas por llamada. Llevan datos del cliente: solo se guardan
+# si se configura (vacío = no se guardan)
+CALL_RECORDS_DIR = os.getenv("CALL_RECORDS_DIR", "")
+PROSPECT_TOOL = "guardar_prospecto"
+
+PostCallJob = Callable[[], Awaitable[None]]
+
+
+class PostCallQueue:
+    def __init__(self, grace_s: float = POST_CALL_GRACE_S) -> None:
+        self.grace_s = grace_s
+        self._jobs: list[tuple[str, PostCallJob]] = []
+        self._tasks: dict[asyncio.Task, str] = {}
+        self._started = False
+
+    def submit(self, name: str, job: PostCallJob) -> None:
+        """Encola un trabajo; si la llamada ya terminó se lanza de inmediato"""
+        if self._started:
+            self._spawn(name, job)
+        else:
+            self._jobs.append((name, job))
+
+    def start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        for name, job in self._jobs:
+            self._spawn(name, job)
+        self._jobs.clear()
+
+    def _spawn(self, name: str, job: PostCallJob) -> None:
+        self._tasks[asyncio.create_task(job(), name=f"post_call_{name}")] = name
+
+    async def drain(self, reason: str = "") -> None:
+        """Espera el trabajo pendiente como máximo `grace_s` (callback de cierre del job)"""
+        self.start()
+        if not self._tasks:
+            return
+
+        started_at = time.perf_counter()
+        done, pending = await asyncio.wait(self._tasks, timeout=self.grace_s)
+        for task in pending:
+            task.cancel()
+            logger.warning(f"[POST_CALL] '{self._tasks[task]}' cancelado tras {self.grace_s:.1f}s de gracia")
+        for task in done:
+            if not task.cancelled() and task.exception():
+                logger.error(f"[POST_CALL] '{self._tasks[task]}' falló: {task.exception()}")
+
+        logger.info(
+            f"[POST_CALL] {len(done)}/{len(self._tasks)} trabajos terminados en "
+            f"{time.perf_counter() - started_at:.2f}s (motivo de cierre: {reason or 'n/a'})"
+        )
+        self._tasks.clear()
+
+
+def attach_post_call(ctx: agents.JobContext, session: AgentSession, queue: PostCallQueue) -> None:
+    """Lanza la cola al cerrarse la sesión y la drena como último paso del job"""
+
+    @session.on("close")
+    def _on_close(ev: CloseEvent) -> None:
+        logger.info(f"[POST_CALL] Sesión cerrada ({ev.reason}), iniciando trabajo post-llamada")
+        queue.start()
+
+    ctx.add_shutdown_callback(queue.drain)
+
+
+def delete_room_on_close(
+    ctx: agents.JobContext, session: AgentSession, keep_room: Callable[[], bool] = lambda: False
+) -> None:
+    """Elimina la sala al cerrarse la sesión (cuelga al llamante) salvo que `keep_room` diga lo contrario"""
+
+    @session.on("close")
+    def _on_close(ev: CloseEvent) -> None:
+        if keep_room():
+            logger.info("[POST_CALL] Sala conservada: el llamante sigue en la llamada")
+            return
+        ctx.delete_room()
+
+
+def close_on_caller_hangup(ctx: agents.JobContext, session: AgentSession, identity: str) -> None:
+    """Cierra la sesión en cuanto se desconecta el llamante, sin esperar a que la sala quede vacía"""
+    # Referencia a la tarea de cierre hasta que termine (el loop solo guarda referencias débiles)
+    closing: set[asyncio.Task] = set()
+
+    @ctx.room.on("participant_disconnected")
+    def _on_participant_disconnected(participant: rtc.RemoteParticipant) -> None:
+        if participant.identity != identity:
+            return
+        logger.info(f"[POST_CALL] El llamante {identity} se desconectó, cerrando la sesión")
+        task = asyncio.create_task(session.aclose())
+        closing.add(task)
+        task.add_done_callback(closing.discard)
+
+
+def record_path(room_name: str, kind: str) -> str:
+    """Archivo del registro `kind` (transcript, usage, memory, startup) de la llamada en CALL_RECORDS_DIR"""
+    return os.path.join(CALL_RECORDS_DIR, f"{room_name}.{kind}.json")
+
+
+def write_json(path: str, data: dict) -> None:
+    """Escritura atómica (archivo temporal y rename); bloquea: se llama con `asyncio.to_thread`"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def transcript_job(session: AgentSession, room_name: str) -> PostCallJob:
+    async def _flush() -> None:
+        if not CALL_RECORDS_DIR:
+            return
+        path = record_path(room_name, "transcript")
+        data = {"room": room_name, "history": session.history.to_dict(exclude_timestamp=False)}
+        await asyncio.to_thread(write_json, path, data)
+        logger.info(f"[POST_CALL] Transcripción guardada en {path}")
+
+    return _flush
+
+
+def failed_tool_calls(history: llm.ChatContext, name: str) -> list[llm.FunctionCall]:
+    """Llamadas a la herramienta sin una salida correcta (fallaron o se interrumpieron)"""
+    calls = [item for item in history.items if item.type == "function_call" and item.name == name]
+    ok = {
+        item.call_id for item in history.items
+        if item.type == "function_call_output" and not item.is_error
+    }
+    return [call for call in calls if call.call_id not in ok]
+
+
+def prospect_sync_job(
+    session: AgentSession, make_server: Callable[[], mcp.MCPServer] | None, cache: ToolCallCache | None = None
+) -> PostCallJob:
+    async def _sync() -> None:
+        pending = [
+            (PROSPECT_TOOL, json.loads(call.arguments or "{}"))
+            for call in failed_tool_calls(session.history, PROSPECT_TOOL)
+        ]
+        if cache is not None:
+            pending += await cache.aclose()
+        if not pending or make_server is None:
+            return
+
+        # El cliente MCP de la sesión ya está cerrado: se abre uno propio
+        server = make_server()
+        try:
+            await server.initialize()
+            tools = {get_raw_function_info(tool).name: tool for tool in await server.list_tools()}
+            for name, arguments in pending:
+                tool = tools.get(name)
+                if tool is None:
+                    logger.warning(f"[POST_CALL] El servidor MCP no expone {name}")
+                    continue
+                try:
+                    await tool(raw_arguments=arguments)
+                    logger.info(f"[POST_CALL] Prospecto sincronizado tras la llamada: {arguments}")
+                except Exception as e:
+                    logger.error(f"[POST_CALL] No se pudo sincronizar el prospecto {arguments}: {e}")
+        finally:
+            await server.aclose()
+
+    return _sync
+
+
+def usage_metrics_job(session: AgentSession, room_name: str) -> PostCallJob:
+    usage = metrics.UsageCollector()
+
+    @session.on("metrics_collected")
+    def _on_metrics(ev: MetricsCollectedEvent) -> None:
+        usage.collect(ev.metrics)
+
+    async def _report() -> None:
+        summary = usage.get_summary()
+        logger.info(f"[POST_CALL] Uso de la llamada: {summary}")
+        if CALL_RECORDS_DIR:
+            await asyncio.to_thread(write_json, record_path(room_name, "usage"), asdict(summary))
+
+    return _report
+
+
+def memory_report_job(memory: SessionMemory, room_name: str) -> PostCallJob:
+    async def _report() -> None:
+        report = memory.close()
+        if CALL_RECORDS_DIR:
+            await asyncio.to_thread(write_json, record_path(room_name, "memory"), report)
+
+    return _report
@@ -0,0 +1,176 @@
+"""Contabilidad de memoria por sesión.
+
+En workers de larga vida se ha visto subir la RSS. `SessionMemory` muestrea cada
+SESSION_MEMORY_INTERVAL_S lo que una sesión retiene y lo reporta al cerrarse:
+
+- audio: buffers de voz del VAD (Silero reserva `max_buffered_speech` segundos
+  por stream) y frames pendientes en las colas de entrada del STT y del VAD, que
+  crecen si un proveedor se atasca
+- contexto: mensajes, argumentos y salidas de herramientas del historial y del
+  contexto del agente (el agente guarda su propia copia)
+- cachés: las registradas con `track_cache` (audio pre-sintetizado del saludo,
+  del buzón y de las FAQ)
+- RSS del proceso al inicio, en el pico y al cierre
+
+El VAD y la caché de FAQ son del proceso: con un job por proceso equivalen a la
+sesión; con varias sesiones por proceso se reportan completos en cada una.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import resource
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass, field
+
+from livekit import rtc
+from livekit.agents import AgentSession, CloseEvent, llm
+
+logger = logging.getLogger(__name__)
+
+SESSION_MEMORY = os.getenv("SESSION_MEMORY", "true").lower() == "true"
+SESSION_MEMORY_INTERVAL_S = float(os.getenv("SESSION_MEMORY_INTERVAL_S", "30"))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def process_rss_mb() -> float:
+    """RSS actual (Linux: /proc/self/statm); fuera de Linux, el máximo del proceso"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 2**20
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def frames_nbytes(frames: Iterable[rtc.AudioFrame] | None) -> int:
+    return sum(len(frame.data) * 2 for frame in frames or [])
+
+
+def chat_ctx_nbytes(chat_ctx: llm.ChatContext) -> tuple[int, int]:
+    """Bytes de texto (UTF-8) del contexto: (total, de ellos salidas de herramientas)"""
+    total = tools = 0
+    for item in chat_ctx.items:
+        if item.type == "message":
+            size = len((item.text_content or "").encode())
+        elif item.type == "function_call":
+            size = len(item.arguments.encode())
+        elif item.type == "function_call_output":
+            size = len(item.output.encode())
+            tools += size
+        else:
+            size = 0
+        total += size
+    return total, tools
+
+
+def _pending_audio_nbytes(streams: Iterable) -> int:
+    pending = 0
+    for stream in list(streams):
+        queue = getattr(getattr(stream, "_input_ch", None), "_queue", ())
+        pending += sum(len(item.data) * 2 for item in list(queue) if isinstance(item, rtc.AudioFrame))
+    return pending
+
+
+@dataclass
+class MemorySample:
+    at_s: float
+    rss_mb: float
+    vad_buffer_kb: float
+    pending_audio_kb: float
+    chat_items: int
+    chat_kb: float
+    tool_output_kb: float
+    caches_kb: dict[str, float] = field(default_factory=dict)
+
+
+class SessionMemory:
+    def __init__(self, *, interval: float = SESSION_MEMORY_INTERVAL_S) -> None:
+        self.session: AgentSession | None = None
+        self.interval = interval
+        self.samples: list[MemorySample] = []
+        self.report: dict | None = None
+        self._caches: dict[str, Callable[[], int]] = {}
+        self._started_at = time.monotonic()
+        self._rss_start_mb = process_rss_mb()
+        self._task: asyncio.Task | None = None
+
+    def track_cache(self, name: str, nbytes: Callable[[], int]) -> None:
+        self._caches[name] = nbytes
+
+    def attach(self, session: AgentSession) -> None:
+        self.session = session
+
+        @session.on("close")
+        def _on_close(ev: CloseEvent) -> None:
+            self.close()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="session_memory")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.sample()
+
+    def sample(self) -> MemorySample:
+        assert self.session is not None, "SessionMemory sin sesión: llama a attach()"
+        vad = self.session.vad
+        vad_streams = list(getattr(vad, "_streams", ()))
+        stt_streams = list(getattr(self.session.stt, "_streams", ()))
+        chat_bytes, tool_bytes = chat_ctx_nbytes(self.session.history)
+        try:
+            agent_bytes, agent_tool_bytes = chat_ctx_nbytes(self.session.current_agent.chat_ctx)
+        except RuntimeError:
+            # Sin agente activo (antes de `start` o ya cerrada)
+            agent_bytes = agent_tool_bytes = 0
+
+        caches = {}
+        for name, nbytes in self._caches.items():
+            try:
+                caches[name] = nbytes() / 1024
+            except Exception as e:
+                logger.debug(f"[MEMORY] No se pudo medir la caché '{name}': {e}")
+
+        sample = MemorySample(
+            at_s=time.monotonic() - self._started_at,
+            rss_mb=process_rss_mb(),
+            vad_buffer_kb=sum(
+                s._speech_buffer.nbytes for s in vad_streams if getattr(s, "_speech_buffer", None) is not None
+            ) / 1024,
+            pending_audio_kb=_pending_audio_nbytes(vad_streams + stt_streams) / 1024,
+            chat_items=len(self.session.history.items),
+            chat_kb=(chat_bytes + agent_bytes) / 1024,
+            tool_output_kb=(tool_bytes + agent_tool_bytes) / 1024,
+            caches_kb=caches,
+        )
+        self.samples.append(sample)
+        return sample
+
+    def close(self) -> dict:
+        """Última muestra y reporte de la sesión (idempotente)"""
+        if self.report is not None:
+            return self.report
+        if self._task is not None:
+            self._task.cancel()
+        last = self.sample()
+        peak = max(self.samples, key=lambda s: s.rss_mb)
+        self.report = {
+            "duration_s": round(last.at_s, 1),
+            "rss_start_mb": round(self._rss_start_mb, 1),
+            "rss_peak_mb": round(peak.rss_mb, 1),
+            "rss_end_mb": round(last.rss_mb, 1),
+            "vad_buffer_peak_kb": round(max(s.vad_buffer_kb for s in self.samples), 1),
+            "pending_audio_peak_kb": round(max(s.pending_audio_kb for s in self.samples), 1),
+            "last": asdict(last),
+        }
+        logger.info(
+            f"[MEMORY] RSS {self._rss_start_mb:.0f} -> {last.rss_mb:.0f} MB (pico {peak.rss_mb:.0f}), "
+            f"VAD {last.vad_buffer_kb:.0f} KB, audio pendiente {last.pending_audio_kb:.0f} KB, "
+            f"contexto {last.chat_items} items / {last.chat_kb:.0f} KB (herramientas {last.tool_output_kb:.0f} KB), "
+            f"cachés {', '.join(f'{k}={v:.0f} KB' for k, v in last.caches_kb.items()) or 'n/a'}"
+        )
+        return self.report
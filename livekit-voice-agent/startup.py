@@ -0,0 +1,197 @@
+"""Arranque del job como grafo de pasos con dependencias explícitas.
+
+El entrypoint corría todo en serie: conectar a la sala, leer la metadata, crear
+el servidor MCP, crear la sesión, `session.start` (que recién ahí hacía el
+handshake MCP), esperar al participante y saludar. Muchos de esos pasos no se
+necesitan entre sí. `StartupPipeline` corre cada paso en cuanto terminan los que
+declara en STARTUP_STEPS:
+
+- en paralelo desde el dispatch: conexión a la sala, metadata, modelos (VAD del
+  prewarm), conexiones de STT/TTS y handshake MCP con su lista de herramientas
+- luego, según la rama: agente, participante (entrantes), sesión, inicio de la
+  sesión, marcado SIP (salientes) y saludo
+
+Cada paso registra su span (inicio y fin en ms desde el dispatch del job). Con
+el primer audio del agente se registra dispatch→saludo (en salientes incluye el
+timbrado, así que se reporta también dispatch→marcado) y la ruta crítica. El
+reporte va al log (`[STARTUP]`) y a CALL_RECORDS_DIR/<sala>.startup.json.
+
+STARTUP_PIPELINE=false corre los mismos pasos en serie, en el orden en que se
+declaran (el comportamiento anterior), para comparar con `evals/bench_startup.py`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import os
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from livekit.agents import AgentSession, AgentStateChangedEvent
+
+from post_call import CALL_RECORDS_DIR, record_path, write_json
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PIPELINE = os.getenv("STARTUP_PIPELINE", "true").lower() == "true"
+
+# Paso -> pasos que necesita. Una dependencia que no se declaró en este job (p. ej.
+# "participante" en una saliente) se ignora. Lo usan el entrypoint y evals/bench_startup.py.
+STARTUP_STEPS: dict[str, tuple[str, ...]] = {
+    "sala": (),
+    "metadata": (),
+    "modelos": (),
+    "proveedores": (),
+    "mcp": (),
+    "agente": ("metadata",),
+    "participante": ("sala",),
+    "sesion": ("metadata", "modelos", "participante"),
+    "inicio": ("sesion", "agente", "sala", "mcp"),
+    "marcado": ("inicio",),
+    "saludo": ("inicio", "participante"),
+}
+
+
+@dataclass
+class StepSpan:
+    name: str
+    after: tuple[str, ...]
+    start_ms: float | None = None
+    end_ms: float | None = None
+    error: str | None = None
+
+
+def job_dispatched_at(job) -> float | None:
+    """Instante (epoch, s) en que el servidor asignó el job; None si no viene en el job"""
+    started_at = getattr(getattr(job, "state", None), "started_at", 0) or 0
+    if started_at <= 0:
+        return None
+    # El servidor lo manda en ns; se aceptan también ms o s
+    for scale in (1e9, 1e3, 1.0):
+        if started_at / scale < 1e11:
+            dispatched_at = started_at / scale
+            break
+    # Relojes desfasados entre el servidor y el worker: se mide desde el entrypoint
+    if not 0 <= time.time() - dispatched_at < 60:
+        return None
+    return dispatched_at
+
+
+class StartupPipeline:
+    """Corre los pasos del arranque en cuanto están listas sus dependencias y mide cada uno"""
+
+    def __init__(
+        self,
+        room_name: str,
+        *,
+        dispatched_at: float | None = None,
+        parallel: bool = STARTUP_PIPELINE,
+        steps: dict[str, tuple[str, ...]] = STARTUP_STEPS,
+    ) -> None:
+        self.room_name = room_name
+        self.parallel = parallel
+        self._graph = steps
+        # Sin hora de dispatch se mide desde la creación del pipeline (el inicio del entrypoint)
+        self.dispatched_at = dispatched_at or time.time()
+        self._t0 = time.perf_counter() - (time.time() - self.dispatched_at)
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._last: str | None = None
+        self.spans: dict[str, StepSpan] = {}
+        self.milestones: dict[str, float] = {}
+
+    def _now_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000
+
+    def step(self, name: str, fn: Callable[[], Any]) -> asyncio.Task:
+        """Programa `fn` (función o corrutina, sin argumentos) tras las dependencias de `name`"""
+        after = tuple(dep for dep in self._graph[name] if dep in self._tasks)
+        if not self.parallel and self._last is not None and self._last not in after:
+            # En serie cada paso espera además al declarado antes
+            after += (self._last,)
+        span = self.spans[name] = StepSpan(name, after)
+        waits = [self._tasks[dep] for dep in after]
+
+        async def _run() -> Any:
+            if waits:
+                await asyncio.gather(*waits)
+            span.start_ms = self._now_ms()
+            try:
+                result = fn()
+                if inspect.isawaitable(result):
+                    result = await result
+                return result
+            except BaseException as e:
+                span.error = repr(e)
+                raise
+            finally:
+                span.end_ms = self._now_ms()
+
+        task = asyncio.create_task(_run(), name=f"startup_{name}")
+        # Un paso fallido se reporta a quien espera su resultado, no como excepción huérfana
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._tasks[name] = task
+        self._last = name
+        return task
+
+    async def result(self, name: str) -> Any:
+        return await self._tasks[name]
+
+    def mark(self, name: str) -> float:
+        """Hito del arranque (ms desde el dispatch); solo cuenta la primera vez"""
+        if name not in self.milestones:
+            self.milestones[name] = self._now_ms()
+        return self.milestones[name]
+
+    def watch_greeting(self, session: AgentSession) -> None:
+        """Registra dispatch→saludo con el primer audio del agente y reporta el arranque"""
+
+        @session.on("agent_state_changed")
+        def _on_agent_state(ev: AgentStateChangedEvent) -> None:
+            if ev.new_state == "speaking" and "saludo" not in self.milestones:
+                self.mark("saludo")
+                self.report()
+
+    def critical_path(self) -> list[str]:
+        """Pasos que marcaron el ritmo: desde el último en terminar, la dependencia más tardía"""
+        done = [s for s in self.spans.values() if s.end_ms is not None]
+        if not done:
+            return []
+        span = max(done, key=lambda s: s.end_ms)
+        path = [span.name]
+        while True:
+            deps = [self.spans[d] for d in span.after if self.spans[d].end_ms is not None]
+            if not deps:
+                break
+            span = max(deps, key=lambda s: s.end_ms)
+            path.append(span.name)
+        return path[::-1]
+
+    def summary(self) -> dict:
+        return {
+            "room": self.room_name,
+            "parallel": self.parallel,
+            "milestones_ms": self.milestones,
+            "critical_path": self.critical_path(),
+            "steps": [asdict(span) for span in self.spans.values()],
+        }
+
+    def report(self) -> None:
+        steps = ", ".join(
+            f"{s.name} {s.start_ms:.0f}-{s.end_ms:.0f}" + (" (error)" if s.error else "")
+            for s in self.spans.values()
+            if s.start_ms is not None and s.end_ms is not None
+        )
+        milestones = ", ".join(f"dispatch→{name} {ms:.0f} ms" for name, ms in self.milestones.items())
+        logger.info(
+            f"[STARTUP] {milestones} ({'en paralelo' if self.parallel else 'en serie'}) - "
+            f"ruta crítica: {' → '.join(self.critical_path())}; pasos (ms): {steps}"
+        )
+        if CALL_RECORDS_DIR:
+            task = asyncio.create_task(
+                asyncio.to_thread(write_json, record_path(self.room_name, "startup"), self.summary())
+            )
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
@@ -0,0 +1,16 @@
+-- Base de conocimiento: fragmentos con su embedding.
+-- vector(1536) = EMBEDDING_DIMENSIONS de text-embedding-3-small; si se cambia el
+-- modelo o las dimensiones, hay que re-generar los embeddings y migrar la columna.
+create extension if not exists vector;
+
+create table if not exists documents (
+  id bigserial primary key,
+  content text,
+  metadata jsonb not null default '{}',
+  embedding vector(1536)
+);
+
+-- Instalaciones creadas con el SQL del README (metadata sin valor por defecto)
+update documents set metadata = '{}' where metadata is null;
+alter table documents alter column metadata set default '{}';
+alter table documents alter column metadata set not null;
@@ -0,0 +1,10 @@
+-- Categoría de cada fragmento, tomada de metadata->>'category':
+-- 'financiamiento', 'inventario', 'sucursales' o 'garantia'.
+-- Columna generada para filtrar con un índice btree antes de ordenar por similitud.
+alter table documents
+  add column if not exists category text generated always as (metadata ->> 'category') stored;
+
+create index if not exists documents_category_idx on documents (category);
+
+-- Filtros por concesionaria u otros campos de metadata (metadata @> filter)
+create index if not exists documents_metadata_idx on documents using gin (metadata jsonb_path_ops);
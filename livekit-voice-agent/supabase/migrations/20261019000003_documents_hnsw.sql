@@ -0,0 +1,13 @@
+-- Índice HNSW por distancia coseno (la que usa match_documents).
+-- HNSW sobre `vector` admite hasta 2000 dimensiones: 1536 entra directo. Con 3072
+-- (text-embedding-3-large) hay que indexar `(embedding::halfvec(3072)) halfvec_cosine_ops`.
+-- m = 16 (el valor por defecto) con ef_construction = 128 (el doble): la base de
+-- una concesionaria son miles de fragmentos y construir con más candidatos es
+-- barato a ese tamaño. evals/bench_pgvector.py compara m, ef_construction y
+-- ef_search por tamaño de corpus antes de cambiarlos.
+set maintenance_work_mem = '512MB';
+
+create index if not exists documents_embedding_hnsw_idx on documents
+  using hnsw (embedding vector_cosine_ops) with (m = 16, ef_construction = 128);
+
+analyze documents;
@@ -0,0 +1,30 @@
+-- match_documents con filtro por categoría y búsqueda HNSW.
+-- - `filter` (metadata @> filter) y `categories` se aplican dentro del recorrido del
+--   índice: con hnsw.iterative_scan (pgvector >= 0.8) el índice sigue buscando hasta
+--   completar match_count filas que pasen el filtro, en vez de devolver menos.
+-- - relaxed_order puede devolver candidatos algo desordenados: se reordenan al final.
+-- - ef_search se ajusta por función: alter function match_documents set hnsw.ef_search = N.
+drop function if exists match_documents(vector, int, jsonb);
+
+create or replace function match_documents (
+  query_embedding vector(1536),
+  match_count int default null,
+  filter jsonb default '{}',
+  categories text[] default null
+) returns table (id bigint, content text, metadata jsonb, category text, similarity float)
+language sql stable
+set hnsw.ef_search = 64
+set hnsw.iterative_scan = relaxed_order
+as $$
+  with candidates as materialized (
+    select d.id, d.content, d.metadata, d.category, d.embedding <=> query_embedding as distance
+    from documents d
+    where d.metadata @> filter
+      and (categories is null or d.category = any (categories))
+    order by d.embedding <=> query_embedding
+    limit match_count
+  )
+  select c.id, c.content, c.metadata, c.category, 1 - c.distance as similarity
+  from candidates c
+  order by c.distance;
+$$;
@@ -0,0 +1,182 @@
+"""Concesionarias (tenants) atendidas por un mismo pool de procesos.
+
+Un despliegue por concesionaria repetía procesos precalentados, modelos (VAD,
+turn detector) y pools de conexiones que cada proceso ya tiene listos. Ahora hay
+un solo worker y cada job resuelve su concesionaria al empezar:
+
+1. de la metadata del dispatch: `{"tenant": "motorsur", ...}` (regla de despacho
+   entrante o metadata de la llamada saliente)
+2. si no viene, por el prefijo de la sala (`room_prefix`, el `roomPrefix` de su
+   regla de despacho SIP)
+3. si tampoco, la concesionaria por defecto (DEFAULT_TENANT)
+
+Cada concesionaria define en TENANTS_FILE su persona (asistente, empresa, web y
+notas para el prompt), voz, base de conocimiento (función RPC y filtro de
+Supabase), servidor MCP, FAQ, troncal saliente, número de transferencia y
+horario de atención para las citas. Sin
+TENANTS_FILE hay una sola, armada con las variables de entorno de siempre.
+
+Compartido por el proceso: modelos, clientes de OpenAI y Supabase, pools de
+conexiones de streaming y salud de los proveedores. Aislamiento:
+
+- un id de concesionaria desconocido no cae en la de por defecto: el job se rechaza
+- el filtro y la función de la base de conocimiento salen de la configuración,
+  nunca de los argumentos del LLM
+- FAQ, audio de FAQ en caché y pools de TTS van separados por concesionaria o voz
+- cada concesionaria del archivo debe definir su voz en cada proveedor de
+  TTS_PROVIDERS: con el valor por defecto, al caer al proveedor de respaldo
+  hablaría con la voz de AutoFuturo
+- el token MCP se lee de la variable que nombra cada concesionaria; sin ella no hay MCP
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+
+from faq import FAQ_FILE
+from tts_router import TTS_PROVIDERS
+
+logger = logging.getLogger(__name__)
+
+TENANTS_FILE = os.getenv("TENANTS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tenants.json"))
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "autofuturo")
+
+# Campo con la voz de la concesionaria en cada proveedor de TTS
+_VOICE_FIELDS = {"elevenlabs": "voice_id", "cartesia": "cartesia_voice"}
+
+_CLI_TENANT = re.compile(r'tenant["\']?\s*:\s*["\']?([\w-]+)')
+
+
+class UnknownTenantError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Tenant:
+    id: str
+    company: str = "AutoFuturo IA"
+    assistant_name: str = "Alex"
+    # Web dictada (nunca se leen URLs)
+    website: str = "autofuturo punto com"
+    # Sucursales, marcas, promociones: se agregan al prompt
+    prompt_notes: str = ""
+    voice_id: str = "b2htR0pMe28pYwCY9gnP"
+    cartesia_voice: str = "5c5ad5e7-1020-476b-8b91-fdcbe9cc313c"
+    # Base de conocimiento: función de búsqueda vectorial y filtro sobre `metadata`
+    kb_function: str = "match_documents"
+    kb_filter: dict = field(default_factory=dict)
+    mcp_server: str | None = None
+    # Nombre de la variable de entorno con el token (los secretos no van en el archivo)
+    mcp_token_env: str | None = None
+    faq_file: str | None = None
+    outbound_trunk_id: str | None = None
+    transfer_to: str | None = None
+    room_prefix: str | None = None
+    # Horario de atención para las pruebas de manejo y duración de cada cita (availability.py)
+    business_hours: dict = field(default_factory=lambda: {"lun-vie": "09:00-18:00", "sab": "09:00-13:00"})
+    slot_minutes: int = 60
+
+    @property
+    def voices(self) -> dict[str, str]:
+        """Voz por proveedor, en el orden de TTS_PROVIDERS"""
+        return {p: getattr(self, _VOICE_FIELDS[p]) for p in TTS_PROVIDERS if p in _VOICE_FIELDS}
+
+    @property
+    def mcp_token(self) -> str | None:
+        return os.getenv(self.mcp_token_env) if self.mcp_token_env else None
+
+    @classmethod
+    def from_dict(cls, data: dict, base_dir: str = "") -> Tenant:
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"campos desconocidos en la concesionaria {data.get('id')!r}: {sorted(unknown)}")
+        data = dict(data)
+        if data.get("faq_file"):
+            data["faq_file"] = os.path.join(base_dir, data["faq_file"])
+        return cls(**data)
+
+
+def default_tenant() -> Tenant:
+    """La concesionaria de un despliegue sin TENANTS_FILE, con la configuración por entorno"""
+    return Tenant(
+        id=DEFAULT_TENANT,
+        mcp_server=os.getenv("MCP_SERVER"),
+        mcp_token_env="MCP_TOKEN",
+        faq_file=FAQ_FILE or None,
+        outbound_trunk_id=os.getenv("SIP_OUTBOUND_TRUNK_ID"),
+        transfer_to=os.getenv("TRANSFER_TO"),
+    )
+
+
+@lru_cache(maxsize=1)
+def load_tenants(path: str = TENANTS_FILE) -> dict[str, Tenant]:
+    if not os.path.exists(path):
+        return {DEFAULT_TENANT: default_tenant()}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    tenants = {}
+    for entry in data["tenants"]:
+        _check_voices(entry)
+        tenant = Tenant.from_dict(entry, base_dir)
+        if tenant.id in tenants:
+            raise ValueError(f"concesionaria duplicada: {tenant.id}")
+        tenants[tenant.id] = tenant
+    _check_kb_isolation(tenants.values())
+    logger.info(f"[TENANT] {len(tenants)} concesionarias cargadas de {path}")
+    return tenants
+
+
+def _check_voices(entry: dict) -> None:
+    """Cada proveedor de TTS_PROVIDERS necesita una voz propia (la de por defecto es la de AutoFuturo)"""
+    missing = [_VOICE_FIELDS[p] for p in TTS_PROVIDERS if p in _VOICE_FIELDS and not entry.get(_VOICE_FIELDS[p])]
+    if missing:
+        raise ValueError(
+            f"la concesionaria {entry.get('id')!r} no define {missing} (TTS_PROVIDERS={','.join(TTS_PROVIDERS)})"
+        )
+
+
+def _check_kb_isolation(tenants) -> None:
+    """Concesionarias que comparten función (tabla) deben separarse con filtros distintos y no vacíos"""
+    by_function: dict[str, list[Tenant]] = {}
+    for tenant in tenants:
+        by_function.setdefault(tenant.kb_function, []).append(tenant)
+    for function, sharing in by_function.items():
+        if len(sharing) < 2:
+            continue
+        filters = [json.dumps(t.kb_filter, sort_keys=True) for t in sharing]
+        if not all(t.kb_filter for t in sharing) or len(set(filters)) < len(filters):
+            raise ValueError(
+                f"{', '.join(t.id for t in sharing)} comparten {function}: cada una necesita su propio kb_filter"
+            )
+
+
+def tenant_id_from_metadata(metadata: str | None) -> str | None:
+    """Id de la metadata del job, en JSON o en el formato sin comillas del CLI"""
+    if not metadata:
+        return None
+    try:
+        data = json.loads(metadata)
+    except json.JSONDecodeError:
+        match = _CLI_TENANT.search(metadata)
+        return match.group(1) if match else None
+    return data.get("tenant") if isinstance(data, dict) else None
+
+
+def resolve_tenant(metadata: str | None, room_name: str) -> Tenant:
+    tenants = load_tenants()
+    tenant_id = tenant_id_from_metadata(metadata)
+    if tenant_id is None:
+        # El prefijo más largo gana (p. ej. "call-sur-" frente a "call-")
+        prefixed = [t for t in tenants.values() if t.room_prefix and room_name.startswith(t.room_prefix)]
+        tenant_id = max(prefixed, key=lambda t: len(t.room_prefix)).id if prefixed else DEFAULT_TENANT
+    tenant = tenants.get(tenant_id)
+    if tenant is None:
+        raise UnknownTenantError(f"concesionaria desconocida: {tenant_id!r}")
+    return tenant
@@ -0,0 +1,385 @@
+"""Segmentación en streaming del texto del LLM hacia el TTS.
+
+El tiempo hasta el primer audio depende de cuándo llega al TTS el primer trozo
+sintetizable. `SpeechSegmenter` es un `SentenceTokenizer` de livekit que se pasa
+a ElevenLabs: corta temprano la primera cláusula (en puntuación o conectores
+del español) y después envía trozos más grandes, hasta fin de oración. Cada
+trozo se normaliza para voz al emitirse (números, fechas, horas, precios y
+porcentajes), así que la normalización también es incremental.
+
+`SegmenterStats` registra la longitud del primer trozo y el tiempo hasta el
+primer audio (TTFB del TTS) de cada respuesta; `attach_speech_metrics` resume la
+distribución al cerrar la sesión.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import statistics
+import time
+from dataclasses import dataclass, field
+
+from livekit.agents import AgentSession, CloseEvent, MetricsCollectedEvent, metrics, tokenize, utils
+from livekit.agents.tokenize.tokenizer import TokenData
+
+logger = logging.getLogger(__name__)
+
+CURRENCY_NAME = os.getenv("CURRENCY_NAME", "dólares")
+
+# Primer trozo: corto, cortado en la primera cláusula disponible
+FIRST_CHUNK_MIN_CHARS = int(os.getenv("FIRST_CHUNK_MIN_CHARS", "12"))
+FIRST_CHUNK_MAX_CHARS = int(os.getenv("FIRST_CHUNK_MAX_CHARS", "60"))
+# Trozos siguientes: oraciones completas agrupadas hasta este tamaño
+CHUNK_MIN_CHARS = int(os.getenv("CHUNK_MIN_CHARS", "60"))
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "220"))
+
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”»)]*\s")
+# Antes del conector (no después): el conector abre el trozo siguiente, como en la prosodia hablada
+_CLAUSE_END = re.compile(r"[,;:]\s|\s(?=(?:y|o|pero|porque|aunque|entonces|así que)\s)")
+_ABBREVIATIONS = ("sr.", "sra.", "srta.", "dr.", "dra.", "av.", "etc.", "aprox.", "no.", "nro.")
+
+
+# --- Normalización para voz ---------------------------------------------------------------
+
+_UNITS = [
+    "cero", "uno", "dos", "tres", "cuatro", "cinco", "seis", "siete", "ocho", "nueve",
+    "diez", "once", "doce", "trece", "catorce", "quince", "dieciséis", "diecisiete",
+    "dieciocho", "diecinueve", "veinte", "veintiuno", "veintidós", "veintitrés",
+    "veinticuatro", "veinticinco", "veintiséis", "veintisiete", "veintiocho", "veintinueve",
+]
+_TENS = ["", "", "", "treinta", "cuarenta", "cincuenta", "sesenta", "setenta", "ochenta", "noventa"]
+_HUNDREDS = [
+    "", "ciento", "doscientos", "trescientos", "cuatrocientos", "quinientos",
+    "seiscientos", "setecientos", "ochocientos", "novecientos",
+]
+_MONTHS = [
+    "enero", "febrero", "marzo", "abril", "mayo", "junio",
+    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre",
+]
+
+
+def _below_thousand(n: int) -> str:
+    if n == 100:
+        return "cien"
+    hundreds, rest = divmod(n, 100)
+    words = [_HUNDREDS[hundreds]] if hundreds else []
+    if rest < 30:
+        if rest or not hundreds:
+            words.append(_UNITS[rest])
+    else:
+        tens, units = divmod(rest, 10)
+        words.append(_TENS[tens] + (f" y {_UNITS[units]}" if units else ""))
+    return " ".join(words)
+
+
+def _apocope(words: str) -> str:
+    """'uno' pierde la vocal delante de un sustantivo: veintiún mil, un millón, un dólar"""
+    if words.endswith("veintiuno"):
+        return words[: -len("veintiuno")] + "veintiún"
+    if words.endswith("uno"):
+        return words[:-1]
+    return words
+
+
+def _feminine(words: str) -> str:
+    """'uno' concuerda con un sustantivo femenino: una cuota, veintiuna semanas"""
+    return words[:-1] + "a" if words.endswith("uno") else words
+
+
+def number_to_words(n: int, *, before_noun: bool = False) -> str:
+    """Número entero en palabras (español)"""
+    if n < 0:
+        return "menos " + number_to_words(-n, before_noun=before_noun)
+    if n < 1000:
+        words = _below_thousand(n)
+    elif n < 1_000_000:
+        thousands, rest = divmod(n, 1000)
+        words = "mil" if thousands == 1 else f"{_apocope(_below_thousand(thousands))} mil"
+        if rest:
+            words += " " + _below_thousand(rest)
+    else:
+        millions, rest = divmod(n, 1_000_000)
+        words = "un millón" if millions == 1 else f"{_apocope(number_to_words(millions))} millones"
+        if rest:
+            words += " " + number_to_words(rest)
+    return _apocope(words) if before_noun else words
+
+
+def _parse_amount(text: str) -> tuple[int, int | None]:
+    """'15,000' / '15.000' / '1,500.50' / '3,5' -> (entero, decimales)"""
+    match = re.fullmatch(r"(\d{1,3}(?:[.,]\d{3})+|\d+)(?:[.,](\d{1,2}))?", text)
+    if not match:
+        return int(re.sub(r"\D", "", text) or 0), None
+    integer = int(re.sub(r"[.,]", "", match.group(1)))
+    return integer, int(match.group(2)) if match.group(2) else None
+
+
+# Palabras tras un número que no son el sustantivo que cuenta: "son 21 y ..." sigue siendo "veintiuno"
+_NOT_NOUNS = {
+    "a", "al", "como", "con", "de", "del", "desde", "e", "en", "entre", "es", "hasta", "menos", "más", "ni",
+    "no", "o", "para", "pero", "por", "que", "se", "si", "son", "u", "y",
+}
+# Terminaciones de sustantivos femeninos, con sus excepciones y otros femeninos frecuentes en las llamadas
+_FEMININE_ENDINGS = ("a", "as", "ción", "ciones", "sión", "siones", "dad", "dades", "tud", "tudes")
+_MASCULINE_IN_A = {"día", "días", "mapa", "mapas", "problema", "problemas", "programa", "programas", "sistema", "sistemas"}
+_FEMININE = {"sucursal", "sucursales", "llave", "llaves", "noche", "noches", "tarde", "tardes", "vez", "veces"}
+
+
+def _say_count(m: re.Match) -> str:
+    """Número suelto; si cuenta un sustantivo, 'uno' se apocopa o concuerda: veintiún años, una cuota"""
+    words = _say_amount(m.group(0))
+    noun = re.match(r"\s+([a-záéíóúñ]+)", m.string[m.end():], flags=re.IGNORECASE)
+    if not noun or not words.endswith("uno") or noun.group(1).lower() in _NOT_NOUNS:
+        return words
+    noun = noun.group(1).lower()
+    if noun in _FEMININE or (noun.endswith(_FEMININE_ENDINGS) and noun not in _MASCULINE_IN_A):
+        return _feminine(words)
+    return _apocope(words)
+
+
+def _say_digits(m: re.Match) -> str:
+    """Teléfonos y códigos: dígito por dígito, con una pausa entre grupos"""
+    groups = re.findall(r"\d+", m.group(0))
+    spoken = ", ".join(" ".join(_UNITS[int(d)] for d in group) for group in groups)
+    return ("más " if m.group(0).startswith("+") else "") + spoken
+
+
+def _say_amount(text: str, noun: str = "") -> str:
+    integer, decimals = _parse_amount(text)
+    words = number_to_words(integer, before_noun=bool(noun))
+    if noun:
+        words += f" {noun}"
+        if decimals:
+            words += f" con {number_to_words(decimals)} centavos"
+    elif decimals is not None:
+        words += f" coma {number_to_words(decimals)}"
+    return words
+
+
+def say_time(hour: int, minute: int, period: str | None) -> str:
+    if period:
+        p = period.lower().replace(".", "")
+        if p == "pm" and hour < 12:
+            hour += 12
+        elif p == "am" and hour == 12:
+            hour = 0
+    spoken_hour = hour % 12 or 12
+    words = "una" if spoken_hour == 1 else number_to_words(spoken_hour)
+    if minute == 30:
+        words += " y media"
+    elif minute == 15:
+        words += " y cuarto"
+    elif minute:
+        words += f" y {number_to_words(minute)}"
+    if period or hour > 12:
+        words += " de la mañana" if hour < 12 else " de la tarde" if hour < 19 else " de la noche"
+    return words
+
+
+def _sentence_dot(m: re.Match) -> str:
+    """Conserva el punto final de 'p.m.' cuando también cierra la oración"""
+    if not m.group(0).endswith("."):
+        return ""
+    return "." if re.match(r"\s*(?:$|[A-ZÁÉÍÓÚÑ¿¡])", m.string[m.end():]) else ""
+
+
+_NUMBER = r"\d{1,3}(?:[.,]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?"
+
+
+def normalize_for_speech(text: str) -> str:
+    """Convierte números, fechas, horas, precios y porcentajes a palabras; los teléfonos, dígito por dígito"""
+    # Fechas: 15/10/2025 y 2025-10-15
+    text = re.sub(
+        r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b",
+        lambda m: f"{number_to_words(int(m.group(1)))} de {_MONTHS[int(m.group(2)) - 1]} de {number_to_words(int(m.group(3)))}"
+        if 1 <= int(m.group(2)) <= 12 else m.group(0),
+        text,
+    )
+    text = re.sub(
+        r"\b(\d{4})-(\d{2})-(\d{2})\b",
+        lambda m: f"{number_to_words(int(m.group(3)))} de {_MONTHS[int(m.group(2)) - 1]} de {number_to_words(int(m.group(1)))}"
+        if 1 <= int(m.group(2)) <= 12 else m.group(0),
+        text,
+    )
+    # Día y mes: 24/10
+    text = re.sub(
+        r"(?<![\d/])(\d{1,2})/(\d{1,2})(?![\d/])",
+        lambda m: f"{number_to_words(int(m.group(1)))} de {_MONTHS[int(m.group(2)) - 1]}"
+        if 1 <= int(m.group(1)) <= 31 and 1 <= int(m.group(2)) <= 12 else m.group(0),
+        text,
+    )
+    # Horas: 10:30, 3:00 PM, 10 AM
+    text = re.sub(
+        r"\b(\d{1,2}):(\d{2})\s*([ap]\.?m\.?)?(?!\w)",
+        lambda m: say_time(int(m.group(1)), int(m.group(2)), m.group(3)) + _sentence_dot(m),
+        text,
+        flags=re.IGNORECASE,
+    )
+    text = re.sub(
+        r"\b(\d{1,2})\s*([ap]\.?m\.?)(?!\w)",
+        lambda m: say_time(int(m.group(1)), 0, m.group(2)) + _sentence_dot(m),
+        text,
+        flags=re.IGNORECASE,
+    )
+    # Teléfonos: +51 987 654 321, 987-654-321, 987654321 (7 dígitos o más, o grupos tras '+')
+    text = re.sub(
+        r"\+\s?\d+(?:[\s-]\d+)*|(?<![\w$/.,])\d(?:[\s-]?\d){6,}(?![\w/]|[.,]\d)",
+        _say_digits,
+        text,
+    )
+    # Precios: $15,000 / USD 15.000 / S/ 1500
+    text = re.sub(rf"(?:US\$|\$|USD\s?)\s?({_NUMBER})", lambda m: _say_amount(m.group(1), CURRENCY_NAME), text)
+    text = re.sub(rf"S/\.?\s?({_NUMBER})", lambda m: _say_amount(m.group(1), "soles"), text)
+    # Porcentajes: 3.5% / 12 %
+    text = re.sub(rf"({_NUMBER})\s?%", lambda m: f"{_say_amount(m.group(1))} por ciento", text)
+    # Resto de números
+    text = re.sub(rf"(?<![\w/])(?:{_NUMBER})(?![\w/])", _say_count, text)
+    return text
+
+
+# --- Segmentador en streaming -------------------------------------------------------------
+
+
+@dataclass
+class SegmenterStats:
+    first_chunk_chars: list[int] = field(default_factory=list)
+    first_chunk_delay: list[float] = field(default_factory=list)
+    ttfa: list[float] = field(default_factory=list)
+
+
+def _find_cut(text: str, pattern: re.Pattern, min_chars: int) -> int:
+    """Índice tras el primer límite de `pattern` a partir de `min_chars` (o -1)"""
+    for match in pattern.finditer(text):
+        end = match.end()
+        if end < min_chars:
+            continue
+        before = text[: match.start() + 1].lower()
+        if pattern is _SENTENCE_END and before.endswith(_ABBREVIATIONS):
+            continue
+        return end
+    return -1
+
+
+class _Chunker:
+    """Lógica de corte sin estado de canal: recibe texto y devuelve trozos listos para voz"""
+
+    def __init__(self) -> None:
+        self._buf = ""
+        self.first_chunk_sent = False
+
+    def push(self, text: str) -> list[str]:
+        self._buf += text
+        chunks = []
+        while (cut := self._next_cut()) >= 0:
+            chunks.append(self._buf[:cut])
+            self._buf = self._buf[cut:]
+            self.first_chunk_sent = True
+        return [c for c in (normalize_for_speech(c.strip()) for c in chunks) if c]
+
+    def flush(self) -> list[str]:
+        chunk = normalize_for_speech(self._buf.strip())
+        self._buf = ""
+        self.first_chunk_sent = False
+        return [chunk] if chunk else []
+
+    def _next_cut(self) -> int:
+        if not self.first_chunk_sent:
+            # Primer trozo: fin de oración o cláusula lo antes posible
+            cut = _find_cut(self._buf, _SENTENCE_END, FIRST_CHUNK_MIN_CHARS)
+            clause = _find_cut(self._buf, _CLAUSE_END, FIRST_CHUNK_MIN_CHARS)
+            if clause >= 0 and (cut < 0 or clause < cut):
+                cut = clause
+            if (cut < 0 or cut > FIRST_CHUNK_MAX_CHARS) and len(self._buf) > FIRST_CHUNK_MAX_CHARS:
+                cut = self._buf.rfind(" ", 0, FIRST_CHUNK_MAX_CHARS) + 1 or -1
+            return cut
+
+        # Trozos siguientes: oraciones completas de tamaño razonable
+        cut = _find_cut(self._buf, _SENTENCE_END, CHUNK_MIN_CHARS)
+        if (cut < 0 or cut > CHUNK_MAX_CHARS) and len(self._buf) > CHUNK_MAX_CHARS:
+            cut = _find_cut(self._buf[:CHUNK_MAX_CHARS], _CLAUSE_END, CHUNK_MIN_CHARS)
+            if cut < 0:
+                cut = self._buf.rfind(" ", 0, CHUNK_MAX_CHARS) + 1 or -1
+        return cut
+
+
+class SpeechSegmentStream(tokenize.SentenceStream):
+    def __init__(self, stats: SegmenterStats) -> None:
+        super().__init__()
+        self._stats = stats
+        self._chunker = _Chunker()
+        self._segment_id = utils.shortuuid()
+        self._started_at: float | None = None
+        self._first_emitted = False
+
+    def push_text(self, text: str) -> None:
+        self._check_not_closed()
+        if self._started_at is None and text:
+            self._started_at = time.perf_counter()
+        for chunk in self._chunker.push(text):
+            self._emit(chunk)
+
+    def _emit(self, chunk: str) -> None:
+        if not self._first_emitted:
+            self._first_emitted = True
+            self._stats.first_chunk_chars.append(len(chunk))
+            if self._started_at is not None:
+                self._stats.first_chunk_delay.append(time.perf_counter() - self._started_at)
+        self._event_ch.send_nowait(TokenData(segment_id=self._segment_id, token=chunk))
+
+    def flush(self) -> None:
+        self._check_not_closed()
+        for chunk in self._chunker.flush():
+            self._emit(chunk)
+        self._segment_id = utils.shortuuid()
+        self._started_at = None
+        self._first_emitted = False
+
+    def end_input(self) -> None:
+        self.flush()
+        self._do_close()
+
+    async def aclose(self) -> None:
+        self._do_close()
+
+
+class SpeechSegmenter(tokenize.SentenceTokenizer):
+    """Tokenizer para el TTS: primera cláusula temprana y luego oraciones agrupadas"""
+
+    def __init__(self) -> None:
+        self.stats = SegmenterStats()
+
+    def tokenize(self, text: str, *, language: str | None = None) -> list[str]:
+        chunker = _Chunker()
+        return chunker.push(text) + chunker.flush()
+
+    def stream(self, *, language: str | None = None) -> tokenize.SentenceStream:
+        return SpeechSegmentStream(self.stats)
+
+
+def attach_speech_metrics(session: AgentSession, segmenter: SpeechSegmenter) -> None:
+    """Registra el TTFB del TTS y resume la distribución al cerrar la sesión"""
+
+    @session.on("metrics_collected")
+    def _on_metrics(ev: MetricsCollectedEvent) -> None:
+        if isinstance(ev.metrics, metrics.TTSMetrics) and ev.metrics.ttfb > 0:
+            segmenter.stats.ttfa.append(ev.metrics.ttfb)
+
+    @session.on("close")
+    def _on_close(ev: CloseEvent) -> None:
+        stats = segmenter.stats
+        if not stats.first_chunk_chars:
+            return
+        logger.info(
+            f"[SEGMENTER] Primer trozo: {statistics.mean(stats.first_chunk_chars):.0f} caracteres en promedio "
+            f"({len(stats.first_chunk_chars)} respuestas); TTFA p50={_percentile(stats.ttfa, 0.5):.3f}s "
+            f"p95={_percentile(stats.ttfa, 0.95):.3f}s"
+        )
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
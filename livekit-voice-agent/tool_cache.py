@@ -0,0 +1,320 @@
+"""Deduplicación y fusión de llamadas a herramientas dentro de una sesión.
+
+El LLM repite herramientas: vuelve a llamar a `guardar_prospecto` cuando el
+cliente corrige un dato y repite `consultar_horarios_disponibles` o
+`buscar_en_base_de_conocimiento` con los mismos argumentos (o casi: mayúsculas,
+tildes, signos). Cada repetición es un viaje a MCP o a Supabase.
+
+`ToolCallCache` (una por sesión) envuelve las herramientas del `Assistant` y las
+del servidor MCP (`CachedMCPServerHTTP`):
+
+- lecturas (TOOL_CACHE_READS): resultado memorizado por argumentos normalizados
+  durante TOOL_CACHE_TTL_S; una llamada igual en curso se comparte en vez de
+  repetirse. Los errores no se memorizan.
+- escrituras por teléfono (TOOL_CACHE_UPSERTS): la primera de cada número se
+  envía en el acto y el LLM recibe el resultado real. Las correcciones que
+  llegan dentro de TOOL_WRITE_COALESCE_S desde el último envío se fusionan por
+  teléfono y se envían juntas al terminar esa ventana, con todos los datos del
+  prospecto (el lado MCP actualiza por teléfono: reenviar es idempotente). Si
+  no cambia nada respecto de lo ya guardado no se envía. Un envío fallido queda
+  pendiente; si el cliente corrige el teléfono (mismo nombre, otro número), la
+  corrección lo reemplaza. Lo pendiente al colgar lo envía el trabajo
+  post-llamada de prospectos.
+- otras escrituras (p. ej. `agendar_cita`): antes se envían los prospectos
+  pendientes y se descartan las lecturas memorizadas que pueden cambiar (los
+  horarios); las de TOOL_CACHE_STABLE (la base de conocimiento) se conservan.
+
+Al cerrar la sesión se registra cuántos viajes se evitaron.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+from livekit.agents import AgentSession, CloseEvent, ToolError, function_tool, mcp
+from livekit.agents.llm.tool_context import get_raw_function_info
+
+logger = logging.getLogger(__name__)
+
+TOOL_CACHE = os.getenv("TOOL_CACHE", "true").lower() == "true"
+TOOL_CACHE_TTL_S = float(os.getenv("TOOL_CACHE_TTL_S", "300"))
+TOOL_CACHE_READS = {
+    t.strip() for t in os.getenv(
+        "TOOL_CACHE_READS", "buscar_en_base_de_conocimiento,consultar_inventario,consultar_horarios_disponibles"
+    ).split(",") if t.strip()
+}
+# Lecturas que ninguna escritura de la llamada cambia
+TOOL_CACHE_STABLE = {t.strip() for t in os.getenv("TOOL_CACHE_STABLE", "buscar_en_base_de_conocimiento").split(",") if t.strip()}
+TOOL_CACHE_UPSERTS = {t.strip() for t in os.getenv("TOOL_CACHE_UPSERTS", "guardar_prospecto").split(",") if t.strip()}
+# Ventana tras un envío en la que las correcciones del mismo prospecto se juntan (llegan en segundos)
+TOOL_WRITE_COALESCE_S = float(os.getenv("TOOL_WRITE_COALESCE_S", "10"))
+# Dígitos finales que identifican un teléfono ("+51 987 654 321" y "987654321" son el mismo)
+PHONE_KEY_DIGITS = int(os.getenv("TOOL_CACHE_PHONE_DIGITS", "9"))
+
+_PHONE_ARG = re.compile(r"tel|phone|celular|movil|fono", re.IGNORECASE)
+_NAME_ARG = re.compile(r"nombre|name", re.IGNORECASE)
+
+ToolCall = Callable[[dict], Awaitable[Any]]
+# Resuelve una herramienta en el proceso o la deja seguir (`call`) hacia MCP
+ToolHandler = Callable[[str, dict, ToolCall], Awaitable[Any]]
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s:]", " ", text).split())
+
+
+def _present(args: dict) -> dict:
+    return {k: v for k, v in args.items() if v not in (None, "")}
+
+
+def call_key(name: str, args: dict) -> str:
+    """Clave de una lectura: argumentos sin vacíos, textos normalizados"""
+    normalized = {k: _normalize(v) if isinstance(v, str) else v for k, v in _present(args).items()}
+    return f"{name}:{json.dumps(normalized, sort_keys=True, ensure_ascii=False)}"
+
+
+def _comparable(args: dict) -> dict:
+    """Datos de un prospecto para decidir si cambiaron: teléfono por sus dígitos, textos normalizados"""
+    return {
+        k: (phone_key({k: v}) or v) if _PHONE_ARG.search(k) else _normalize(v) if isinstance(v, str) else v
+        for k, v in _present(args).items()
+    }
+
+
+def _name(args: dict) -> str | None:
+    for arg, value in args.items():
+        if _NAME_ARG.search(arg) and isinstance(value, str) and value.strip():
+            return _normalize(value)
+    return None
+
+
+def phone_key(args: dict) -> str | None:
+    for arg, value in args.items():
+        if _PHONE_ARG.search(arg) and value:
+            digits = re.sub(r"\D", "", str(value))
+            if len(digits) >= 6:
+                return digits[-PHONE_KEY_DIGITS:]
+    return None
+
+
+@dataclass
+class _PendingWrite:
+    name: str
+    args: dict
+    call: ToolCall
+    timer: asyncio.TimerHandle | None = None
+
+
+class ToolCallCache:
+    def __init__(self, *, ttl_s: float = TOOL_CACHE_TTL_S, coalesce_s: float = TOOL_WRITE_COALESCE_S) -> None:
+        self.ttl_s = ttl_s
+        self.coalesce_s = coalesce_s
+        self._reads: dict[str, tuple[str, float, Any]] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._pending: dict[str, _PendingWrite] = {}
+        self._written: dict[str, dict] = {}
+        # Último envío por teléfono (monotonic) y un envío a la vez por teléfono, en orden
+        self._sent_at: dict[str, float] = {}
+        self._write_locks: dict[str, asyncio.Lock] = {}
+        self._flushing: set[asyncio.Task] = set()
+        self.calls: Counter[str] = Counter()
+        self.avoided: Counter[str] = Counter()
+        self._closed = False
+
+    async def call(self, name: str, args: dict, call: ToolCall) -> Any:
+        """Ejecuta `call(args)` o la evita según el tipo de herramienta"""
+        self.calls[name] += 1
+        if name in TOOL_CACHE_READS:
+            return await self._read(name, args, call)
+        if name in TOOL_CACHE_UPSERTS and not self._closed and (key := phone_key(args)):
+            return await self._upsert(key, name, args, call)
+        # Escritura que puede depender de los prospectos y cambiar lo leído (agendar, cancelar...)
+        await self.flush()
+        self._reads = {key: read for key, read in self._reads.items() if read[0] in TOOL_CACHE_STABLE}
+        return await call(args)
+
+    async def _read(self, name: str, args: dict, call: ToolCall) -> Any:
+        key = call_key(name, args)
+        cached = self._reads.get(key)
+        if cached and time.monotonic() - cached[1] < self.ttl_s:
+            self.avoided[name] += 1
+            logger.info(f"[TOOL_CACHE] {name}: resultado memorizado")
+            return cached[2]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.avoided[name] += 1
+            logger.info(f"[TOOL_CACHE] {name}: compartiendo la llamada en curso")
+            return await asyncio.shield(inflight)
+
+        # Tarea propia: si se interrumpe el turno que la pidió, el resultado queda para la repetición
+        task = asyncio.ensure_future(call(args))
+        self._inflight[key] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+        self._reads[key] = (name, time.monotonic(), result)
+        return result
+
+    async def _upsert(self, key: str, name: str, args: dict, call: ToolCall) -> Any:
+        pending = self._pending.get(key)
+        if pending is None and key not in self._written:
+            pending = self._take_corrected_phone(key, args)
+        written = self._written.get(key)
+        merged = {**(written or {}), **(pending.args if pending else {}), **_present(args)}
+        if pending is None and written is not None and _comparable(merged) == _comparable(written):
+            self.avoided[name] += 1
+            logger.info(f"[TOOL_CACHE] {name}: sin cambios para el teléfono {key}")
+            return "Los datos del prospecto ya estaban guardados, sin cambios."
+
+        if pending is not None:
+            self.avoided[name] += 1
+            if pending.timer:
+                pending.timer.cancel()
+            pending.args, pending.call = merged, call
+        else:
+            pending = self._pending[key] = _PendingWrite(name, merged, call)
+
+        sent_at = self._sent_at.get(key)
+        if sent_at is not None and (wait := self.coalesce_s - (time.monotonic() - sent_at)) > 0:
+            # Corrección poco después de un envío: se junta con las que sigan y sale al cerrar la ventana
+            pending.timer = asyncio.get_running_loop().call_later(wait, self._spawn_flush, key)
+            logger.info(f"[TOOL_CACHE] {name}: corrección del prospecto {key} en cola ({pending.args})")
+            return "Corrección registrada: se guarda junto con los datos anteriores en unos segundos."
+        return await self._flush_one(key, raise_errors=True)
+
+    def _take_corrected_phone(self, key: str, args: dict) -> _PendingWrite | None:
+        """Prospecto no enviado del mismo nombre con otro teléfono: se corrigió el número"""
+        name = _name(args)
+        for other, pending in self._pending.items():
+            if name and _name(pending.args) == name and other not in self._written:
+                logger.info(f"[TOOL_CACHE] Teléfono corregido antes del envío: {other} -> {key}")
+                self._pending[key] = self._pending.pop(other)
+                return pending
+        return None
+
+    def _spawn_flush(self, key: str) -> None:
+        task = asyncio.create_task(self._flush_one(key))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush_one(self, key: str, *, raise_errors: bool = False) -> Any:
+        async with self._write_locks.setdefault(key, asyncio.Lock()):
+            pending = self._pending.pop(key, None)
+            if pending is None:
+                return None
+            if pending.timer:
+                pending.timer.cancel()
+            # Desde el inicio del envío: una corrección simultánea espera la ventana
+            self._sent_at[key] = time.monotonic()
+            try:
+                result = await pending.call(pending.args)
+            except Exception as e:
+                # Queda pendiente para el próximo envío o para el trabajo post-llamada
+                logger.error(f"[TOOL_CACHE] {pending.name}: no se pudo guardar el prospecto {key}: {e}")
+                self._sent_at.pop(key, None)
+                queued = self._pending.get(key)
+                if queued is not None:
+                    queued.args = {**pending.args, **queued.args}
+                else:
+                    self._pending[key] = pending
+                if raise_errors:
+                    raise
+                return None
+            self._written[key] = pending.args
+            logger.info(f"[TOOL_CACHE] {pending.name}: prospecto {key} guardado")
+            return result
+
+    async def flush(self) -> None:
+        """Envía ya los prospectos pendientes"""
+        for key in list(self._pending):
+            await self._flush_one(key)
+
+    async def aclose(self) -> list[tuple[str, dict]]:
+        """Deja de acumular y devuelve lo que no se pudo enviar durante la llamada (nombre, argumentos)"""
+        self._closed = True
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+        pending = list(self._pending.values())
+        self._pending.clear()
+        for write in pending:
+            if write.timer:
+                write.timer.cancel()
+        return [(write.name, write.args) for write in pending]
+
+    def summary(self) -> str:
+        total, avoided = sum(self.calls.values()), sum(self.avoided.values())
+        detail = ", ".join(f"{name} {self.avoided[name]}/{count}" for name, count in self.calls.most_common())
+        return f"{avoided} de {total} viajes evitados ({detail or 'sin herramientas'})"
+
+
+def attach_tool_cache_summary(session: AgentSession, cache: ToolCallCache) -> None:
+    @session.on("close")
+    def _on_close(ev: CloseEvent) -> None:
+        logger.info(f"[TOOL_CACHE] Resumen - {cache.summary()}")
+
+
+class CachedMCPServerHTTP(mcp.MCPServerHTTP):
+    """Servidor MCP cuyas herramientas pasan por la `ToolCallCache` de la sesión y, antes, por un
+    manejador del proceso (`handler`, p. ej. los horarios de `availability.py`).
+
+    `timeouts` reemplaza, por herramienta, la espera de `client_session_timeout_seconds`
+    (p. ej. más larga para las escrituras, que no conviene cortar a mitad).
+    """
+
+    def __init__(
+        self, *args, cache: ToolCallCache | None = None, handler: ToolHandler | None = None,
+        timeouts: dict[str, float] | None = None, **kwargs
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+        self.handler = handler
+        self.timeouts = timeouts or {}
+
+    def _make_function_tool(self, name, description, input_schema, meta):
+        tool = super()._make_function_tool(name, description, input_schema, meta)
+        timeout = self.timeouts.get(name)
+
+        async def _call(raw_arguments: dict) -> Any:
+            if timeout is None:
+                return await tool(raw_arguments=raw_arguments)
+            return await self._call_tool(name, raw_arguments, timeout)
+
+        async def _cached(raw_arguments: dict) -> Any:
+            if self.cache is None:
+                return await _call(raw_arguments)
+            return await self.cache.call(name, raw_arguments, _call)
+
+        async def _tool_called(raw_arguments: dict[str, Any]) -> Any:
+            if self.handler is None:
+                return await _cached(raw_arguments)
+            return await self.handler(name, raw_arguments, _cached)
+
+        return function_tool(_tool_called, raw_schema=get_raw_function_info(tool).raw_schema)
+
+    async def _call_tool(self, name: str, raw_arguments: dict, timeout: float) -> Any:
+        """Como la herramienta de `MCPServer`, con su propia espera máxima"""
+        if self._client is None:
+            raise ToolError("Tool invocation failed: internal service is unavailable.")
+        result = await self._client.call_tool(name, raw_arguments, read_timeout_seconds=timedelta(seconds=timeout))
+        if result.isError:
+            raise ToolError("\n".join(str(part) for part in result.content))
+        if len(result.content) == 1:
+            return result.content[0].model_dump_json()
+        if len(result.content) > 1:
+            return json.dumps([item.model_dump() for item in result.content])
+        raise ToolError(f"Tool '{name}' completed without producing a result.")
@@ -0,0 +1,285 @@
+"""Enrutado de TTS por latencia y salud de cada proveedor.
+
+`TTSRouter` es un `FallbackAdapter` de livekit. Cada proveedor es otra voz, así
+que la llamada se queda con el preferido (el primero de TTS_PROVIDERS) mientras
+esté sano. Si el proveedor elegido falla antes de emitir audio, el adapter
+reenvía el texto ya recibido al siguiente, así que el turno no se pierde.
+
+Con TTS_ROUTING=utterance el router revisa la salud antes de cada locución y
+solo cambia de proveedor si el actual dejó de estar sano (demasiados errores o
+TTFB p95 sobre TTS_ROUTER_MAX_TTFB_S). El reemplazo es el sano con menor TTFB
+p95; los que aún no tienen mediciones van después de los sanos medidos. Cuando
+un proveedor anterior en TTS_PROVIDERS vuelve a estar sano (sus fallas salieron
+de la ventana o el sondeo lo recuperó), se vuelve a él.
+
+Por defecto (TTS_ROUTING=session) no hay enrutado por latencia: la llamada usa
+el preferido y el adapter solo cae al siguiente si falla, y vuelve al preferido
+cuando se recupera.
+
+La salud se mide en el proceso del job, es decir, durante la llamada: TTFB p95
+a partir de las métricas del TTS y tasa de errores a partir de sus eventos de
+error, en una ventana de tiempo. Las muestras viejas caducan, de modo que un
+proveedor degradado vuelve a probarse cuando pasa la ventana.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from functools import partial
+
+from livekit.agents import AgentSession, CloseEvent, metrics, tts
+from livekit.agents.tts.fallback_adapter import DEFAULT_FALLBACK_API_CONNECT_OPTIONS, AvailabilityChangedEvent
+from livekit.agents.types import APIConnectOptions
+
+logger = logging.getLogger(__name__)
+
+# Proveedores en orden de preferencia inicial
+TTS_PROVIDERS = [p.strip() for p in os.getenv("TTS_PROVIDERS", "elevenlabs,cartesia").split(",") if p.strip()]
+# "session": el proveedor preferido toda la llamada (el adapter cae al siguiente si falla);
+# "utterance": además se cambia de proveedor entre locuciones si el actual deja de estar sano
+TTS_ROUTING = os.getenv("TTS_ROUTING", "session")
+# Ventana de las estadísticas de salud
+TTS_ROUTER_WINDOW_S = float(os.getenv("TTS_ROUTER_WINDOW_S", "120"))
+# Tasa de errores a partir de la cual un proveedor se considera no sano
+TTS_ROUTER_MAX_ERROR_RATE = float(os.getenv("TTS_ROUTER_MAX_ERROR_RATE", "0.2"))
+# TTFB p95 (s) a partir del cual un proveedor se considera no sano
+TTS_ROUTER_MAX_TTFB_S = float(os.getenv("TTS_ROUTER_MAX_TTFB_S", "1.0"))
+# Reintentos en el mismo proveedor antes de pasar al siguiente
+TTS_ROUTER_MAX_RETRY = int(os.getenv("TTS_ROUTER_MAX_RETRY", "0"))
+# Cada cuánto se sondea en segundo plano un proveedor caído
+TTS_ROUTER_PROBE_INTERVAL_S = float(os.getenv("TTS_ROUTER_PROBE_INTERVAL_S", "10"))
+_PROBE_TEXT = "Hola."
+_MIN_SAMPLES = 3
+
+
+def _quantile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+@dataclass
+class ProviderHealth:
+    name: str
+    window_s: float = TTS_ROUTER_WINDOW_S
+    # (instante, ttfb) y (instante, éxito)
+    ttfb: deque[tuple[float, float]] = field(default_factory=deque)
+    outcomes: deque[tuple[float, bool]] = field(default_factory=deque)
+
+    def record_ttfb(self, ttfb: float, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        self.ttfb.append((now, ttfb))
+        self.outcomes.append((now, True))
+
+    def record_error(self, now: float | None = None) -> None:
+        self.outcomes.append((time.monotonic() if now is None else now, False))
+
+    def _prune(self, now: float) -> None:
+        for samples in (self.ttfb, self.outcomes):
+            while samples and now - samples[0][0] > self.window_s:
+                samples.popleft()
+
+    def p95_ttfb(self, now: float | None = None) -> float | None:
+        self._prune(time.monotonic() if now is None else now)
+        if len(self.ttfb) < _MIN_SAMPLES:
+            return None
+        return _quantile([v for _, v in self.ttfb], 0.95)
+
+    def error_rate(self, now: float | None = None) -> float:
+        self._prune(time.monotonic() if now is None else now)
+        if len(self.outcomes) < _MIN_SAMPLES:
+            return 0.0
+        return sum(not ok for _, ok in self.outcomes) / len(self.outcomes)
+
+    def healthy(self, now: float | None = None) -> bool:
+        p95 = self.p95_ttfb(now)
+        return self.error_rate(now) < TTS_ROUTER_MAX_ERROR_RATE and (p95 is None or p95 < TTS_ROUTER_MAX_TTFB_S)
+
+    def score(self, now: float | None = None) -> tuple[bool, bool, float]:
+        """Menor es mejor: sanos medidos por TTFB p95, luego sanos sin mediciones, luego los no sanos"""
+        p95 = self.p95_ttfb(now)
+        return (not self.healthy(now), p95 is None, 0.0 if p95 is None else p95)
+
+
+# Salud por proveedor del proceso. Cada proceso de job atiende una llamada, así que
+# empieza sin mediciones en cada llamada
+_health: dict[str, ProviderHealth] = {}
+
+
+class TTSRouter(tts.FallbackAdapter):
+    def __init__(
+        self,
+        providers: dict[str, tts.TTS],
+        *,
+        routing: str = TTS_ROUTING,
+        sample_rate: int | None = None,
+        health: dict[str, ProviderHealth] | None = None,
+    ) -> None:
+        instances = list(providers.values())
+        super().__init__(
+            instances,
+            max_retry_per_tts=TTS_ROUTER_MAX_RETRY,
+            # Por defecto, la tasa del proveedor preferido (sin remuestrear en el caso normal)
+            sample_rate=sample_rate or instances[0].sample_rate,
+        )
+        self._per_utterance = routing == "utterance"
+        self._names = {id(t): name for name, t in providers.items()}
+        # Posición de cada proveedor en TTS_PROVIDERS
+        self._rank = {id(t): i for i, t in enumerate(instances)}
+        registry = _health if health is None else health
+        self._health = {name: registry.setdefault(name, ProviderHealth(name)) for name in providers}
+        self._streams: set[tts.ChunkedStream | tts.SynthesizeStream] = set()
+        self._last_probe: dict[str, float] = {}
+
+        self._listeners = []
+        for name, t in providers.items():
+            on_metrics = partial(self._on_provider_metrics, name)
+            on_error = partial(self._on_provider_error, name)
+            t.on("metrics_collected", on_metrics)
+            t.on("error", on_error)
+            self._listeners.append((t, on_metrics, on_error))
+        self.on("tts_availability_changed", self._on_availability_changed)
+
+        self._route()
+
+    @property
+    def current(self) -> str:
+        return self._names[id(self._tts_instances[0])]
+
+    @property
+    def current_tts(self) -> tts.TTS:
+        return self._tts_instances[0]
+
+    def _on_provider_metrics(self, name: str, ev: metrics.TTSMetrics) -> None:
+        if ev.ttfb > 0 and not ev.cancelled:
+            self._health[name].record_ttfb(ev.ttfb)
+
+    def _on_provider_error(self, name: str, ev: tts.TTSError) -> None:
+        self._health[name].record_error()
+
+    def _on_availability_changed(self, ev: AvailabilityChangedEvent) -> None:
+        name = self._names[id(ev.tts)]
+        if ev.available:
+            logger.info(f"[TTS_ROUTER] {name} disponible de nuevo")
+        else:
+            logger.warning(f"[TTS_ROUTER] {name} falló, el turno continúa con el siguiente proveedor")
+
+    def _route(self) -> None:
+        """Vuelve a un proveedor anterior en TTS_PROVIDERS en cuanto está sano; si no, cambia solo
+        si el actual dejó de estar sano y hay uno mejor"""
+        now = time.monotonic()
+        scores = {id(t): self._health[self._names[id(t)]].score(now) for t in self._tts_instances}
+        healthy = [
+            status.available and not scores[id(t)][0] for t, status in zip(self._tts_instances, self._status)
+        ]
+        rank = [self._rank[id(t)] for t in self._tts_instances]
+        # El preferido recuperado (disponible y sin errores ni TTFB alto en la ventana) vuelve al frente
+        preferred = min((i for i in range(len(rank)) if healthy[i]), key=rank.__getitem__, default=None)
+        if preferred is not None and rank[preferred] < rank[0]:
+            order = [preferred, *(i for i in range(len(rank)) if i != preferred)]
+        elif healthy[0]:
+            return
+        else:
+            # Orden estable: entre los que empatan (p. ej. sin mediciones) se respeta el orden actual;
+            # los que el adapter marcó como caídos van al final
+            order = sorted(
+                range(len(self._tts_instances)),
+                key=lambda i: (not self._status[i].available, *scores[id(self._tts_instances[i])]),
+            )
+        if order[0] == 0:
+            return
+
+        # Se reemplazan las listas (no se mutan) junto con su estado de disponibilidad
+        self._tts_instances = [self._tts_instances[i] for i in order]
+        self._status = [self._status[i] for i in order]
+        logger.info(
+            f"[TTS_ROUTER] Proveedor principal: {self.current} - "
+            + ", ".join(
+                f"{self._names[id(t)]}: p95={'-' if scores[id(t)][1] else f'{scores[id(t)][2]:.2f}s'}"
+                for t in self._tts_instances
+            )
+        )
+
+    def _probe_unavailable(self, now: float) -> None:
+        """Sondea los proveedores marcados como caídos por el adapter.
+
+        El adapter solo intenta recuperarlos cuando el bucle de fallback pasa por
+        ellos con texto ya recibido; el router los sondea por su cuenta para que
+        un proveedor recuperado vuelva a competir.
+        """
+        for t, status in zip(self._tts_instances, self._status):
+            name = self._names[id(t)]
+            if status.available or (status.recovering_task and not status.recovering_task.done()):
+                continue
+            if now - self._last_probe.get(name, 0.0) < TTS_ROUTER_PROBE_INTERVAL_S:
+                continue
+            self._last_probe[name] = now
+            status.recovering_task = asyncio.create_task(self._probe(t, status))
+
+    async def _probe(self, t: tts.TTS, status) -> None:
+        try:
+            async with t.stream(conn_options=DEFAULT_FALLBACK_API_CONNECT_OPTIONS) as stream:
+                stream.push_text(_PROBE_TEXT)
+                stream.end_input()
+                async for _ in stream:
+                    pass
+        except Exception:
+            logger.info(f"[TTS_ROUTER] {self._names[id(t)]} sigue sin responder")
+            return
+
+        status.available = True
+        self.emit("tts_availability_changed", AvailabilityChangedEvent(tts=t, available=True))
+
+    def _maybe_route(self) -> None:
+        # Los caídos se sondean también con TTS_ROUTING=session: así el adapter vuelve al preferido
+        self._probe_unavailable(time.monotonic())
+        # Solo se reordena sin locuciones en curso: sus bucles de fallback leen estas listas
+        self._streams = {s for s in self._streams if not _stream_done(s)}
+        if self._per_utterance and not self._streams:
+            self._route()
+
+    def synthesize(
+        self, text: str, *, conn_options: APIConnectOptions = DEFAULT_FALLBACK_API_CONNECT_OPTIONS
+    ) -> tts.ChunkedStream:
+        self._maybe_route()
+        stream = super().synthesize(text, conn_options=conn_options)
+        self._streams.add(stream)
+        return stream
+
+    def stream(
+        self, *, conn_options: APIConnectOptions = DEFAULT_FALLBACK_API_CONNECT_OPTIONS
+    ) -> tts.SynthesizeStream:
+        self._maybe_route()
+        stream = super().stream(conn_options=conn_options)
+        self._streams.add(stream)
+        return stream
+
+    def summary(self) -> str:
+        parts = []
+        for name, health in self._health.items():
+            p95 = health.p95_ttfb()
+            parts.append(
+                f"{name}: p95={'-' if p95 is None else f'{p95:.2f}s'} errores={health.error_rate():.0%}"
+            )
+        return ", ".join(parts)
+
+    async def aclose(self) -> None:
+        for t, on_metrics, on_error in self._listeners:
+            t.off("metrics_collected", on_metrics)
+            t.off("error", on_error)
+        await super().aclose()
+
+
+def _stream_done(stream: tts.ChunkedStream | tts.SynthesizeStream) -> bool:
+    task = stream._task if isinstance(stream, tts.SynthesizeStream) else stream._synthesize_task
+    return task.done()
+
+
+def attach_router_summary(session: AgentSession, router: TTSRouter) -> None:
+    @session.on("close")
+    def _on_close(ev: CloseEvent) -> None:
+        logger.info(f"[TTS_ROUTER] Resumen - {router.summary()}")
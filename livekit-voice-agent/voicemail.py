@@ -0,0 +1,288 @@
+"""Detección de contestadora y buzón de voz en llamadas salientes.
+
+Cuando el recordatorio cae en un buzón, el agente conversa con la grabación y
+ocupa un proceso y un canal del troncal. `VoicemailDetector` decide con los
+primeros segundos del audio del cliente combinando tres señales:
+
+- cadencia: una persona contesta con algo corto ("¿aló?") y espera; una
+  contestadora habla de corrido varios segundos
+- pitido: tono puro y sostenido (300-2500 Hz) como el que precede a la grabación
+- transcripción: frases típicas de buzón ("deje su mensaje", "después del tono"...)
+
+`VoicemailGuard` lo ejecuta en la rama saliente del entrypoint. Si detecta un
+buzón deja de escuchar, corta el saludo y, según VOICEMAIL_ACTION, deja tras el
+pitido un mensaje corto ya sintetizado durante el timbrado o cuelga de inmediato.
+El detector es puro (frames PCM y textos con marca de tiempo) para poder
+evaluarlo sin conexión con `evals/eval_voicemail.py`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Literal
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import AgentSession, UserInputTranscribedEvent
+
+from outbound_greeting import replay, synthesize
+
+logger = logging.getLogger(__name__)
+
+VOICEMAIL_DETECTION = os.getenv("VOICEMAIL_DETECTION", "true").lower() == "true"
+# "message" deja un mensaje tras el pitido; "hangup" cuelga al detectar el buzón
+VOICEMAIL_ACTION = os.getenv("VOICEMAIL_ACTION", "message").lower()
+# Sin decisión tras este tiempo se asume una persona (el error barato)
+VOICEMAIL_MAX_DECISION_S = float(os.getenv("VOICEMAIL_MAX_DECISION_S", "5"))
+# Máximo que se espera el pitido (o el fin de la grabación) para dejar el mensaje
+VOICEMAIL_BEEP_WAIT_S = float(os.getenv("VOICEMAIL_BEEP_WAIT_S", "8"))
+
+FRAME_MS = 20
+SPEECH_MIN_DBFS = -42.0
+# Por encima del piso de ruido para considerar voz
+SPEECH_OVER_NOISE_DB = 10.0
+# Silencio que cierra una locución
+PAUSE_S = 0.6
+# Una persona contesta corto; una contestadora habla de corrido
+HUMAN_MAX_UTTERANCE_S = 1.8
+HUMAN_WAIT_S = 1.2
+MACHINE_MIN_SPEECH_S = 3.0
+# Pitido: tono concentrado y estable durante al menos BEEP_MIN_S
+BEEP_MIN_S = 0.14
+BEEP_MIN_PURITY = 0.7
+BEEP_FREQ_RANGE = (300.0, 2500.0)
+BEEP_FREQ_TOLERANCE = 60.0
+# Silencio tras la grabación que se toma como fin del saludo si no hay pitido
+GREETING_END_SILENCE_S = 1.5
+
+# Sin "no se encuentra en este momento", "no está disponible" ni "no puede atender": una
+# persona los contesta cuando se busca a otro. Las grabaciones que solo dicen eso se
+# detectan por la cadencia (voz continua) o el pitido
+_VOICEMAIL_CUES = re.compile(
+    r"deje (?:su|un|tu) mensaje|despues (?:del|de la) (?:tono|senal|pitido)|buzon|casilla de voz|"
+    r"contestadora|grabe su mensaje|el numero (?:que usted )?marco|fuera del area"
+)
+
+Label = Literal["humano", "buzon"]
+
+
+@dataclass
+class Decision:
+    label: Label
+    reason: str
+    # Segundos de audio del cliente hasta la decisión
+    at_s: float
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def is_voicemail_phrase(text: str) -> bool:
+    return bool(_VOICEMAIL_CUES.search(_normalize(text)))
+
+
+class VoicemailDetector:
+    """Analiza ventanas de 20 ms del audio del cliente y decide persona o buzón"""
+
+    def __init__(self, sample_rate: int) -> None:
+        self.sample_rate = sample_rate
+        self._window = sample_rate * FRAME_MS // 1000
+        self._hann = np.hanning(self._window)
+        self._freqs = np.fft.rfftfreq(self._window, 1 / sample_rate)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self.elapsed_s = 0.0
+        self.decision: Decision | None = None
+        self.beep_at: float | None = None
+        self._noise_dbfs = -60.0
+        self._utterance_start: float | None = None
+        self._last_speech: float | None = None
+        self._utterances: list[float] = []
+        self._speech_s = 0.0
+        self._tone_run: list[float] = []
+
+    def push_audio(self, samples: np.ndarray) -> Decision | None:
+        """Recibe PCM int16 mono; devuelve la decisión en cuanto la hay"""
+        self._pending = np.concatenate([self._pending, samples.astype(np.float32) / 32768.0])
+        while len(self._pending) >= self._window:
+            window, self._pending = self._pending[: self._window], self._pending[self._window :]
+            self._analyze(window)
+            self.elapsed_s += FRAME_MS / 1000
+        return self.decision
+
+    def push_transcript(self, text: str) -> Decision | None:
+        if self.decision is None and is_voicemail_phrase(text):
+            self._decide("buzon", "frase de buzón")
+        return self.decision
+
+    @property
+    def greeting_over(self) -> bool:
+        """Tras decidir buzón: pitido o silencio suficiente para dejar el mensaje"""
+        if self.beep_at is not None:
+            return True
+        return self._last_speech is not None and self.elapsed_s - self._last_speech >= GREETING_END_SILENCE_S
+
+    def _decide(self, label: Label, reason: str) -> None:
+        if self.decision is None:
+            self.decision = Decision(label=label, reason=reason, at_s=self.elapsed_s)
+
+    def _analyze(self, window: np.ndarray) -> None:
+        now = self.elapsed_s
+        dbfs = 10 * np.log10(np.mean(window**2) + 1e-12)
+        if self._is_beep(window, dbfs):
+            self.beep_at = now
+            self._decide("buzon", "pitido")
+
+        speech = dbfs > max(SPEECH_MIN_DBFS, self._noise_dbfs + SPEECH_OVER_NOISE_DB)
+        if not speech:
+            # El piso de ruido sigue rápido hacia abajo y lento hacia arriba
+            rate = 0.3 if dbfs < self._noise_dbfs else 0.02
+            self._noise_dbfs += rate * (dbfs - self._noise_dbfs)
+
+        if speech:
+            if self._utterance_start is None:
+                self._utterance_start = now
+            self._last_speech = now
+            self._speech_s += FRAME_MS / 1000
+        elif self._utterance_start is not None and now - self._last_speech >= PAUSE_S:
+            self._utterances.append(self._last_speech - self._utterance_start)
+            self._utterance_start = None
+
+        if self.decision is None:
+            self._apply_cadence(now)
+
+    def _apply_cadence(self, now: float) -> None:
+        # Voz de corrido (pausas < PAUSE_S) más larga de lo que contesta una persona
+        if self._utterance_start is not None and self._last_speech - self._utterance_start >= MACHINE_MIN_SPEECH_S:
+            self._decide("buzon", "voz continua")
+        elif self._utterances and self._utterance_start is None:
+            silence = now - self._last_speech
+            if len(self._utterances) == 1 and self._utterances[0] <= HUMAN_MAX_UTTERANCE_S:
+                self._decide("humano", "respuesta corta")
+            elif silence >= HUMAN_WAIT_S and self._speech_s < MACHINE_MIN_SPEECH_S:
+                self._decide("humano", "espera respuesta")
+        if self.decision is None and now >= VOICEMAIL_MAX_DECISION_S:
+            if self._speech_s >= MACHINE_MIN_SPEECH_S:
+                self._decide("buzon", "mucha voz")
+            else:
+                self._decide("humano", "sin decisión" if self._speech_s else "silencio")
+
+    def _is_beep(self, window: np.ndarray, dbfs: float) -> bool:
+        if dbfs < SPEECH_MIN_DBFS:
+            self._tone_run.clear()
+            return False
+        spectrum = np.abs(np.fft.rfft(window * self._hann)) ** 2
+        peak = int(np.argmax(spectrum))
+        purity = spectrum[max(peak - 1, 0) : peak + 2].sum() / (spectrum.sum() + 1e-12)
+        freq = float(self._freqs[peak])
+        if purity < BEEP_MIN_PURITY or not BEEP_FREQ_RANGE[0] <= freq <= BEEP_FREQ_RANGE[1]:
+            self._tone_run.clear()
+            return False
+        if self._tone_run and abs(freq - self._tone_run[0]) > BEEP_FREQ_TOLERANCE:
+            self._tone_run.clear()
+        self._tone_run.append(freq)
+        return len(self._tone_run) * FRAME_MS / 1000 >= BEEP_MIN_S
+
+
+def voicemail_message(name: str, appointment_time: str, company: str = "AutoFuturo IA") -> str:
+    return (
+        f"Hola {name}, te llamamos de {company} para recordarte tu cita programada para {appointment_time}. "
+        "Si necesitas reagendarla, devuélvenos la llamada. ¡Gracias!"
+    )
+
+
+class VoicemailGuard:
+    def __init__(self, session: AgentSession, *, message: str, action: str = VOICEMAIL_ACTION) -> None:
+        self.session = session
+        self.message = message
+        self.action = action
+        self.decision: Decision | None = None
+        self.frames: list[rtc.AudioFrame] | None = None
+        self._prerender_task: asyncio.Task | None = None
+        self._task: asyncio.Task | None = None
+
+    def prerender(self) -> None:
+        """Sintetiza el mensaje de buzón mientras suena el teléfono"""
+        if self.action == "message":
+            self._prerender_task = asyncio.create_task(self._prerender())
+
+    async def _prerender(self) -> None:
+        try:
+            self.frames = await synthesize(self.session.tts, self.message)
+        except Exception as e:
+            logger.warning(f"[VOICEMAIL] No se pudo pre-sintetizar el mensaje: {e}")
+
+    def start(self, participant: rtc.RemoteParticipant, sample_rate: int = 8000) -> None:
+        self._task = asyncio.create_task(self.run(participant, sample_rate), name="voicemail_guard")
+
+    async def run(self, participant: rtc.RemoteParticipant, sample_rate: int = 8000) -> Decision:
+        detector = VoicemailDetector(sample_rate)
+        answered_at = time.perf_counter()
+
+        @self.session.on("user_input_transcribed")
+        def _on_transcript(ev: UserInputTranscribedEvent) -> None:
+            detector.push_transcript(ev.transcript)
+
+        stream = rtc.AudioStream.from_participant(
+            participant=participant,
+            track_source=rtc.TrackSource.SOURCE_MICROPHONE,
+            sample_rate=sample_rate,
+            num_channels=1,
+        )
+        try:
+            async for ev in stream:
+                detector.push_audio(np.frombuffer(ev.frame.data, dtype=np.int16))
+                if detector.decision is not None:
+                    break
+            if detector.decision is None:
+                return Decision("humano", "sin audio", time.perf_counter() - answered_at)
+
+            self.decision = detector.decision
+            logger.info(
+                f"[VOICEMAIL] Decisión: {self.decision.label} ({self.decision.reason}) a los "
+                f"{self.decision.at_s:.1f}s de audio, {time.perf_counter() - answered_at:.1f}s tras contestar"
+            )
+            if self.decision.label == "buzon":
+                await self._handle_voicemail(stream, detector)
+            return self.decision
+        finally:
+            self.session.off("user_input_transcribed", _on_transcript)
+            await stream.aclose()
+
+    async def _handle_voicemail(self, stream: rtc.AudioStream, detector: VoicemailDetector) -> None:
+        # La grabación ya no llega al LLM y se corta el saludo (aunque no admita interrupciones)
+        self.session.input.set_audio_enabled(False)
+        self.session.interrupt(force=True)
+
+        if self.action != "message":
+            logger.info("[VOICEMAIL] Colgando sin dejar mensaje")
+            await self.session.aclose()
+            return
+
+        async def _wait_greeting_end() -> None:
+            if detector.greeting_over:
+                return
+            async for ev in stream:
+                detector.push_audio(np.frombuffer(ev.frame.data, dtype=np.int16))
+                if detector.greeting_over:
+                    return
+
+        try:
+            await asyncio.wait_for(_wait_greeting_end(), VOICEMAIL_BEEP_WAIT_S)
+        except asyncio.TimeoutError:
+            logger.info("[VOICEMAIL] Sin pitido, dejando el mensaje igualmente")
+        if self._prerender_task is not None:
+            await self._prerender_task
+
+        audio = replay(self.frames) if self.frames else None
+        await self.session.say(self.message, audio=audio, allow_interruptions=False).wait_for_playout()
+        logger.info("[VOICEMAIL] Mensaje dejado, colgando")
+        # Al cerrar la sesión se elimina la sala (delete_room_on_close)
+        self.session.shutdown()
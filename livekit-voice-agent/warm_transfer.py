@@ -0,0 +1,260 @@
+"""Transferencia en caliente a un asesor humano.
+
+La transferencia ciega (`transfer_sip_participant`) deja al llamante en silencio
+mientras se establece la llamada y el asesor contesta sin contexto. Con
+`WarmTransfer`:
+
+1. Al pedirse la transferencia se marca a TRANSFER_TO en una sala de consulta
+   (`<sala>-consulta`) en segundo plano; el asistente sigue conversando con el
+   llamante mientras tanto.
+2. En paralelo se genera un resumen corto de la llamada con el modelo rápido y
+   el agente entra a la sala de consulta, con su propio TTS: el aviso al
+   llamante y el resumen al asesor suenan a la vez y no comparten conexión.
+3. Cuando el asesor contesta escucha el resumen y se le mueve a la sala del
+   llamante (`move_participant`); recién entonces sale el agente. Si no se puede
+   mover (solo LiveKit Cloud) se recurre a la transferencia ciega.
+4. Si el asesor no contesta en TRANSFER_RING_TIMEOUT_S se cancela la marcación y
+   el asistente ofrece que un asesor devuelva la llamada.
+
+La espera del llamante se mide desde que se pide la transferencia hasta que
+queda con el asesor o recibe la oferta de devolución.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Literal
+
+from google.protobuf.duration_pb2 import Duration
+from livekit import api, rtc
+from livekit.agents import Agent, AgentSession, RoomInputOptions, RoomOutputOptions, get_job_context, inference, llm, tts
+
+from llm_router import LLM_FAST_MODELS
+
+logger = logging.getLogger(__name__)
+
+# "warm" marca al asesor en paralelo; "blind" mantiene la transferencia SIP directa
+TRANSFER_MODE = os.getenv("TRANSFER_MODE", "warm").lower()
+TRANSFER_RING_TIMEOUT_S = float(os.getenv("TRANSFER_RING_TIMEOUT_S", "25"))
+TRANSFER_SUMMARY_TIMEOUT_S = float(os.getenv("TRANSFER_SUMMARY_TIMEOUT_S", "4"))
+ADVISOR_IDENTITY = "asesor"
+
+SUMMARY_PROMPT = (
+    "Eres el asistente de una concesionaria y vas a transferir una llamada a un asesor humano. "
+    "Resume la conversación para el asesor en dos oraciones habladas, en español y sin listas: "
+    "quién llama si se sabe, qué necesita y qué se le ofreció. Escribe números y horas en palabras."
+)
+
+Outcome = Literal["puenteada", "devolucion", "ciega", "fallida"]
+
+
+@dataclass
+class TransferResult:
+    outcome: Outcome
+    # Segundos desde que se pidió la transferencia hasta que el llamante queda atendido
+    caller_wait_s: float
+
+
+def call_transcript(history: llm.ChatContext, max_turns: int = 20) -> str:
+    lines = [
+        f"{'Cliente' if item.role == 'user' else 'Agente'}: {item.text_content}"
+        for item in history.items
+        if item.type == "message" and item.role in ("user", "assistant") and item.text_content
+    ]
+    return "\n".join(lines[-max_turns:])
+
+
+async def summarize_call(history: llm.ChatContext, reason: str) -> str:
+    """Resumen hablado para el asesor; si el LLM no responde a tiempo se usa el motivo"""
+    fallback = f"Te transfiero a un cliente del asistente virtual. Motivo: {reason}."
+    transcript = call_transcript(history)
+    if not transcript:
+        return fallback
+
+    chat_ctx = llm.ChatContext()
+    chat_ctx.add_message(role="system", content=SUMMARY_PROMPT)
+    chat_ctx.add_message(role="user", content=f"Motivo de la transferencia: {reason}\n\n{transcript}")
+    summary_llm = inference.LLM(LLM_FAST_MODELS[0])
+    try:
+        async def _generate() -> str:
+            parts = []
+            async with summary_llm.chat(chat_ctx=chat_ctx) as stream:
+                async for chunk in stream:
+                    if chunk.delta and chunk.delta.content:
+                        parts.append(chunk.delta.content)
+            return "".join(parts).strip()
+
+        summary = await asyncio.wait_for(_generate(), TRANSFER_SUMMARY_TIMEOUT_S)
+        return summary or fallback
+    except Exception as e:
+        logger.warning(f"[TRANSFER] No se pudo generar el resumen: {e}")
+        return fallback
+    finally:
+        await summary_llm.aclose()
+
+
+class WarmTransfer:
+    def __init__(
+        self,
+        session: AgentSession,
+        *,
+        caller_identity: str,
+        transfer_to: str,
+        trunk_id: str,
+        reason: str,
+        tts_factory: Callable[[], tts.TTS],
+    ) -> None:
+        self.session = session
+        self.caller_identity = caller_identity
+        self.transfer_to = transfer_to
+        self.trunk_id = trunk_id
+        self.reason = reason
+        self.result: TransferResult | None = None
+        self._job_ctx = get_job_context()
+        self._consult_room_name = f"{self._job_ctx.room.name}-consulta"
+        self._requested_at = 0.0
+        self._task: asyncio.Task | None = None
+        # TTS de la sala de consulta, aparte del de la sesión del llamante
+        self._tts_factory = tts_factory
+        self._consult_tts: tts.TTS | None = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def bridged(self) -> bool:
+        return self.result is not None and self.result.outcome == "puenteada"
+
+    def start(self) -> None:
+        self._requested_at = time.perf_counter()
+        self._task = asyncio.create_task(self._run(), name="warm_transfer")
+
+    def _finish(self, outcome: Outcome) -> TransferResult:
+        self.result = TransferResult(outcome=outcome, caller_wait_s=time.perf_counter() - self._requested_at)
+        logger.info(f"[TRANSFER] Resultado: {outcome}, espera del llamante: {self.result.caller_wait_s:.1f}s")
+        return self.result
+
+    async def _run(self) -> TransferResult:
+        consult_room = rtc.Room()
+        summary_task = asyncio.create_task(summarize_call(self.session.history, self.reason))
+        join_task = asyncio.create_task(self._join_consult_room(consult_room))
+        try:
+            try:
+                await self._dial_advisor()
+            except (asyncio.TimeoutError, api.TwirpError) as e:
+                logger.warning(f"[TRANSFER] El asesor no contestó: {e}")
+                return await self._offer_callback()
+
+            consult_session = await join_task
+            summary = await summary_task
+            logger.info(f"[TRANSFER] Asesor en línea, resumen: {summary}")
+
+            # El llamante sabe que ya lo comunican mientras el asesor escucha el resumen
+            self.session.interrupt()
+            caller_notice = self.session.say("Listo, ya tengo a un asesor en línea. Te comunico en un momento.")
+            await asyncio.gather(caller_notice.wait_for_playout(), consult_session.say(summary).wait_for_playout())
+
+            try:
+                await self._job_ctx.api.room.move_participant(
+                    api.MoveParticipantRequest(
+                        room=self._consult_room_name,
+                        identity=ADVISOR_IDENTITY,
+                        destination_room=self._job_ctx.room.name,
+                    )
+                )
+            except Exception as e:
+                logger.warning(f"[TRANSFER] No se pudo mover al asesor ({e}), usando transferencia ciega")
+                return await self._blind_fallback()
+
+            result = self._finish("puenteada")
+            # El agente sale y libera el proceso; la sala sigue con el llamante y el asesor
+            await self.session.aclose()
+            self._job_ctx.shutdown("transferencia completada")
+            return result
+        except Exception as e:
+            logger.error(f"[TRANSFER] Error en la transferencia en caliente: {e}", exc_info=True)
+            return await self._offer_callback(outcome="fallida")
+        finally:
+            for task in (summary_task, join_task):
+                task.cancel()
+            if join_task.done() and not join_task.cancelled() and join_task.exception() is None:
+                await join_task.result().aclose()
+            await consult_room.disconnect()
+            if self._consult_tts is not None:
+                await self._consult_tts.aclose()
+            if not self.bridged:
+                await self._delete_consult_room()
+
+    async def _dial_advisor(self) -> None:
+        request = api.CreateSIPParticipantRequest(
+            room_name=self._consult_room_name,
+            sip_trunk_id=self.trunk_id,
+            sip_call_to=self.transfer_to,
+            participant_identity=ADVISOR_IDENTITY,
+            participant_name="Asesor",
+            ringing_timeout=Duration(seconds=int(TRANSFER_RING_TIMEOUT_S)),
+            wait_until_answered=True,
+        )
+        logger.info(f"[TRANSFER] Marcando al asesor {self.transfer_to} en {self._consult_room_name}")
+        # Margen sobre el timbrado por si el servidor no corta a tiempo
+        await asyncio.wait_for(
+            self._job_ctx.api.sip.create_sip_participant(request), TRANSFER_RING_TIMEOUT_S + 5
+        )
+
+    async def _join_consult_room(self, room: rtc.Room) -> AgentSession:
+        """El agente entra a la sala de consulta solo para hablarle al asesor"""
+        token = (
+            api.AccessToken()
+            .with_identity(f"agente-{self._consult_room_name}")
+            .with_grants(api.VideoGrants(room_join=True, room=self._consult_room_name))
+            .to_jwt()
+        )
+        await room.connect(os.getenv("LIVEKIT_URL"), token)
+        self._consult_tts = self._tts_factory()
+        consult_session = AgentSession(tts=self._consult_tts)
+        await consult_session.start(
+            agent=Agent(instructions="Informa al asesor sobre la llamada que se le transfiere."),
+            room=room,
+            room_input_options=RoomInputOptions(audio_enabled=False, close_on_disconnect=False, delete_room_on_close=False),
+            room_output_options=RoomOutputOptions(transcription_enabled=False),
+        )
+        return consult_session
+
+    async def _offer_callback(self, outcome: Outcome = "devolucion") -> TransferResult:
+        self.session.interrupt()
+        self.session.generate_reply(
+            instructions=(
+                "No se pudo comunicar al cliente con un asesor en este momento. Discúlpate brevemente y "
+                "ofrécele que un asesor le devuelva la llamada; si acepta, confirma su nombre y teléfono "
+                "y usa guardar_prospecto."
+            )
+        )
+        return self._finish(outcome)
+
+    async def _blind_fallback(self) -> TransferResult:
+        # El asesor ya escuchó el resumen: se corta la consulta y se transfiere al llamante directamente
+        await self._delete_consult_room()
+        try:
+            await self._job_ctx.api.sip.transfer_sip_participant(
+                api.TransferSIPParticipantRequest(
+                    room_name=self._job_ctx.room.name,
+                    participant_identity=self.caller_identity,
+                    transfer_to=f"tel:{self.transfer_to}",
+                )
+            )
+        except Exception as e:
+            logger.error(f"[TRANSFER] Falló la transferencia ciega: {e}")
+            return await self._offer_callback(outcome="fallida")
+        return self._finish("ciega")
+
+    async def _delete_consult_room(self) -> None:
+        try:
+            await self._job_ctx.api.room.delete_room(api.DeleteRoomRequest(room=self._consult_room_name))
+        except Exception as e:
+            logger.debug(f"[TRANSFER] No se pudo eliminar la sala de consulta: {e}")